@@ -0,0 +1,270 @@
+"""
+End-to-End-Durchsatz-Benchmark für FaxFinity.
+
+Lässt den vollständigen `scan_and_process`-Pfad gegen einen Mock-Ollama
+(mock_ollama_server.py) oder eine Replay-Kassette laufen und misst für
+jede Korpusgröße:
+  - Dateien/Minute
+  - Latenz je Verarbeitungsschritt (p50/p95/Mittelwert, aus den
+    Zeitmessungen von process_single_pdf)
+  - Peak-RSS
+  - Platten-I/O (gelesen/geschrieben)
+
+Jede Größe läuft in einem eigenen Python-Prozess, damit Peak-RSS und I/O
+nicht von vorherigen Läufen verfälscht werden.
+
+Beispiele:
+    python benchmarks/bench_pipeline.py --sizes 10,100 --backend mock
+    python benchmarks/bench_pipeline.py --backend replay --save baseline.json
+    python benchmarks/bench_pipeline.py --backend replay --compare baseline.json
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from faxfinity.timing import STAGES, percentile
+
+
+# ──────────────────────────────────────────────────────────────
+# MESSHILFEN
+# ──────────────────────────────────────────────────────────────
+def peak_rss_mb() -> float | None:
+    """Peak-RSS des aktuellen Prozesses in MB."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux: KB, macOS: Bytes
+        return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / 1024 / 1024
+    except ImportError:
+        return None
+
+
+def io_counters() -> dict | None:
+    """Gelesene/geschriebene Bytes des aktuellen Prozesses (inkl. Page-Cache-Zugriffe)."""
+    try:
+        import psutil
+        c = psutil.Process().io_counters()
+        return {"read_bytes": c.read_bytes, "write_bytes": c.write_bytes}
+    except (ImportError, AttributeError):
+        pass
+    try:
+        with open("/proc/self/io", "r") as f:
+            values = dict(line.split(": ") for line in f.read().splitlines())
+        # rchar/wchar zählen alle read()/write()-Aufrufe, auch aus dem Cache
+        return {"read_bytes": int(values["rchar"]), "write_bytes": int(values["wchar"])}
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def summarize(values: list) -> dict:
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values) if values else 0.0,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+    }
+
+
+# ──────────────────────────────────────────────────────────────
+# EINZELLAUF (im Kindprozess)
+# ──────────────────────────────────────────────────────────────
+def run_single(args) -> dict:
+    from faxfinity import pipeline
+
+    if not args.verbose:
+        logging.getLogger("FaxFinity").setLevel(logging.WARNING)
+
+    run_dir = os.path.abspath(args.run_dir)
+    inbox = os.path.join(run_dir, "inbox")
+    os.makedirs(inbox, exist_ok=True)
+    corpus = sorted(f for f in os.listdir(args.corpus_dir) if f.lower().endswith(".pdf"))[: args.single]
+    for name in corpus:
+        shutil.copyfile(os.path.join(args.corpus_dir, name), os.path.join(inbox, name))
+    os.chdir(run_dir)  # processing_history.db landet im Lauf-Ordner
+
+    cfg = dict(pipeline.DEFAULT_CONFIG)
+    cfg.update(
+        eingangsordner=inbox,
+        ollama_url=args.ollama_url,
+        ollama_model=args.model,
+        scan_pause=0,
+        ollama_cassette_mode=args.cassette_mode,
+        ollama_cassette_path=args.cassette_path,
+    )
+
+    io_before = io_counters()
+    t0 = time.perf_counter()
+    results = pipeline.scan_and_process(cfg)
+    elapsed = time.perf_counter() - t0
+    io_after = io_counters()
+
+    statuses: dict = {}
+    stages: dict = {}
+    for r in results:
+        statuses[r["status"]] = statuses.get(r["status"], 0) + 1
+        for stage, ms in r.get("timings_ms", {}).items():
+            stages.setdefault(stage, []).append(ms / 1000)
+
+    report = {
+        "files": len(results),
+        "seconds": elapsed,
+        "files_per_min": len(results) / elapsed * 60 if elapsed > 0 else 0.0,
+        "statuses": statuses,
+        "stages": {name: summarize(stages[name]) for name in STAGES if name in stages},
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    if io_before and io_after:
+        report["read_mb"] = (io_after["read_bytes"] - io_before["read_bytes"]) / 1024 / 1024
+        report["write_mb"] = (io_after["write_bytes"] - io_before["write_bytes"]) / 1024 / 1024
+    return report
+
+
+# ──────────────────────────────────────────────────────────────
+# STEUERUNG (Elternprozess)
+# ──────────────────────────────────────────────────────────────
+def _spawn(args, size: int, run_dir: str, ollama_url: str, cassette_mode: str) -> dict:
+    cmd = [
+        sys.executable, os.path.abspath(__file__),
+        "--single", str(size),
+        "--run-dir", run_dir,
+        "--corpus-dir", args.corpus_dir,
+        "--ollama-url", ollama_url,
+        "--model", args.model,
+        "--cassette-mode", cassette_mode,
+        "--cassette-path", args.cassette_path,
+    ]
+    if args.verbose:
+        cmd.append("--verbose")
+    proc = subprocess.run(cmd, capture_output=True, text=True)
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr)
+        raise SystemExit(f"Benchmark-Lauf mit {size} Dateien fehlgeschlagen.")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def print_report(results: dict, baseline: dict | None = None):
+    def delta(now, before):
+        if not before:
+            return ""
+        return f" ({(now - before) / before * 100:+.0f} %)"
+
+    for size, r in results.items():
+        base = (baseline or {}).get(size)
+        print(f"\n── {size} Dateien ──")
+        print(f"  Durchsatz:  {r['files_per_min']:.1f} Dateien/min"
+              f"{delta(r['files_per_min'], base and base['files_per_min'])}"
+              f"   ({r['seconds']:.1f} s)")
+        print(f"  Status:     {r['statuses']}")
+        if r.get("peak_rss_mb") is not None:
+            print(f"  Peak-RSS:   {r['peak_rss_mb']:.0f} MB"
+                  f"{delta(r['peak_rss_mb'], base and base.get('peak_rss_mb'))}")
+        if "read_mb" in r:
+            print(f"  Disk-I/O:   {r['read_mb']:.1f} MB gelesen, {r['write_mb']:.1f} MB geschrieben")
+        print(f"  {'Schritt':<19} {'p50 ms':>9} {'p95 ms':>9} {'Ø ms':>9}")
+        for stage, s in r["stages"].items():
+            base_p50 = base and base["stages"].get(stage, {}).get("p50")
+            print(f"  {stage:<19} {s['p50'] * 1000:>9.1f} {s['p95'] * 1000:>9.1f} "
+                  f"{s['mean'] * 1000:>9.1f}{delta(s['p50'], base_p50)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FaxFinity End-to-End-Benchmark")
+    parser.add_argument("--sizes", default="10,100,1000", help="Kommagetrennte Korpusgrößen")
+    parser.add_argument("--backend", choices=["mock", "replay"], default="mock")
+    parser.add_argument("--latency", default="const:0",
+                        help="Latenz-Verteilung des Mock-Servers (siehe mock_ollama_server.py)")
+    parser.add_argument("--mock-concurrency", type=int, default=1)
+    parser.add_argument("--model", default="llama3.2-vision")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", default="", help="Arbeitsordner (Standard: temporär)")
+    parser.add_argument("--save", default="", help="Ergebnisse als JSON speichern")
+    parser.add_argument("--compare", default="", help="Mit gespeicherter Baseline vergleichen")
+    parser.add_argument("--verbose", action="store_true")
+    # intern: Einzellauf im Kindprozess
+    parser.add_argument("--single", type=int, default=0, help=argparse.SUPPRESS)
+    parser.add_argument("--run-dir", default="", help=argparse.SUPPRESS)
+    parser.add_argument("--corpus-dir", default="", help=argparse.SUPPRESS)
+    parser.add_argument("--ollama-url", default="", help=argparse.SUPPRESS)
+    parser.add_argument("--cassette-mode", default="", help=argparse.SUPPRESS)
+    parser.add_argument("--cassette-path", default="", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        print(json.dumps(run_single(args)))
+        return 0
+
+    from generate_fax_corpus import generate_corpus
+    from mock_ollama_server import MockOllamaServer
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="faxfinity_bench_"))
+    os.makedirs(workdir, exist_ok=True)
+
+    args.corpus_dir = os.path.join(workdir, f"corpus_seed{args.seed}")
+    existing = len([f for f in os.listdir(args.corpus_dir)]) if os.path.isdir(args.corpus_dir) else 0
+    if existing < max(sizes):
+        print(f"Erzeuge Korpus mit {max(sizes)} Faxen in {args.corpus_dir} ...")
+        shutil.rmtree(args.corpus_dir, ignore_errors=True)
+        generate_corpus(args.corpus_dir, max(sizes), seed=args.seed)
+
+    server = MockOllamaServer(
+        port=0,
+        latency=args.latency if args.backend == "mock" else "const:0",
+        max_concurrency=args.mock_concurrency,
+        seed=args.seed,
+    ).start()
+
+    args.cassette_path = ""
+    cassette_mode = ""
+    ollama_url = server.url
+    if args.backend == "replay":
+        args.cassette_path = os.path.join(workdir, f"cassette_seed{args.seed}.jsonl")
+        if not os.path.exists(args.cassette_path):
+            print("Nehme Kassette gegen Mock-Server auf ...")
+            _spawn(args, max(sizes), os.path.join(workdir, "record"), server.url, "record")
+        cassette_mode = "replay"
+        ollama_url = "http://127.0.0.1:9"  # darf im Replay nie angesprochen werden
+
+    results = {}
+    try:
+        for size in sizes:
+            run_dir = os.path.join(workdir, f"run_{size}")
+            shutil.rmtree(run_dir, ignore_errors=True)
+            print(f"Lauf: {size} Dateien ({args.backend}) ...")
+            results[str(size)] = _spawn(args, size, run_dir, ollama_url, cassette_mode)
+    finally:
+        server.stop()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+    print_report(results, baseline)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"backend": args.backend, "latency": args.latency, "seed": args.seed,
+                       "results": results}, f, indent=2)
+        print(f"\nErgebnisse gespeichert: {args.save}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
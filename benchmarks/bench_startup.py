@@ -0,0 +1,255 @@
+"""
+Kaltstart-Benchmark für FaxFinity.
+
+Misst in jeweils frischen Python-Prozessen:
+  - Import der Pipeline (faxfinity.pipeline) und der Kommandozeile
+  - Server bereit: `streamlit run faxsort_ai.py` bis /_stcore/health antwortet
+  - Erste Darstellung: erster Skriptlauf der Oberfläche (Streamlit AppTest)
+    sowie ein Rerun im selben Prozess
+  - Erstes verarbeitetes Fax: Prozessstart bis ein Fax gegen den
+    Mock-Ollama fertig umbenannt ist
+
+Jede Messung wird `--repeat`-mal wiederholt; berichtet wird der Median.
+
+Beispiele:
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --repeat 5 --save startup.json
+    python benchmarks/bench_startup.py --compare startup.json
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+APP_SCRIPT = os.path.join(REPO_DIR, "faxsort_ai.py")
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from faxfinity.timing import percentile
+
+HEAVY_MODULES = ("streamlit", "pymupdf", "fitz", "PIL", "requests", "pdf2image")
+
+
+# ──────────────────────────────────────────────────────────────
+# MESSUNGEN (im Kindprozess)
+# ──────────────────────────────────────────────────────────────
+def child_import(args) -> dict:
+    t0 = time.perf_counter()
+    import faxfinity.pipeline  # noqa: F401
+    import faxfinity.cli  # noqa: F401
+    return {
+        "import_s": time.perf_counter() - t0,
+        "heavy_loaded": [m for m in HEAVY_MODULES if m in sys.modules],
+    }
+
+
+def child_paint(args) -> dict:
+    t0 = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    t_import = time.perf_counter()
+    at = AppTest.from_file(APP_SCRIPT, default_timeout=120)
+    at.run()
+    t_first = time.perf_counter()
+    if at.exception:
+        raise SystemExit(f"Oberfläche fehlerhaft: {at.exception}")
+    at.run()
+    t_rerun = time.perf_counter()
+    return {
+        "streamlit_import_s": t_import - t0,
+        "first_run_s": t_first - t_import,
+        "rerun_s": t_rerun - t_first,
+    }
+
+
+def child_fax(args) -> dict:
+    import logging
+    t0 = time.perf_counter()
+    from faxfinity import pipeline
+    t_import = time.perf_counter()
+    logging.getLogger("FaxFinity").setLevel(logging.WARNING)
+    cfg = pipeline.load_config()
+    cfg["scan_pause"] = 0
+    results = pipeline.scan_and_process(cfg, max_files=1)
+    if not results:
+        raise SystemExit("Kein Fax verarbeitet.")
+    return {
+        "import_s": t_import - t0,
+        "process_s": time.perf_counter() - t_import,
+        "status": results[0]["status"],
+    }
+
+
+CHILDREN = {"import": child_import, "paint": child_paint, "fax": child_fax}
+
+
+# ──────────────────────────────────────────────────────────────
+# STEUERUNG (Elternprozess)
+# ──────────────────────────────────────────────────────────────
+def _spawn(mode: str, cwd: str) -> tuple[float, dict]:
+    """Starte einen Kindprozess; Rückgabe: Wandzeit inkl. Interpreterstart, Bericht."""
+    cmd = [sys.executable, os.path.abspath(__file__), "--child", mode]
+    t0 = time.perf_counter()
+    proc = subprocess.run(cmd, capture_output=True, text=True, cwd=cwd)
+    wall = time.perf_counter() - t0
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr)
+        raise SystemExit(f"Messung '{mode}' fehlgeschlagen.")
+    return wall, json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure_server_ready(cwd: str, timeout: float = 60.0) -> float:
+    """`streamlit run` starten und warten, bis der Health-Endpunkt antwortet."""
+    port = _free_port()
+    cmd = [
+        sys.executable, "-m", "streamlit", "run", APP_SCRIPT,
+        "--server.headless", "true",
+        "--server.port", str(port),
+        "--browser.gatherUsageStats", "false",
+        "--server.fileWatcherType", "none",
+    ]
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - t0 < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1) as r:
+                    if r.status == 200:
+                        return time.perf_counter() - t0
+            except OSError:
+                time.sleep(0.05)
+        raise SystemExit("Streamlit-Server nicht rechtzeitig bereit.")
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def _prepare_workdir(workdir: str, ollama_url: str, with_fax: bool):
+    """Eingangsordner + config.json; optional mit einem Fax aus dem Korpus."""
+    from generate_fax_corpus import generate_corpus
+
+    shutil.rmtree(workdir, ignore_errors=True)
+    inbox = os.path.join(workdir, "inbox")
+    os.makedirs(inbox)
+    if with_fax:
+        generate_corpus(inbox, 1, seed=0)
+    with open(os.path.join(workdir, "config.json"), "w", encoding="utf-8") as f:
+        json.dump({"eingangsordner": inbox, "ollama_url": ollama_url}, f)
+
+
+def run_benchmark(args) -> dict:
+    from mock_ollama_server import MockOllamaServer
+
+    root = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="faxfinity_startup_"))
+    server = MockOllamaServer(port=0, latency="const:0").start()
+    samples: dict = {}
+
+    def add(name, value):
+        samples.setdefault(name, []).append(value)
+
+    try:
+        ui_dir = os.path.join(root, "ui")
+        _prepare_workdir(ui_dir, server.url, with_fax=False)
+        for i in range(args.repeat):
+            print(f"Durchlauf {i + 1}/{args.repeat} ...")
+            wall, r = _spawn("import", ui_dir)
+            add("import_process_s", wall)
+            add("import_s", r["import_s"])
+            samples["heavy_loaded"] = r["heavy_loaded"]
+
+            add("server_ready_s", measure_server_ready(ui_dir))
+
+            wall, r = _spawn("paint", ui_dir)
+            add("first_paint_process_s", wall)
+            add("first_run_s", r["first_run_s"])
+            add("rerun_s", r["rerun_s"])
+
+            fax_dir = os.path.join(root, f"fax_{i}")
+            _prepare_workdir(fax_dir, server.url, with_fax=True)
+            wall, r = _spawn("fax", fax_dir)
+            if r["status"] != "success":
+                raise SystemExit(f"Fax nicht erfolgreich verarbeitet: {r['status']}")
+            add("first_fax_process_s", wall)
+            add("first_fax_import_s", r["import_s"])
+    finally:
+        server.stop()
+
+    heavy = samples.pop("heavy_loaded", [])
+    report = {name: percentile(values, 50) for name, values in samples.items()}
+    report["heavy_loaded_by_pipeline"] = heavy
+    return report
+
+
+LABELS = [
+    ("import_process_s", "Prozess + Pipeline-Import"),
+    ("import_s", "  davon Import"),
+    ("server_ready_s", "Streamlit-Server bereit"),
+    ("first_paint_process_s", "Erste Darstellung (Prozess)"),
+    ("first_run_s", "  davon erster Skriptlauf"),
+    ("rerun_s", "Rerun (Module gecacht)"),
+    ("first_fax_process_s", "Erstes Fax verarbeitet"),
+    ("first_fax_import_s", "  davon Import"),
+]
+
+
+def print_report(report: dict, baseline: dict | None = None):
+    print(f"\n  {'Messung':<30} {'Median':>10}")
+    for key, label in LABELS:
+        if key not in report:
+            continue
+        line = f"  {label:<30} {report[key] * 1000:>8.0f} ms"
+        before = (baseline or {}).get(key)
+        if before:
+            line += f" ({(report[key] - before) / before * 100:+.0f} %)"
+        print(line)
+    heavy = report.get("heavy_loaded_by_pipeline")
+    print(f"\n  Schwere Module beim Pipeline-Import: {', '.join(heavy) if heavy else 'keine'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FaxFinity Kaltstart-Benchmark")
+    parser.add_argument("--repeat", type=int, default=3, help="Wiederholungen je Messung")
+    parser.add_argument("--workdir", default="", help="Arbeitsordner (Standard: temporär)")
+    parser.add_argument("--save", default="", help="Ergebnisse als JSON speichern")
+    parser.add_argument("--compare", default="", help="Mit gespeicherter Baseline vergleichen")
+    # intern: Messung im Kindprozess
+    parser.add_argument("--child", choices=sorted(CHILDREN), default="", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(CHILDREN[args.child](args)))
+        return 0
+
+    report = run_benchmark(args)
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+    print_report(report, baseline)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version.split()[0], "repeat": args.repeat,
+                       "results": report}, f, indent=2)
+        print(f"\nErgebnisse gespeichert: {args.save}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
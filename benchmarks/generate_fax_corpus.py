@@ -0,0 +1,254 @@
+"""
+Synthetischer Fax-Korpus für Benchmarks und Tests.
+
+Erzeugt realistische Fax-PDFs mit PyMuPDF:
+  - Briefköpfe mit Absender, Fachrichtung und Faxnummer
+  - Fax-Kopfzeile (Datum, Absender-Faxnummer, Seitenzahl)
+  - optionale Fax-Deckblätter
+  - mehrseitige Dokumente
+  - mit Textebene (digital versendet) oder ohne (gescannt: 1-Bit-Bild,
+    CCITT-G4-komprimiert, leicht gedreht und verrauscht)
+
+Beispiel:
+    python benchmarks/generate_fax_corpus.py corpus/ --count 100 --seed 1
+"""
+import argparse
+import io
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+from PIL import Image, ImageFilter
+
+try:
+    import pymupdf as fitz  # ab PyMuPDF 1.24.3, ohne Deprecation-Hinweis auf stdout
+except ImportError:
+    import fitz  # PyMuPDF
+
+A4_WIDTH, A4_HEIGHT = 595, 842  # Punkte
+FAX_DPI = 200  # "Fine"-Auflösung (~204x196 dpi)
+
+SENDERS = [
+    {"name": "Dr. med. Anna Schneider", "fach": "Kardiologie", "ort": "Nürnberg", "fax": "0911 4478120"},
+    {"name": "Dr. med. Jörg Müller", "fach": "Pneumologie", "ort": "Fürth", "fax": "0911 7789233"},
+    {"name": "Synlab MVZ Labor", "fach": "Labormedizin", "ort": "Erlangen", "fax": "09131 55012"},
+    {"name": "Seniorenresidenz Abendsonne", "fach": "Pflege", "ort": "Schwabach", "fax": "09122 83344"},
+    {"name": "Blindeninstitut", "fach": "Wohnheim", "ort": "Würzburg", "fax": "0931 20920"},
+    {"name": "Apotheke am Markt", "fach": "Apotheke", "ort": "Nürnberg", "fax": "0911 223399"},
+    {"name": "Radiologie Zentrum Süd", "fach": "Radiologie", "ort": "Nürnberg", "fax": "0911 6601177"},
+    {"name": "MediShop GmbH", "fach": "Praxisbedarf", "ort": "Hamburg", "fax": "040 8899001"},
+]
+PATIENTS = ["Wagner", "Neubauer", "Schäfer", "Öztürk", "Becker", "Weiß", "Hoffmann", "Krüger"]
+DOC_TYPES = {
+    "Arztbrief": [
+        "wir berichten über o.g. Patienten, der sich am {datum} in unserer",
+        "Sprechstunde vorstellte. Diagnosen: arterielle Hypertonie, KHK.",
+        "Befund: Sinusrhythmus, normofrequent, keine Erregungsrückbildungsstörung.",
+        "Procedere: Fortführung der bestehenden Medikation, Kontrolle in 6 Monaten.",
+    ],
+    "Labor": [
+        "Laborbefund vom {datum}",
+        "Hämoglobin 13,8 g/dl   Leukozyten 7,2 /nl   Thrombozyten 245 /nl",
+        "Kreatinin 0,9 mg/dl   GFR >90   TSH 1,8 mU/l   HbA1c 5,6 %",
+        "CRP 12 mg/l (erhöht)",
+    ],
+    "Rezeptanforderung": [
+        "bitte stellen Sie für o.g. Bewohner folgende Rezepte aus:",
+        "Ramipril 5 mg N3, Metformin 1000 mg N3, Pantoprazol 20 mg N2",
+        "Vielen Dank und freundliche Grüße, Wohnbereich 2",
+    ],
+    "Werbung": [
+        "SONDERANGEBOT nur diesen Monat!",
+        "Einmalhandschuhe Nitril, 10 Boxen à 100 Stück – jetzt 20 % günstiger.",
+        "Bestellen Sie einfach per Fax-Rückantwort.",
+    ],
+    "Kommunikation": [
+        "wir möchten Sie über eine Änderung der Besuchszeiten informieren.",
+        "Ab dem {datum} ist die Station werktags von 8 bis 18 Uhr erreichbar.",
+    ],
+}
+PRAXIS = "Praxis Dr. med. Florian Rasche, Huttenstr. 6"
+
+
+def _fax_header(sender: dict, when: datetime, page_no: int, page_count: int) -> str:
+    return (f"{when.strftime('%d.%m.%Y %H:%M')}   FAX {sender['fax']}   "
+            f"{sender['name'][:28]}   S. {page_no}/{page_count}")
+
+
+def _draw_cover_sheet(page, sender: dict, when: datetime, page_count: int):
+    page.insert_text((60, 90), "TELEFAX", fontsize=28, fontname="hebo")
+    y = 150
+    for label, value in [
+        ("An:", PRAXIS),
+        ("Von:", f"{sender['name']}, {sender['fach']}"),
+        ("Fax:", sender["fax"]),
+        ("Datum:", when.strftime("%d.%m.%Y %H:%M")),
+        ("Seiten:", f"{page_count} (inkl. Deckblatt)"),
+    ]:
+        page.insert_text((60, y), label, fontsize=12, fontname="hebo")
+        page.insert_text((140, y), value, fontsize=12, fontname="helv")
+        y += 24
+    page.draw_rect(fitz.Rect(60, y + 10, A4_WIDTH - 60, y + 160), color=(0, 0, 0), width=1)
+    page.insert_text((70, y + 32), "Vertraulich: Diese Nachricht enthält Patientendaten.",
+                     fontsize=10, fontname="helv")
+
+
+def _draw_letter_page(page, sender: dict, doc_type: str, patient: str, when: datetime,
+                      page_no: int, rng: random.Random):
+    # Briefkopf
+    page.draw_rect(fitz.Rect(50, 50, A4_WIDTH - 50, 120), color=(0, 0, 0), width=1.5)
+    page.insert_text((62, 78), sender["name"], fontsize=16, fontname="hebo")
+    page.insert_text((62, 96), f"{sender['fach']} · {sender['ort']}", fontsize=10, fontname="helv")
+    page.insert_text((62, 111), f"Telefax {sender['fax']}", fontsize=9, fontname="helv")
+
+    y = 160
+    if page_no == 1:
+        for line in (PRAXIS.split(", ")):
+            page.insert_text((62, y), line, fontsize=10, fontname="helv")
+            y += 13
+        y += 25
+        page.insert_text((62, y), f"{doc_type} - Patient: {patient}, geb. "
+                                  f"{rng.randint(1, 28):02d}.{rng.randint(1, 12):02d}.{rng.randint(1930, 2000)}",
+                         fontsize=11, fontname="hebo")
+        y += 30
+        page.insert_text((62, y), "Sehr geehrter Herr Kollege,", fontsize=10, fontname="helv")
+        y += 22
+
+    datum = (when - timedelta(days=rng.randint(1, 20))).strftime("%d.%m.%Y")
+    lines = [l.format(datum=datum) for l in DOC_TYPES[doc_type]]
+    # Fließtext auffüllen, damit Seiten realistisch "voll" sind
+    for _ in range(rng.randint(6, 18)):
+        lines.append(rng.choice(lines[: len(DOC_TYPES[doc_type])]))
+    for line in lines:
+        if y > A4_HEIGHT - 80:
+            break
+        page.insert_text((62, y), line, fontsize=10, fontname="helv")
+        y += 15
+
+
+def _rasterize_as_fax(src_page, rng: random.Random) -> tuple[bytes, int, int, bool]:
+    """
+    Rendere eine Seite wie ein Faxgerät: Graustufen → 1 Bit, leichte
+    Schräglage und Rauschen, CCITT-G4-kodiert.
+    Rückgabe: (G4-Daten, Breite, Höhe, BlackIs1).
+    """
+    pix = src_page.get_pixmap(dpi=FAX_DPI, colorspace=fitz.csGRAY)
+    img = Image.frombytes("L", [pix.width, pix.height], pix.samples)
+    img = img.rotate(rng.uniform(-0.8, 0.8), resample=Image.BILINEAR, fillcolor=255)
+    if rng.random() < 0.5:
+        img = img.filter(ImageFilter.GaussianBlur(0.6))
+    threshold = rng.randint(150, 190)
+    bw = img.point(lambda v: 255 if v > threshold else 0).convert("1")
+
+    # Speckle-Rauschen
+    px = bw.load()
+    for _ in range(rng.randint(200, 1500)):
+        px[rng.randrange(bw.width), rng.randrange(bw.height)] = 0
+
+    buf = io.BytesIO()
+    bw.save(buf, "TIFF", compression="group4", tiffinfo={278: bw.height})
+    tiff = Image.open(io.BytesIO(buf.getvalue()))
+    offset = tiff.tag_v2[273][0]
+    length = tiff.tag_v2[279][0]
+    black_is_1 = tiff.tag_v2.get(262) == 1
+    return buf.getvalue()[offset:offset + length], bw.width, bw.height, black_is_1
+
+
+def _insert_g4_image(page, g4: bytes, width: int, height: int, black_is_1: bool):
+    """Bette einen rohen CCITT-G4-Datenstrom als Bild-XObject ein."""
+    placeholder = io.BytesIO()
+    Image.new("1", (8, 8), 1).save(placeholder, "PNG")
+    xref = page.insert_image(page.rect, stream=placeholder.getvalue())
+    doc = page.parent
+    doc.update_stream(xref, g4, compress=False)
+    doc.xref_set_key(xref, "Width", str(width))
+    doc.xref_set_key(xref, "Height", str(height))
+    doc.xref_set_key(xref, "ColorSpace", "/DeviceGray")
+    doc.xref_set_key(xref, "BitsPerComponent", "1")
+    doc.xref_set_key(xref, "Filter", "/CCITTFaxDecode")
+    doc.xref_set_key(
+        xref, "DecodeParms",
+        f"<</K -1/Columns {width}/Rows {height}/BlackIs1 {'true' if black_is_1 else 'false'}>>",
+    )
+    for key in ("SMask", "Decode"):
+        doc.xref_set_key(xref, key, "null")
+
+
+def generate_fax(path: str, rng: random.Random, text_layer: bool, when: datetime) -> dict:
+    """Erzeuge ein einzelnes Fax-PDF. Rückgabe: Metadaten zum Dokument."""
+    sender = rng.choice(SENDERS)
+    doc_type = rng.choice(list(DOC_TYPES))
+    patient = "" if doc_type == "Werbung" else rng.choice(PATIENTS)
+    cover = rng.random() < 0.3
+    body_pages = rng.choices([1, 2, 3, 5], weights=[60, 25, 10, 5])[0]
+    page_count = body_pages + (1 if cover else 0)
+
+    src = fitz.open()
+    for page_no in range(1, page_count + 1):
+        page = src.new_page(width=A4_WIDTH, height=A4_HEIGHT)
+        page.insert_text((30, 22), _fax_header(sender, when, page_no, page_count),
+                         fontsize=8, fontname="cour")
+        if cover and page_no == 1:
+            _draw_cover_sheet(page, sender, when, page_count)
+        else:
+            _draw_letter_page(page, sender, doc_type, patient, when,
+                              page_no - (1 if cover else 0), rng)
+
+    if text_layer:
+        src.save(path, garbage=3, deflate=True)
+    else:
+        out = fitz.open()
+        for src_page in src:
+            g4, width, height, black_is_1 = _rasterize_as_fax(src_page, rng)
+            page = out.new_page(width=A4_WIDTH, height=A4_HEIGHT)
+            _insert_g4_image(page, g4, width, height, black_is_1)
+        out.save(path, garbage=3, deflate=True)
+        out.close()
+    src.close()
+
+    return {
+        "file": os.path.basename(path),
+        "kategorie": doc_type,
+        "absender": sender["name"],
+        "fax": sender["fax"],
+        "patient": patient,
+        "pages": page_count,
+        "cover_sheet": cover,
+        "text_layer": text_layer,
+    }
+
+
+def generate_corpus(out_dir: str, count: int, seed: int = 0, text_layer_ratio: float = 0.4) -> list:
+    """Erzeuge `count` Fax-PDFs in `out_dir`. Rückgabe: Liste der Metadaten."""
+    os.makedirs(out_dir, exist_ok=True)
+    rng = random.Random(seed)
+    start = datetime(2026, 1, 5, 7, 30)
+    docs = []
+    for i in range(count):
+        when = start + timedelta(minutes=rng.randint(0, 60 * 24 * 60))
+        # Dateinamen wie von typischen Fax-Servern
+        name = f"Fax_{when.strftime('%Y%m%d_%H%M%S')}_{i:05d}.pdf"
+        docs.append(generate_fax(os.path.join(out_dir, name), rng,
+                                 text_layer=rng.random() < text_layer_ratio, when=when))
+    return docs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetischen Fax-Korpus erzeugen")
+    parser.add_argument("out_dir", help="Zielordner für die PDFs")
+    parser.add_argument("--count", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--text-layer-ratio", type=float, default=0.4,
+                        help="Anteil der PDFs mit Textebene (Rest: gescannte 1-Bit-Bilder)")
+    args = parser.parse_args()
+
+    docs = generate_corpus(args.out_dir, args.count, args.seed, args.text_layer_ratio)
+    pages = sum(d["pages"] for d in docs)
+    size = sum(os.path.getsize(os.path.join(args.out_dir, d["file"])) for d in docs)
+    print(f"{len(docs)} Fax-PDFs ({pages} Seiten, {size / 1024 / 1024:.1f} MB) in {args.out_dir}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
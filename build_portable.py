@@ -18,6 +18,9 @@ FILES_TO_COPY = [
     "requirements.txt",
     "README.md",
 ]
+DIRS_TO_COPY = [
+    "faxfinity",
+]
 
 def main():
     print("=" * 60)
@@ -80,6 +83,14 @@ def main():
         if os.path.exists(src):
             shutil.copy2(src, dist_path)
             print(f"   ✓ {filename} kopiert")
+    for dirname in DIRS_TO_COPY:
+        src = os.path.join(base_dir, dirname)
+        if os.path.isdir(src):
+            shutil.copytree(
+                src, os.path.join(dist_path, dirname),
+                ignore=shutil.ignore_patterns("__pycache__", "*.pyc"),
+            )
+            print(f"   ✓ {dirname}/ kopiert")
 
     # Batch-Installer erstellen
     installer_bat = os.path.join(dist_path, "ERSTINSTALLATION.bat")
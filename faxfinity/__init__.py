@@ -0,0 +1,8 @@
+"""
+FaxFinity – Verarbeitungs-Pipeline und Hilfsmodule.
+
+Die Streamlit-Oberfläche liegt in ``faxsort_ai.py``, die Verarbeitung in
+``faxfinity.pipeline``, die Kommandozeile in ``faxfinity.cli``. Module dieses
+Pakets werden nur einmal pro Prozess importiert; ihr Zustand bleibt über
+Streamlit-Reruns hinweg erhalten.
+"""
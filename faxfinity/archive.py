@@ -0,0 +1,184 @@
+"""
+Deduplizierte Archivierung (`archiv_modus = "dedup"`).
+
+Im Modus "kopie" (Standard) legt Schritt 1 jedes Fax als vollständige Kopie
+in `Archiv/` ab – jedes Fax wird also mindestens zweimal geschrieben, und
+erneut gesendete Faxe liegen mehrfach im Archiv. Im Modus "dedup":
+
+  * Jede PDF liegt genau einmal unter ihrem SHA-256 in
+    `Archiv/objekte/ab/abcdef….pdf` (schreibgeschützt).
+  * Neue Objekte entstehen per Reflink (FICLONE, z.B. Btrfs/XFS: kein
+    Datenblock wird geschrieben), optional per Hardlink
+    (`archiv_hardlinks`), sonst als Kopie. Ist das Objekt schon da, wird
+    gar nichts geschrieben.
+  * Das Manifest (`Archiv/manifest_<knoten>.jsonl`, eine Zeile je Fax und
+    eine Datei je Rechner, damit sich Rechner am NAS nicht in die Quere
+    kommen) ordnet Zeitstempel und Originalnamen dem Objekt zu.
+
+Hardlinks teilen sich die Datei mit dem Fax, das danach nach Umbenannt/
+wandert: Eine dort direkt bearbeitete PDF würde das Archiv mitändern. Das
+Objekt ist deshalb schreibgeschützt – mit Hardlinks also auch die Datei in
+Umbenannt/. Darum sind Hardlinks nur auf Wunsch aktiv.
+
+Wiederherstellen: `python faxsort_ai.py archive <Name> [--restore ORDNER]`.
+"""
+
+import errno
+import hashlib
+import json
+import logging
+import os
+import shutil
+import stat
+import threading
+import uuid
+from datetime import datetime
+
+from faxfinity import metrics
+from faxfinity.leases import node_name
+
+logger = logging.getLogger("FaxFinity")
+
+ARCHIVE_MODES = ("kopie", "dedup")
+OBJECTS_DIR = "objekte"
+MANIFEST_PREFIX = "manifest_"
+FICLONE = 0x40049409  # linux/fs.h
+
+_manifest_lock = threading.Lock()
+
+
+def file_sha256(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def object_path(archiv_dir: str, digest: str) -> str:
+    return os.path.join(archiv_dir, OBJECTS_DIR, digest[:2], f"{digest}.pdf")
+
+
+def manifest_path(archiv_dir: str, cfg: dict) -> str:
+    return os.path.join(archiv_dir, f"{MANIFEST_PREFIX}{node_name(cfg)}.jsonl")
+
+
+def _reflink(src: str, dest: str) -> bool:
+    try:
+        import fcntl
+    except ImportError:
+        return False  # Windows
+    with open(src, "rb") as fsrc, open(dest, "wb") as fdest:
+        try:
+            fcntl.ioctl(fdest.fileno(), FICLONE, fsrc.fileno())
+        except OSError:
+            return False
+    shutil.copystat(src, dest)
+    return True
+
+
+def _materialize(src: str, dest: str, hardlinks: bool) -> str:
+    """Objekt anlegen. Rückgabe: Methode oder "vorhanden", wenn es schon jemand angelegt hat."""
+    if hardlinks:
+        try:
+            os.link(src, dest)
+            return "hardlink"
+        except FileExistsError:
+            return "vorhanden"
+        except OSError:
+            pass  # anderes Laufwerk oder Dateisystem ohne Hardlinks
+    # Unter Zufallsnamen schreiben und erst vollständig unter dem Hash sichtbar machen
+    tmp = f"{dest}.{uuid.uuid4().hex}.tmp"
+    try:
+        method = "reflink" if _reflink(src, tmp) else "kopie"
+        if method == "kopie":
+            shutil.copy2(src, tmp)
+        os.chmod(tmp, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+        try:
+            os.link(tmp, dest)  # scheitert, wenn ein anderer Prozess schneller war
+        except FileExistsError:
+            return "vorhanden"
+        except OSError:
+            os.replace(tmp, dest)  # ohne Hardlinks: gleicher Inhalt, Ersetzen schadet nicht
+        return method
+    finally:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+
+
+def store(pdf_path: str, archiv_dir: str, original: str, timestamp: str, cfg: dict) -> tuple[str, str]:
+    """
+    PDF ins deduplizierte Archiv übernehmen und im Manifest vermerken.
+    Rückgabe: (Objektpfad, Methode: "reflink"/"hardlink"/"kopie"/"vorhanden").
+    """
+    digest = file_sha256(pdf_path)
+    dest = object_path(archiv_dir, digest)
+    if os.path.exists(dest):
+        method = "vorhanden"
+    else:
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        method = _materialize(pdf_path, dest, bool(cfg.get("archiv_hardlinks")))
+        if method == "hardlink":
+            os.chmod(dest, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+    metrics.record_cache("archiv_dedup", method == "vorhanden")
+    entry = {
+        "zeit": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "zeitstempel": timestamp,
+        "original": original,
+        "sha256": digest,
+        "groesse": os.path.getsize(dest),
+        "objekt": os.path.relpath(dest, archiv_dir),
+        "postfach": cfg.get("postfach_name", ""),
+        "methode": method,
+    }
+    line = json.dumps(entry, ensure_ascii=False) + "\n"
+    with _manifest_lock, open(manifest_path(archiv_dir, cfg), "a", encoding="utf-8") as f:
+        f.write(line)
+    return dest, method
+
+
+# ──────────────────────────────────────────────────────────────
+# MANIFEST LESEN & WIEDERHERSTELLEN
+# ──────────────────────────────────────────────────────────────
+def read_manifest(archiv_dir: str):
+    """Alle Manifest-Zeilen aller Rechner (unsortiert)."""
+    try:
+        names = [n for n in os.listdir(archiv_dir)
+                 if n.startswith(MANIFEST_PREFIX) and n.endswith(".jsonl")]
+    except OSError:
+        return
+    for name in names:
+        with open(os.path.join(archiv_dir, name), "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue  # abgebrochene letzte Zeile
+
+
+def find(archiv_dir: str, name: str) -> list:
+    """Manifest-Einträge, deren Originalname mit `name` beginnt (oder deren Hash), neueste zuerst."""
+    needle = name.casefold()
+    found = [e for e in read_manifest(archiv_dir)
+             if e.get("original", "").casefold().startswith(needle) or e.get("sha256") == name]
+    return sorted(found, key=lambda e: e.get("zeitstempel", ""), reverse=True)
+
+
+def restore(archiv_dir: str, entry: dict, dest_dir: str) -> str:
+    """Objekt als `<zeitstempel>_<original>` nach `dest_dir` kopieren (beschreibbar)."""
+    src = os.path.join(archiv_dir, entry["objekt"])
+    os.makedirs(dest_dir, exist_ok=True)
+    dest = os.path.join(dest_dir, f"{entry['zeitstempel']}_{entry['original']}")
+    if os.path.exists(dest):
+        raise OSError(errno.EEXIST, "Datei existiert bereits", dest)
+    shutil.copyfile(src, dest)
+    return dest
+
+
+def summary(archiv_dir: str) -> dict:
+    """Anzahl Faxe, Objekte und eingesparte Bytes laut Manifest."""
+    faxe, objekte, gesamt = 0, {}, 0
+    for entry in read_manifest(archiv_dir):
+        faxe += 1
+        gesamt += entry.get("groesse", 0)
+        objekte[entry.get("sha256")] = entry.get("groesse", 0)
+    return {"faxe": faxe, "objekte": len(objekte), "eingespart": gesamt - sum(objekte.values())}
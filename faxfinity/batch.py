@@ -0,0 +1,197 @@
+"""
+Stapelverarbeitung eines Eingangsordners ohne Web-Oberfläche.
+
+`python faxsort_ai.py batch [<ordner>] [--workers N] [--dry-run]` arbeitet einen
+Rückstau, etwa nach Urlaub oder Ausfall, mit mehreren Workern ab – ohne Ordner
+in allen konfigurierten Postfächern, mit Ordner nur in diesem. Auch ein
+angegebener Ordner schreibt Archiv, Umbenannt und Fehler in den konfigurierten
+`ausgabeordner`, sofern einer gesetzt ist. Jeder Worker nutzt dieselbe
+Pipeline wie die Oberfläche; Rendern und Encoding begrenzt das gemeinsame
+Speicherbudget. Der Fortschritt steht laufend auf stderr, am Ende folgt eine
+JSON-Zusammenfassung auf stdout.
+"""
+
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+
+from faxfinity import metrics
+from faxfinity.inboxes import FairScheduler, get_inboxes, output_base
+from faxfinity.pipeline import ensure_subdirs, logger, process_pdf
+from faxfinity.timing import time_to_file_by_category
+
+STATUS_ICONS = {
+    "success": "✅",
+    "analysis_error": "⚠️",
+    "conversion_error": "❌",
+    "move_error": "❌",
+    "backup_error": "❌",
+    "error": "❌",
+}
+
+
+class BatchProgress:
+    """Fortschrittszeile mit Durchsatz und Restzeit (auf einem Terminal überschrieben)."""
+
+    def __init__(self, total: int, stream=sys.stderr, interval: float = 5.0):
+        self.total = total
+        self.done = 0
+        self.statuses: dict[str, int] = {}
+        self.stream = stream
+        self.interval = interval  # ohne Terminal: höchstens alle `interval` s eine Zeile
+        self._tty = hasattr(stream, "isatty") and stream.isatty()
+        self._start = time.monotonic()
+        self._last_print = 0.0
+
+    def update(self, result: dict):
+        self.done += 1
+        status = result.get("status", "?")
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        now = time.monotonic()
+        if self._tty or self.done == self.total or now - self._last_print >= self.interval:
+            self._last_print = now
+            self._write(self.line())
+
+    def files_per_min(self) -> float:
+        elapsed = time.monotonic() - self._start
+        return self.done / elapsed * 60 if elapsed > 0 else 0.0
+
+    def eta_seconds(self) -> float | None:
+        rate = self.files_per_min() / 60
+        return (self.total - self.done) / rate if rate > 0 else None
+
+    def line(self) -> str:
+        pct = self.done / self.total * 100 if self.total else 100.0
+        eta = self.eta_seconds()
+        if eta is None:
+            eta_text = "--:--"
+        else:
+            finish = datetime.now() + timedelta(seconds=eta)
+            eta_text = f"{_format_duration(eta)} (fertig ~{finish:%H:%M})"
+        counts = " ".join(f"{STATUS_ICONS.get(s, '?')} {n}" for s, n in sorted(self.statuses.items()))
+        return (f"[{self.done:>{len(str(self.total))}}/{self.total}] {pct:5.1f} % | "
+                f"{self.files_per_min():.1f} Dateien/min | ETA {eta_text} | {counts}")
+
+    def finish(self):
+        if self._tty:
+            self.stream.write("\n")
+            self.stream.flush()
+
+    def _write(self, text: str):
+        if self._tty:
+            self.stream.write("\r\033[K" + text)
+        else:
+            self.stream.write(text + "\n")
+        self.stream.flush()
+
+
+def _format_duration(seconds: float) -> str:
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}" if hours else f"{minutes}:{secs:02d}"
+
+
+def run_batch(cfg: dict, workers: int = 2, dry_run: bool = False,
+              progress: BatchProgress | None = None) -> dict:
+    """
+    Verarbeite alle PDFs aller Postfächer (siehe faxfinity.inboxes) mit
+    `workers` Threads. Die Worker holen sich Dateien aus einem gemeinsamen
+    Scheduler; während des Laufs eintreffende Faxe werden einsortiert.
+    Rückgabe: Zusammenfassung (JSON-serialisierbar). Bei Strg+C laufen
+    angefangene Dokumente zu Ende, wartende werden nicht mehr begonnen.
+    """
+    # Ein Probelauf beansprucht nichts: der geteilte Eingang bleibt für die anderen Knoten
+    queue = FairScheduler(get_inboxes(cfg), wait_for_claims=not dry_run, claim=not dry_run)
+    if not queue.inboxes:
+        raise FileNotFoundError(f"Eingangsordner existiert nicht: {cfg['eingangsordner']}")
+
+    dirs = {inbox["postfach_name"]: {} if dry_run else ensure_subdirs(output_base(inbox))
+            for inbox in queue.inboxes}
+    metrics.export(cfg)
+    workers = max(1, int(workers))
+    metrics.INBOX_QUEUE_DEPTH.set(len(queue))
+    logger.info(f"📬 {len(queue)} PDF(s), {workers} Worker{' – Probelauf' if dry_run else ''}.")
+    if progress is not None:
+        progress.total = queue.discovered
+
+    results = []
+    results_lock = threading.Lock()
+    stop = threading.Event()
+
+    def worker():
+        while not stop.is_set():
+            item = queue.pop()
+            if item is None:
+                return
+            inbox, pdf_path = item
+            try:
+                result = process_pdf(pdf_path, inbox, dirs[inbox["postfach_name"]], dry_run)
+            except Exception as e:
+                logger.error(f"  ✗ Unerwarteter Fehler bei {os.path.basename(pdf_path)}: {e}")
+                result = {"original": os.path.basename(pdf_path), "status": "error",
+                          "postfach": inbox["postfach_name"], "details": str(e)}
+            finally:
+                queue.release(inbox, pdf_path)
+            with results_lock:
+                results.append(result)
+                metrics.INBOX_QUEUE_DEPTH.set(len(queue))
+                metrics.export(cfg)
+                if progress is not None:
+                    progress.total = queue.discovered
+                    progress.update(result)
+
+    interrupted = False
+    t0 = time.perf_counter()
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch")
+    try:
+        futures = [pool.submit(worker) for _ in range(workers)]
+        # Mit Timeout warten, damit Strg+C auch unter Windows ankommt
+        while wait(futures, timeout=0.5).not_done:
+            pass
+    except KeyboardInterrupt:
+        interrupted = True
+        stop.set()
+        queue.close()
+        logger.warning("⏹ Abbruch – laufende Dokumente werden noch fertig verarbeitet...")
+    finally:
+        pool.shutdown(wait=True)
+        if progress is not None:
+            progress.finish()
+    seconds = time.perf_counter() - t0
+
+    metrics.scan_finished()
+    metrics.export(cfg)
+
+    statuses: dict[str, int] = {}
+    for r in results:
+        statuses[r["status"]] = statuses.get(r["status"], 0) + 1
+    return {
+        "folder": os.path.abspath(queue.inboxes[0]["eingangsordner"]),
+        "inboxes": {i["postfach_name"]: os.path.abspath(i["eingangsordner"]) for i in queue.inboxes},
+        "workers": workers,
+        "dry_run": dry_run,
+        "interrupted": interrupted,
+        "files_total": queue.discovered,
+        "files_done": len(results),
+        "seconds": round(seconds, 2),
+        "files_per_min": round(len(results) / seconds * 60, 1) if seconds > 0 else 0.0,
+        "statuses": statuses,
+        "time_to_file_by_category": time_to_file_by_category(results),
+        "results": [
+            {
+                "original": r["original"],
+                "postfach": r.get("postfach", ""),
+                "status": r["status"],
+                "new_name": r.get("new_name", ""),
+                "kategorie": r.get("kategorie", ""),
+                "time_to_file_s": r.get("time_to_file_s"),
+                "details": r.get("details", ""),
+                "seconds": round(r.get("timings_ms", {}).get("total", 0) / 1000, 3),
+            }
+            for r in results
+        ],
+    }
@@ -0,0 +1,137 @@
+"""
+Record/Replay-Kassette für Ollama-Antworten.
+
+Im Modus ``record`` wird zu jeder Anfrage ein Fingerabdruck (Bild-Hash,
+Modell, Prompt-Version, Optionen) zusammen mit der rohen Ollama-Antwort
+gespeichert. Im Modus ``replay`` werden diese Antworten ohne GPU direkt
+aus dem Speicher ausgeliefert – damit lassen sich Umbenennungsregeln und
+alle Nicht-LLM-Schritte offline testen und benchmarken.
+
+Format: JSON Lines, ein Eintrag pro Aufnahme (append-only).
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+
+logger = logging.getLogger("FaxFinity")
+
+CASSETTE_MODES = ("", "record", "replay")
+
+
+def image_fingerprint(image) -> str:
+    """SHA-256 über die Rohpixel eines PIL-Bildes (ohne PNG-Encoding)."""
+    h = hashlib.sha256()
+    h.update(f"{image.mode}:{image.width}x{image.height}:".encode("ascii"))
+    h.update(image.tobytes())
+    return h.hexdigest()
+
+
+def request_fingerprint(image_hash: str, model: str, prompt_version: str, options: dict) -> str:
+    """Stabiler Schlüssel für eine Ollama-Anfrage."""
+    key = json.dumps(
+        {
+            "image": image_hash,
+            "model": model,
+            "prompt_version": prompt_version,
+            "options": options,
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+class OllamaCassette:
+    """Speichert und liefert rohe Ollama-Antworten anhand des Fingerabdrucks."""
+
+    def __init__(self, path: str, mode: str):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unbekannter Kassetten-Modus: {mode!r}")
+        self.path = path
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._entries: dict[str, dict] = {}
+        self._num_ctx: dict[str, int] = {}  # Modell → num_ctx der letzten Aufnahme
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line_no, line in enumerate(f, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                    self._entries[entry["fingerprint"]] = entry["response"]
+                    self._remember_options(entry)
+                except (json.JSONDecodeError, KeyError):
+                    logger.warning(f"Kassette {self.path}: Zeile {line_no} ungültig, übersprungen.")
+        logger.info(f"Kassette geladen: {len(self._entries)} Aufnahme(n) aus {self.path}")
+
+    def _remember_options(self, entry: dict):
+        num_ctx = (entry.get("options") or {}).get("num_ctx")
+        if entry.get("model") and isinstance(num_ctx, int):
+            self._num_ctx[entry["model"]] = num_ctx
+
+    def num_ctx(self, model: str) -> int | None:
+        """`num_ctx`, mit dem zuletzt für `model` aufgenommen wurde (None = keine Aufnahme)."""
+        with self._lock:
+            return self._num_ctx.get(model)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, fingerprint: str) -> dict | None:
+        """Liefere die gespeicherte Antwort oder None."""
+        with self._lock:
+            response = self._entries.get(fingerprint)
+            if response is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return response
+
+    def record(self, fingerprint: str, meta: dict, response: dict):
+        """Hänge eine Aufnahme an die Kassettendatei an."""
+        entry = {
+            "fingerprint": fingerprint,
+            "recorded_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            **meta,
+            "response": response,
+        }
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            self._entries[fingerprint] = response
+            self._remember_options(entry)
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+_cassettes: dict[tuple[str, str], OllamaCassette] = {}
+_cassettes_lock = threading.Lock()
+
+
+def get_cassette(mode: str, path: str) -> OllamaCassette | None:
+    """
+    Prozessweit geteilte Kassette für (Modus, Pfad).
+    Gibt None zurück, wenn kein Kassetten-Modus aktiv ist.
+    """
+    if not mode or not path:
+        return None
+    key = (mode, os.path.abspath(path))
+    with _cassettes_lock:
+        cassette = _cassettes.get(key)
+        if cassette is None:
+            cassette = OllamaCassette(path, mode)
+            _cassettes[key] = cassette
+        return cassette
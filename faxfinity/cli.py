@@ -0,0 +1,217 @@
+"""
+Kommandozeile ohne Web-Oberfläche (python faxsort_ai.py <befehl>).
+Lädt weder Streamlit noch die UI.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+
+from faxfinity import profiling
+from faxfinity.inboxes import get_inboxes
+from faxfinity.pipeline import load_config, scan_and_process, vision_model_problem
+
+
+def cli(argv: list) -> int:
+    """Kommandozeile ohne Web-Oberfläche."""
+    parser = argparse.ArgumentParser(
+        prog="faxsort_ai.py",
+        description="FaxFinity ohne Web-Oberfläche. Web-UI: streamlit run faxsort_ai.py",
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_profile = sub.add_parser("profile", help="Die nächsten N Dokumente profiliert verarbeiten")
+    p_profile.add_argument("folder", nargs="?", default="",
+                           help="Eingangsordner (Standard: aus config.json)")
+    p_profile.add_argument("-n", "--count", type=int, default=1, help="Anzahl Dokumente")
+    p_profile.add_argument("--out", default="", help="Ordner für die Berichte")
+
+    p_batch = sub.add_parser("batch", help="Ordner ohne Browser abarbeiten (parallel)")
+    p_batch.add_argument("folder", nargs="?", default="",
+                         help="Eingangsordner (Standard: alle Postfächer aus config.json)")
+    p_batch.add_argument("-w", "--workers", type=int, default=2,
+                         help="Parallele Dokumente (Standard: 2)")
+    p_batch.add_argument("--dry-run", action="store_true",
+                         help="Nur analysieren und Namen vorschlagen, nichts verschieben")
+    p_batch.add_argument("--order", default="",
+                         help="Reihenfolge, z.B. priority,arrival (Standard: aus config.json)")
+    p_batch.add_argument("--summary", default="",
+                         help="Zusammenfassung zusätzlich als JSON-Datei speichern")
+    p_batch.add_argument("-v", "--verbose", action="store_true",
+                         help="Ausführliches Log statt nur Fortschrittszeile")
+
+    p_reshard = sub.add_parser("reshard",
+                               help="Archiv/Umbenannt/Fehler nach den Ablage-Vorlagen umsortieren")
+    p_reshard.add_argument("--dry-run", action="store_true",
+                           help="Nur zählen, wohin verschoben würde")
+    p_reshard.add_argument("--postfach", default="",
+                           help="Nur dieses Postfach (Standard: alle)")
+
+    p_archive = sub.add_parser("archive", help="Deduplizierte Archiv-Einträge suchen/wiederherstellen")
+    p_archive.add_argument("name", nargs="?", default="",
+                           help="Originalname (Anfang) oder SHA-256; leer = Übersicht")
+    p_archive.add_argument("--restore", default="", metavar="ORDNER",
+                           help="Gefundene Faxe in diesen Ordner kopieren")
+    p_archive.add_argument("--postfach", default="",
+                           help="Nur dieses Postfach (Standard: alle)")
+
+    p_maintain = sub.add_parser("maintain",
+                                help="Archiv nachkomprimieren, bündeln, Aufbewahrungsfrist prüfen")
+    p_maintain.add_argument("--dry-run", action="store_true",
+                            help="Nur ermitteln, was gespart würde; nichts ändern")
+
+    sub.add_parser("index", help="Suchindex um ältere Historien-Einträge ergänzen")
+    p_search = sub.add_parser("search", help="Verarbeitete Faxe durchsuchen")
+    p_search.add_argument("text", help="Suchwörter, z.B. \"kardio meier\"")
+    p_search.add_argument("-n", "--limit", type=int, default=20, help="Höchstens N Treffer")
+
+    args = parser.parse_args(argv)
+    cfg = load_config()
+
+    if args.command == "profile":
+        from faxfinity.coordinator import ScanBusy, os_locks
+
+        if args.folder:
+            cfg["eingangsordner"] = args.folder
+        if args.out:
+            cfg["profile_dir"] = args.out
+        profiling.request_profiles(args.count)
+        try:
+            # Verschiebt echte Faxe: nie parallel zu Oberfläche, Auto-Scan oder batch
+            with os_locks(cfg, trigger="profile"):
+                results = scan_and_process(cfg, max_files=args.count)
+        except ScanBusy as busy:
+            print(f"Es läuft bereits ein Scan (Prozess {busy.owner.get('pid', '?')}, "
+                  f"{busy.path}).", file=sys.stderr)
+            return 2
+        finally:
+            profiling.request_profiles(0)
+        for report in profiling.last_reports()[-len(results):] if results else []:
+            print(f"{report['file']}: {report['status']} → {report['report_dir']}")
+        return 0 if results else 1
+
+    if args.command == "batch":
+        from faxfinity.batch import BatchProgress, run_batch
+        from faxfinity.coordinator import ScanBusy, os_locks
+
+        if args.folder:
+            if not os.path.isdir(args.folder):
+                print(f"Ordner nicht gefunden: {args.folder}", file=sys.stderr)
+                return 2
+            # Expliziter Ordner: nur dieses Postfach
+            cfg["eingangsordner"] = args.folder
+            cfg["postfaecher"] = []
+        elif not cfg["eingangsordner"] or not os.path.isdir(cfg["eingangsordner"]):
+            print("Kein Eingangsordner konfiguriert – Ordner angeben.", file=sys.stderr)
+            return 2
+        if args.order:
+            cfg["queue_order"] = [o.strip() for o in args.order.split(",") if o.strip()]
+        if not args.verbose:
+            logging.getLogger("FaxFinity").setLevel(logging.WARNING)
+        problem = vision_model_problem(get_inboxes(cfg))
+        if problem:
+            print(problem, file=sys.stderr)
+            return 2
+        try:
+            # Nicht parallel zu einer laufenden Oberfläche oder einem zweiten
+            # batch scannen; ein Probelauf verschiebt nichts und darf immer
+            with os_locks({} if args.dry_run else cfg):
+                summary = run_batch(cfg, workers=args.workers, dry_run=args.dry_run,
+                                    progress=BatchProgress(0))
+        except ScanBusy as busy:
+            print(f"Es läuft bereits ein Scan (Prozess {busy.owner.get('pid', '?')}, "
+                  f"{busy.path}).", file=sys.stderr)
+            return 2
+        text = json.dumps(summary, indent=2, ensure_ascii=False)
+        if args.summary:
+            with open(args.summary, "w", encoding="utf-8") as f:
+                f.write(text)
+        print(text)
+        if summary["interrupted"]:
+            return 130
+        return 0 if summary["statuses"].keys() <= {"success"} else 1
+
+    if args.command == "reshard":
+        from faxfinity.coordinator import ScanBusy, os_locks
+        from faxfinity.reshard import reshard
+
+        inboxes = [i for i in get_inboxes(cfg)
+                   if not args.postfach or i["postfach_name"] == args.postfach]
+        if not inboxes:
+            print(f"Postfach nicht gefunden: {args.postfach}", file=sys.stderr)
+            return 2
+
+        def progress(counts):
+            print(f"\r{counts['geprüft']} geprüft, {counts['verschoben']} verschoben …",
+                  end="", file=sys.stderr, flush=True)
+
+        try:
+            # Nie parallel zu einem Scan: der würde in die alten Ordner ablegen
+            with os_locks({} if args.dry_run else cfg, trigger="reshard"):
+                summary = reshard(inboxes, dry_run=args.dry_run, progress=progress)
+        except ScanBusy as busy:
+            print(f"Es läuft gerade ein Scan (Prozess {busy.owner.get('pid', '?')}, "
+                  f"{busy.path}).", file=sys.stderr)
+            return 2
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            return 2
+        print(file=sys.stderr)
+        print(json.dumps(summary, indent=2, ensure_ascii=False))
+        return 1 if any(c["fehler"] for c in summary.values()) else 0
+
+    if args.command == "archive":
+        from faxfinity import archive
+        from faxfinity.inboxes import output_base
+
+        archiv_dirs = {i["postfach_name"]: os.path.join(output_base(i), "Archiv")
+                       for i in get_inboxes(cfg)
+                       if i.get("eingangsordner") and (not args.postfach or i["postfach_name"] == args.postfach)}
+        if not args.name:
+            summary = {name: archive.summary(d) for name, d in archiv_dirs.items()}
+            print(json.dumps(summary, indent=2, ensure_ascii=False))
+            return 0
+        found = 0
+        for name, archiv_dir in archiv_dirs.items():
+            for entry in archive.find(archiv_dir, args.name):
+                found += 1
+                line = f"{entry['zeitstempel']}  {entry['original']}  {entry['sha256'][:12]}  [{name}]"
+                if args.restore:
+                    try:
+                        line += f"  → {archive.restore(archiv_dir, entry, args.restore)}"
+                    except OSError as e:
+                        line += f"  ✗ {e}"
+                print(line)
+        if not found:
+            print(f"Nichts gefunden: {args.name}", file=sys.stderr)
+            return 1
+        return 0
+
+    if args.command == "maintain":
+        from faxfinity import maintenance
+
+        report = maintenance.run(cfg, dry_run=args.dry_run)
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+        return 1 if report["fehler"] else 0
+
+    if args.command in ("index", "search"):
+        from faxfinity import search
+        from faxfinity.history import get_history
+
+        history = get_history()
+        if args.command == "index":
+            search.backfill(history, progress=lambda done: print(
+                f"\r{done} Einträge nachgetragen …", end="", file=sys.stderr, flush=True))
+            print(file=sys.stderr)
+            print(f"{history.unindexed()} Einträge fehlen noch im Suchindex.")
+            return 0
+        for entry in history.search(args.text, limit=args.limit):
+            print(f"{entry['timestamp']}  {entry.get('kategorie') or '-':<18} "
+                  f"{entry.get('neu') or entry.get('original', '')}")
+            if entry["treffer"]:
+                print(f"    {entry['treffer']}")
+        return 0
+
+    return 2
@@ -0,0 +1,405 @@
+"""
+Es läuft immer nur ein Scan.
+
+Jeder Browser-Tab ist eine eigene Streamlit-Sitzung mit eigenem Auto-Scan-
+Timer; ohne Absprache würden Empfang und Sprechzimmer dieselbe PDF parallel
+analysieren. Dieses Modul lebt (anders als faxsort_ai.py) über Reruns und
+Sitzungen hinweg im Prozess:
+
+  - Ein prozessweiter Lock lässt nur einen Scan gleichzeitig zu; andere
+    Sitzungen sehen über `status()` dessen Fortschritt.
+  - Der Auto-Scan läuft in einem Hintergrund-Thread für alle Sitzungen:
+    zehn offene Tabs scannen nicht zehnmal pro Intervall, und keine Sitzung
+    wartet blockierend auf den nächsten Scan. Die Oberfläche liest nur den
+    Zustand (`status`, `upcoming`, timing.activity).
+  - Eine Lock-Datei `.faxfinity_scan.lock` in jedem Eingangsordner
+    (fcntl bzw. msvcrt) schützt vor weiteren FaxFinity-Prozessen, z.B. einer
+    zweiten Streamlit-Instanz oder `batch`. Das Betriebssystem gibt sie beim
+    Prozessende frei, auch nach einem Absturz. Die Datei enthält Besitzer und
+    Fortschritt, damit andere Prozesse ihn anzeigen können.
+
+Im Mehrplatzbetrieb (`shared_inbox`) gilt die Lock-Datei nur je Rechner –
+zwischen Rechnern sorgen die Leases aus faxfinity.leases für Eindeutigkeit.
+"""
+
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from faxfinity.inboxes import FairScheduler, get_inboxes
+from faxfinity.leases import node_name
+from faxfinity.pipeline import scan_and_process
+
+logger = logging.getLogger("FaxFinity")
+
+LOCK_FILE = ".faxfinity_scan.lock"
+_LOCK_OFFSET = 1 << 30  # Windows sperrt Byte-Bereiche hart: hinter dem Inhalt sperren
+
+_scan_lock = threading.Lock()
+_state_lock = threading.Lock()
+_state: dict = {"running": False}
+_last_scan_start = 0.0  # prozessweit, für den Auto-Scan aller Sitzungen
+_queue = None  # Scheduler des laufenden Scans (für die Vorschau)
+_scan_id = 0  # abgeschlossene Scans; die Oberfläche lädt neu, wenn er sich ändert
+_last_summary: dict | None = None
+
+_auto: dict = {"enabled": None, "cfg": {}}
+_auto_lock = threading.Lock()
+_auto_wakeup = threading.Event()
+_auto_thread: threading.Thread | None = None
+
+
+class ScanBusy(Exception):
+    """Ein anderer Prozess scannt gerade (Lock-Datei belegt)."""
+
+    def __init__(self, path: str, owner: dict):
+        super().__init__(f"Scan läuft bereits: {path}")
+        self.path = path
+        self.owner = owner
+
+
+# ──────────────────────────────────────────────────────────────
+# LOCK-DATEI (prozessübergreifend)
+# ──────────────────────────────────────────────────────────────
+def lock_path(inbox: dict) -> str:
+    name = LOCK_FILE
+    if inbox.get("shared_inbox"):
+        name = f".faxfinity_scan_{node_name(inbox)}.lock"
+    return os.path.join(inbox["eingangsordner"], name)
+
+
+def _try_lock(path: str):
+    """Datei exklusiv sperren (nicht blockierend); Rückgabe: offene Datei oder None."""
+    f = open(path, "a+", encoding="utf-8")
+    try:
+        if os.name == "nt":
+            import msvcrt
+            f.seek(_LOCK_OFFSET)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return None
+    return f
+
+
+def _unlock(f):
+    try:
+        if os.name == "nt":
+            import msvcrt
+            f.seek(_LOCK_OFFSET)
+            msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+    except OSError:
+        pass
+    finally:
+        f.close()
+
+
+def _write_owner(f, info: dict):
+    try:
+        f.seek(0)
+        f.truncate()
+        f.write(json.dumps(info, ensure_ascii=False))
+        f.flush()
+    except OSError:
+        pass  # nur Anzeige für andere Prozesse
+
+
+def read_owner(path: str) -> dict:
+    """Besitzer und Fortschritt aus einer Lock-Datei (leer, wenn unlesbar)."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.loads(f.read() or "{}")
+    except (OSError, ValueError):
+        return {}
+
+
+def _pid_alive(pid) -> bool:
+    """Läuft der Prozess noch? (Windows: os.kill würde ihn beenden.)"""
+    if not isinstance(pid, int):
+        return False
+    if os.name == "nt":
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        code = ctypes.c_ulong()
+        try:
+            kernel32.GetExitCodeProcess(handle, ctypes.byref(code))
+        finally:
+            kernel32.CloseHandle(handle)
+        return code.value == 259  # STILL_ACTIVE
+    try:
+        os.kill(pid, 0)
+    except PermissionError:
+        return True  # gehört einem anderen Benutzer
+    except OSError:
+        return False
+    return True
+
+
+def held_by(path: str) -> dict:
+    """
+    Besitzer einer gehaltenen Lock-Datei, ohne sie zu sperren ({} = frei).
+    Der Besitzer leert die Datei beim Freigeben; nach einem Absturz bleibt
+    sein Eintrag stehen – dann entscheidet, ob der Prozess noch läuft
+    (auf anderen Rechnern lässt sich das nicht prüfen).
+    """
+    owner = read_owner(path)
+    if not owner:
+        return {}
+    if owner.get("host") == socket.gethostname() and not _pid_alive(owner.get("pid")):
+        return {}
+    return owner
+
+
+def _owner_info(trigger: str) -> dict:
+    return {
+        "pid": os.getpid(),
+        "host": socket.gethostname(),
+        "trigger": trigger,
+        "started": datetime.now().strftime("%H:%M:%S"),
+    }
+
+
+@contextmanager
+def file_lock(path: str, trigger: str):
+    """Eine beliebige Lock-Datei halten (z.B. Archiv-Pflege); ScanBusy, wenn belegt."""
+    f = _try_lock(path)
+    if f is None:
+        raise ScanBusy(path, read_owner(path))
+    try:
+        _write_owner(f, _owner_info(trigger))
+        yield f
+    finally:
+        _write_owner(f, {})
+        _unlock(f)
+
+
+@contextmanager
+def os_locks(cfg: dict, trigger: str = "batch"):
+    """
+    Sperrt die Lock-Dateien aller Postfächer. Ist eine davon belegt, werden
+    die bereits gesperrten wieder freigegeben und ScanBusy ausgelöst.
+    Liefert die offenen Dateien (für Fortschritts-Updates).
+    """
+    info = _owner_info(trigger)
+    held = []
+    try:
+        for inbox in get_inboxes(cfg):
+            if not inbox.get("eingangsordner") or not os.path.isdir(inbox["eingangsordner"]):
+                continue
+            path = lock_path(inbox)
+            try:
+                f = _try_lock(path)
+            except OSError as e:
+                logger.warning(f"Lock-Datei nicht nutzbar ({path}): {e}")
+                continue
+            if f is None:
+                raise ScanBusy(path, read_owner(path))
+            held.append(f)
+            _write_owner(f, info)
+        yield held
+    finally:
+        for f in held:
+            _write_owner(f, {})
+            _unlock(f)
+
+
+# ──────────────────────────────────────────────────────────────
+# SCAN-KOORDINATION (prozessweit)
+# ──────────────────────────────────────────────────────────────
+def run_scan(cfg: dict, owner: str = "", trigger: str = "manuell") -> list | None:
+    """
+    Führe scan_and_process aus, sofern gerade kein anderer Scan läuft
+    (in diesem oder einem anderen Prozess). Rückgabe: Ergebnisse oder None,
+    wenn bereits gescannt wird – dann zeigt `status()` den laufenden Scan.
+    """
+    if not _scan_lock.acquire(blocking=False):
+        return None
+    return _run_locked(cfg, owner, trigger)
+
+
+def start_scan(cfg: dict, owner: str = "", trigger: str = "manuell") -> bool:
+    """
+    Wie run_scan, aber im Hintergrund: kehrt sofort zurück (False, wenn
+    bereits ein Scan läuft). Fortschritt über `status()`/`upcoming()`.
+    """
+    if not _scan_lock.acquire(blocking=False):
+        return False
+    threading.Thread(target=_run_locked, args=(dict(cfg), owner, trigger),
+                     daemon=True, name="scan").start()
+    return True
+
+
+def _run_locked(cfg: dict, owner: str, trigger: str) -> list | None:
+    """Eigentlicher Scan; der Aufrufer hält _scan_lock, hier wird er freigegeben."""
+    global _last_scan_start, _queue, _scan_id, _last_summary
+    results = None
+    try:
+        _last_scan_start = time.time()
+        try:
+            with os_locks(cfg, trigger) as lock_files:
+                info = dict(_owner_info(trigger), current="", done=0, pending=0)
+                with _state_lock:
+                    _state.clear()
+                    _state.update(info, running=True, owner=owner, foreign=None)
+
+                def progress(current: str | None, pending: int, result: dict | None = None):
+                    with _state_lock:
+                        _state["current"] = current or ""
+                        _state["pending"] = pending
+                        if result is not None:
+                            _state["done"] += 1
+                        snapshot = {k: _state[k] for k in info}
+                    for f in lock_files:
+                        _write_owner(f, snapshot)
+
+                _queue = FairScheduler(get_inboxes(cfg))
+                results = scan_and_process(cfg, progress=progress, scheduler=_queue)
+                return results
+        except ScanBusy as busy:
+            logger.info(f"⏳ Scan übersprungen – läuft bereits in Prozess "
+                        f"{busy.owner.get('pid', '?')} ({busy.path}).")
+            with _state_lock:
+                _state.clear()
+                _state.update(running=False, foreign=busy.owner)
+            return None
+        except Exception as e:
+            logger.error(f"Scan abgebrochen: {e}")
+            raise
+        finally:
+            _queue = None
+            with _state_lock:
+                _state["running"] = False
+                _state["finished"] = datetime.now().strftime("%H:%M:%S")
+                if results is not None:
+                    _scan_id += 1
+                    _last_summary = {
+                        "trigger": trigger,
+                        "finished": _state["finished"],
+                        "total": len(results),
+                        "success": sum(1 for r in results if r["status"] == "success"),
+                    }
+    finally:
+        _scan_lock.release()
+
+
+def upcoming(n: int = 5) -> list:
+    """Nächste Dateien des laufenden Scans als (Postfach, Datei, Hinweis)."""
+    queue = _queue
+    return queue.peek(n) if queue is not None else []
+
+
+def last_scan() -> tuple[int, dict | None]:
+    """(Zähler abgeschlossener Scans, Zusammenfassung des letzten) – prozessweit."""
+    with _state_lock:
+        return _scan_id, _last_summary
+
+
+# ──────────────────────────────────────────────────────────────
+# AUTO-SCAN (ein Hintergrund-Thread für alle Sitzungen)
+# ──────────────────────────────────────────────────────────────
+def auto_scan_enabled(cfg: dict) -> bool:
+    """Prozessweiter Auto-Scan-Zustand; beim ersten Aufruf aus der Config übernommen."""
+    with _auto_lock:
+        if _auto["enabled"] is None:
+            _set_auto(cfg, bool(cfg.get("auto_scan_active", False)))
+        return _auto["enabled"]
+
+
+def set_auto_scan(cfg: dict, enabled: bool):
+    with _auto_lock:
+        _set_auto(cfg, enabled)
+
+
+def update_auto_config(cfg: dict):
+    """Aktuelle Einstellungen an den Auto-Scan weitergeben (z.B. nach Änderung im UI)."""
+    with _auto_lock:
+        _auto["cfg"] = dict(cfg)
+
+
+def _set_auto(cfg: dict, enabled: bool):
+    global _auto_thread
+    _auto["enabled"] = enabled
+    _auto["cfg"] = dict(cfg)
+    _auto_wakeup.set()
+    if enabled and (_auto_thread is None or not _auto_thread.is_alive()):
+        _auto_thread = threading.Thread(target=_auto_loop, daemon=True, name="auto-scan")
+        _auto_thread.start()
+        logger.info("🔄 Auto-Scan gestartet.")
+
+
+def _auto_loop():
+    while True:
+        with _auto_lock:
+            if not _auto["enabled"]:
+                logger.info("⏹ Auto-Scan beendet.")
+                return
+            cfg = _auto["cfg"]
+        wait = seconds_until_due(cfg.get("scan_interval", 120))
+        if wait <= 0 and cfg.get("ollama_model") and os.path.isdir(cfg.get("eingangsordner") or ""):
+            if _scan_lock.acquire(blocking=False):
+                try:
+                    _run_locked(cfg, "", "auto")
+                except Exception:
+                    pass  # bereits geloggt; nächster Versuch im nächsten Intervall
+                continue
+            wait = 1.0  # anderer Scan läuft
+        _auto_wakeup.wait(max(1.0, min(wait, 30.0)))
+        _auto_wakeup.clear()
+
+
+def status(cfg: dict | None = None) -> dict:
+    """
+    Zustand des aktuellen Scans: running, owner, trigger, started, current,
+    done, pending. Mit `cfg` wird zusätzlich geprüft, ob ein anderer Prozess
+    scannt (`foreign`: dessen Angaben aus der Lock-Datei). Die Lock-Dateien
+    werden dabei nur gelesen, nie gesperrt – `status()` läuft alle paar
+    Sekunden und darf einem echten Scan den Lock nicht wegnehmen.
+    """
+    with _state_lock:
+        snapshot = dict(_state)
+    if cfg is not None and not snapshot["running"]:
+        snapshot["foreign"] = None
+        for inbox in get_inboxes(cfg):
+            if not inbox.get("eingangsordner") or not os.path.isdir(inbox["eingangsordner"]):
+                continue
+            owner = held_by(lock_path(inbox))
+            if owner:
+                snapshot["foreign"] = owner
+                break
+    return snapshot
+
+
+def seconds_until_due(interval: float) -> float:
+    """Sekunden bis zum nächsten Auto-Scan (prozessweit, 0 = jetzt fällig)."""
+    return max(0.0, _last_scan_start + interval - time.time())
+
+
+def describe(snapshot: dict, owner: str = "") -> str:
+    """Kurzbeschreibung eines laufenden Scans für die Oberfläche ("" = keiner)."""
+    if snapshot.get("running"):
+        info = snapshot
+        who = ""
+        if snapshot.get("owner"):
+            who = " aus dieser Sitzung" if snapshot["owner"] == owner else " aus einer anderen Sitzung"
+    elif snapshot.get("foreign"):
+        info = snapshot["foreign"]
+        who = f" aus Prozess {info.get('pid', '?')} auf {info.get('host', '?')}"
+    else:
+        return ""
+    text = f"🔄 {info.get('trigger', 'Scan').capitalize()}-Scan{who} seit {info.get('started', '?')}"
+    if "done" in info:
+        text += f" – {info['done']} erledigt, {info.get('pending', 0)} wartend"
+    if info.get("current"):
+        text += f", aktuell: {info['current']}"
+    return text
@@ -0,0 +1,215 @@
+"""
+Verzeichnis-Schnappschüsse für die Ordner-Übersicht.
+
+`Archiv/` wächst unbegrenzt; über SMB dauert ein listdir + stat je Datei bei
+zehntausenden PDFs Sekunden. Deshalb hält der Prozess je Ordner einen
+Schnappschuss (Name → Größe, Änderungszeit), der
+
+  * träge nachgeladen wird: ein einzelnes stat() des Ordners pro Zugriff;
+    nur wenn sich dessen mtime geändert hat (oder sie zu frisch ist, um ihr
+    zu trauen), wird per os.scandir neu eingelesen,
+  * von der Pipeline fortgeschrieben wird: record_added()/record_removed()
+    nach jedem Kopieren und Verschieben, ohne den Ordner neu zu lesen,
+  * spätestens nach FULL_RESCAN_INTERVAL Sekunden komplett neu gelesen wird
+    (Änderungen anderer Rechner, die in dieselbe Sekunde fallen).
+
+Abfragen (`page`) sortieren, filtern und schneiden serverseitig; die
+Oberfläche rendert nur eine Seite. Sortierte Listen werden je Sortierung
+zwischengespeichert, bis sich der Ordner ändert. Unterordner (Ablage nach
+Vorlage, siehe faxfinity.layout) merkt sich der Schnappschuss nur mit Namen;
+jeder hat seinen eigenen Schnappschuss.
+"""
+
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger("FaxFinity")
+
+FULL_RESCAN_INTERVAL = 600.0  # Sekunden
+MTIME_SLACK = 2.0  # Zeitauflösung des Dateisystems (NAS/SMB: bis 2 s)
+SORT_KEYS = ("name", "mtime", "size")
+PAGE_SIZE = 50  # Zeilen je Seite in der Ordner-Übersicht
+
+_registry: dict = {}  # absoluter Ordnerpfad → FolderSnapshot; prozessweit
+_registry_lock = threading.Lock()
+
+
+def _is_pdf(name: str) -> bool:
+    return name.lower().endswith(".pdf")
+
+
+def get_snapshot(directory: str) -> "FolderSnapshot":
+    """Prozessweit ein Schnappschuss je Ordner."""
+    key = os.path.abspath(directory)
+    with _registry_lock:
+        snapshot = _registry.get(key)
+        if snapshot is None:
+            snapshot = _registry[key] = FolderSnapshot(key)
+        return snapshot
+
+
+def _existing(directory: str) -> "FolderSnapshot | None":
+    with _registry_lock:
+        return _registry.get(os.path.abspath(directory))
+
+
+def record_added(path: str):
+    """Pipeline-Ereignis: Datei liegt jetzt unter `path`."""
+    snapshot = _existing(os.path.dirname(path))
+    if snapshot is not None and _is_pdf(path):
+        snapshot.add(os.path.basename(path))
+
+
+def record_removed(path: str):
+    """Pipeline-Ereignis: Datei unter `path` ist weg (verschoben/gelöscht)."""
+    snapshot = _existing(os.path.dirname(path))
+    if snapshot is not None:
+        snapshot.remove(os.path.basename(path))
+
+
+def record_moved(src: str, dest: str):
+    record_removed(src)
+    record_added(dest)
+
+
+def all_files(directory: str) -> list:
+    """Pfade aller PDFs in `directory` und seinen Unterordnern (über die Schnappschüsse)."""
+    snapshot = get_snapshot(directory)
+    if not snapshot.refresh():
+        return []
+    paths = [os.path.join(snapshot.directory, name) for name in snapshot.names()]
+    for sub in snapshot.subdirs():
+        paths += all_files(os.path.join(snapshot.directory, sub))
+    return paths
+
+
+def format_size(size: int) -> str:
+    return f"{size / 1024:.0f} KB" if size < 1024 * 1024 else f"{size / (1024 * 1024):.1f} MB"
+
+
+class FolderSnapshot:
+    """PDFs eines Ordners als {Name: (Größe, mtime)}; thread-sicher."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._files: dict = {}
+        self._subdirs: set = set()
+        self._dir_mtime_ns: int | None = None
+        self._scanned_at = 0.0
+        self._sorted: dict = {}  # (Sortierung, absteigend) → Namensliste
+        self._lock = threading.Lock()
+
+    # ── Aktualisieren ─────────────────────────────────────────
+    def refresh(self, force: bool = False) -> bool:
+        """Bei Bedarf neu einlesen. Rückgabe: False, wenn der Ordner fehlt."""
+        try:
+            st = os.stat(self.directory)
+        except OSError:
+            with self._lock:
+                self._files, self._subdirs, self._dir_mtime_ns = {}, set(), None
+                self._sorted.clear()
+            return False
+        now = time.time()
+        with self._lock:
+            trusted = (self._dir_mtime_ns == st.st_mtime_ns
+                       and now - st.st_mtime > MTIME_SLACK
+                       and time.monotonic() - self._scanned_at < FULL_RESCAN_INTERVAL)
+        if trusted and not force:
+            return True
+        files, subdirs = {}, set()
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if not _is_pdf(entry.name):
+                        try:
+                            if entry.is_dir() and not entry.name.startswith("."):
+                                subdirs.add(entry.name)
+                        except OSError:
+                            pass
+                        continue
+                    try:
+                        if entry.is_file():
+                            est = entry.stat()
+                            files[entry.name] = (est.st_size, est.st_mtime)
+                    except OSError:
+                        continue  # inzwischen verschwunden
+        except OSError as e:
+            logger.warning(f"Ordner nicht lesbar ({self.directory}): {e}")
+            return False
+        with self._lock:
+            self._files, self._subdirs = files, subdirs
+            self._dir_mtime_ns = st.st_mtime_ns
+            self._scanned_at = time.monotonic()
+            self._sorted.clear()
+        return True
+
+    def _adopt_dir_mtime(self):
+        # Eigene Änderung: neue mtime übernehmen, damit sie keinen Neu-Scan auslöst.
+        # Fällt eine fremde Änderung in denselben Moment, holt sie der nächste
+        # volle Scan nach (siehe MTIME_SLACK/FULL_RESCAN_INTERVAL).
+        try:
+            self._dir_mtime_ns = os.stat(self.directory).st_mtime_ns
+        except OSError:
+            self._dir_mtime_ns = None
+
+    def add(self, name: str):
+        try:
+            st = os.stat(os.path.join(self.directory, name))
+        except OSError:
+            return
+        with self._lock:
+            if self._dir_mtime_ns is None:
+                return  # noch nie eingelesen – der erste Zugriff liest ohnehin alles
+            self._files[name] = (st.st_size, st.st_mtime)
+            self._sorted.clear()
+            self._adopt_dir_mtime()
+
+    def remove(self, name: str):
+        with self._lock:
+            if self._files.pop(name, None) is not None:
+                self._sorted.clear()
+                self._adopt_dir_mtime()
+
+    # ── Abfragen ──────────────────────────────────────────────
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._files)
+
+    def names(self) -> list:
+        with self._lock:
+            return sorted(self._files)
+
+    def subdirs(self) -> list:
+        with self._lock:
+            return sorted(self._subdirs)
+
+    def _ordered(self, sort: str, descending: bool) -> list:
+        key = (sort, descending)
+        ordered = self._sorted.get(key)
+        if ordered is None:
+            if sort == "name":
+                ordered = sorted(self._files, key=str.lower, reverse=descending)
+            else:
+                index = 0 if sort == "size" else 1
+                ordered = sorted(self._files, key=lambda n: (self._files[n][index], n),
+                                 reverse=descending)
+            self._sorted[key] = ordered
+        return ordered
+
+    def page(self, offset: int = 0, limit: int = 50, sort: str = "name",
+             descending: bool = False, contains: str = "") -> tuple[int, list]:
+        """
+        Eine Seite: (Anzahl Treffer, [(Name, Größe, mtime), ...]).
+        `contains` filtert nach Namensbestandteil ohne Groß-/Kleinschreibung.
+        """
+        if sort not in SORT_KEYS:
+            raise ValueError(f"Unbekannte Sortierung: {sort}")
+        with self._lock:
+            ordered = self._ordered(sort, descending)
+            if contains:
+                needle = contains.casefold()
+                ordered = [n for n in ordered if needle in n.casefold()]
+            rows = [(n, *self._files[n]) for n in ordered[offset:offset + limit]]
+            return len(ordered), rows
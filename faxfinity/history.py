@@ -0,0 +1,335 @@
+"""
+Verarbeitungs-Historie: unbegrenzt, nur anhängend, mit Abfragen.
+
+Bisher wurde für jedes Fax das ganze `processing_log.json` gelesen, ein
+Eintrag angehängt und die Datei auf 50 Einträge gekürzt neu geschrieben.
+Jetzt liegt jeder Eintrag als Zeile in einer SQLite-Datenbank
+(`processing_history.db`, WAL-Modus):
+
+  * Anhängen statt Neuschreiben – Kosten unabhängig von der Länge.
+  * Group Commit: ein Schreib-Thread pro Prozess sammelt alle Einträge, die
+    während eines Commits eintreffen, und schreibt sie in der nächsten
+    Transaktion gemeinsam. `append()` kehrt erst nach dem Commit zurück.
+  * Nichts wird gekürzt (Nachweispflicht); Abfragen nach Datum, Status,
+    Kategorie, Absender, Patient und Postfach laufen über Indizes.
+  * Oberfläche, Auto-Scan und `batch` dürfen gleichzeitig schreiben; SQLite
+    sperrt selbst, Leser blockieren im WAL-Modus keine Schreiber.
+
+Neben den Einträgen liegen hier der Pfad-Index der Ablage (faxfinity.layout),
+der Suchindex (faxfinity.search) und das Absender-Verzeichnis
+(faxfinity.senders).
+
+Ein vorhandenes `processing_log.json` wird beim ersten Öffnen übernommen
+und in `processing_log.migrated.json` umbenannt.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+from faxfinity import layout, search, senders, stats
+
+logger = logging.getLogger("FaxFinity")
+
+HISTORY_FILE = "processing_history.db"
+LEGACY_LOG_FILE = "processing_log.json"
+BUSY_TIMEOUT_MS = 10_000
+WRITE_RETRIES = 5  # weitere Versuche, wenn die Datenbank gesperrt ist (0,2 s, 0,4 s, …)
+
+# Spalten neben dem vollständigen Eintrag (data); Absender und Patient in
+# Kleinschreibung (casefold, auch Umlaute), Präfix-Suchen sind Index-Bereiche
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS eintraege (
+    id        INTEGER PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    status    TEXT NOT NULL,
+    ok        INTEGER NOT NULL,
+    kategorie TEXT,
+    absender  TEXT,
+    patient   TEXT,
+    postfach  TEXT,
+    original  TEXT,
+    data      TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_timestamp ON eintraege (timestamp);
+CREATE INDEX IF NOT EXISTS idx_status ON eintraege (status, timestamp);
+CREATE INDEX IF NOT EXISTS idx_kategorie ON eintraege (kategorie, timestamp);
+CREATE INDEX IF NOT EXISTS idx_absender ON eintraege (absender, timestamp);
+CREATE INDEX IF NOT EXISTS idx_patient ON eintraege (patient, timestamp);
+CREATE INDEX IF NOT EXISTS idx_postfach ON eintraege (postfach, timestamp);
+"""
+_INSERT = ("INSERT INTO eintraege (timestamp, status, ok, kategorie, absender, patient, "
+           "postfach, original, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)")
+
+_registry: dict = {}  # absoluter Pfad → ProcessingHistory; prozessweit geteilt
+_registry_lock = threading.Lock()
+
+
+class HistoryError(RuntimeError):
+    """Eintrag konnte nicht in die Historie geschrieben werden."""
+
+
+def get_history(path: str = HISTORY_FILE) -> "ProcessingHistory":
+    """Prozessweit eine Instanz je Datenbankdatei (Sessions, Worker, Auto-Scan)."""
+    key = os.path.abspath(path)
+    with _registry_lock:
+        history = _registry.get(key)
+        if history is None:
+            history = _registry[key] = ProcessingHistory(key)
+        return history
+
+
+def is_ok(status: str) -> bool:
+    return status.startswith("✅")
+
+
+def _row(entry: dict) -> tuple:
+    status = entry.get("status", "")
+    return (
+        entry.get("timestamp", ""), status, int(is_ok(status)),
+        entry.get("kategorie", ""), (entry.get("absender") or "").casefold(),
+        (entry.get("patient") or "").casefold(),
+        entry.get("postfach", ""), entry.get("original", ""),
+        # Der Volltext steht nur im Suchindex
+        json.dumps({k: v for k, v in entry.items() if k != "volltext"}, ensure_ascii=False),
+    )
+
+
+class ProcessingHistory:
+    """Historie in einer SQLite-Datei; thread-sicher, Schreiben per Group Commit."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._cond = threading.Condition()
+        self._pending: list = []
+        self._queued = 0  # Nummer des zuletzt eingereihten Eintrags
+        self._committed = 0  # … und des zuletzt geschriebenen
+        self._failed: dict = {}  # Nummer → Fehler, bis append() ihn abholt
+        self._writer: threading.Thread | None = None
+        with closing(self._connect()) as conn:
+            conn.executescript(_SCHEMA)
+            layout.ensure_schema(conn)
+            search.ensure_schema(conn)
+            senders.ensure_schema(conn)
+            stats.ensure_schema(conn)
+        self._migrate_legacy()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000,
+                               check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")  # im WAL-Modus trotzdem absturzsicher
+        return conn
+
+    def _migrate_legacy(self):
+        legacy = os.path.join(os.path.dirname(self.path), LEGACY_LOG_FILE)
+        migrated = legacy.replace(".json", ".migrated.json")
+        try:
+            # Erst umbenennen: startet ein zweiter Prozess gleichzeitig, übernimmt nur einer
+            os.rename(legacy, migrated)
+        except OSError:
+            return
+        try:
+            with open(migrated, "r", encoding="utf-8") as f:
+                entries = [e for e in json.load(f) if isinstance(e, dict)]
+            with closing(self._connect()) as conn, conn:
+                conn.executemany(_INSERT, [_row(e) for e in entries])
+                stats.update(conn, entries, backlog=0)
+            logger.info(f"🗃️ {len(entries)} Einträge aus {LEGACY_LOG_FILE} übernommen.")
+        except (OSError, ValueError, TypeError, sqlite3.Error) as e:
+            logger.warning(f"Altes Verarbeitungs-Log nicht übernommen: {e}")
+            os.replace(migrated, legacy)
+
+    # ── Schreiben ─────────────────────────────────────────────
+    def append(self, entry: dict):
+        """
+        Eintrag anhängen; kehrt zurück, sobald er (mit anderen) geschrieben ist.
+        HistoryError, wenn sein Commit fehlgeschlagen ist.
+        """
+        with self._cond:
+            self._pending.append(entry)
+            self._queued += 1
+            ticket = self._queued
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, daemon=True,
+                                                name="history-writer")
+                self._writer.start()
+            self._cond.notify_all()
+            while self._committed < ticket:
+                self._cond.wait()
+            error = self._failed.pop(ticket, None)
+        if error is not None:
+            raise HistoryError(f"Historie nicht geschrieben: {error}") from error
+
+    def _write_loop(self):
+        conn = self._connect()
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                batch, self._pending = self._pending, []
+                last = self._queued
+            error = None
+            try:
+                self._write_batch(conn, batch)
+            except Exception as e:  # der Schreiber darf nie sterben: append() wartete sonst ewig
+                logger.error(f"Historie: {len(batch)} Eintrag/Einträge nicht geschrieben: {e}")
+                error = e
+            with self._cond:
+                if error is not None:
+                    self._failed.update(dict.fromkeys(range(last - len(batch) + 1, last + 1), error))
+                self._committed = last
+                self._cond.notify_all()
+
+    def _write_batch(self, conn: sqlite3.Connection, batch: list):
+        """Ein Group Commit; gesperrte Datenbank (andere Prozesse) → mit Backoff wiederholen."""
+        for attempt in range(WRITE_RETRIES + 1):
+            try:
+                with conn:
+                    conn.executemany(_INSERT, [_row(e) for e in batch])
+                    # Eine Verbindung, eine Transaktion: die ids sind fortlaufend
+                    last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+                    stats.update(conn, batch)  # Statistik im selben Commit
+                    layout.update(conn, batch)
+                    search.update(conn, batch, last_id - len(batch) + 1)
+                    senders.observe(conn, batch)
+                return
+            except sqlite3.OperationalError as e:
+                message = str(e).lower()
+                if attempt == WRITE_RETRIES or ("locked" not in message and "busy" not in message):
+                    raise
+                logger.warning(f"Historie gesperrt ({e}) – neuer Versuch")
+                time.sleep(0.2 * 2 ** attempt)
+
+    # ── Abfragen ──────────────────────────────────────────────
+    def _where(self, since: str = "", until: str = "", status: str = "", ok: bool | None = None,
+               kategorie: str = "", absender: str = "", patient: str = "",
+               postfach: str = "") -> tuple[str, list]:
+        clauses, params = [], []
+        if since:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+        if until:
+            clauses.append("timestamp < ?")
+            params.append(until)
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if ok is not None:
+            clauses.append("ok = ?")
+            params.append(int(ok))
+        if kategorie:
+            clauses.append("kategorie = ?")
+            params.append(kategorie)
+        for column, value in (("absender", absender), ("patient", patient)):
+            if value:
+                # Präfix als Bereich [wert, wert + höchstes Zeichen) – nutzt den Index
+                clauses.append(f"{column} >= ? AND {column} < ?")
+                params += [value.casefold(), value.casefold() + "\U0010ffff"]
+        if postfach:
+            clauses.append("postfach = ?")
+            params.append(postfach)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query(self, limit: int | None = 100, offset: int = 0, newest_first: bool = True,
+              **filters) -> list:
+        """
+        Einträge (dicts wie bisher im Log) nach Filtern: since/until
+        ("YYYY-MM-DD[ HH:MM:SS]", until exklusiv), status, ok, kategorie,
+        postfach (exakt), absender/patient (Anfang des Namens, ohne
+        Groß-/Kleinschreibung).
+        """
+        where, params = self._where(**filters)
+        order = "DESC" if newest_first else "ASC"
+        sql = f"SELECT data FROM eintraege{where} ORDER BY timestamp {order}, id {order}"
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            params += [int(limit), int(offset)]
+        with self.reader() as conn:
+            return [json.loads(data) for (data,) in conn.execute(sql, params)]
+
+    def count(self, **filters) -> int:
+        where, params = self._where(**filters)
+        with self.reader() as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM eintraege{where}", params).fetchone()[0]
+
+    def summary(self) -> dict:
+        """Gesamtzahl, erfolgreiche und fehlgeschlagene Einträge (aus faxfinity.stats)."""
+        with self.reader() as conn:
+            return stats.totals(conn)
+
+    def distinct(self, column: str) -> list:
+        """Vorkommende Werte von status, kategorie oder postfach (für Filter-Auswahlen)."""
+        if column not in stats.DIMENSIONS:
+            raise ValueError(f"Unbekannte Spalte: {column}")
+        with self.reader() as conn:
+            return sorted(stats.counts(conn, column))
+
+    def locate(self, name: str) -> list:
+        """Ablageorte zu einem Dateinamen(-anfang): [(bereich, pfad), …]."""
+        with self.reader() as conn:
+            return layout.locate(conn, name)
+
+    def relocate(self, moves: list):
+        """Verschobene Dateien im Pfad-Index nachtragen (eine Transaktion)."""
+        with closing(self._connect()) as conn, conn:
+            layout.relocate(conn, moves)
+
+    def forget(self, directory: str):
+        """Gelöschtes Verzeichnis aus dem Pfad-Index nehmen (faxfinity.layout.forget)."""
+        with closing(self._connect()) as conn, conn:
+            layout.forget(conn, directory)
+
+    def search(self, text: str, limit: int = search.RESULT_LIMIT, **filters) -> list:
+        """
+        Volltextsuche (faxfinity.search), neueste zuerst: Einträge mit
+        zusätzlich `id` und `treffer` (Ausschnitt aus der Textebene).
+        Filter: since, until, kategorie.
+        """
+        with self.reader() as conn:
+            hits = search.search(conn, text, limit=limit, **filters)
+            if not hits:
+                return []
+            ids = [hit_id for hit_id, _, _ in hits]
+            data = dict(conn.execute(
+                f"SELECT id, data FROM eintraege WHERE id IN ({','.join('?' * len(ids))})", ids))
+        results = []
+        for hit_id, _, snippet in hits:
+            if hit_id in data:
+                entry = json.loads(data[hit_id])
+                entry.update(id=hit_id, treffer=snippet)
+                results.append(entry)
+        return results
+
+    def unindexed(self) -> int:
+        """Einträge, die noch nicht im Suchindex stehen (siehe search.backfill)."""
+        with self.reader() as conn:
+            return search.missing_count(conn)
+
+    def index_rows(self, rows: list):
+        """Nachgetragene Suchindex-Zeilen schreiben (eine Transaktion)."""
+        with closing(self._connect()) as conn, conn:
+            search.insert_rows(conn, rows)
+
+    def sender(self, numbers: list) -> dict | None:
+        """Absender der ersten bekannten Faxnummer (faxfinity.senders) oder None."""
+        with self.reader() as conn:
+            return senders.lookup(conn, numbers)
+
+    def senders(self) -> list:
+        """Absender-Verzeichnis für die Oberfläche."""
+        with self.reader() as conn:
+            return senders.entries(conn)
+
+    def save_senders(self, rows: list) -> int:
+        """Bearbeitetes Absender-Verzeichnis übernehmen (eine Transaktion)."""
+        with closing(self._connect()) as conn, conn:
+            return senders.save(conn, rows)
+
+    def reader(self) -> closing:
+        """Kurzlebige Leseverbindung; SQLite-Verbindungen sind billig zu öffnen."""
+        return closing(sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000))
@@ -0,0 +1,205 @@
+"""
+Mehrere Postfächer (Faxleitungen), eine gemeinsame Pipeline.
+
+Neben dem Haupt-Eingangsordner können unter `postfaecher` weitere
+Eingänge definiert werden, z.B. Praxis- und Pflegeheim-Leitung. Jeder
+Eintrag überschreibt beliebige Konfigurationswerte, typischerweise:
+
+  postfach_name      – Anzeigename (auch im Log)
+  eingangsordner     – überwachter Ordner
+  ausgabeordner      – Basis für Archiv/Umbenannt/Fehler (Standard: Eingang)
+  eigener_name       – Empfänger, der nie als Absender/Patient erscheint
+  dateiname_vorlage  – Namensschema, z.B. "PH_{kategorie}_{patient}_{zeitstempel}"
+  ablage_archiv …    – Unterordner je Bereich, z.B. "{yyyy}/{mm}" (faxfinity.layout)
+  gewicht            – Anteil an der GPU-Zeit relativ zu den anderen
+
+Ein einziger Scheduler verteilt die Arbeit per Weighted Fair Queueing:
+jedes Postfach hat eine virtuelle Uhr, die pro Dokument um 1/gewicht
+vorrückt; bedient wird das Postfach mit der kleinsten Uhr. Da nur die
+erste Seite analysiert wird, kostet jedes Dokument etwa gleich viel.
+Dringende Faxe (siehe faxfinity.priority) gehen postfachübergreifend vor.
+
+Mit `shared_inbox` teilt sich das Postfach den Eingang mit anderen Rechnern;
+jede Datei wird vor der Verarbeitung beansprucht (siehe faxfinity.leases).
+"""
+
+import logging
+import os
+import threading
+
+from faxfinity.leases import RECOVER_INTERVAL, get_leases
+from faxfinity.priority import InboxQueue
+
+logger = logging.getLogger("FaxFinity")
+
+DEFAULT_INBOX_NAME = "Praxis"
+
+
+def get_inboxes(cfg: dict) -> list:
+    """
+    Wirksame Konfiguration je Postfach: das Haupt-Postfach aus den
+    Top-Level-Werten plus alle Einträge aus cfg["postfaecher"].
+    """
+    primary = dict(cfg)
+    primary["postfach_name"] = cfg.get("postfach_name") or DEFAULT_INBOX_NAME
+    inboxes = [primary]
+    names = {primary["postfach_name"]}
+    for i, extra in enumerate(cfg.get("postfaecher") or [], start=2):
+        if not extra.get("eingangsordner"):
+            continue
+        inbox = dict(cfg)
+        inbox.update({k: v for k, v in extra.items() if v not in (None, "")})
+        inbox["postfach_name"] = extra.get("postfach_name") or f"Postfach {i}"
+        if inbox["postfach_name"] in names:
+            inbox["postfach_name"] = f"{inbox['postfach_name']} ({i})"
+        names.add(inbox["postfach_name"])
+        inboxes.append(inbox)
+    return inboxes
+
+
+def output_base(inbox: dict) -> str:
+    """Basisordner für Archiv/Umbenannt/Fehler eines Postfachs."""
+    return inbox.get("ausgabeordner") or inbox["eingangsordner"]
+
+
+class _Lane:
+    def __init__(self, index: int, inbox: dict, max_files: int | None, claim: bool):
+        self.index = index
+        self.inbox = inbox
+        self.queue = InboxQueue(inbox["eingangsordner"], inbox, max_files=max_files)
+        try:
+            self.weight = max(0.01, float(inbox.get("gewicht") or 1))
+        except (TypeError, ValueError):
+            self.weight = 1.0
+        self.vtime = 0.0
+        self.idle = True
+        self.leases = get_leases(inbox["eingangsordner"], inbox) \
+            if claim and inbox.get("shared_inbox") else None
+
+
+class FairScheduler:
+    """
+    Weighted Fair Queueing über mehrere Postfächer. `pop()` liefert
+    (Postfach-Konfiguration, PDF-Pfad) oder None, wenn nichts mehr wartet.
+    Thread-sicher; mehrere Worker können sich denselben Scheduler teilen.
+
+    Mit `wait_for_claims` wartet `pop()` bei geteiltem Eingang, bis auch die
+    Dateien anderer Knoten erledigt oder nach deren Ausfall zurückgelegt sind
+    (Stapelverarbeitung: Eingang wirklich leer). `close()` beendet das Warten.
+
+    Ohne `claim` (Probelauf) werden Dateien im geteilten Eingang nicht
+    beansprucht und fremde Arbeitsordner nicht zurückgelegt – der Eingang
+    bleibt unverändert.
+    """
+
+    def __init__(self, inboxes: list, max_files: int | None = None,
+                 wait_for_claims: bool = False, claim: bool = True):
+        self.max_files = max_files
+        self.wait_for_claims = wait_for_claims
+        self.popped = 0
+        self._lanes = []
+        for i, inbox in enumerate(inboxes):
+            if not inbox.get("eingangsordner") or not os.path.isdir(inbox["eingangsordner"]):
+                logger.warning(f"Postfach '{inbox.get('postfach_name')}': Eingangsordner "
+                               f"fehlt oder existiert nicht – übersprungen.")
+                continue
+            self._lanes.append(_Lane(i, inbox, max_files, claim))
+        self._vclock = 0.0
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+
+    @property
+    def inboxes(self) -> list:
+        return [lane.inbox for lane in self._lanes]
+
+    def pop(self) -> tuple[dict, str] | None:
+        with self._lock:
+            while self.max_files is None or self.popped < self.max_files:
+                for lane in self._lanes:
+                    if lane.leases is not None and lane.leases.recover_stale():
+                        lane.queue.refresh()  # zurückgelegte Dateien sofort einsortieren
+                backlogged = []
+                for lane in self._lanes:
+                    rank = lane.queue.head_rank()
+                    if rank is None:
+                        lane.idle = True
+                        continue
+                    if lane.idle:
+                        # Wieder aktiv: kein angespartes Guthaben aus der Leerlaufzeit
+                        lane.vtime = max(lane.vtime, self._vclock)
+                        lane.idle = False
+                    backlogged.append((rank, lane.vtime, lane.index, lane))
+                if not backlogged:
+                    if self.wait_for_claims and any(
+                            lane.leases is not None and lane.leases.foreign_claims()
+                            for lane in self._lanes):
+                        if self._closed.wait(RECOVER_INTERVAL):
+                            return None
+                        continue
+                    return None
+                _, _, _, lane = min(backlogged, key=lambda b: b[:3])
+                pdf_path = lane.queue.pop()
+                if pdf_path is None:
+                    continue  # inzwischen verschwunden
+                if lane.leases is not None:
+                    claimed = lane.leases.claim(pdf_path)
+                    if claimed is None:
+                        # Anderer Knoten war schneller; kommt die Datei nach
+                        # dessen Ausfall zurück, soll sie erneut einsortiert werden
+                        lane.queue.forget(pdf_path)
+                        continue
+                    pdf_path = claimed
+                lane.vtime += 1.0 / lane.weight
+                self._vclock = min(b[3].vtime for b in backlogged)
+                self.popped += 1
+                return lane.inbox, pdf_path
+            return None
+
+    def peek(self, n: int = 5) -> list:
+        """
+        Voraussichtlich nächste `n` Dateien über alle Postfächer als
+        (Postfach, Dateiname, Hinweis) – simuliert dieselbe Auswahl wie pop(),
+        ohne etwas zu entnehmen. Für die Anzeige; blockiert nicht.
+        """
+        lanes = [(lane, lane.queue.peek(n)) for lane in self._lanes]
+        vtimes = [max(lane.vtime, self._vclock) if lane.idle else lane.vtime for lane, _ in lanes]
+        positions = [0] * len(lanes)
+        upcoming = []
+        while len(upcoming) < n:
+            candidates = [
+                (items[positions[i]][2], vtimes[i], lane.index, i)
+                for i, (lane, items) in enumerate(lanes)
+                if positions[i] < len(items)
+            ]
+            if not candidates:
+                break
+            *_, i = min(candidates)
+            lane, items = lanes[i]
+            path, hint, _ = items[positions[i]]
+            upcoming.append((lane.inbox["postfach_name"], os.path.basename(path), hint))
+            positions[i] += 1
+            vtimes[i] += 1.0 / lane.weight
+        if self.max_files is not None:
+            upcoming = upcoming[:max(0, self.max_files - self.popped)]
+        return upcoming
+
+    def close(self):
+        """Wartende `pop()`-Aufrufe beenden (z.B. bei Strg+C)."""
+        self._closed.set()
+
+    def release(self, inbox: dict, pdf_path: str):
+        """Nach der Verarbeitung aufrufen: gibt eine beanspruchte Datei frei."""
+        for lane in self._lanes:
+            if lane.inbox is inbox and lane.leases is not None:
+                lane.leases.release(pdf_path)
+
+    def __len__(self) -> int:
+        pending = sum(len(lane.queue) for lane in self._lanes)
+        if self.max_files is not None:
+            pending = min(pending, max(0, self.max_files - self.popped))
+        return pending
+
+    @property
+    def discovered(self) -> int:
+        total = sum(lane.queue.discovered for lane in self._lanes)
+        return min(total, self.max_files) if self.max_files is not None else total
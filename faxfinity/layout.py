@@ -0,0 +1,198 @@
+"""
+Ablage-Struktur: Unterordner nach Datum/Kategorie statt flacher Ordner.
+
+Flache Ordner mit zehntausenden PDFs machen jedes Auflisten, jede
+Namensprüfung und das Öffnen im Explorer (SMB) langsam. Je Bereich kann
+deshalb eine Vorlage für Unterordner gesetzt werden (global oder je Postfach):
+
+  ablage_archiv     – z.B. "{yyyy}/{mm}"       → Archiv/2025/03/…
+  ablage_umbenannt  – z.B. "{kategorie}"       → Umbenannt/Labor/…
+  ablage_fehler     – z.B. "{yyyy}-{mm}"       → Fehler/2025-03/…
+
+Platzhalter: {yyyy} {mm} {dd} (Verarbeitungszeit), {kategorie}, {absender},
+{patient}, {postfach}. Leere Felder fallen samt Ordnerebene weg (im Archiv
+gibt es z.B. noch keine Kategorie); leere Vorlage = flach wie bisher.
+Im deduplizierten Archiv (faxfinity.archive) liegen die Objekte nach Hash;
+dort gilt ablage_archiv nicht.
+
+Wo eine Datei gelandet ist, hält der Pfad-Index fest: die Tabelle `ablage`
+in der Historie (Dateiname → Pfad), fortgeschrieben im selben Commit wie
+der Historien-Eintrag. Bestehende Ordner baut `python faxsort_ai.py reshard`
+um (siehe faxfinity.reshard).
+"""
+
+import logging
+import os
+import re
+import sqlite3
+import threading
+import zipfile
+from datetime import datetime
+
+logger = logging.getLogger("FaxFinity")
+
+AREAS = {"archiv": "Archiv", "umbenannt": "Umbenannt", "fehler": "Fehler"}
+TEMPLATE_KEYS = {area: f"ablage_{area}" for area in AREAS}
+PLACEHOLDERS = ("yyyy", "mm", "dd", "kategorie", "absender", "patient", "postfach")
+LOCATE_LIMIT = 50
+MEMBER_SEP = "::"  # "<bündel>.zip::<name>" – Datei in einem Jahresbündel (faxfinity.maintenance)
+_TIMESTAMP = re.compile(r"(?<!\d)(\d{8})_(\d{6})(?!\d)")  # JJJJMMTT_HHMMSS im Dateinamen
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ablage (
+    pfad    TEXT PRIMARY KEY,
+    name    TEXT NOT NULL,
+    bereich TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_ablage_name ON ablage (name);
+"""
+_UPSERT = "INSERT OR REPLACE INTO ablage (pfad, name, bereich) VALUES (?, ?, ?)"
+
+_created: set = set()  # bereits angelegte Ordner; prozessweit
+_created_lock = threading.Lock()
+
+
+# ──────────────────────────────────────────────────────────────
+# VORLAGEN
+# ──────────────────────────────────────────────────────────────
+def fields_for(when: datetime, analysis: dict | None = None, postfach: str = "") -> dict:
+    """Platzhalter-Werte für eine Datei; ohne Analyse bleiben die Inhaltsfelder leer."""
+    analysis = analysis or {}
+    absender = analysis.get("absender", "")
+    return {
+        "yyyy": f"{when.year:04d}",
+        "mm": f"{when.month:02d}",
+        "dd": f"{when.day:02d}",
+        "kategorie": analysis.get("kategorie", ""),
+        "absender": absender if absender != "Unbekannt" else "",
+        "patient": analysis.get("patient", ""),
+        "postfach": postfach,
+    }
+
+
+def date_of(name: str, path: str) -> datetime:
+    """Ablagedatum einer vorhandenen Datei: Zeitstempel im Namen, sonst Änderungszeit."""
+    match = _TIMESTAMP.search(name)
+    if match:
+        try:
+            return datetime.strptime("".join(match.groups()), "%Y%m%d%H%M%S")
+        except ValueError:
+            pass
+    return datetime.fromtimestamp(os.path.getmtime(path))
+
+
+def _component(part: str) -> str:
+    # wie sanitize_filename; "." und ".." kommen so nicht durch
+    part = re.sub(r"[^\w\-.]", "_", part.strip(), flags=re.UNICODE)
+    part = re.sub(r"_+", "_", part).strip("_.")
+    return part
+
+
+def check_template(template: str) -> str:
+    """Fehlermeldung zu einer Vorlage, sonst ""."""
+    try:
+        template.format(**dict.fromkeys(PLACEHOLDERS, "x"))
+    except (KeyError, IndexError, ValueError) as e:
+        return f"Ungültige Ablage-Vorlage {template!r}: {e}"
+    return ""
+
+
+def subpath(template: str, fields: dict) -> str:
+    """Relativer Unterordner zur Vorlage ("" = direkt im Bereich)."""
+    if not template:
+        return ""
+    try:
+        rendered = template.format(**fields)
+    except (KeyError, IndexError, ValueError) as e:
+        logger.warning(f"  {check_template(template) or e} – lege flach ab")
+        return ""
+    parts = [p for p in (_component(p) for p in re.split(r"[\\/]", rendered)) if p]
+    return os.path.join(*parts) if parts else ""
+
+
+def target_dir(area_dir: str, template: str, fields: dict) -> str:
+    """Zielordner im Bereich `area_dir`; wird beim ersten Gebrauch angelegt."""
+    sub = subpath(template, fields)
+    if not sub:
+        return area_dir
+    directory = os.path.join(area_dir, sub)
+    with _created_lock:
+        known = directory in _created
+    if not known:
+        os.makedirs(directory, exist_ok=True)
+        with _created_lock:
+            _created.add(directory)
+    return directory
+
+
+def forget_created():
+    """Angelegte Ordner vergessen (z.B. wenn jemand Unterordner gelöscht hat)."""
+    with _created_lock:
+        _created.clear()
+
+
+def template_for(cfg: dict, area: str) -> str:
+    return (cfg.get(TEMPLATE_KEYS[area]) or "").strip()
+
+
+# ──────────────────────────────────────────────────────────────
+# PFAD-INDEX (Tabelle in der Historie)
+# ──────────────────────────────────────────────────────────────
+def ensure_schema(conn: sqlite3.Connection):
+    conn.executescript(SCHEMA)
+
+
+def index_rows(paths: dict) -> list:
+    """{bereich: Pfad} → Zeilen für die Tabelle `ablage`."""
+    return [(os.path.abspath(p), os.path.basename(split_member(p)[1] or p).casefold(), area)
+            for area, p in paths.items() if p]
+
+
+def split_member(path: str) -> tuple[str, str]:
+    """(Dateipfad, Name im Bündel oder "")."""
+    outer, _, member = path.partition(MEMBER_SEP)
+    return outer, member
+
+
+def exists(path: str) -> bool:
+    """Gibt es die Datei noch – auch als Eintrag in einem Jahresbündel?"""
+    outer, member = split_member(path)
+    if not member:
+        return os.path.exists(path)
+    try:
+        with zipfile.ZipFile(outer) as bundle:
+            bundle.getinfo(member)
+    except (OSError, KeyError, zipfile.BadZipFile):
+        return False
+    return True
+
+
+def update(conn: sqlite3.Connection, entries: list):
+    """Ablageorte neuer Historien-Einträge übernehmen (innerhalb der laufenden Transaktion)."""
+    rows = [row for entry in entries for row in index_rows(entry.get("ablage") or {})]
+    if rows:
+        conn.executemany(_UPSERT, rows)
+
+
+def relocate(conn: sqlite3.Connection, moves: list):
+    """[(alter Pfad oder None, neuer Pfad, bereich), …] eintragen."""
+    old = [(os.path.abspath(src),) for src, _, _ in moves if src]
+    conn.executemany("DELETE FROM ablage WHERE pfad = ?", old)
+    conn.executemany(_UPSERT, [row for _, dest, area in moves
+                               for row in index_rows({area: dest})])
+
+
+def forget(conn: sqlite3.Connection, directory: str):
+    """Alle Pfade unterhalb eines gelöschten Verzeichnisses (auch in dessen Bündeln) austragen."""
+    prefix = os.path.join(os.path.abspath(directory), "")
+    conn.execute("DELETE FROM ablage WHERE pfad >= ? AND pfad < ?", (prefix, prefix + "\U0010ffff"))
+
+
+def locate(conn: sqlite3.Connection, name: str, limit: int = LOCATE_LIMIT) -> list:
+    """Ablageorte zu einem Dateinamen (oder dessen Anfang): [(bereich, pfad), …]."""
+    needle = name.strip().casefold()
+    if not needle:
+        return []
+    return conn.execute(
+        "SELECT bereich, pfad FROM ablage WHERE name >= ? AND name < ? ORDER BY name LIMIT ?",
+        (needle, needle + "\U0010ffff", limit)).fetchall()
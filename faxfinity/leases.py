@@ -0,0 +1,225 @@
+"""
+Mehrplatzbetrieb: mehrere Rechner arbeiten denselben Eingangsordner ab.
+
+Liegt der Eingang auf einem NAS, würden ohne Absprache zwei Instanzen
+dieselbe PDF sichern und analysieren. Mit `shared_inbox` beansprucht ein
+Knoten eine Datei, indem er sie atomar in seinen Arbeitsordner umbenennt:
+
+  <eingang>/.in_arbeit/<knoten>/<datei>.pdf
+
+Ein Rename gelingt genau einem Knoten; alle anderen bekommen
+FileNotFoundError und nehmen die nächste Datei. Die Pipeline verschiebt die
+Datei danach wie gewohnt nach Umbenannt/Fehler, übrig gebliebene Dateien
+(Backup-Fehler) wandern zurück in den Eingang. Ein Probelauf (`batch
+--dry-run`) beansprucht nichts.
+
+Lebenszeichen: Solange ein Knoten Dateien beansprucht hat, schreibt er alle
+`lease_ttl / 4` Sekunden einen Zähler in `<knoten>/.heartbeat`. Die anderen
+Knoten vergleichen nur, ob sich der Inhalt ändert – nach ihrer eigenen Uhr,
+damit falsch gehende Uhren der Arbeitsplätze keine Rolle spielen. Bleibt er
+länger als `lease_ttl` gleich, gilt der Knoten als ausgefallen und seine
+Dateien werden in den Eingang zurückgelegt (wieder per Rename, also ebenfalls
+genau einmal). Beim ersten Blick auf einen Knoten wird zusätzlich die mtime
+des Heartbeats mit einer frisch geschriebenen Probedatei verglichen – beide
+Zeitstempel stammen vom NAS, so werden lange verwaiste Ordner sofort erkannt.
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+
+from faxfinity import metrics
+
+logger = logging.getLogger("FaxFinity")
+
+CLAIM_DIR = ".in_arbeit"
+HEARTBEAT_FILE = ".heartbeat"
+RECOVER_INTERVAL = 5.0  # Sekunden zwischen zwei Prüfungen fremder Arbeitsordner
+
+_registry: dict = {}  # Arbeitsordner → InboxLeases; prozessweit geteilt
+_registry_lock = threading.Lock()
+
+
+def node_name(cfg: dict) -> str:
+    """Knotenname aus der Konfiguration, sonst der Rechnername."""
+    name = cfg.get("node_name") or socket.gethostname() or "knoten"
+    return "".join(c if c.isalnum() or c in "-_." else "_" for c in name)
+
+
+def get_leases(eingang: str, cfg: dict) -> "InboxLeases":
+    """Prozessweit eine Instanz je Eingangsordner und Knoten (Sessions, Batch-Worker)."""
+    node = node_name(cfg)
+    key = os.path.join(os.path.abspath(eingang), CLAIM_DIR, node)
+    with _registry_lock:
+        leases = _registry.get(key)
+        if leases is None:
+            leases = _registry[key] = InboxLeases(eingang, node, float(cfg.get("lease_ttl", 120)))
+        return leases
+
+
+class InboxLeases:
+    """Beanspruchen, Freigeben und Wiederherstellen von Dateien eines Eingangsordners."""
+
+    def __init__(self, eingang: str, node: str, ttl: float = 120.0):
+        self.eingang = os.path.abspath(eingang)
+        self.node = node
+        self.ttl = max(10.0, ttl)
+        self.root = os.path.join(self.eingang, CLAIM_DIR)
+        self.own_dir = os.path.join(self.root, node)
+        self._active: set = set()
+        self._lock = threading.Lock()
+        self._beat = 0
+        self._beat_thread: threading.Thread | None = None
+        self._observed: dict = {}  # Knoten → (Heartbeat-Inhalt, zuerst gesehen)
+        self._last_recover = 0.0
+        self._recover_lock = threading.Lock()
+
+    # ── Beanspruchen / Freigeben ──────────────────────────────
+    def claim(self, pdf_path: str) -> str | None:
+        """Datei atomar übernehmen; Rückgabe: neuer Pfad oder None (schon vergeben)."""
+        os.makedirs(self.own_dir, exist_ok=True)
+        claimed = os.path.join(self.own_dir, os.path.basename(pdf_path))
+        with self._lock:
+            if not self._active:
+                self._write_heartbeat()
+            try:
+                os.rename(pdf_path, claimed)
+            except FileNotFoundError:
+                return None  # anderer Knoten war schneller
+            except OSError as e:
+                logger.warning(f"Beanspruchen fehlgeschlagen ({os.path.basename(pdf_path)}): {e}")
+                return None
+            self._active.add(claimed)
+            self._ensure_heartbeat()
+        return claimed
+
+    def release(self, claimed: str):
+        """Arbeit beendet: liegt die Datei noch im Arbeitsordner, zurück in den Eingang."""
+        with self._lock:
+            self._active.discard(claimed)
+        if os.path.exists(claimed):
+            self._return_to_inbox(claimed)
+
+    def _return_to_inbox(self, path: str) -> bool:
+        name = os.path.basename(path)
+        target = os.path.join(self.eingang, name)
+        if os.path.exists(target):
+            stem, ext = os.path.splitext(name)
+            target = os.path.join(self.eingang, f"{stem}_{os.path.basename(os.path.dirname(path))}{ext}")
+        try:
+            os.rename(path, target)
+            return True
+        except FileNotFoundError:
+            return False  # anderer Knoten hat sie schon zurückgelegt
+        except OSError as e:
+            logger.warning(f"Zurücklegen fehlgeschlagen ({name}): {e}")
+            return False
+
+    # ── Lebenszeichen ─────────────────────────────────────────
+    def _write_heartbeat(self):
+        self._beat += 1
+        path = os.path.join(self.own_dir, HEARTBEAT_FILE)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(f"{self.node} {os.getpid()} {self._beat}\n")
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"Heartbeat nicht schreibbar: {e}")
+
+    def _ensure_heartbeat(self):
+        if self._beat_thread is None or not self._beat_thread.is_alive():
+            self._beat_thread = threading.Thread(target=self._heartbeat_loop, daemon=True,
+                                                 name=f"heartbeat-{self.node}")
+            self._beat_thread.start()
+
+    def _heartbeat_loop(self):
+        while True:
+            time.sleep(self.ttl / 4)
+            with self._lock:
+                if not self._active:
+                    self._beat_thread = None
+                    return
+                self._write_heartbeat()
+
+    # ── Ausgefallene Knoten ───────────────────────────────────
+    def foreign_claims(self) -> int:
+        """Anzahl PDFs, die andere Knoten gerade beansprucht haben."""
+        try:
+            nodes = [e.path for e in os.scandir(self.root) if e.is_dir() and e.path != self.own_dir]
+        except FileNotFoundError:
+            return 0
+        return sum(1 for d in nodes for e in os.scandir(d)
+                   if e.is_file() and e.name.lower().endswith(".pdf"))
+
+    def recover_stale(self, force: bool = False) -> int:
+        """
+        Dateien von Knoten zurücklegen, deren Heartbeat sich seit `ttl`
+        Sekunden nicht geändert hat. Höchstens alle RECOVER_INTERVAL Sekunden.
+        Rückgabe: Anzahl zurückgelegter Dateien.
+        """
+        if not self._recover_lock.acquire(blocking=False):
+            return 0  # läuft gerade in einem anderen Thread
+        try:
+            now = time.monotonic()
+            if not force and now - self._last_recover < RECOVER_INTERVAL:
+                return 0
+            self._last_recover = now
+            return self._recover(now)
+        finally:
+            self._recover_lock.release()
+
+    def _recover(self, now: float) -> int:
+        try:
+            nodes = [e for e in os.scandir(self.root) if e.is_dir()]
+        except FileNotFoundError:
+            return 0
+        recovered = 0
+        for entry in nodes:
+            with self._lock:
+                if entry.path == self.own_dir and self._active:
+                    continue
+            pdfs = [e.path for e in os.scandir(entry.path)
+                    if e.is_file() and e.name.lower().endswith(".pdf")]
+            if not pdfs:
+                self._observed.pop(entry.name, None)
+                continue
+            if not self._is_stale(entry.name, entry.path, now):
+                continue
+            count = sum(1 for path in pdfs if self._return_to_inbox(path))
+            if count:
+                logger.warning(f"♻️ Knoten '{entry.name}' antwortet nicht – "
+                               f"{count} Datei(en) zurück in den Eingang.")
+                metrics.LEASES_RECOVERED.inc(count)
+            recovered += count
+            self._observed.pop(entry.name, None)
+        return recovered
+
+    def _share_time(self) -> float | None:
+        """Aktuelle Uhrzeit des NAS: mtime einer gerade geschriebenen Probedatei."""
+        probe = os.path.join(self.root, f".uhr_{self.node}")
+        try:
+            with open(probe, "w", encoding="utf-8") as f:
+                f.write(self.node)
+            return os.stat(probe).st_mtime
+        except OSError:
+            return None
+
+    def _is_stale(self, node: str, node_dir: str, now: float) -> bool:
+        heartbeat = os.path.join(node_dir, HEARTBEAT_FILE)
+        try:
+            with open(heartbeat, "r", encoding="utf-8") as f:
+                content = f.read()
+            beat_mtime = os.stat(heartbeat).st_mtime
+        except OSError:
+            content, beat_mtime = "", 0.0
+        seen = self._observed.get(node)
+        if seen is None or seen[0] != content:
+            self._observed[node] = (content, now)
+            # Erstmals gesehen: lange verwaiste Knoten sofort erkennen, gemessen
+            # an der Uhr des NAS statt an der eigenen
+            share_now = self._share_time() if seen is None else None
+            return share_now is not None and share_now - beat_mtime > self.ttl
+        return now - seen[1] > self.ttl
@@ -0,0 +1,522 @@
+"""
+Archiv-Pflege: verlustfrei nachkomprimieren, in Jahresbündel packen,
+Aufbewahrungsfrist überwachen – gedrosselt im Hintergrund.
+
+`Archiv/` wird nie aufgeräumt; manche Absender schicken aufgeblähte PDFs
+(RGB-Scans, unkomprimierte Bilder). Die Pflege läuft in drei Schritten:
+
+  1. Nachkomprimieren (PyMuPDF): Schwarz-Weiß-Bilder (1 Bit, aber auch
+     RGB-/Graustufen-Scans, die nur Schwarz und Weiß enthalten) als
+     CCITT G4, unbenutzte Objekte entfernen, Streams deflaten. Übernommen wird das Ergebnis nur,
+     wenn es deutlich kleiner ist; nach einer G4-Umwandlung müssen alle
+     Seiten pixelgleich rendern. Änderungszeit und Name bleiben erhalten.
+  2. Jahresbündel: Dateien älter als `archiv_buendel_tage` wandern
+     komprimiert nach `Archiv/Jahresbuendel/<Jahr>/<Jahr>_teilNNNN.zip`.
+     Jeder Lauf schreibt neue Teile (erst vollständig und geprüft sichtbar,
+     dann werden die Originale gelöscht).
+  3. Aufbewahrung: Jahresbündel, deren Frist (`archiv_aufbewahrung_jahre`,
+     Standard 10 Jahre nach Jahresende, § 630f BGB) abgelaufen ist, werden
+     gemeldet – gelöscht (samt ihren Einträgen im Pfad-Index) nur mit
+     `archiv_loeschen`.
+
+Objekte des deduplizierten Archivs (faxfinity.archive) fasst die Pflege nicht
+an: ihr Name ist ihr SHA-256, und auf sie verweisen Manifest und Pfad-Index.
+
+Drosselung: Die Pflege wartet, solange in diesem oder einem anderen Prozess
+gescannt wird oder Faxe im Eingang liegen, liest/schreibt höchstens
+`archiv_pflege_mb_s` MB/s und läuft (Linux) mit niedrigster CPU-Priorität.
+Ein Lock in `Archiv/` verhindert parallele Läufe mehrerer Prozesse/Rechner;
+geprüfte Dateien merkt sich `Archiv/.faxfinity_pflege.json`.
+
+Start: Schalter in der Oberfläche (alle `archiv_pflege_stunden` Stunden)
+oder `python faxsort_ai.py maintain [--dry-run]`.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import zipfile
+from datetime import datetime
+from importlib.util import find_spec
+from io import BytesIO
+
+from faxfinity import archive, coordinator, layout, metrics
+from faxfinity.history import get_history
+from faxfinity.inboxes import get_inboxes, output_base
+from faxfinity.priority import count_inbox_pdfs
+
+logger = logging.getLogger("FaxFinity")
+
+LOCK_FILE = ".faxfinity_pflege.lock"
+STATE_FILE = ".faxfinity_pflege.json"
+BUNDLE_DIR = "Jahresbuendel"
+MIN_SIZE = 32 * 1024  # kleinere PDFs lohnen nicht
+MIN_AGE = 3600.0  # Sekunden; frisch archivierte Dateien nicht anfassen
+MIN_GAIN = 0.05  # mindestens 5 % kleiner, sonst Original behalten
+VERIFY_DPI = 72
+BUNDLE_MAX_FILES = 2000  # Dateien je Bündel-Teil
+IDLE_POLL = 10.0  # Sekunden zwischen zwei Prüfungen, ob die Pipeline ruht
+STATE_SAVE_EVERY = 200
+START_DELAY = 600.0  # Sekunden nach Prozessstart bis zum ersten periodischen Lauf
+
+_job: dict = {"cfg": None, "thread": None, "running": False, "last": None, "last_end": 0.0}
+_job_lock = threading.Lock()
+_wakeup = threading.Event()
+_stop = threading.Event()
+
+
+class Stopped(Exception):
+    """Pflege wurde abgebrochen (Schalter aus, Prozessende)."""
+
+
+# ──────────────────────────────────────────────────────────────
+# DROSSELUNG
+# ──────────────────────────────────────────────────────────────
+class Throttle:
+    """Wartet auf Leerlauf der Pipeline und begrenzt den Durchsatz."""
+
+    def __init__(self, cfg: dict, stop: threading.Event | None = None):
+        self.cfg = cfg
+        self.rate = float(cfg.get("archiv_pflege_mb_s") or 0) * 1024 * 1024
+        self.stop = stop or threading.Event()
+
+    def busy(self) -> str:
+        """Grund, warum gerade nicht gepflegt werden soll ("" = Leerlauf)."""
+        scan = coordinator.status(self.cfg)
+        if scan["running"] or scan.get("foreign"):
+            return "Scan läuft"
+        waiting = sum(count_inbox_pdfs(i["eingangsordner"]) for i in get_inboxes(self.cfg)
+                      if i.get("eingangsordner") and os.path.isdir(i["eingangsordner"]))
+        return f"{waiting} Fax(e) im Eingang" if waiting else ""
+
+    def wait_idle(self):
+        reason = self.busy()
+        if reason:
+            logger.info(f"🧹 Archiv-Pflege pausiert: {reason}")
+        while reason:
+            if self.stop.wait(IDLE_POLL):
+                raise Stopped()
+            reason = self.busy()
+        if self.stop.is_set():
+            raise Stopped()
+
+    def account(self, nbytes: int):
+        if self.rate > 0 and self.stop.wait(nbytes / self.rate):
+            raise Stopped()
+
+
+def _lower_priority():
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)  # Linux: nur dieser Thread
+    except (AttributeError, OSError):
+        pass
+
+
+# ──────────────────────────────────────────────────────────────
+# NACHKOMPRIMIEREN
+# ──────────────────────────────────────────────────────────────
+def _fitz():
+    try:
+        import pymupdf as fitz  # ab PyMuPDF 1.24.3, ohne Deprecation-Hinweis auf stdout
+    except ImportError:
+        import fitz  # PyMuPDF
+    return fitz
+
+
+def _bilevel_samples(pixmap) -> bytes | None:
+    """Graustufen-Samples (0/255), wenn das Bild nur Schwarz und Weiß enthält."""
+    if pixmap.alpha or pixmap.n not in (1, 3):
+        return None
+    samples = pixmap.samples
+    if pixmap.n == 3:
+        gray = samples[0::3]
+        if gray != samples[1::3] or gray != samples[2::3]:
+            return None  # farbig
+        samples = gray
+    return samples if not samples.translate(None, b"\x00\xff") else None
+
+
+def _g4_encode(width: int, height: int, samples: bytes) -> tuple[bytes, bool] | None:
+    """Schwarz-Weiß-Samples → (roher CCITT-G4-Strom, BlackIs1)."""
+    from PIL import Image
+
+    img = Image.frombytes("L", (width, height), samples).convert("1")
+    buf = BytesIO()
+    img.save(buf, "TIFF", compression="group4", tiffinfo={278: height})  # ein Streifen
+    tiff = Image.open(BytesIO(buf.getvalue()))
+    offsets, lengths = tiff.tag_v2[273], tiff.tag_v2[279]
+    if len(offsets) != 1:
+        return None
+    return buf.getvalue()[offsets[0]:offsets[0] + lengths[0]], tiff.tag_v2.get(262) == 1
+
+
+def _bilevel_to_g4(doc) -> int:
+    """
+    Schwarz-Weiß-Bilder (1 Bit, oder 8 Bit Grau/RGB mit nur 0/255) ohne
+    verlustbehafteten Filter als G4 speichern. Rückgabe: Anzahl umgewandelter Bilder.
+    """
+    fitz = _fitz()
+
+    converted = 0
+    for xref in range(1, doc.xref_length()):
+        if doc.xref_get_key(xref, "Subtype")[1] != "/Image":
+            continue
+        if (doc.xref_get_key(xref, "BitsPerComponent")[1] not in ("1", "8")
+                or doc.xref_get_key(xref, "Filter")[1] not in ("null", "/FlateDecode")
+                or doc.xref_get_key(xref, "ColorSpace")[1] not in ("/DeviceGray", "/DeviceRGB")
+                or any(doc.xref_get_key(xref, k)[0] != "null"
+                       for k in ("ImageMask", "Decode", "SMask", "Mask"))):
+            continue
+        try:
+            pixmap = fitz.Pixmap(doc, xref)
+            samples = _bilevel_samples(pixmap)
+            encoded = samples and _g4_encode(pixmap.width, pixmap.height, samples)
+        except Exception:
+            continue
+        if not encoded or len(encoded[0]) >= len(doc.xref_stream_raw(xref)):
+            continue
+        g4, black_is_1 = encoded
+        doc.update_stream(xref, g4, compress=False)
+        doc.xref_set_key(xref, "Filter", "/CCITTFaxDecode")
+        doc.xref_set_key(xref, "ColorSpace", "/DeviceGray")
+        doc.xref_set_key(xref, "BitsPerComponent", "1")
+        doc.xref_set_key(xref, "DecodeParms",
+                         f"<</K -1/Columns {pixmap.width}/Rows {pixmap.height}"
+                         f"/BlackIs1 {'true' if black_is_1 else 'false'}>>")
+        converted += 1
+    return converted
+
+
+def _page_digests(doc) -> list:
+    fitz = _fitz()
+
+    return [hashlib.sha256(page.get_pixmap(dpi=VERIFY_DPI, colorspace=fitz.csGRAY).samples).digest()
+            for page in doc]
+
+
+def recompress_bytes(data: bytes) -> bytes | None:
+    """Verlustfrei kleinere Fassung einer PDF oder None (nicht lohnend/nicht möglich)."""
+    fitz = _fitz()
+
+    try:
+        with fitz.open(stream=data, filetype="pdf") as doc:
+            if doc.needs_pass or doc.is_encrypted:
+                return None
+            before = _page_digests(doc)
+            converted = _bilevel_to_g4(doc)
+            out = doc.tobytes(garbage=4, deflate=True, deflate_images=True,
+                              deflate_fonts=True, use_objstms=1)
+        if len(out) > len(data) * (1 - MIN_GAIN):
+            return None
+        with fitz.open(stream=out, filetype="pdf") as check:
+            if check.page_count != len(before) or (converted and _page_digests(check) != before):
+                logger.warning("  Nachkomprimierte Fassung rendert anders – Original bleibt")
+                return None
+    except Exception as e:
+        logger.debug(f"Nachkomprimieren fehlgeschlagen: {e}")
+        return None
+    return out
+
+
+def _replace_keep_times(path: str, data: bytes):
+    st = os.stat(path)
+    tmp = f"{path}.pflege.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.chmod(tmp, st.st_mode & 0o777)
+    os.utime(tmp, ns=(st.st_atime_ns, st.st_mtime_ns))
+    os.replace(tmp, path)
+
+
+# ──────────────────────────────────────────────────────────────
+# ZUSTAND JE ARCHIV
+# ──────────────────────────────────────────────────────────────
+def _load_state(archiv_dir: str) -> dict:
+    try:
+        with open(os.path.join(archiv_dir, STATE_FILE), "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        state = {}
+    state.setdefault("geprueft", {})  # relativer Pfad → [Größe, mtime_ns]
+    return state
+
+
+def _save_state(archiv_dir: str, state: dict):
+    path = os.path.join(archiv_dir, STATE_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(path + ".tmp", path)
+
+
+def _archive_files(archiv_dir: str):
+    """PDFs in `Archiv/` ohne Jahresbündel und ohne Objekte des deduplizierten Archivs."""
+    for root, dirs, files in os.walk(archiv_dir):
+        if root == archiv_dir:
+            dirs[:] = [d for d in dirs if d not in (BUNDLE_DIR, archive.OBJECTS_DIR)
+                       and not d.startswith(".")]
+        for name in files:
+            if name.lower().endswith(".pdf"):
+                yield os.path.join(root, name)
+
+
+def _empty_report() -> dict:
+    return {"geprueft": 0, "komprimiert": 0, "gespart_komprimiert": 0,
+            "gebuendelt": 0, "gespart_buendel": 0, "abgelaufen": [], "geloescht": 0,
+            "fehler": 0}
+
+
+# ──────────────────────────────────────────────────────────────
+# DIE DREI SCHRITTE
+# ──────────────────────────────────────────────────────────────
+def _recompress_all(archiv_dir: str, state: dict, report: dict, throttle: Throttle, dry_run: bool):
+    if find_spec("pymupdf") is None and find_spec("fitz") is None:
+        logger.warning("🧹 PyMuPDF nicht installiert – Nachkomprimieren übersprungen.")
+        return
+    seen = state["geprueft"]
+    now = time.time()
+    for path in _archive_files(archiv_dir):
+        rel = os.path.relpath(path, archiv_dir)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        if seen.get(rel) == [st.st_size, st.st_mtime_ns] or st.st_size < MIN_SIZE \
+                or now - st.st_mtime < MIN_AGE:
+            continue
+        if st.st_nlink > 1:
+            continue  # Hardlink (archiv_hardlinks): Ersetzen würde die Datei verdoppeln
+        throttle.wait_idle()
+        report["geprueft"] += 1
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            smaller = recompress_bytes(data)
+            if smaller is not None:
+                report["komprimiert"] += 1
+                report["gespart_komprimiert"] += len(data) - len(smaller)
+                if not dry_run:
+                    _replace_keep_times(path, smaller)
+                    st = os.stat(path)
+                    logger.info(f"  🧹 {rel}: {len(data) // 1024} → {len(smaller) // 1024} KB")
+        except OSError as e:
+            logger.warning(f"  🧹 {rel}: {e}")
+            report["fehler"] += 1
+            continue
+        if not dry_run:
+            seen[rel] = [st.st_size, st.st_mtime_ns]
+            if report["geprueft"] % STATE_SAVE_EVERY == 0:
+                _save_state(archiv_dir, state)
+        throttle.account(len(data) + (len(smaller) if smaller else 0))
+
+
+def _next_part(year_dir: str, year: str) -> str:
+    existing = [n for n in os.listdir(year_dir) if n.startswith(f"{year}_teil") and n.endswith(".zip")]
+    return os.path.join(year_dir, f"{year}_teil{len(existing) + 1:04d}.zip")
+
+
+def _write_bundle(archiv_dir: str, year: str, paths: list, throttle: Throttle) -> tuple[str, int]:
+    """Ein Bündel-Teil schreiben und prüfen. Rückgabe: (Pfad, Größe)."""
+    year_dir = os.path.join(archiv_dir, BUNDLE_DIR, year)
+    os.makedirs(year_dir, exist_ok=True)
+    target = _next_part(year_dir, year)
+    tmp = target + ".tmp"
+    with zipfile.ZipFile(tmp, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=9) as zf:
+        for path in paths:
+            throttle.wait_idle()
+            zf.write(path, os.path.relpath(path, archiv_dir).replace(os.sep, "/"))
+            throttle.account(os.path.getsize(path))
+    with open(tmp, "rb") as f:
+        os.fsync(f.fileno())
+    with zipfile.ZipFile(tmp) as zf:
+        if zf.testzip() is not None or len(zf.namelist()) != len(paths):
+            raise OSError(f"Bündel {tmp} fehlerhaft")
+    os.replace(tmp, target)
+    return target, os.path.getsize(target)
+
+
+def _bundle_old(archiv_dir: str, cfg: dict, state: dict, report: dict, throttle: Throttle,
+                dry_run: bool):
+    days = int(cfg.get("archiv_buendel_tage") or 0)
+    if days <= 0:
+        return
+    cutoff = time.time() - days * 86400
+    per_year: dict = {}
+    for path in _archive_files(archiv_dir):
+        try:
+            when = layout.date_of(os.path.basename(path), path)
+        except OSError:
+            continue
+        if when.timestamp() < cutoff:
+            per_year.setdefault(f"{when.year:04d}", []).append(path)
+    for year, paths in sorted(per_year.items()):
+        for i in range(0, len(paths), BUNDLE_MAX_FILES):
+            chunk = paths[i:i + BUNDLE_MAX_FILES]
+            size = sum(os.path.getsize(p) for p in chunk)
+            if dry_run:
+                report["gebuendelt"] += len(chunk)
+                continue
+            try:
+                bundle, bundle_size = _write_bundle(archiv_dir, year, chunk, throttle)
+            except OSError as e:
+                logger.warning(f"  🧹 Jahresbündel {year}: {e}")
+                report["fehler"] += 1
+                continue
+            moves = []
+            for path in chunk:
+                os.unlink(path)
+                rel = os.path.relpath(path, archiv_dir)
+                state["geprueft"].pop(rel, None)
+                moves.append((path, f"{bundle}{layout.MEMBER_SEP}{rel.replace(os.sep, '/')}", "archiv"))
+            get_history().relocate(moves)
+            report["gebuendelt"] += len(chunk)
+            report["gespart_buendel"] += max(0, size - bundle_size)
+            logger.info(f"  📦 {len(chunk)} Datei(en) → {os.path.relpath(bundle, archiv_dir)}")
+            _save_state(archiv_dir, state)
+
+
+def _retention(archiv_dir: str, cfg: dict, report: dict, dry_run: bool):
+    years = int(cfg.get("archiv_aufbewahrung_jahre") or 10)
+    last_expired = datetime.now().year - years - 1  # Frist läuft ab Ende des Jahres
+    bundle_root = os.path.join(archiv_dir, BUNDLE_DIR)
+    try:
+        year_dirs = sorted(d for d in os.listdir(bundle_root) if d.isdigit())
+    except OSError:
+        return
+    for year in year_dirs:
+        if int(year) > last_expired:
+            continue
+        year_dir = os.path.join(bundle_root, year)
+        report["abgelaufen"].append(year)
+        if dry_run or not cfg.get("archiv_loeschen"):
+            continue
+        size = sum(os.path.getsize(os.path.join(year_dir, n)) for n in os.listdir(year_dir))
+        shutil.rmtree(year_dir)
+        get_history().forget(year_dir)
+        report["geloescht"] += size
+        logger.info(f"  🗑️ Jahresbündel {year} gelöscht (Aufbewahrungsfrist {years} Jahre abgelaufen)")
+
+
+def run(cfg: dict, dry_run: bool = False, stop: threading.Event | None = None) -> dict:
+    """
+    Ein Pflege-Lauf über die Archive aller Postfächer. Rückgabe: Bericht mit
+    Zählern und eingesparten Bytes (gespart_komprimiert, gespart_buendel, geloescht).
+    """
+    throttle = Throttle(cfg, stop)
+    report = _empty_report()
+    report["start"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    archiv_dirs = sorted({os.path.join(output_base(i), "Archiv") for i in get_inboxes(cfg)
+                          if i.get("eingangsordner")})
+    for archiv_dir in archiv_dirs:
+        if not os.path.isdir(archiv_dir):
+            continue
+        try:
+            with coordinator.file_lock(os.path.join(archiv_dir, LOCK_FILE), "archiv-pflege"):
+                state = _load_state(archiv_dir)
+                try:
+                    _recompress_all(archiv_dir, state, report, throttle, dry_run)
+                    _bundle_old(archiv_dir, cfg, state, report, throttle, dry_run)
+                    _retention(archiv_dir, cfg, report, dry_run)
+                finally:
+                    if not dry_run:
+                        _save_state(archiv_dir, state)
+        except coordinator.ScanBusy:
+            logger.info(f"🧹 Archiv-Pflege für {archiv_dir} läuft bereits anderswo.")
+        except Stopped:
+            report["abgebrochen"] = True
+            break
+    report["ende"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    if not dry_run:
+        metrics.ARCHIVE_BYTES_SAVED.inc(report["gespart_komprimiert"], art="komprimiert")
+        metrics.ARCHIVE_BYTES_SAVED.inc(report["gespart_buendel"], art="gebuendelt")
+        metrics.ARCHIVE_BYTES_SAVED.inc(report["geloescht"], art="geloescht")
+    logger.info(f"🧹 Archiv-Pflege: {describe(report)}")
+    return report
+
+
+def describe(report: dict) -> str:
+    saved = report["gespart_komprimiert"] + report["gespart_buendel"] + report["geloescht"]
+    text = (f"{report['komprimiert']}/{report['geprueft']} PDF(s) nachkomprimiert, "
+            f"{report['gebuendelt']} gebündelt, {saved / (1024 * 1024):.1f} MB gespart")
+    if report["abgelaufen"]:
+        text += f", Frist abgelaufen: {', '.join(report['abgelaufen'])}"
+    if report.get("abgebrochen"):
+        text += " (abgebrochen)"
+    return text
+
+
+# ──────────────────────────────────────────────────────────────
+# HINTERGRUND-JOB (ein Thread je Prozess)
+# ──────────────────────────────────────────────────────────────
+def update_config(cfg: dict):
+    """Einstellungen übernehmen; startet bzw. beendet den periodischen Job."""
+    with _job_lock:
+        _job["cfg"] = dict(cfg)
+        if cfg.get("archiv_pflege"):
+            _stop.clear()
+            if _job["thread"] is None or not _job["thread"].is_alive():
+                _job["thread"] = threading.Thread(target=_loop, daemon=True, name="archiv-pflege")
+                _job["thread"].start()
+        else:
+            _stop.set()  # laufenden periodischen Lauf beim nächsten Schritt beenden
+    _wakeup.set()
+
+
+def run_now(cfg: dict) -> bool:
+    """Einen Lauf sofort im Hintergrund starten (False, wenn gerade einer läuft)."""
+    with _job_lock:
+        if _job["running"]:
+            return False
+        _job["running"] = True
+    threading.Thread(target=_run_job, args=(dict(cfg), threading.Event()),
+                     daemon=True, name="archiv-pflege-jetzt").start()
+    return True
+
+
+def status() -> dict:
+    """{"running": bool, "last": Bericht des letzten Laufs in diesem Prozess oder None}."""
+    with _job_lock:
+        return {"running": _job["running"], "last": _job["last"]}
+
+
+def _run_job(cfg: dict, stop: threading.Event):
+    """Ein Lauf; der Aufrufer hat `running` bereits gesetzt."""
+    _lower_priority()
+    report = None
+    try:
+        report = run(cfg, stop=stop)
+    except Exception as e:
+        logger.error(f"🧹 Archiv-Pflege fehlgeschlagen: {e}")
+    finally:
+        with _job_lock:
+            _job["running"] = False
+            _job["last_end"] = time.time()
+            if report is not None:
+                _job["last"] = report
+
+
+def _loop():
+    with _job_lock:
+        if not _job["last_end"]:
+            # Erster Lauf erst nach START_DELAY – nicht mit dem Start der Oberfläche konkurrieren
+            interval = float(_job["cfg"].get("archiv_pflege_stunden") or 24) * 3600
+            _job["last_end"] = time.time() - interval + START_DELAY
+    while True:
+        with _job_lock:
+            cfg = _job["cfg"]
+            if not cfg.get("archiv_pflege"):
+                return
+            due = _job["last_end"] + float(cfg.get("archiv_pflege_stunden") or 24) * 3600
+            start = time.time() >= due and not _job["running"]
+            if start:
+                _job["running"] = True
+        if start:
+            _run_job(cfg, _stop)
+        else:
+            _wakeup.wait(max(1.0, min(300.0, due - time.time())))
+            _wakeup.clear()
@@ -0,0 +1,156 @@
+"""
+Globales Speicherbudget mit Rückstau für Rendern und Encoding.
+
+Eine 300-DPI-RGB-Seite belegt als PIL-Bild ~26 MB, dazu kommen Pixmap,
+PNG-Puffer, Base64-String und JSON-Body – zusammen 60–80 MB pro Fax in
+Bearbeitung. Vor dem Rendern wird der Bedarf aus Seitengröße und DPI
+geschätzt; neue Arbeit wartet, solange das Budget überschritten würde.
+Das Budget gilt prozessweit, also für alle Streamlit-Sitzungen und Worker.
+"""
+
+import logging
+import math
+import threading
+
+from faxfinity import metrics
+
+logger = logging.getLogger("FaxFinity")
+
+RENDER_DPI = 300
+A4_POINTS = (595.0, 842.0)
+# Schätzung für die PNG-Größe eines Fax-Scans relativ zu den Rohpixeln
+# (verrauschte Scans komprimieren schlecht)
+PNG_RATIO = 0.5
+
+RESERVED_BYTES = metrics.REGISTRY.register(metrics.Gauge(
+    "faxfinity_memory_reserved_bytes",
+    "Aktuell reservierter Speicher für Dokumente in Bearbeitung.",
+))
+ADMISSION_WAITS = metrics.REGISTRY.register(metrics.Counter(
+    "faxfinity_memory_admission_waits_total",
+    "Dokumente, die auf freies Speicherbudget warten mussten.",
+))
+
+
+def estimate_document_bytes(pdf_path: str, dpi: int = RENDER_DPI) -> int:
+    """
+    Geschätzter Spitzenbedarf für Rendern + Encoding der ersten Seite.
+    Liest nur die Seitengröße, rendert nichts.
+    """
+    width_pt, height_pt = A4_POINTS
+    try:
+        try:
+            import pymupdf as fitz  # ab PyMuPDF 1.24.3, ohne Deprecation-Hinweis auf stdout
+        except ImportError:
+            import fitz  # PyMuPDF
+        with fitz.open(pdf_path) as doc:
+            if len(doc) > 0:
+                rect = doc[0].rect
+                width_pt, height_pt = rect.width, rect.height
+    except Exception:
+        pass  # Fallback: A4
+
+    raw = math.ceil(width_pt * dpi / 72) * math.ceil(height_pt * dpi / 72) * 3
+    # Rendern: Pixmap + PIL-Bild gleichzeitig (samples_mv, keine Kopie)
+    render_peak = 2 * raw
+    # Encoding: PIL-Bild + PNG + Base64 (4/3) + JSON-Body (4/3)
+    png = raw * PNG_RATIO
+    encode_peak = raw + png * (1 + 4 / 3 + 4 / 3)
+    return int(max(render_peak, encode_peak))
+
+
+class Reservation:
+    """Reservierter Speicher eines Dokuments; kann verkleinert und freigegeben werden."""
+
+    def __init__(self, budget: "MemoryBudget", nbytes: int):
+        self._budget = budget
+        self.nbytes = nbytes
+
+    def resize(self, nbytes: int):
+        """Verkleinere die Reservierung (z.B. wenn nur noch der Request-Body lebt)."""
+        nbytes = max(0, int(nbytes))
+        if nbytes < self.nbytes:
+            self._budget._give_back(self.nbytes - nbytes)
+            self.nbytes = nbytes
+
+    def release(self):
+        self.resize(0)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class MemoryBudget:
+    """Zulassungskontrolle: blockiert, solange reserviert + Bedarf > Limit."""
+
+    def __init__(self, limit_bytes: int = 0):
+        self.limit_bytes = limit_bytes  # 0 = unbegrenzt
+        self.reserved = 0
+        self._cond = threading.Condition()
+
+    def set_limit(self, limit_bytes: int):
+        with self._cond:
+            self.limit_bytes = max(0, int(limit_bytes))
+            self._cond.notify_all()
+
+    def _fits(self, nbytes: int) -> bool:
+        if not self.limit_bytes:
+            return True
+        # Ein einzelnes Dokument über dem Limit darf allein laufen
+        return self.reserved + nbytes <= self.limit_bytes or self.reserved == 0
+
+    def reserve(self, nbytes: int) -> Reservation:
+        """Reserviere `nbytes`; wartet, bis genug Budget frei ist."""
+        nbytes = max(0, int(nbytes))
+        with self._cond:
+            if not self._fits(nbytes):
+                ADMISSION_WAITS.inc()
+                logger.info(f"  ⏸ Speicherbudget belegt ({self.reserved / 2**20:.0f}/"
+                            f"{self.limit_bytes / 2**20:.0f} MB) – warte...")
+                self._cond.wait_for(lambda: self._fits(nbytes))
+            if self.limit_bytes and nbytes > self.limit_bytes:
+                logger.warning(f"  ⚠ Dokument braucht geschätzt {nbytes / 2**20:.0f} MB "
+                               f"und überschreitet allein das Budget.")
+            self.reserved += nbytes
+            RESERVED_BYTES.set(self.reserved)
+        return Reservation(self, nbytes)
+
+    def _give_back(self, nbytes: int):
+        with self._cond:
+            self.reserved = max(0, self.reserved - nbytes)
+            RESERVED_BYTES.set(self.reserved)
+            self._cond.notify_all()
+
+
+_budget = MemoryBudget()
+
+
+def get_budget(limit_mb: float = 0) -> MemoryBudget:
+    """Prozessweites Budget; das Limit folgt der aktuellen Konfiguration."""
+    limit_bytes = int(float(limit_mb or 0) * 1024 * 1024)
+    if limit_bytes != _budget.limit_bytes:
+        _budget.set_limit(limit_bytes)
+    return _budget
+
+
+def iter_body_chunks(body: bytes, reservation: Reservation | None = None,
+                     chunk_size: int = 256 * 1024):
+    """
+    Liefere einen Request-Body in Stücken (memoryview, ohne Kopie). Die
+    Reservierung schrumpft auf den noch nicht gesendeten Rest und wird nach
+    dem letzten Stück freigegeben – dann gibt der Generator auch den Body
+    frei, während Ollama rechnet.
+    """
+    view = memoryview(body)
+    del body
+    total = len(view)
+    for off in range(0, total, chunk_size):
+        yield view[off:off + chunk_size]
+        if reservation is not None:
+            reservation.resize(max(0, total - off - chunk_size))
+    del view
+    if reservation is not None:
+        reservation.release()
@@ -0,0 +1,286 @@
+"""
+Prometheus-kompatible Metriken der Fax-Pipeline.
+
+Ohne Zusatzabhängigkeit: Zähler, Gauges und Histogramme werden im
+Textformat 0.0.4 ausgegeben – wahlweise über einen lokalen HTTP-Endpunkt
+(/metrics) oder als Datei für den node_exporter-Textfile-Collector.
+"""
+
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger("FaxFinity")
+
+# Sekunden; deckt Backup (ms) bis Vision-Inferenz (Minuten) ab
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: Labels {sorted(labels)} != {list(self.labelnames)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def header(self) -> list:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def get(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> list:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._values: dict[tuple, list] = {}  # key → [bucket_counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            data = self._values.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    data[i] += 1
+            data[-2] += value
+            data[-1] += 1
+
+    def render(self) -> list:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        lines = self.header()
+        for key, data in items:
+            for i, bound in enumerate(self.buckets):
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {data[i]}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(data[-2])}")
+            lines.append(f"{self.name}_count{labels} {data[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+DOCUMENTS_PROCESSED = REGISTRY.register(Counter(
+    "faxfinity_documents_processed_total",
+    "Verarbeitete Dokumente nach Ergebnis-Status.",
+    ("status",),
+))
+STAGE_DURATION = REGISTRY.register(Histogram(
+    "faxfinity_stage_duration_seconds",
+    "Dauer der Verarbeitungsschritte pro Dokument.",
+    ("stage",),
+))
+INBOX_QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "faxfinity_inbox_queue_depth",
+    "PDFs im Eingangsordner, die noch auf Verarbeitung warten.",
+))
+OLLAMA_ERRORS = REGISTRY.register(Counter(
+    "faxfinity_ollama_errors_total",
+    "Fehlgeschlagene Ollama-Analysen nach Ursache.",
+    ("reason",),
+))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    "faxfinity_cache_requests_total",
+    "Cache-Zugriffe nach Cache und Ergebnis (hit/miss).",
+    ("cache", "result"),
+))
+TIME_TO_FILE = REGISTRY.register(Histogram(
+    "faxfinity_time_to_file_seconds",
+    "Zeit vom Eingang eines Faxes bis zur Ablage nach Kategorie.",
+    ("kategorie",),
+    buckets=(10, 30, 60, 120, 300, 600, 1800, 3600, 7200, 14400, 43200, 86400),
+))
+LEASES_RECOVERED = REGISTRY.register(Counter(
+    "faxfinity_leases_recovered_total",
+    "Dateien ausgefallener Knoten, die in den Eingang zurückgelegt wurden.",
+))
+SCANS = REGISTRY.register(Counter(
+    "faxfinity_scans_total",
+    "Durchgeführte Scans des Eingangsordners.",
+))
+LAST_SCAN = REGISTRY.register(Gauge(
+    "faxfinity_last_scan_timestamp_seconds",
+    "Unix-Zeitpunkt des letzten abgeschlossenen Scans.",
+))
+ARCHIVE_BYTES_SAVED = REGISTRY.register(Counter(
+    "faxfinity_archive_bytes_saved_total",
+    "Durch die Archiv-Pflege eingesparte Bytes nach Art (komprimiert/gebuendelt/geloescht).",
+    ("art",),
+))
+PATIENT_MATCHES = REGISTRY.register(Counter(
+    "faxfinity_patient_matches_total",
+    "Abgleich des Patienten mit der Patientenliste nach Ergebnis "
+    "(exakt/korrigiert/mehrdeutig/unbekannt).",
+    ("ergebnis",),
+))
+SENDER_LOOKUPS = REGISTRY.register(Counter(
+    "faxfinity_sender_directory_lookups_total",
+    "Nachschlagen im Absender-Verzeichnis nach Ergebnis (bekannt/unbekannt/ohne_nummer).",
+    ("ergebnis",),
+))
+
+
+def record_document(status: str, timings_ms: dict):
+    """Verbuche ein fertig verarbeitetes Dokument."""
+    DOCUMENTS_PROCESSED.inc(status=status)
+    for stage, ms in timings_ms.items():
+        STAGE_DURATION.observe(ms / 1000, stage=stage)
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+# ──────────────────────────────────────────────────────────────
+# EXPORT: HTTP-ENDPUNKT & TEXTFILE
+# ──────────────────────────────────────────────────────────────
+def _metrics_handler():
+    # http.server (inkl. ssl) erst laden, wenn der Endpunkt aktiviert ist
+    from http.server import BaseHTTPRequestHandler
+
+    class _MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = REGISTRY.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, fmt, *args):
+            pass
+
+    return _MetricsHandler
+
+
+_server = None  # ThreadingHTTPServer
+_server_lock = threading.Lock()
+
+
+def start_http_server(port: int, host: str = "127.0.0.1") -> bool:
+    """Starte /metrics einmal pro Prozess. Rückgabe: True wenn aktiv."""
+    global _server
+    with _server_lock:
+        if _server is not None:
+            if _server.server_address[1] != port:
+                logger.warning(f"Metrik-Server läuft bereits auf Port {_server.server_address[1]}; "
+                               f"Portänderung greift erst nach Neustart.")
+            return True
+        from http.server import ThreadingHTTPServer
+
+        try:
+            _server = ThreadingHTTPServer((host, port), _metrics_handler())
+        except OSError as e:
+            logger.error(f"Metrik-Server konnte nicht auf {host}:{port} starten: {e}")
+            return False
+        _server.daemon_threads = True
+        threading.Thread(target=_server.serve_forever, daemon=True, name="metrics").start()
+        logger.info(f"📊 Prometheus-Metriken unter http://{host}:{port}/metrics")
+        return True
+
+
+def write_textfile(path: str):
+    """Schreibe die Metriken atomar für den node_exporter-Textfile-Collector."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(REGISTRY.render())
+        os.replace(tmp, path)
+    except OSError as e:
+        logger.warning(f"Metrik-Datei konnte nicht geschrieben werden: {e}")
+
+
+def export(cfg: dict):
+    """Aktiviere die in der Konfiguration gewählten Exporte."""
+    port = int(cfg.get("metrics_port") or 0)
+    if port:
+        start_http_server(port, cfg.get("metrics_host") or "127.0.0.1")
+    if cfg.get("metrics_textfile"):
+        write_textfile(cfg["metrics_textfile"])
+
+
+def scan_finished():
+    SCANS.inc()
+    LAST_SCAN.set(time.time())
@@ -0,0 +1,119 @@
+"""
+Eindeutige Dateinamen in großen Ausgabeordnern ohne wiederholtes Prüfen.
+
+`unique_filepath` fragt für jeden Kandidaten (`name`, `name_1`, `name_2`, …)
+das Dateisystem; bei vielen gleichen Namen (z.B. mehrere Werbefaxe in
+derselben Sekunde) und großen Ordnern auf dem NAS sind das viele teure
+stat-Aufrufe. Für Archiv/Umbenannt/Fehler hält der Prozess deshalb je
+Ordner einen Namensindex:
+
+  * einmal per os.scandir geladen (spätestens alle RELOAD_INTERVAL Sekunden
+    neu, damit gelöschte Dateien wieder frei werden),
+  * Namen ohne Groß-/Kleinschreibung (SMB/NTFS unterscheiden sie nicht),
+  * je Basisname merkt er sich den nächsten freien Zähler,
+  * ein Name gilt erst als vergeben, wenn die Datei mit O_CREAT|O_EXCL
+    angelegt werden konnte. Schlägt das fehl (anderer Prozess/Rechner), wird
+    der Name nachgetragen und der nächste versucht.
+
+Die angelegte leere Datei ist der Platzhalter, den `move_to` bzw. copy2
+danach atomar ersetzt. Nicht für den Eingangsordner verwenden – dort würde
+der Scanner den Platzhalter als neues Fax sehen.
+"""
+
+import errno
+import logging
+import os
+import shutil
+import threading
+import time
+
+logger = logging.getLogger("FaxFinity")
+
+RELOAD_INTERVAL = 600.0  # Sekunden
+
+_registry: dict = {}  # absoluter Ordnerpfad → NameIndex; prozessweit
+_registry_lock = threading.Lock()
+
+
+def _index_for(directory: str) -> "NameIndex":
+    key = os.path.abspath(directory)
+    with _registry_lock:
+        index = _registry.get(key)
+        if index is None:
+            index = _registry[key] = NameIndex(key)
+        return index
+
+
+def reserve_filepath(directory: str, filename: str) -> str:
+    """Freien Pfad für `filename` in `directory` belegen (legt einen leeren Platzhalter an)."""
+    return _index_for(directory).reserve(filename)
+
+
+def release(path: str):
+    """Reservierung aufgeben, wenn die Datei nicht geschrieben wurde (leerer Platzhalter)."""
+    _index_for(os.path.dirname(path)).release(os.path.basename(path))
+
+
+def move_to(src: str, dest: str):
+    """Datei auf einen reservierten Pfad verschieben (ersetzt den Platzhalter)."""
+    try:
+        os.replace(src, dest)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.copy2(src, dest)  # anderes Laufwerk: kopieren, dann Quelle löschen
+        os.unlink(src)
+
+
+class NameIndex:
+    """Vergebene Namen eines Ordners; thread-sicher."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._taken: set = set()
+        self._next: dict = {}  # (Basis, Endung) → nächster zu probierender Zähler
+        self._loaded_at: float | None = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            with os.scandir(self.directory) as it:
+                self._taken = {entry.name.casefold() for entry in it}
+        except OSError as e:
+            logger.warning(f"Namensindex nicht ladbar ({self.directory}): {e}")
+            self._taken = set()
+        self._next.clear()
+        self._loaded_at = time.monotonic()
+
+    def reserve(self, filename: str) -> str:
+        base, ext = os.path.splitext(filename)
+        key = (base.casefold(), ext.casefold())
+        with self._lock:
+            if self._loaded_at is None or time.monotonic() - self._loaded_at > RELOAD_INTERVAL:
+                self._load()
+            candidate, counter = filename, None
+            while True:
+                if candidate.casefold() not in self._taken:
+                    path = os.path.join(self.directory, candidate)
+                    try:
+                        os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644))
+                    except FileExistsError:
+                        pass  # von außerhalb angelegt – nachtragen und weiter
+                    else:
+                        self._taken.add(candidate.casefold())
+                        if counter is not None:
+                            self._next[key] = counter + 1
+                        return path
+                    self._taken.add(candidate.casefold())
+                counter = self._next.get(key, 1) if counter is None else counter + 1
+                candidate = f"{base}_{counter}{ext}"
+
+    def release(self, name: str):
+        path = os.path.join(self.directory, name)
+        try:
+            if os.path.getsize(path) == 0:
+                os.unlink(path)
+        except OSError:
+            return
+        with self._lock:
+            self._taken.discard(name.casefold())
@@ -0,0 +1,181 @@
+"""
+Modell-Katalog: zwischengespeicherte Antworten von /api/tags und /api/show.
+
+Die Modell-Liste und die Eigenschaften eines Modells ändern sich nur, wenn
+jemand in Ollama ein Modell zieht oder löscht. Statt bei jeder Sitzung und
+jedem Klick auf 🔄 neu zu fragen, hält der Prozess die Antworten für
+`TAGS_TTL` bzw. `SHOW_TTL` Sekunden:
+
+  list_models(url)        – Modellnamen (sortiert)
+  model_info(url, modell) – vision, context_length, quantization, …
+  context_size(url, modell, gewünscht) – num_ctx passend zum Modell
+  invalidate(url)         – alles zu einem Server vergessen (🔄 in der Oberfläche)
+
+Die Eigenschaften werden zusammen mit dem Digest aus /api/tags gespeichert:
+wird ein Modell neu gezogen, passt der Eintrag nicht mehr und wird neu geholt.
+Fehlschläge (Server aus) werden nur `FAIL_TTL` Sekunden gemerkt, damit die
+Oberfläche nicht bei jedem Rerun auf den Timeout wartet.
+"""
+
+import logging
+import threading
+import time
+
+from faxfinity import metrics
+
+logger = logging.getLogger("FaxFinity")
+
+TAGS_TTL = 60.0  # Sekunden
+SHOW_TTL = 600.0
+FAIL_TTL = 15.0
+REQUEST_TIMEOUT = 10
+
+# Modellfamilien mit Bild-Encoder, falls Ollama (vor 0.6) keine `capabilities` liefert
+VISION_FAMILIES = ("clip", "mllama", "llava", "qwen2vl", "qwen25vl", "gemma3", "minicpmv")
+
+_tags: dict = {}  # URL → (Zeitpunkt, {Modell: Digest} oder None bei Fehler)
+_show: dict = {}  # (URL, Modell) → (Zeitpunkt, Digest, Info oder None)
+_lock = threading.Lock()
+
+
+def _normalize(model: str) -> str:
+    return model if ":" in model else f"{model}:latest"
+
+
+def _fetch_tags(ollama_url: str) -> dict | None:
+    import requests
+
+    try:
+        resp = requests.get(f"{ollama_url}/api/tags", timeout=REQUEST_TIMEOUT)
+        resp.raise_for_status()
+        return {m["name"]: m.get("digest", "") for m in resp.json().get("models", [])}
+    except Exception as e:
+        logger.warning(f"Ollama-Modelle konnten nicht geladen werden: {e}")
+        return None
+
+
+def _tags_for(ollama_url: str, force: bool = False) -> dict | None:
+    now = time.monotonic()
+    with _lock:
+        cached = _tags.get(ollama_url)
+    if cached is not None and not force:
+        ttl = TAGS_TTL if cached[1] is not None else FAIL_TTL
+        if now - cached[0] < ttl:
+            metrics.record_cache("ollama_tags", True)
+            return cached[1]
+    metrics.record_cache("ollama_tags", False)
+    models = _fetch_tags(ollama_url)
+    with _lock:
+        _tags[ollama_url] = (time.monotonic(), models)
+    return models
+
+
+def list_models(ollama_url: str, force: bool = False) -> list:
+    """Verfügbare Modelle (sortiert); leer, wenn Ollama nicht erreichbar ist."""
+    return sorted(_tags_for(ollama_url, force) or {})
+
+
+def parse_show(data: dict) -> dict:
+    """Antwort von /api/show → Fähigkeiten und Eckdaten des Modells."""
+    details = data.get("details") or {}
+    info = data.get("model_info") or {}
+    capabilities = data.get("capabilities")
+    if capabilities is not None:
+        vision = "vision" in capabilities
+    else:
+        families = [f.lower() for f in (details.get("families") or [details.get("family", "")]) if f]
+        vision = bool(data.get("projector_info")) or any(
+            f in VISION_FAMILIES for f in families)
+    context_length = next(
+        (int(v) for k, v in info.items() if k.endswith(".context_length") and v), None)
+    return {
+        "vision": vision,
+        "context_length": context_length,
+        "quantization": details.get("quantization_level", ""),
+        "parameter_size": details.get("parameter_size", ""),
+        "family": details.get("family", ""),
+    }
+
+
+def _fetch_show(ollama_url: str, model: str) -> dict | None:
+    import requests
+
+    try:
+        resp = requests.post(f"{ollama_url}/api/show", json={"model": model},
+                             timeout=REQUEST_TIMEOUT)
+        resp.raise_for_status()
+        return parse_show(resp.json())
+    except Exception as e:
+        logger.warning(f"Modell-Infos für {model} nicht abrufbar: {e}")
+        return None
+
+
+def model_info(ollama_url: str, model: str, force: bool = False) -> dict | None:
+    """
+    Eigenschaften eines Modells: {"vision": bool, "context_length": int|None,
+    "quantization": str, "parameter_size": str, "family": str}.
+    None, wenn das Modell unbekannt oder Ollama nicht erreichbar ist.
+    """
+    if not model:
+        return None
+    tags = _tags_for(ollama_url)
+    if tags is None:
+        return None  # Server nicht erreichbar – nicht noch einmal auf den Timeout warten
+    name = model if model in tags else _normalize(model)
+    if name not in tags:
+        return None  # nicht installiert
+    digest = tags[name]
+    key = (ollama_url, _normalize(model))
+    now = time.monotonic()
+    with _lock:
+        cached = _show.get(key)
+    if cached is not None and not force and cached[1] == digest:
+        ttl = SHOW_TTL if cached[2] is not None else FAIL_TTL
+        if now - cached[0] < ttl:
+            metrics.record_cache("ollama_show", True)
+            return cached[2]
+    metrics.record_cache("ollama_show", False)
+    info = _fetch_show(ollama_url, model)
+    with _lock:
+        _show[key] = (time.monotonic(), digest, info)
+    return info
+
+
+def context_size(ollama_url: str, model: str, wanted: int) -> int:
+    """`num_ctx` für eine Anfrage: höchstens so groß, wie das Modell trainiert ist."""
+    info = model_info(ollama_url, model)
+    if info and info["context_length"]:
+        return min(wanted, info["context_length"])
+    return wanted
+
+
+def vision_problem(ollama_url: str, model: str) -> str:
+    """Fehlermeldung, wenn das Modell nachweislich keine Bilder verarbeitet, sonst ""."""
+    info = model_info(ollama_url, model)
+    if info is not None and not info["vision"]:
+        return f"Modell '{model}' kann keine Bilder verarbeiten – bitte ein Vision-Modell wählen."
+    return ""
+
+
+def describe(info: dict | None) -> str:
+    """Kurzbeschreibung für die Oberfläche, z.B. "👁️ Vision · 128k Kontext · Q4_K_M"."""
+    if info is None:
+        return "❔ Modell-Infos nicht verfügbar"
+    parts = ["👁️ Vision" if info["vision"] else "🚫 Nur Text"]
+    if info["context_length"]:
+        ctx = info["context_length"]
+        parts.append(f"{ctx // 1024}k Kontext" if ctx >= 1024 else f"{ctx} Kontext")
+    parts += [p for p in (info["parameter_size"], info["quantization"]) if p]
+    return " · ".join(parts)
+
+
+def invalidate(ollama_url: str | None = None):
+    """Zwischengespeicherte Antworten verwerfen (alle oder zu einem Server)."""
+    with _lock:
+        if ollama_url is None:
+            _tags.clear()
+            _show.clear()
+            return
+        _tags.pop(ollama_url, None)
+        for key in [k for k in _show if k[0] == ollama_url]:
+            del _show[key]
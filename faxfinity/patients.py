@@ -0,0 +1,355 @@
+"""
+Patientennamen gegen die Patientenliste der Praxis abgleichen.
+
+Der `patient`-Wert des Modells landet direkt im Dateinamen; Lesefehler
+("Müller", "Mueller", "Mülller") verteilen einen Patienten auf viele Namen.
+Mit `patientenliste` (CSV-Export der Praxissoftware, global oder je
+Postfach) wird der Wert nach `normalize_analysis` auf die Schreibweise der
+Liste gebracht:
+
+  * Schlüssel je Nachname: klein, ohne Umlaute und Akzente, nur Buchstaben
+    ("Müller", "Mueller" und "Muller" → "muller"); exakte Treffer sind ein
+    Dict-Zugriff,
+  * sonst unscharf über einen Index der Lösch-Varianten (Levenshtein inkl.
+    Vertauschung, höchstens 1 Fehler bis 7 Buchstaben, 2 darüber) – statt
+    jeden Namen der Liste zu vergleichen, nur die wenigen Kandidaten,
+  * nennt das Modell auch den Vornamen, grenzt er die Treffer ein,
+  * mehrdeutig (verschiedene Nachnamen gleich nah, oder mehrere Patienten
+    gleichen Namens) wird im Log-Eintrag vermerkt; bei verschiedenen
+    Nachnamen bleibt der Wert des Modells stehen,
+  * ohne Treffer bleibt der Wert unverändert.
+
+Die CSV braucht eine Kopfzeile mit Nachname (oder Name/Patient, auch als
+"Nachname, Vorname"), optional Vorname und Geburtsdatum; Trennzeichen und
+Zeichensatz (UTF-8 oder Windows-1252) werden erkannt. Ändert sich die Datei,
+werden nur hinzugekommene und entfallene Zeilen in den Index übernommen.
+"""
+
+import csv
+import io
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+
+from faxfinity import metrics
+
+logger = logging.getLogger("FaxFinity")
+
+CHECK_INTERVAL = 5.0  # Sekunden zwischen zwei stat() der Liste
+SALUTATIONS = {"herr", "herrn", "hr", "frau", "fr", "dr", "prof", "med", "pat", "patient", "patientin"}
+SURNAME_COLUMNS = ("nachname", "familienname", "name", "patient", "patientenname")
+FIRST_NAME_COLUMNS = ("vorname", "rufname")
+BIRTH_COLUMNS = ("geburtsdatum", "geb.datum", "gebdatum", "geburtstag", "geb", "geb.")
+
+_LETTERS = re.compile(r"[^a-z]")
+_SPELLED_UMLAUT = re.compile(r"([aou])e")
+_WORDS = re.compile(r"[^\W\d_]+(?:[-'][^\W\d_]+)*", re.UNICODE)
+
+_registry: dict = {}  # absoluter Pfad → PatientIndex; prozessweit
+_registry_lock = threading.Lock()
+
+
+def fold(name: str) -> str:
+    """Vergleichsschlüssel: "Müller", "Mueller", "Muller" → "muller"; "Öztürk" → "ozturk"."""
+    name = unicodedata.normalize("NFKD", name.casefold())  # ß → ss, ü → u + Trema
+    return _SPELLED_UMLAUT.sub(r"\1", _LETTERS.sub("", name))
+
+
+def max_distance(key: str) -> int:
+    return 0 if len(key) <= 3 else 1 if len(key) <= 7 else 2
+
+
+def distance(a: str, b: str, limit: int) -> int:
+    """Levenshtein mit Vertauschung benachbarter Zeichen; > limit wird früh abgebrochen."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2, prev = None, list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        row = [i] + [0] * len(b)
+        for j, cb in enumerate(b, 1):
+            row[j] = min(prev[j] + 1, row[j - 1] + 1, prev[j - 1] + (ca != cb))
+            if prev2 is not None and i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                row[j] = min(row[j], prev2[j - 2] + 1)
+        if min(row) > limit:
+            return limit + 1
+        prev2, prev = prev, row
+    return prev[-1]
+
+
+def _deletions(key: str, depth: int) -> set:
+    variants, frontier = {key}, {key}
+    for _ in range(depth):
+        frontier = {word[:i] + word[i + 1:] for word in frontier for i in range(len(word))}
+        variants |= frontier
+    return variants
+
+
+class DeletionIndex:
+    """
+    Unscharfe Suche über Lösch-Varianten (SymSpell): Zwei Schlüssel mit
+    höchstens d Fehlern haben eine gemeinsame Variante mit ≤ d gelöschten
+    Buchstaben. Nur die ersten PREFIX Buchstaben werden variiert – das hält
+    den Index klein (höchstens 29 Varianten je Name); Kandidaten werden über
+    den ganzen Namen nachgeprüft.
+    """
+
+    PREFIX = 7
+
+    def __init__(self):
+        self.variants: dict = {}  # Variante → Schlüssel, oder {Schlüssel, …} bei mehreren
+
+    def _variants(self, key: str, depth: int) -> set:
+        return _deletions(key[:self.PREFIX], depth)
+
+    def add(self, key: str):
+        for variant in self._variants(key, max_distance(key)):
+            keys = self.variants.get(variant)
+            if keys is None:
+                self.variants[variant] = key  # meist nur einer: kein Set je Variante
+            elif isinstance(keys, str):
+                if keys != key:
+                    self.variants[variant] = {keys, key}
+            else:
+                keys.add(key)
+
+    def remove(self, key: str):
+        for variant in self._variants(key, max_distance(key)):
+            keys = self.variants.get(variant)
+            if keys == key:
+                del self.variants[variant]
+            elif isinstance(keys, set):
+                keys.discard(key)
+                if len(keys) == 1:
+                    self.variants[variant] = keys.pop()
+
+    def search(self, key: str) -> list:
+        """[(Abstand, Schlüssel), …] innerhalb der zulässigen Fehlerzahl beider Schlüssel."""
+        limit = max_distance(key)
+        if not limit:
+            return []
+        candidates = set()
+        for variant in self._variants(key, limit):
+            keys = self.variants.get(variant)
+            if isinstance(keys, str):
+                candidates.add(keys)
+            elif keys:
+                candidates |= keys
+        found = []
+        for candidate in candidates:
+            allowed = min(limit, max_distance(candidate))
+            d = distance(key, candidate, allowed)
+            if d <= allowed:
+                found.append((d, candidate))
+        return found
+
+
+# ──────────────────────────────────────────────────────────────
+# CSV-EXPORT LESEN
+# ──────────────────────────────────────────────────────────────
+def _decode(data: bytes) -> str:
+    try:
+        return data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return data.decode("cp1252", errors="replace")  # ältere Praxissoftware unter Windows
+
+
+def _column(header: list, names: tuple) -> int | None:
+    folded = [h.strip().casefold() for h in header]
+    for name in names:
+        if name in folded:
+            return folded.index(name)
+    return None
+
+
+def read_patient_list(path: str) -> set:
+    """Patienten der CSV als {(Nachname, Vorname, Geburtsdatum), …}."""
+    with open(path, "rb") as f:
+        text = _decode(f.read())
+    try:
+        rows = csv.reader(io.StringIO(text), csv.Sniffer().sniff(text[:4096], delimiters=";,\t|"))
+    except csv.Error:
+        rows = csv.reader(io.StringIO(text), delimiter=";")  # nur eine Spalte
+    header = next(rows, [])
+    surname = _column(header, SURNAME_COLUMNS)
+    if surname is None:
+        raise ValueError(f"Keine Spalte für den Nachnamen ({', '.join(SURNAME_COLUMNS)}) "
+                         f"in der Kopfzeile: {';'.join(header)}")
+    first, birth = _column(header, FIRST_NAME_COLUMNS), _column(header, BIRTH_COLUMNS)
+    patients = set()
+    for row in rows:
+        if len(row) <= surname or not row[surname].strip():
+            continue
+        nachname = row[surname].strip()
+        vorname = row[first].strip() if first is not None and len(row) > first else ""
+        if first is None and "," in nachname:
+            nachname, vorname = (part.strip() for part in nachname.split(",", 1))
+        geburtsdatum = row[birth].strip() if birth is not None and len(row) > birth else ""
+        patients.add((nachname, vorname, geburtsdatum))
+    return patients
+
+
+# ──────────────────────────────────────────────────────────────
+# INDEX
+# ──────────────────────────────────────────────────────────────
+def get_index(path: str) -> "PatientIndex":
+    """Prozessweit ein Index je Listendatei (Sessions, Worker, Auto-Scan)."""
+    key = os.path.abspath(path)
+    with _registry_lock:
+        index = _registry.get(key)
+        if index is None:
+            index = _registry[key] = PatientIndex(key)
+        return index
+
+
+class PatientIndex:
+    """Nachname-Schlüssel → Patienten plus Index für unscharfe Suche; thread-sicher."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.patients: set = set()
+        self.by_key: dict = {}  # Schlüssel → {(Nachname, Vorname, Geburtsdatum), …}
+        self.fuzzy = DeletionIndex()
+        self.error = ""
+        self.loaded_at: float | None = None
+        self._stamp = None  # (mtime_ns, size) der geladenen Fassung
+        self._checked: float | None = None
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Liste neu einlesen, falls sie sich geändert hat (höchstens alle CHECK_INTERVAL s)."""
+        with self._lock:
+            now = time.monotonic()
+            if self._checked is not None and now - self._checked < CHECK_INTERVAL:
+                return
+            self._checked = now
+            try:
+                st = os.stat(self.path)
+                if (st.st_mtime_ns, st.st_size) == self._stamp:
+                    return
+                patients = read_patient_list(self.path)
+            except (OSError, ValueError, csv.Error) as e:
+                if str(e) != self.error:
+                    logger.warning(f"📇 Patientenliste nicht lesbar ({self.path}): {e}")
+                self.error = str(e)
+                return
+            self.error = ""
+            self._apply(patients)
+            self._stamp = (st.st_mtime_ns, st.st_size)
+            self.loaded_at = time.time()
+
+    def _apply(self, patients: set):
+        added, removed = patients - self.patients, self.patients - patients
+        for patient in removed:
+            key = fold(patient[0])
+            if key not in self.by_key:
+                continue  # Name ohne Buchstaben
+            self.by_key[key].discard(patient)
+            if not self.by_key[key]:
+                del self.by_key[key]
+                self.fuzzy.remove(key)
+        for patient in added:
+            key = fold(patient[0])
+            if not key:
+                continue
+            if key not in self.by_key:
+                self.by_key[key] = set()
+                self.fuzzy.add(key)
+            self.by_key[key].add(patient)
+        self.patients = patients
+        if added or removed:
+            logger.info(f"📇 Patientenliste: {len(patients)} Patienten "
+                        f"(+{len(added)}/−{len(removed)}), {len(self.by_key)} Nachnamen")
+
+    def candidates(self, key: str) -> tuple[int, list]:
+        """Nächste Nachnamen-Schlüssel: (Abstand, [Schlüssel, …]); ([], …) ohne Treffer."""
+        with self._lock:
+            if key in self.by_key:
+                return 0, [key]
+            found = self.fuzzy.search(key)
+        if not found:
+            return max_distance(key) + 1, []
+        best = min(d for d, _ in found)
+        return best, sorted(k for d, k in found if d == best)
+
+    def patients_for(self, key: str) -> list:
+        with self._lock:
+            return sorted(self.by_key.get(key, ()))
+
+
+# ──────────────────────────────────────────────────────────────
+# ABGLEICH
+# ──────────────────────────────────────────────────────────────
+def _describe(patients: list) -> str:
+    return ", ".join(f"{n}, {v}" + (f" ({g})" if g else "") if v else n + (f" ({g})" if g else "")
+                     for n, v, g in patients[:5]) + (" …" if len(patients) > 5 else "")
+
+
+def match(index: PatientIndex, value: str) -> dict:
+    """
+    Modellwert gegen die Liste: {"status": "exakt"/"korrigiert"/"mehrdeutig"/
+    "unbekannt", "patient": Schreibweise für den Dateinamen, "hinweis": Text}.
+    """
+    words = [w for w in _WORDS.findall(value) if fold(w) and fold(w) not in SALUTATIONS]
+    best = None  # (Abstand, Wort, [Schlüssel])
+    for word in words:
+        d, keys = index.candidates(fold(word))
+        if keys and (best is None or d < best[0]):
+            best = (d, word, keys)
+    if best is None:
+        metrics.PATIENT_MATCHES.inc(ergebnis="unbekannt")
+        return {"status": "unbekannt", "patient": value, "hinweis": ""}
+    d, word, keys = best
+    patients = [p for key in keys for p in index.patients_for(key)]
+    others = [fold(w) for w in words if w != word]
+    if others:
+        # Vorname aus dem Modellwert grenzt ein, wenn er zu einem Treffer passt
+        narrowed = [p for p in patients if p[1] and any(
+            distance(fold(p[1]), o, max_distance(o)) <= max_distance(o) for o in others)]
+        patients = narrowed or patients
+    surnames = sorted({p[0] for p in patients})
+    if len(surnames) > 1:
+        metrics.PATIENT_MATCHES.inc(ergebnis="mehrdeutig")
+        return {"status": "mehrdeutig", "patient": value,
+                "hinweis": f"Patient mehrdeutig: {_describe(patients)}"}
+    status = "exakt" if d == 0 and surnames[0] == word else "korrigiert"
+    hinweis = f"Patient {word!r} → {surnames[0]!r} laut Liste" if status == "korrigiert" else ""
+    if len(patients) > 1:
+        status = "mehrdeutig"
+        hinweis = f"{hinweis}; " if hinweis else ""
+        hinweis += f"mehrere Patienten: {_describe(patients)}"
+    metrics.PATIENT_MATCHES.inc(ergebnis=status)
+    return {"status": status, "patient": surnames[0], "hinweis": hinweis}
+
+
+def resolve(analysis: dict, cfg: dict) -> dict:
+    """
+    `analysis["patient"]` auf die Schreibweise der Patientenliste bringen
+    (ohne `patientenliste` unverändert). Ein Hinweis für das Log steht danach
+    in `analysis["patient_hinweis"]`.
+    """
+    path = (cfg.get("patientenliste") or "").strip()
+    if not path or not analysis.get("patient"):
+        return analysis
+    index = get_index(path)
+    index.refresh()
+    if not index.by_key:
+        return analysis
+    result = match(index, analysis["patient"])
+    if result["patient"] != analysis["patient"]:
+        logger.info(f"  📇 Patient: {analysis['patient']} → {result['patient']}")
+    if result["hinweis"]:
+        logger.info(f"  📇 {result['hinweis']}")
+        analysis["patient_hinweis"] = result["hinweis"]
+    analysis["patient"] = result["patient"]
+    return analysis
+
+
+def status(path: str) -> dict:
+    """Für die Oberfläche: {"patienten", "nachnamen", "geladen" (Zeitpunkt), "fehler"}."""
+    index = get_index(path)
+    index.refresh()
+    return {"patienten": len(index.patients), "nachnamen": len(index.by_key),
+            "geladen": index.loaded_at, "fehler": index.error}
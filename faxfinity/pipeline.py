@@ -0,0 +1,1036 @@
+"""
+Verarbeitungs-Pipeline: Konfiguration, Log, Ollama-Analyse, PDF-Rendern,
+Umbenennen und Scan des Eingangsordners.
+
+Streamlit führt faxsort_ai.py bei jedem Rerun komplett neu aus; dieses Modul
+wird dagegen nur einmal pro Prozess importiert. Schwere Abhängigkeiten
+(PyMuPDF, pdf2image, Pillow, requests) werden erst beim ersten Dokument bzw.
+der ersten Ollama-Anfrage geladen – die Oberfläche steht dadurch schneller.
+"""
+
+import os
+import json
+import time
+import shutil
+import base64
+import re
+import uuid
+import logging
+from datetime import datetime
+from functools import partial
+from importlib.util import find_spec
+from io import BytesIO
+from typing import TYPE_CHECKING
+
+from faxfinity import (archive, folder_index, layout, metrics, ollama_models, patients, profiling,
+                       search, senders)
+from faxfinity.memory_budget import estimate_document_bytes, get_budget, iter_body_chunks
+from faxfinity.inboxes import FairScheduler, get_inboxes, output_base
+from faxfinity.history import HistoryError, get_history
+from faxfinity.name_index import move_to, reserve_filepath
+from faxfinity.name_index import release as release_filepath
+from faxfinity.cassette import get_cassette, image_fingerprint, request_fingerprint
+from faxfinity.timing import StageTimer, track_document
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+# Nur prüfen, ob installiert – importiert wird erst in pdf_to_image()
+PYMUPDF_AVAILABLE = find_spec("pymupdf") is not None or find_spec("fitz") is not None
+PDF2IMAGE_AVAILABLE = find_spec("pdf2image") is not None
+
+# ──────────────────────────────────────────────────────────────
+# LOGGING
+# ──────────────────────────────────────────────────────────────
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+logger = logging.getLogger("FaxFinity")
+
+# ──────────────────────────────────────────────────────────────
+# CONSTANTS & DEFAULTS
+# ──────────────────────────────────────────────────────────────
+CONFIG_FILE = "config.json"
+DEFAULT_CONFIG = {
+    "eingangsordner": "",
+    "ollama_url": "http://localhost:11434",
+    "ollama_model": "llama3.2-vision",
+    "eigener_name": "Dr. med. Florian Rasche, Huttenstr. 6",
+    "scan_interval": 120,  # Sekunden
+    "poppler_path": "",  # Optional: Pfad zu Poppler/bin
+    "scan_pause": 1.0,  # Sekunden Pause zwischen zwei Dateien
+    "ollama_cassette_mode": "",  # "", "record" oder "replay"
+    "ollama_cassette_path": "ollama_cassette.jsonl",
+    "metrics_port": 0,  # 0 = kein /metrics-Endpunkt
+    "metrics_host": "127.0.0.1",
+    "metrics_textfile": "",  # Optional: Datei für node_exporter-Textfile-Collector
+    "profile_dir": "profiles",  # Ablage für Profiling-Berichte
+    "memory_budget_mb": 400,  # Max. Speicher für Dokumente in Bearbeitung (0 = unbegrenzt)
+    "queue_order": ["priority", "arrival"],  # siehe faxfinity.priority
+    "urgent_categories": ["Rezeptanforderung", "Labor"],
+    "low_categories": ["Werbung"],
+    "fax_number_rules": {},  # Faxnummer (Präfix) → Kategorie, z.B. {"09131 55012": "Labor"}
+    "patientenliste": "",  # CSV-Export der Praxissoftware (siehe faxfinity.patients); leer = aus
+    "absender_verzeichnis": True,  # Absender anhand der Faxnummer festlegen (siehe faxfinity.senders)
+    "eigene_faxnummern": "",  # eigene Nummern, z.B. "09131 12345, 09131 12346" – nie als Absender
+    "postfach_name": "Praxis",
+    "ausgabeordner": "",  # Basis für Archiv/Umbenannt/Fehler (leer = Eingangsordner)
+    "dateiname_vorlage": "",  # leer = Standardschema, sonst z.B. "{kategorie}_{patient}_{zeitstempel}"
+    "ablage_archiv": "",  # Unterordner, z.B. "{yyyy}/{mm}"; leer = flach (siehe faxfinity.layout)
+    "ablage_umbenannt": "",  # z.B. "{kategorie}"
+    "ablage_fehler": "",
+    "archiv_modus": "kopie",  # "kopie" oder "dedup" (siehe faxfinity.archive)
+    "archiv_hardlinks": False,  # dedup: Hardlinks erlauben (Datei in Umbenannt wird schreibgeschützt)
+    "archiv_pflege": False,  # Archiv-Pflege im Hintergrund (siehe faxfinity.maintenance)
+    "archiv_pflege_stunden": 24,  # Abstand zwischen zwei Läufen
+    "archiv_pflege_mb_s": 5,  # Lese-/Schreibgrenze der Pflege (0 = unbegrenzt)
+    "archiv_buendel_tage": 365,  # ältere Archivdateien in Jahresbündel packen (0 = nie)
+    "archiv_aufbewahrung_jahre": 10,  # Aufbewahrungsfrist ab Jahresende (§ 630f BGB)
+    "archiv_loeschen": False,  # Jahresbündel nach Ablauf der Frist löschen (sonst nur melden)
+    "gewicht": 1,  # Anteil an der GPU-Zeit bei mehreren Postfächern
+    "postfaecher": [],  # weitere Postfächer, siehe faxfinity.inboxes
+    "shared_inbox": False,  # Eingang mit anderen Rechnern teilen, siehe faxfinity.leases
+    "node_name": "",  # leer = Rechnername
+    "lease_ttl": 120,  # Sekunden ohne Lebenszeichen, bis ein Knoten als ausgefallen gilt
+}
+LOG_MAX_ENTRIES = 50  # Standard für load_processing_log; die Historie selbst ist unbegrenzt
+
+# Bei Änderungen an System-/User-Prompt hochzählen, damit alte
+# Kassetten-Aufnahmen nicht mehr passen.
+PROMPT_VERSION = "1"
+# Kürzerer Prompt bei bekanntem Absender (faxfinity.senders): eigene Aufnahmen
+SHORT_PROMPT_VERSION = f"{PROMPT_VERSION}-ohne-absender"
+OLLAMA_OPTIONS = {
+    "temperature": 0.1,
+    "num_ctx": 4096,  # Genug für Bild-Tokens + Analyse
+}
+
+
+# ──────────────────────────────────────────────────────────────
+# CONFIG PERSISTENCE
+# ──────────────────────────────────────────────────────────────
+def load_config() -> dict:
+    """Lade Konfiguration aus JSON-Datei oder erstelle Defaults."""
+    if os.path.exists(CONFIG_FILE):
+        try:
+            with open(CONFIG_FILE, "r", encoding="utf-8") as f:
+                cfg = json.load(f)
+            # Merge mit Defaults für neue Keys
+            for k, v in DEFAULT_CONFIG.items():
+                if k not in cfg:
+                    cfg[k] = v
+            return cfg
+        except Exception:
+            pass
+    return DEFAULT_CONFIG.copy()
+
+
+def save_config(cfg: dict):
+    """Speichere Konfiguration als JSON."""
+    with open(CONFIG_FILE, "w", encoding="utf-8") as f:
+        json.dump(cfg, f, indent=2, ensure_ascii=False)
+
+
+# ──────────────────────────────────────────────────────────────
+# PROCESSING LOG
+# ──────────────────────────────────────────────────────────────
+def load_processing_log(limit: int = LOG_MAX_ENTRIES) -> list:
+    """Die letzten `limit` Einträge der Historie, älteste zuerst."""
+    return list(reversed(get_history().query(limit=limit)))
+
+
+def add_log_entry(
+    original_name: str,
+    new_name: str,
+    status: str,
+    kategorie: str = "",
+    absender: str = "",
+    patient: str = "",
+    details: str = "",
+    timer: StageTimer | None = None,
+    time_to_file_s: float | None = None,
+    postfach: str = "",
+    ablage: dict | None = None,
+    volltext: str = "",
+    faxnummern: list | None = None,
+    absender_quelle: str = "",
+):
+    """
+    Füge einen Eintrag zur Historie hinzu (siehe faxfinity.history).
+    Mit `timer` werden die Schrittdauern des Dokuments mitgespeichert;
+    `log_write` umfasst dabei nur das Zusammenstellen des Eintrags, das
+    gemeinsame Schreiben (Group Commit) folgt danach. `time_to_file_s` ist
+    die Zeit vom Eingang der Datei bis zur Ablage, `ablage` die Zielpfade
+    je Bereich ({"archiv": …, "umbenannt"/"fehler": …}) für den Pfad-Index,
+    `volltext` die Textebene der PDF für den Suchindex (faxfinity.search).
+    `faxnummern` und `absender_quelle` ("verzeichnis", wenn der Absender
+    aus dem Absender-Verzeichnis stammt) speisen faxfinity.senders.
+    Scheitert das Schreiben, wird das nur geloggt – die Datei ist bereits abgelegt.
+    """
+    t0 = time.perf_counter()
+    entry = {
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "original": original_name,
+        "neu": new_name,
+        "status": status,
+        "kategorie": kategorie,
+        "absender": absender,
+        "patient": patient,
+        "details": details,
+    }
+    if postfach:
+        entry["postfach"] = postfach
+    if time_to_file_s is not None:
+        entry["time_to_file_s"] = time_to_file_s
+    if ablage:
+        entry["ablage"] = ablage
+    if volltext:
+        entry["volltext"] = volltext
+    if faxnummern:
+        entry["faxnummern"] = faxnummern
+    if absender_quelle:
+        entry["absender_quelle"] = absender_quelle
+    if timer is not None:
+        timer.add("log_write", time.perf_counter() - t0)
+        timer.add("total", timer.elapsed())
+        entry["timings_ms"] = timer.as_ms()
+    try:
+        get_history().append(entry)
+    except HistoryError as e:
+        logger.error(f"❌ {original_name}: {e}")
+
+
+# ──────────────────────────────────────────────────────────────
+# HELPER: ORDNER ERSTELLEN
+# ──────────────────────────────────────────────────────────────
+def ensure_subdirs(base: str):
+    """
+    Erstelle Unterordner Archiv, Umbenannt, Fehler. Tiefere Ordner nach den
+    Ablage-Vorlagen entstehen bei Bedarf (faxfinity.layout).
+    """
+    for sub in layout.AREAS.values():
+        p = os.path.join(base, sub)
+        os.makedirs(p, exist_ok=True)
+    layout.forget_created()  # einmal je Scan neu prüfen, ob sie noch existieren
+    return {
+        "archiv": os.path.join(base, "Archiv"),
+        "umbenannt": os.path.join(base, "Umbenannt"),
+        "fehler": os.path.join(base, "Fehler"),
+    }
+
+
+# ──────────────────────────────────────────────────────────────
+# HELPER: SICHERE DATEINAMEN
+# ──────────────────────────────────────────────────────────────
+def sanitize_filename(name: str) -> str:
+    """Entferne unerlaubte Zeichen aus Dateinamen."""
+    # Erlaube nur Buchstaben, Zahlen, Unterstriche, Bindestriche, Punkte
+    name = re.sub(r"[^\w\-.]", "_", name, flags=re.UNICODE)
+    # Entferne doppelte Unterstriche
+    name = re.sub(r"_+", "_", name)
+    # Entferne führende/trailing Unterstriche
+    name = name.strip("_")
+    return name
+
+
+def unique_filepath(directory: str, filename: str) -> str:
+    """
+    Stelle sicher, dass der Dateiname eindeutig ist (prüft jeden Kandidaten).
+    Für Archiv/Umbenannt/Fehler siehe faxfinity.name_index.reserve_filepath.
+    """
+    filepath = os.path.join(directory, filename)
+    if not os.path.exists(filepath):
+        return filepath
+    base, ext = os.path.splitext(filename)
+    counter = 1
+    while True:
+        new_name = f"{base}_{counter}{ext}"
+        new_path = os.path.join(directory, new_name)
+        if not os.path.exists(new_path):
+            return new_path
+        counter += 1
+
+
+# ──────────────────────────────────────────────────────────────
+# OLLAMA API
+# ──────────────────────────────────────────────────────────────
+def fetch_ollama_models(ollama_url: str, force: bool = False) -> list:
+    """Hole verfügbare Modelle von Ollama (prozessweit zwischengespeichert)."""
+    return ollama_models.list_models(ollama_url, force=force)
+
+
+def vision_model_problem(inboxes: list) -> str:
+    """
+    Fehlermeldung für das erste Postfach, dessen Modell laut Ollama keine
+    Bilder verarbeitet; "" wenn alles passt oder Ollama nichts dazu sagt.
+    Bei Wiedergabe einer Kassette wird Ollama nicht gefragt.
+    """
+    for inbox in inboxes:
+        if inbox.get("ollama_cassette_mode") == "replay":
+            continue
+        problem = ollama_models.vision_problem(inbox["ollama_url"], inbox["ollama_model"])
+        if problem:
+            return f"Postfach '{inbox['postfach_name']}': {problem}"
+    return ""
+
+
+def request_options(ollama_url: str, model: str, cassette=None) -> dict:
+    """
+    Tatsächlich gesendete Optionen – dieselben für Anfrage, Fingerabdruck und
+    Aufnahme: `num_ctx` nicht größer als das Kontextfenster des Modells (aus
+    dem Modell-Katalog). Bei Wiedergabe einer Kassette wird Ollama nicht
+    gefragt; die Grenze stammt dann aus den Aufnahmen des Modells.
+    """
+    wanted = OLLAMA_OPTIONS["num_ctx"]
+    if cassette is not None and cassette.mode == "replay":
+        num_ctx = min(wanted, cassette.num_ctx(model) or wanted)
+    else:
+        num_ctx = ollama_models.context_size(ollama_url, model, wanted)
+    return dict(OLLAMA_OPTIONS, num_ctx=num_ctx)
+
+
+def analyze_image_with_ollama(
+    image: "Image.Image",
+    ollama_url: str,
+    model: str,
+    eigener_name: str,
+    cassette=None,
+    timer: StageTimer | None = None,
+    reservation=None,
+    absender_bekannt: bool = False,
+) -> dict | None:
+    """
+    Sende ein Bild an Ollama Vision und erhalte strukturierte Analyse.
+    Gibt ein dict zurück: {'kategorie': ..., 'absender': ..., 'patient': ...}
+    oder None bei Fehler.
+
+    Nutzt /api/chat mit System-Prompt für saubere Kontext-Isolation
+    zwischen aufeinanderfolgenden PDFs.
+
+    Mit einer Kassette (siehe faxfinity.cassette) werden Antworten
+    aufgezeichnet bzw. ohne Ollama wiedergegeben. Ein `timer` erhält die
+    Dauer von Encoding, Anfrage und Parsing sowie Ollamas eigene Zeiten.
+
+    Speicher: Das Bild wird nach dem Encoding geschlossen, PNG- und
+    Base64-Puffer werden verworfen, sobald der JSON-Body steht, und der Body
+    wird stückweise gesendet und freigegeben. Eine `reservation` aus dem
+    Speicherbudget schrumpft entsprechend mit.
+
+    Mit `absender_bekannt` (faxfinity.senders) fragt der Prompt nur
+    Kategorie und Patient; der Absender bleibt "Unbekannt" und wird vom
+    Aufrufer gesetzt.
+    """
+    import requests
+
+    timer = timer or StageTimer()
+    fingerprint = ""
+    prompt_version = SHORT_PROMPT_VERSION if absender_bekannt else PROMPT_VERSION
+    options = request_options(ollama_url, model, cassette)
+    if cassette is not None:
+        image_hash = image_fingerprint(image)
+        fingerprint = request_fingerprint(image_hash, model, prompt_version, options)
+        if cassette.mode == "replay":
+            image.close()
+            response_data = cassette.lookup(fingerprint)
+            if response_data is None and absender_bekannt:
+                # Aufnahme mit vollem Prompt passt auch: der Absender wird ohnehin ersetzt
+                response_data = cassette.lookup(
+                    request_fingerprint(image_hash, model, PROMPT_VERSION, options))
+            metrics.record_cache("cassette", response_data is not None)
+            if response_data is None:
+                logger.error(f"Kassette: keine Aufnahme für Anfrage {fingerprint[:12]}")
+                return None
+            raw_response = response_data.get("message", {}).get("content", "")
+            logger.info(f"Ollama Antwort [Kassette {fingerprint[:8]}]: {raw_response}")
+            with timer.stage("parse"):
+                return parse_ollama_response(raw_response, eigener_name)
+
+    # Bild → Base64
+    with timer.stage("encode"):
+        buffer = BytesIO()
+        image.save(buffer, format="PNG")
+        image.close()  # Pixeldaten sofort freigeben
+        img_base64 = base64.b64encode(buffer.getvalue()).decode("utf-8")
+        buffer.close()
+        del buffer
+
+    # Eindeutige Request-ID verhindert Kontext-Vermischung
+    request_id = uuid.uuid4().hex[:8]
+
+    system_prompt = (
+        f"Du bist ein Fax-Analyse-Assistent für eine Arztpraxis. "
+        f"Dies ist eine NEUE, UNABHÄNGIGE Analyse (ID: {request_id}). "
+        f"Vergiss alles aus vorherigen Analysen komplett. "
+        f"Analysiere NUR das beigefügte Bild. "
+        f"Der Empfänger ist '{eigener_name}' — dieser Name darf NIEMALS "
+        f"als Absender oder Patient in deiner Antwort erscheinen. "
+        f"Antworte AUSSCHLIESSLICH im JSON-Format. "
+        f"Verwende KEINE Beispielnamen — nur das, was du tatsächlich im Dokument liest."
+    )
+
+    if absender_bekannt:
+        user_prompt = (
+            f"Analysiere dieses Fax-Dokument (ID: {request_id}). "
+            f"Der Absender ist bereits bekannt.\n\n"
+            f"1. KATEGORIE — wähle die passendste:\n"
+            f"   Arztbrief, Labor, Medikationsplan, Sturzprotokoll, "
+            f"   Rezeptanforderung, Bestellung, Werbung, Kommunikation, "
+            f"   Überweisung, Befund\n"
+            f"   Falls keine passt, erfinde eine kurze treffende Kategorie.\n\n"
+            f"2. PATIENT — Nachname des Patienten, falls im Dokument erkennbar.\n\n"
+            f"Antworte NUR mit diesem JSON, sonst nichts:\n"
+            f'{{\"kategorie\": \"...\", \"patient\": \"...\"}}'
+        )
+    else:
+        user_prompt = (
+            f"Analysiere dieses Fax-Dokument (ID: {request_id}).\n\n"
+            f"Lies das Dokument aufmerksam und identifiziere:\n\n"
+            f"1. KATEGORIE — wähle die passendste:\n"
+            f"   Arztbrief, Labor, Medikationsplan, Sturzprotokoll, "
+            f"   Rezeptanforderung, Bestellung, Werbung, Kommunikation, "
+            f"   Überweisung, Befund\n"
+            f"   Falls keine passt, erfinde eine kurze treffende Kategorie.\n\n"
+            f"2. ABSENDER — wer hat das Fax gesendet?\n"
+            f"   Lies den tatsächlichen Namen und ggf. Fachrichtung aus dem Dokument.\n"
+            f"   Der Empfänger '{eigener_name}' ist NICHT der Absender!\n\n"
+            f"3. PATIENT — Nachname des Patienten, falls im Dokument erkennbar.\n\n"
+            f"Antworte NUR mit diesem JSON, sonst nichts:\n"
+            f'{{\"kategorie\": \"...\", \"absender\": \"...\", \"patient\": \"...\"}}'
+        )
+
+    payload = {
+        "model": model,
+        "messages": [
+            {
+                "role": "system",
+                "content": system_prompt,
+            },
+            {
+                "role": "user",
+                "content": user_prompt,
+                "images": [img_base64],
+            },
+        ],
+        "stream": False,
+        "options": options,
+        "keep_alive": "5s",  # Kurzes Behalten für Performance, aber schnelles Freigeben
+    }
+    with timer.stage("encode"):
+        body = json.dumps(payload).encode("utf-8")
+    del payload, img_base64
+    if reservation is not None:
+        reservation.resize(len(body))
+    # Der Generator hält die einzige Referenz: nach dem letzten Stück ist der Body frei
+    body_chunks = iter_body_chunks(body, reservation)
+    del body
+
+    try:
+        with timer.stage("request"):
+            resp = requests.post(
+                f"{ollama_url}/api/chat",
+                data=body_chunks,
+                headers={"Content-Type": "application/json"},
+                timeout=180,
+            )
+            resp.raise_for_status()
+            response_data = resp.json()
+        timer.add_ollama_durations(response_data)
+        if cassette is not None:
+            cassette.record(
+                fingerprint,
+                {
+                    "image_hash": image_hash,
+                    "model": model,
+                    "prompt_version": prompt_version,
+                    "options": options,
+                },
+                response_data,
+            )
+        raw_response = response_data.get("message", {}).get("content", "")
+        logger.info(f"Ollama Antwort [{request_id}]: {raw_response}")
+        with timer.stage("parse"):
+            analysis = parse_ollama_response(raw_response, eigener_name)
+        if analysis is None:
+            metrics.OLLAMA_ERRORS.inc(reason="parse")
+        return analysis
+    except requests.exceptions.Timeout:
+        logger.error("Ollama Timeout – Modell hat zu lange gebraucht.")
+        metrics.OLLAMA_ERRORS.inc(reason="timeout")
+        return None
+    except requests.exceptions.ConnectionError:
+        logger.error("Ollama nicht erreichbar. Ist der Server gestartet?")
+        metrics.OLLAMA_ERRORS.inc(reason="connection")
+        return None
+    except requests.exceptions.HTTPError as e:
+        logger.error(f"Ollama Fehler: {e}")
+        metrics.OLLAMA_ERRORS.inc(reason="http")
+        return None
+    except Exception as e:
+        logger.error(f"Ollama Fehler: {e}")
+        metrics.OLLAMA_ERRORS.inc(reason="other")
+        return None
+
+
+def parse_ollama_response(raw: str, eigener_name: str = "") -> dict | None:
+    """Parse die JSON-Antwort von Ollama, auch wenn sie in Text eingebettet ist."""
+    # Repariere doppelte Unicode-Escapes (z.B. \u\u00f6 → \u00f6)
+    cleaned = re.sub(r'\\u\\u([0-9a-fA-F]{4})', r'\\u\1', raw)
+    # Auch einfache Variante: \u\u → \u
+    cleaned = re.sub(r'\\u(?=\\u[0-9a-fA-F]{4})', '', cleaned)
+
+    # Versuche direktes JSON-Parsing
+    for text in [cleaned, raw]:
+        try:
+            data = json.loads(text)
+            if isinstance(data, dict):
+                return normalize_analysis(data, eigener_name)
+        except json.JSONDecodeError:
+            pass
+
+    # Versuche JSON aus dem Text zu extrahieren
+    json_patterns = [
+        r"```json\s*(\{[^{}]*\})\s*```",  # Code-Block
+        r"```\s*(\{[^{}]*\})\s*```",  # Code-Block ohne Sprache
+        r"\{[^{}]*\}",  # Einfaches JSON-Objekt
+    ]
+
+    for text in [cleaned, raw]:
+        for pattern in json_patterns:
+            matches = re.findall(pattern, text, re.DOTALL)
+            for match in matches:
+                try:
+                    data = json.loads(match)
+                    if isinstance(data, dict):
+                        return normalize_analysis(data, eigener_name)
+                except json.JSONDecodeError:
+                    continue
+
+    # ── FALLBACK: Markdown-/Freitext-Parsing ──────────────────
+    # Ollama antwortet manchmal im Format:
+    # **Kategorie:** Arztbrief
+    # **Absender:** Dr. Müller
+    logger.info("  ℹ JSON nicht gefunden, versuche Markdown-Parsing...")
+    result = _parse_markdown_response(raw)
+    if result:
+        return normalize_analysis(result, eigener_name)
+
+    logger.warning(f"Konnte Antwort nicht parsen: {raw[:200]}")
+    return None
+
+
+def _parse_markdown_response(raw: str) -> dict | None:
+    """
+    Fallback-Parser für Markdown-formatierte Antworten von Ollama.
+    Erkennt Muster wie:
+      **Kategorie:** Arztbrief
+      Kategorie: Arztbrief
+      - Kategorie: Arztbrief
+    """
+    result = {}
+    patterns = {
+        "kategorie": [
+            r"\*\*Kategorie[:\*]*\*\*\s*:?\s*(.+?)(?:\n|$)",
+            r"(?:^|\n)\s*[-•]?\s*Kategorie\s*:\s*(.+?)(?:\n|$)",
+            r"Kategorie[:\s]+([A-ZÄÖÜ][a-zäöüß-]+)",
+        ],
+        "absender": [
+            r"\*\*Absender[:\*]*\*\*\s*:?\s*(.+?)(?:\n|$)",
+            r"(?:^|\n)\s*[-•]?\s*Absender\s*:\s*(.+?)(?:\n|$)",
+        ],
+        "patient": [
+            r"\*\*Patient[:\*]*\*\*\s*:?\s*(.+?)(?:\n|$)",
+            r"(?:^|\n)\s*[-•]?\s*Patient\s*:\s*(.+?)(?:\n|$)",
+        ],
+    }
+
+    for key, key_patterns in patterns.items():
+        for pattern in key_patterns:
+            match = re.search(pattern, raw, re.IGNORECASE)
+            if match:
+                value = match.group(1).strip().strip("*").strip()
+                # Entferne Klammerbemerkungen am Ende
+                value = re.sub(r"\s*\(.*\)\s*$", "", value)
+                result[key] = value
+                break
+
+    if result.get("kategorie"):
+        logger.info(f"  ✓ Markdown-Parsing erfolgreich: {result}")
+        return result
+
+    return None
+
+
+def _contains_own_name(text: str, eigener_name: str) -> bool:
+    """Prüfe ob der Text den eigenen Namen (Empfänger) enthält."""
+    if not eigener_name or not text:
+        return False
+    text_lower = text.lower()
+    # Prüfe den vollständigen Namen
+    if eigener_name.lower() in text_lower:
+        return True
+    # Prüfe einzelne relevante Namensbestandteile (mind. 3 Buchstaben)
+    # Ignoriere Titel, Abkürzungen und Adressen
+    ignore_parts = {"dr", "dr.", "med", "med.", "prof", "prof.", "str", "str.",
+                    "huttenstr", "huttenstr.", "praxis", "herr", "frau"}
+    name_parts = [p.strip(".,") for p in eigener_name.split()]
+    significant_parts = [p for p in name_parts
+                         if len(p) >= 3 and p.lower() not in ignore_parts]
+    for part in significant_parts:
+        if part.lower() in text_lower:
+            return True
+    return False
+
+
+def normalize_analysis(data: dict, eigener_name: str = "") -> dict:
+    """Normalisiere die Analysedaten und filtere den Empfängernamen heraus."""
+    result = {
+        "kategorie": str(data.get("kategorie", data.get("Kategorie", "Befund"))).strip(),
+        "absender": str(data.get("absender", data.get("Absender", "Unbekannt"))).strip(),
+        "patient": str(data.get("patient", data.get("Patient", ""))).strip(),
+    }
+
+    # Leere Werte behandeln
+    empty_values = ("", "none", "null", "n/a", "-", "unbekannt",
+                    "nicht erkennbar", "nicht ersichtlich", "nicht angegeben",
+                    "keine angabe", "keine", "k.a.", "k. a.", "n.a.",
+                    "kein angabe", "nicht vorhanden", "nicht bekannt")
+    if not result["kategorie"] or result["kategorie"].lower().strip() in empty_values:
+        result["kategorie"] = "Befund"
+    if not result["absender"] or result["absender"].lower().strip() in empty_values:
+        result["absender"] = "Unbekannt"
+    if not result["patient"] or result["patient"].lower().strip() in empty_values:
+        result["patient"] = ""
+
+    # ── EIGENER NAME FILTER ──────────────────────────────────
+    # Wenn der Empfängername im Absender steht, wurde er fälschlich erkannt
+    if eigener_name and _contains_own_name(result["absender"], eigener_name):
+        logger.warning(f"  ⚠ Eigener Name im Absender erkannt: '{result['absender']}' → entfernt")
+        result["absender"] = "Unbekannt"
+
+    # Wenn der Empfängername im Patient steht, wurde er fälschlich erkannt
+    if eigener_name and _contains_own_name(result["patient"], eigener_name):
+        logger.warning(f"  ⚠ Eigener Name im Patient erkannt: '{result['patient']}' → entfernt")
+        result["patient"] = ""
+
+    return result
+
+
+# ──────────────────────────────────────────────────────────────
+# PDF → IMAGE
+# ──────────────────────────────────────────────────────────────
+def pdf_to_image(pdf_path: str, poppler_path: str = "") -> "Image.Image | None":
+    """
+    Konvertiere die erste Seite einer PDF in ein Bild.
+    Versucht zuerst PyMuPDF (braucht kein Poppler), dann pdf2image als Fallback.
+    """
+    # ── Methode 1: PyMuPDF (bevorzugt, keine externe Dependency) ──
+    if PYMUPDF_AVAILABLE:
+        try:
+            try:
+                import pymupdf as fitz  # ab PyMuPDF 1.24.3, ohne Deprecation-Hinweis auf stdout
+            except ImportError:
+                import fitz  # PyMuPDF
+            from PIL import Image
+
+            doc = fitz.open(pdf_path)
+            if len(doc) > 0:
+                page = doc[0]
+                # Hohe Auflösung: 300 DPI (Standard ist 72)
+                mat = fitz.Matrix(300 / 72, 300 / 72)
+                pix = page.get_pixmap(matrix=mat)
+                # samples_mv vermeidet eine zusätzliche 26-MB-Kopie der Pixel
+                samples = pix.samples_mv if hasattr(pix, "samples_mv") else pix.samples
+                img = Image.frombytes("RGB", [pix.width, pix.height], samples)
+                del samples, pix
+                doc.close()
+                logger.info(f"  ✓ PDF→Bild via PyMuPDF ({img.width}x{img.height}px)")
+                return img
+            doc.close()
+        except Exception as e:
+            logger.warning(f"  PyMuPDF Fehler: {e} – versuche pdf2image...")
+
+    # ── Methode 2: pdf2image + Poppler (Fallback) ──
+    if PDF2IMAGE_AVAILABLE:
+        try:
+            from pdf2image import convert_from_path
+
+            kwargs = {"first_page": 1, "last_page": 1, "dpi": 300}
+            if poppler_path and os.path.isdir(poppler_path):
+                kwargs["poppler_path"] = poppler_path
+            images = convert_from_path(pdf_path, **kwargs)
+            if images:
+                logger.info(f"  ✓ PDF→Bild via pdf2image/Poppler")
+                return images[0]
+        except Exception as e:
+            logger.warning(f"  pdf2image Fehler: {e}")
+
+    logger.error(f"  ✗ PDF→Bild fehlgeschlagen für {pdf_path}. "
+                 f"PyMuPDF={PYMUPDF_AVAILABLE}, pdf2image={PDF2IMAGE_AVAILABLE}")
+    return None
+
+
+# ──────────────────────────────────────────────────────────────
+# DATEINAME GENERIEREN
+# ──────────────────────────────────────────────────────────────
+def generate_new_filename(analysis: dict, timestamp: str, vorlage: str = "") -> str:
+    """
+    Generiere den neuen Dateinamen basierend auf der Analyse.
+    Schema:
+      - Werbung: Werbung_[Zeitstempel].pdf
+      - Arztbrief: Arztbrief_[Fachrichtung]_[Absender]_[Patient]_[Zeitstempel].pdf
+        (Fachrichtung aus dem Absender-Verzeichnis, sonst erstes Wort des Absenders)
+      - Sonstige: [Kategorie]_[Absender]_[Patient]_[Zeitstempel].pdf
+    Eine `vorlage` (pro Postfach) ersetzt das Schema, z.B.
+    "PH_{kategorie}_{patient}_{zeitstempel}"; leere Felder fallen weg.
+    """
+    kat = analysis.get("kategorie", "Sonstiges")
+    absender = analysis.get("absender", "Unbekannt")
+    patient = analysis.get("patient", "")
+
+    if vorlage:
+        fields = {
+            "kategorie": kat,
+            "absender": absender if absender != "Unbekannt" else "",
+            "patient": patient,
+            "zeitstempel": timestamp,
+        }
+        try:
+            filename = vorlage.format(**fields)
+        except (KeyError, IndexError, ValueError) as e:
+            logger.warning(f"  Ungültige Dateinamen-Vorlage {vorlage!r}: {e} – nutze Standardschema")
+        else:
+            return sanitize_filename(filename.removesuffix(".pdf")) + ".pdf"
+
+    if kat.lower() == "werbung":
+        filename = f"Werbung_{timestamp}.pdf"
+    elif kat.lower() == "arztbrief":
+        # Fachrichtung aus Absender extrahieren (z.B. "Kardiologe Müller")
+        parts = absender.split()
+        if analysis.get("fachrichtung"):
+            fachrichtung = analysis["fachrichtung"]
+            arzt_name = "_".join(parts)
+        elif len(parts) >= 2:
+            fachrichtung = parts[0]
+            arzt_name = "_".join(parts[1:])
+        else:
+            fachrichtung = "Arzt"
+            arzt_name = absender if absender != "Unbekannt" else ""
+
+        components = ["Arztbrief", fachrichtung]
+        if arzt_name:
+            components.append(arzt_name)
+        if patient:
+            components.append(patient)
+        components.append(timestamp)
+        filename = "_".join(components) + ".pdf"
+    else:
+        components = [kat]
+        if absender and absender != "Unbekannt":
+            components.append(absender)
+        if patient:
+            components.append(patient)
+        components.append(timestamp)
+        filename = "_".join(components) + ".pdf"
+
+    return sanitize_filename(filename)
+
+
+# ──────────────────────────────────────────────────────────────
+# HAUPTVERARBEITUNG EINER DATEI
+# ──────────────────────────────────────────────────────────────
+def process_single_pdf(pdf_path: str, cfg: dict, dirs: dict,
+                       timer: StageTimer | None = None, dry_run: bool = False) -> dict:
+    """
+    Verarbeite eine einzelne PDF-Datei.
+    Rückgabe: dict mit Ergebnis-Informationen.
+
+    Mit `dry_run` wird nur gerendert und analysiert: kein Backup, nichts
+    wird verschoben oder geloggt; `new_name` ist der vorgeschlagene Name.
+    """
+    original_name = os.path.basename(pdf_path)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    result = {"original": original_name, "status": "pending", "new_name": "",
+              "arrival": _arrival_time(pdf_path), "postfach": cfg.get("postfach_name", ""),
+              "ablage": {}}
+    timer = timer or StageTimer()
+
+    logger.info(f"{'='*60}")
+    logger.info(f"▶ Verarbeite: {original_name}{' (Probelauf)' if dry_run else ''}")
+
+    # ── SCHRITT 1: BACKUP (CRITICAL) ──────────────────────────
+    if not dry_run:
+        try:
+            if cfg.get("archiv_modus") == "dedup":
+                with timer.stage("backup"):
+                    archive_path, method = archive.store(pdf_path, dirs["archiv"], original_name,
+                                                         timestamp, cfg)
+                logger.info(f"  ✓ Backup: {os.path.basename(archive_path)[:12]}… ({method})")
+            else:
+                archive_name = f"{timestamp}_{original_name}"
+                with timer.stage("backup"):
+                    archive_path = reserve_filepath(_area_dir(cfg, dirs, "archiv", timestamp), archive_name)
+                    try:
+                        shutil.copy2(pdf_path, archive_path)
+                    except Exception:
+                        release_filepath(archive_path)
+                        raise
+                folder_index.record_added(archive_path)
+                logger.info(f"  ✓ Backup: {os.path.basename(archive_path)}")
+            result["ablage"]["archiv"] = archive_path
+        except Exception as e:
+            logger.error(f"  ✗ Backup fehlgeschlagen: {e}")
+            result["status"] = "backup_error"
+            result["details"] = str(e)
+            add_log_entry(original_name, "", "❌ Backup-Fehler", details=str(e), timer=timer,
+                          postfach=cfg.get("postfach_name", ""))
+            return _finish_timings(result, timer)
+
+    # ── SPEICHERBUDGET: erst rendern, wenn genug Speicher frei ist ──
+    budget = get_budget(cfg.get("memory_budget_mb", 0))
+    with timer.stage("admission"):
+        reservation = budget.reserve(estimate_document_bytes(pdf_path))
+    try:
+        return _render_analyze_move(pdf_path, cfg, dirs, timer, reservation,
+                                    original_name, timestamp, result, dry_run)
+    finally:
+        reservation.release()
+
+
+def _render_analyze_move(pdf_path: str, cfg: dict, dirs: dict, timer: StageTimer,
+                         reservation, original_name: str, timestamp: str,
+                         result: dict, dry_run: bool = False) -> dict:
+    """Schritte 2–5 von process_single_pdf (innerhalb der Speicherreservierung)."""
+    # ── SCHRITT 2: PDF → BILD ─────────────────────────────────
+    with timer.stage("render"):
+        image = pdf_to_image(pdf_path, cfg.get("poppler_path", ""))
+    if image is None:
+        logger.error(f"  ✗ PDF konnte nicht in Bild konvertiert werden.")
+        result["status"] = "conversion_error"
+        if dry_run:
+            return _finish_timings(result, timer)
+        with timer.stage("move"):
+            error_dest = _move_to_fehler(pdf_path, cfg, dirs, result, timestamp,
+                                         f"KONVERTIERUNG_{timestamp}_{original_name}")
+        add_log_entry(original_name, "", "❌ Konvertierungsfehler",
+                      details="PDF→Bild fehlgeschlagen", timer=timer,
+                      postfach=cfg.get("postfach_name", ""), ablage=result["ablage"])
+        return _finish_timings(result, timer)
+
+    # Textebene für die Suche (digitale Faxe; bei Scans leer)
+    volltext = ""
+    if not dry_run:
+        with timer.stage("text"):
+            volltext = search.pdf_text(pdf_path)
+
+    # Bekannte Faxnummer: Absender steht fest, der Prompt wird kürzer
+    faxnummern, known = [], None
+    if cfg.get("absender_verzeichnis", True):
+        with timer.stage("sender"):
+            faxnummern = senders.fax_numbers(pdf_path, cfg)
+            known = get_history().sender(faxnummern)
+        if known:
+            logger.info(f"  📠 Absender laut Verzeichnis ({known['nummer']}): {known['absender']}")
+
+    # ── SCHRITT 3: VISION-ANALYSE ─────────────────────────────
+    logger.info(f"  ⏳ Sende an Ollama ({cfg['ollama_model']})...")
+    analysis = analyze_image_with_ollama(
+        image=image,
+        ollama_url=cfg["ollama_url"],
+        model=cfg["ollama_model"],
+        eigener_name=cfg["eigener_name"],
+        cassette=get_cassette(cfg.get("ollama_cassette_mode", ""),
+                              cfg.get("ollama_cassette_path", "")),
+        timer=timer,
+        reservation=reservation,
+        absender_bekannt=known is not None,
+    )
+    del image  # wurde beim Encoding bereits geschlossen
+
+    if analysis is None:
+        logger.warning(f"  ✗ Ollama-Analyse fehlgeschlagen → /Fehler")
+        result["status"] = "analysis_error"
+        if dry_run:
+            return _finish_timings(result, timer)
+        with timer.stage("move"):
+            error_dest = _move_to_fehler(pdf_path, cfg, dirs, result, timestamp,
+                                         f"ANALYSE_{timestamp}_{original_name}")
+        add_log_entry(original_name, os.path.basename(error_dest or ""),
+                      "⚠️ Analyse-Fehler → /Fehler",
+                      details="Ollama nicht erreichbar oder Parsing fehlgeschlagen",
+                      timer=timer, postfach=cfg.get("postfach_name", ""), ablage=result["ablage"],
+                      volltext=volltext)
+        return _finish_timings(result, timer)
+
+    logger.info(f"  ✓ Analyse: Kat={analysis['kategorie']}, "
+                f"Abs={analysis['absender']}, Pat={analysis['patient']}")
+    with timer.stage("match"):
+        if known:
+            senders.apply(analysis, known)
+        patients.resolve(analysis, cfg)
+
+    # ── SCHRITT 4: UMBENENNUNG ────────────────────────────────
+    new_filename = generate_new_filename(analysis, timestamp, cfg.get("dateiname_vorlage", ""))
+    logger.info(f"  → Neuer Name: {new_filename}")
+    for key in ("kategorie", "absender", "patient"):
+        result[key] = analysis[key]
+    if dry_run:
+        result["status"] = "success"
+        result["new_name"] = new_filename
+        return _finish_timings(result, timer)
+
+    # ── SCHRITT 5: VERSCHIEBEN & CLEANUP ──────────────────────
+    try:
+        with timer.stage("move"):
+            dest_path = reserve_filepath(
+                _area_dir(cfg, dirs, "umbenannt", timestamp, analysis), new_filename)
+            try:
+                move_to(pdf_path, dest_path)
+            except Exception:
+                release_filepath(dest_path)
+                raise
+        folder_index.record_moved(pdf_path, dest_path)
+        result["ablage"]["umbenannt"] = dest_path
+        final_name = os.path.basename(dest_path)
+        logger.info(f"  ✓ Verschoben nach: /{os.path.relpath(dest_path, os.path.dirname(dirs['umbenannt']))}")
+        result["status"] = "success"
+        result["new_name"] = final_name
+        result["time_to_file_s"] = round(max(0.0, time.time() - result["arrival"]), 1)
+        add_log_entry(
+            original_name, final_name, "✅ Erfolgreich",
+            kategorie=analysis["kategorie"],
+            absender=analysis["absender"],
+            patient=analysis["patient"],
+            details=analysis.get("patient_hinweis", ""),
+            timer=timer,
+            time_to_file_s=result["time_to_file_s"],
+            postfach=cfg.get("postfach_name", ""),
+            ablage=result["ablage"],
+            volltext=volltext,
+            faxnummern=[known["nummer"]] if known else faxnummern,
+            absender_quelle="verzeichnis" if known else "",
+        )
+    except Exception as e:
+        logger.error(f"  ✗ Verschieben fehlgeschlagen: {e}")
+        result["status"] = "move_error"
+        add_log_entry(original_name, new_filename, "❌ Verschiebe-Fehler",
+                      details=str(e), timer=timer, postfach=cfg.get("postfach_name", ""),
+                      ablage=result["ablage"], volltext=volltext)
+
+    return _finish_timings(result, timer)
+
+
+def _area_dir(cfg: dict, dirs: dict, area: str, timestamp: str,
+              analysis: dict | None = None) -> str:
+    """Zielordner in Archiv/Umbenannt/Fehler nach der Ablage-Vorlage (faxfinity.layout)."""
+    when = datetime.strptime(timestamp, "%Y%m%d_%H%M%S")
+    fields = layout.fields_for(when, analysis, cfg.get("postfach_name", ""))
+    return layout.target_dir(dirs[area], layout.template_for(cfg, area), fields)
+
+
+def _move_to_fehler(pdf_path: str, cfg: dict, dirs: dict, result: dict, timestamp: str,
+                    name: str) -> str | None:
+    """Nach /Fehler verschieben; Rückgabe: Zielpfad oder None, wenn das scheitert."""
+    try:
+        error_dest = reserve_filepath(_area_dir(cfg, dirs, "fehler", timestamp), name)
+    except OSError:
+        return None
+    try:
+        move_to(pdf_path, error_dest)
+    except Exception:
+        release_filepath(error_dest)
+        return None
+    folder_index.record_moved(pdf_path, error_dest)
+    result["ablage"]["fehler"] = error_dest
+    return error_dest
+
+
+def _arrival_time(pdf_path: str) -> float:
+    """Eingangszeit = Änderungszeit der Datei (vom Fax-Server geschrieben)."""
+    try:
+        return os.path.getmtime(pdf_path)
+    except OSError:
+        return time.time()
+
+
+def _finish_timings(result: dict, timer: StageTimer) -> dict:
+    """Übernimm die Schrittdauern (ms) ins Ergebnis und logge eine Zusammenfassung."""
+    if "total" not in timer.timings:
+        timer.add("total", timer.elapsed())
+    result["timings_ms"] = timer.as_ms()
+    metrics.record_document(result["status"], result["timings_ms"])
+    if "time_to_file_s" in result:
+        metrics.TIME_TO_FILE.observe(result["time_to_file_s"], kategorie=result.get("kategorie", ""))
+    logger.info("  ⏱ " + ", ".join(f"{k}={v:.0f}ms" for k, v in result["timings_ms"].items()))
+    return result
+
+
+# ──────────────────────────────────────────────────────────────
+# ORDNER-SCAN
+# ──────────────────────────────────────────────────────────────
+def process_pdf(pdf_path: str, cfg: dict, dirs: dict, dry_run: bool = False) -> dict:
+    """process_single_pdf, profiliert falls ein Profiling-Kontingent offen ist."""
+    with track_document(os.path.basename(pdf_path), cfg.get("postfach_name", "")):
+        if profiling.take_slot():
+            return profiling.profile_document(partial(process_single_pdf, dry_run=dry_run),
+                                              pdf_path, cfg, dirs, cfg.get("profile_dir", "profiles"))
+        return process_single_pdf(pdf_path, cfg, dirs, dry_run=dry_run)
+
+
+def scan_and_process(cfg: dict, max_files: int | None = None, progress=None,
+                     scheduler: FairScheduler | None = None) -> list:
+    """
+    Scanne alle Postfächer und verarbeite die PDFs (bzw. höchstens
+    `max_files`) über einen gemeinsamen Scheduler. `progress(aktuell,
+    wartend, ergebnis=None)` wird vor und nach jeder Datei aufgerufen; einen
+    eigenen `scheduler` übergibt, wer die Warteschlange beobachten will.
+    Rückgabe: Liste der Verarbeitungsergebnisse.
+    """
+    if scheduler is None:
+        scheduler = FairScheduler(get_inboxes(cfg), max_files=max_files)
+    if not scheduler.inboxes:
+        logger.warning("Eingangsordner nicht konfiguriert oder existiert nicht.")
+        return []
+    problem = vision_model_problem(scheduler.inboxes)
+    if problem:
+        # Lieber gar nicht anfangen, als jede Datei nach /Fehler zu schieben
+        logger.error(f"❌ {problem}")
+        return []
+
+    dirs = {inbox["postfach_name"]: ensure_subdirs(output_base(inbox))
+            for inbox in scheduler.inboxes}
+    metrics.export(cfg)
+
+    # Reihenfolge je Postfach nach queue_order, zwischen den Postfächern nach
+    # Gewicht; neu eintreffende Faxe werden während des Scans einsortiert
+    metrics.INBOX_QUEUE_DEPTH.set(len(scheduler))
+    if not len(scheduler):
+        logger.info("Keine neuen PDFs im Eingangsordner.")
+        metrics.scan_finished()
+        metrics.export(cfg)
+        return []
+
+    logger.info(f"📬 {len(scheduler)} neue PDF(s) gefunden.")
+    results = []
+    while True:
+        item = scheduler.pop()
+        if item is None:
+            break
+        inbox, pdf_path = item
+        if progress is not None:
+            progress(os.path.basename(pdf_path), len(scheduler))
+        try:
+            result = process_pdf(pdf_path, inbox, dirs[inbox["postfach_name"]])
+        finally:
+            scheduler.release(inbox, pdf_path)
+        results.append(result)
+        if progress is not None:
+            progress(None, len(scheduler), result)
+        metrics.INBOX_QUEUE_DEPTH.set(len(scheduler))
+        metrics.export(cfg)
+        time.sleep(cfg.get("scan_pause", 1.0))  # Kleine Pause zwischen Dateien
+
+    metrics.scan_finished()
+    metrics.export(cfg)
+    return results
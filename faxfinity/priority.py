@@ -0,0 +1,290 @@
+"""
+Prioritäts-Warteschlange für den Eingangsordner.
+
+Statt nach Dateiname wird nach einer konfigurierbaren Reihenfolge
+abgearbeitet (`queue_order`, z.B. ["priority", "arrival"]):
+
+  priority – Vorab-Einstufung ohne Ollama: Textebene der ersten beiden
+             Seiten (Stichwörter) und Absender-Faxnummer (Regeln aus der
+             Konfiguration, auch aus dem Dateinamen). Dringende Kategorien
+             (`urgent_categories`, z.B. Rezeptanforderung, Labor) zuerst,
+             `low_categories` (z.B. Werbung) zuletzt.
+  arrival  – Eingangszeit (Änderungszeit der Datei), älteste zuerst
+  pages    – Seitenzahl, kurze zuerst
+  size     – Dateigröße, kleine zuerst
+  name     – Dateiname (bisheriges Verhalten)
+
+Die Warteschlange liest den Ordner während der Abarbeitung regelmäßig neu
+ein: ein Rezept, das mitten in einem Rückstau eintrifft, wird vorgezogen.
+"""
+
+import heapq
+import logging
+import os
+import re
+import threading
+import time
+
+logger = logging.getLogger("FaxFinity")
+
+QUEUE_ORDERS = ("priority", "arrival", "pages", "size", "name")
+# Kategorien wie im Analyse-Prompt (faxfinity.pipeline)
+KATEGORIEN = (
+    "Arztbrief", "Labor", "Medikationsplan", "Sturzprotokoll", "Rezeptanforderung",
+    "Bestellung", "Werbung", "Kommunikation", "Überweisung", "Befund",
+)
+REFRESH_INTERVAL = 5.0  # Sekunden zwischen zwei Neueinlesungen des Ordners
+
+# Stichwörter (klein geschrieben) für die Vorab-Einstufung per Textebene
+KEYWORDS = {
+    "Rezeptanforderung": ("rezept", "verordnung", "folgerezept", "medikamente bestellen"),
+    "Labor": ("laborbefund", "laborwerte", "blutbild", "hba1c", "kreatinin", "referenzbereich"),
+    # Nur eindeutige Werbe-Begriffe: "angebot", "rabatt" oder "günstiger" stehen auch in
+    # Therapieangeboten, Rabattverträgen und Befunden ("günstiger Verlauf")
+    "Werbung": ("sonderangebot", "aktionspreis", "newsletter", "abbestellen"),
+}
+_FAX_NUMBER = re.compile(r"(?:fax|telefax)\D{0,5}(\+?[\d][\d \-/()]{4,}\d)", re.IGNORECASE)
+_DIGIT_RUN = re.compile(r"\d{6,}")
+
+_cache: dict = {}  # (Pfad, mtime, Größe) → Merkmale; prozessweit
+_cache_lock = threading.Lock()
+_count_cache: dict = {}  # Ordner → (mtime_ns, Anzahl PDFs)
+
+
+def list_inbox_pdfs(eingang: str) -> list:
+    """Alle PDFs im Eingangsordner (nicht in Unterordnern), sortiert."""
+    return sorted(
+        [
+            os.path.join(eingang, f)
+            for f in os.listdir(eingang)
+            if f.lower().endswith(".pdf") and os.path.isfile(os.path.join(eingang, f))
+        ]
+    )
+
+
+def count_inbox_pdfs(eingang: str) -> int:
+    """
+    Anzahl PDFs im Eingangsordner für die Anzeige. Neu gezählt wird nur,
+    wenn sich die Änderungszeit des Ordners geändert hat (Datei hinzugefügt,
+    entfernt oder umbenannt) oder sie zu frisch ist, um ihr zu trauen.
+    """
+    st = os.stat(eingang)
+    cached = _count_cache.get(eingang)
+    # Innerhalb der Zeitauflösung des Dateisystems (NAS: bis 2 s) kann sich der
+    # Ordner ändern, ohne dass sich die mtime ändert
+    if cached is not None and cached[0] == st.st_mtime_ns and time.time() - st.st_mtime > 2:
+        return cached[1]
+    count = sum(1 for e in os.scandir(eingang) if e.name.lower().endswith(".pdf") and e.is_file())
+    _count_cache[eingang] = (st.st_mtime_ns, count)
+    return count
+
+
+def _digits(text: str) -> str:
+    return re.sub(r"\D", "", text)
+
+
+def match_fax_rules(numbers: list, rules: dict) -> str:
+    """Kategorie der ersten Regel, deren Nummer (nur Ziffern) ein Präfix ist."""
+    normalized = [(_digits(k), v) for k, v in (rules or {}).items() if _digits(k)]
+    # Längste Regel zuerst: spezifische Nummern schlagen Vorwahl-Regeln
+    normalized.sort(key=lambda kv: -len(kv[0]))
+    for number in numbers:
+        for prefix, kategorie in normalized:
+            if number.startswith(prefix):
+                return kategorie
+    return ""
+
+
+def parse_fax_rules(text: str) -> dict:
+    """Zeilen der Form "Faxnummer = Kategorie" → dict (leere/ungültige Zeilen ignoriert)."""
+    rules = {}
+    for line in text.splitlines():
+        number, sep, kategorie = line.partition("=")
+        if sep and _digits(number) and kategorie.strip():
+            rules[number.strip()] = kategorie.strip()
+    return rules
+
+
+def format_fax_rules(rules: dict) -> str:
+    return "\n".join(f"{number} = {kategorie}" for number, kategorie in (rules or {}).items())
+
+
+def classify_text(text: str) -> str:
+    """Kategorie-Hinweis aus der Textebene (erster Treffer in KEYWORDS)."""
+    lowered = text.lower()
+    for kategorie, words in KEYWORDS.items():
+        if any(w in lowered for w in words):
+            return kategorie
+    return ""
+
+
+def inspect_pdf(pdf_path: str, fax_rules: dict | None = None) -> dict:
+    """
+    Günstige Merkmale eines Faxes ohne Rendern: Eingangszeit, Größe,
+    Seitenzahl, Faxnummern und Kategorie-Hinweis. Ergebnis wird pro
+    (Pfad, mtime, Größe) zwischengespeichert.
+    """
+    st = os.stat(pdf_path)
+    key = (pdf_path, st.st_mtime, st.st_size)
+    with _cache_lock:
+        cached = _cache.get(key)
+    if cached is None:
+        cached = {"arrival": st.st_mtime, "size": st.st_size, "pages": 0,
+                  "text_hint": "", "numbers": []}
+        text = ""
+        try:
+            try:
+                import pymupdf as fitz  # ab PyMuPDF 1.24.3, ohne Deprecation-Hinweis auf stdout
+            except ImportError:
+                import fitz  # PyMuPDF
+            with fitz.open(pdf_path) as doc:
+                cached["pages"] = len(doc)
+                # Seite 2 mit, falls Seite 1 nur ein Fax-Deckblatt ist
+                text = "\n".join(doc[i].get_text() for i in range(min(2, len(doc))))
+        except Exception:
+            pass  # ohne PyMuPDF oder bei defekter PDF: nur Datei-Merkmale
+        cached["text_hint"] = classify_text(text)
+        numbers = [_digits(m) for m in _FAX_NUMBER.findall(text)]
+        numbers += _DIGIT_RUN.findall(os.path.basename(pdf_path))
+        cached["numbers"] = numbers
+        with _cache_lock:
+            _cache[key] = cached
+    info = dict(cached)
+    # Faxnummer-Regeln sind eindeutiger als Stichwörter
+    info["hint"] = match_fax_rules(info["numbers"], fax_rules) or info["text_hint"]
+    return info
+
+
+def _prune_cache(eingang: str, present: set):
+    """Vergiss Merkmale von Dateien, die den Eingangsordner verlassen haben."""
+    with _cache_lock:
+        for key in [k for k in _cache if os.path.dirname(k[0]) == eingang and k[0] not in present]:
+            del _cache[key]
+
+
+def priority_rank(hint: str, cfg: dict) -> int:
+    """0 = dringend, 1 = normal, 2 = niedrig."""
+    if hint and hint in cfg.get("urgent_categories", []):
+        return 0
+    if hint and hint in cfg.get("low_categories", []):
+        return 2
+    return 1
+
+
+def sort_key(pdf_path: str, info: dict, order: list, cfg: dict) -> tuple:
+    values = {
+        "priority": priority_rank(info["hint"], cfg),
+        "arrival": info["arrival"],
+        "pages": info["pages"],
+        "size": info["size"],
+        "name": os.path.basename(pdf_path),
+    }
+    return tuple(values[o] for o in order if o in values) + (os.path.basename(pdf_path),)
+
+
+class InboxQueue:
+    """
+    Thread-sichere Warteschlange über dem Eingangsordner. `pop()` liefert
+    die nächste Datei nach `cfg["queue_order"]` und liest den Ordner höchstens
+    alle `refresh_interval` Sekunden neu ein. Jede Datei wird nur einmal
+    ausgegeben (auch im Probelauf, in dem nichts verschoben wird).
+    """
+
+    def __init__(self, eingang: str, cfg: dict, max_files: int | None = None,
+                 refresh_interval: float = REFRESH_INTERVAL):
+        self.eingang = eingang
+        self.cfg = cfg
+        self.order = [o for o in cfg.get("queue_order", ["priority", "arrival"]) if o in QUEUE_ORDERS]
+        self.max_files = max_files
+        self.refresh_interval = refresh_interval
+        self.popped = 0
+        self._heap: list = []
+        self._seen: set = set()
+        self._lock = threading.Lock()
+        self._last_refresh = 0.0
+        with self._lock:
+            self._refresh()
+
+    def _refresh(self):
+        self._last_refresh = time.monotonic()
+        try:
+            paths = list_inbox_pdfs(self.eingang)
+        except OSError as e:
+            logger.warning(f"Eingangsordner nicht lesbar: {e}")
+            return
+        _prune_cache(self.eingang, set(paths))
+        rules = self.cfg.get("fax_number_rules", {})
+        for path in paths:
+            if path in self._seen:
+                continue
+            try:
+                info = inspect_pdf(path, rules)
+            except OSError:
+                continue  # inzwischen verschwunden
+            self._seen.add(path)
+            heapq.heappush(self._heap, (sort_key(path, info, self.order, self.cfg), path, info["hint"]))
+
+    def pop(self) -> str | None:
+        """Nächste Datei oder None, wenn nichts mehr wartet."""
+        with self._lock:
+            if self.max_files is not None and self.popped >= self.max_files:
+                return None
+            if time.monotonic() - self._last_refresh >= self.refresh_interval:
+                self._refresh()
+            while self._heap:
+                key, path, hint = heapq.heappop(self._heap)
+                if not os.path.exists(path):
+                    self._seen.discard(path)  # taucht sie wieder auf, neu einsortieren
+                    continue
+                self.popped += 1
+                if "priority" in self.order and priority_rank(hint, self.cfg) == 0:
+                    logger.info(f"🚨 Vorgezogen ({hint}): {os.path.basename(path)}")
+                return path
+            return None
+
+    def refresh(self):
+        """Ordner sofort neu einlesen, unabhängig vom Intervall."""
+        with self._lock:
+            self._refresh()
+
+    def forget(self, path: str):
+        """Datei beim nächsten Einlesen wieder aufnehmen (z.B. nach Rückgabe)."""
+        with self._lock:
+            self._seen.discard(path)
+
+    def head_rank(self) -> int | None:
+        """Dringlichkeit (0–2) der nächsten Datei, None wenn nichts wartet."""
+        with self._lock:
+            if self.max_files is not None and self.popped >= self.max_files:
+                return None
+            if time.monotonic() - self._last_refresh >= self.refresh_interval:
+                self._refresh()
+            while self._heap and not os.path.exists(self._heap[0][1]):
+                self._seen.discard(heapq.heappop(self._heap)[1])
+            if not self._heap:
+                return None
+            return self._rank(self._heap[0][2])
+
+    def _rank(self, hint: str) -> int:
+        return priority_rank(hint, self.cfg) if "priority" in self.order else 1
+
+    def peek(self, n: int) -> list:
+        """Die nächsten `n` Dateien als (Pfad, Hinweis, Dringlichkeit), ohne Neueinlesen."""
+        with self._lock:
+            limit = n if self.max_files is None else min(n, max(0, self.max_files - self.popped))
+            return [(path, hint, self._rank(hint))
+                    for _, path, hint in heapq.nsmallest(limit, self._heap)]
+
+    def __len__(self) -> int:
+        with self._lock:
+            pending = len(self._heap)
+            if self.max_files is not None:
+                pending = min(pending, max(0, self.max_files - self.popped))
+            return pending
+
+    @property
+    def discovered(self) -> int:
+        """Bisher gefundene Dateien (ausgegebene + wartende)."""
+        with self._lock:
+            total = len(self._seen)
+            return min(total, self.max_files) if self.max_files is not None else total
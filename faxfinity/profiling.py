@@ -0,0 +1,231 @@
+"""
+Profiling einzelner Dokumente auf Abruf.
+
+"Profiliere die nächsten N Dokumente" (UI oder CLI) führt
+`process_single_pdf` unter cProfile und tracemalloc aus und misst pro
+Verarbeitungsschritt RSS-Spitze (während des Schritts alle SAMPLE_INTERVAL
+Sekunden abgetastet), RSS danach und Python-Speicherspitze. Pro Dokument
+entsteht ein Ordner mit:
+  profile.prof      – cProfile-Daten (z.B. für snakeviz)
+  profile.txt       – Top-Funktionen nach kumulierter Zeit
+  allocations.txt   – größte Speicher-Allokationen (tracemalloc)
+  summary.json      – Status, Zeiten und Speicher je Schritt
+"""
+
+import io
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import tracemalloc
+from datetime import datetime
+
+from faxfinity.timing import StageTimer
+
+logger = logging.getLogger("FaxFinity")
+
+SAMPLE_INTERVAL = 0.01  # Sekunden zwischen zwei RSS-Messungen
+
+_lock = threading.Lock()
+_remaining = 0
+_profile_lock = threading.Lock()  # tracemalloc ist prozessweit: nur ein Profil gleichzeitig
+_last_reports: list = []
+
+
+def current_rss_mb() -> float | None:
+    """Aktueller RSS des Prozesses in MB (psutil, /proc oder None)."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 1024 / 1024
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm", "r") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def request_profiles(count: int):
+    """Profiliere die nächsten `count` Dokumente (0 = abbrechen)."""
+    global _remaining
+    with _lock:
+        _remaining = max(0, int(count))
+    if _remaining:
+        logger.info(f"🔬 Profiling für die nächsten {_remaining} Dokument(e) aktiviert.")
+    else:
+        logger.info("🔬 Profiling deaktiviert.")
+
+
+def remaining() -> int:
+    with _lock:
+        return _remaining
+
+
+def take_slot() -> bool:
+    """Reserviere ein Profiling-Kontingent für das nächste Dokument."""
+    global _remaining
+    with _lock:
+        if _remaining <= 0:
+            return False
+        _remaining -= 1
+        return True
+
+
+def last_reports() -> list:
+    """Zusammenfassungen der zuletzt profilierten Dokumente (neueste zuletzt)."""
+    with _lock:
+        return list(_last_reports)
+
+
+class _MemoryProbe:
+    """
+    StageTimer-Hook: RSS-Spitze, RSS danach und tracemalloc-Spitze pro
+    Schritt. Ein Hintergrund-Thread tastet den RSS ab, solange profiliert wird.
+    """
+
+    def __init__(self):
+        self.stages: dict[str, dict] = {}
+        self.peak_rss_mb = current_rss_mb()
+        self._active: dict = {}  # laufende Schritte → bisherige RSS-Spitze
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, daemon=True, name="rss-sampler")
+
+    def start(self):
+        self._sampler.start()
+
+    def stop(self):
+        self._stop.set()
+        self._sampler.join()
+
+    def _sample(self):
+        while not self._stop.wait(SAMPLE_INTERVAL):
+            self._record(current_rss_mb())
+
+    def _record(self, rss: float | None):
+        if rss is None:
+            return
+        with self._lock:
+            if self.peak_rss_mb is None or rss > self.peak_rss_mb:
+                self.peak_rss_mb = rss
+            for name, peak in self._active.items():
+                if peak is None or rss > peak:
+                    self._active[name] = rss
+
+    def stage_started(self, name: str):
+        tracemalloc.reset_peak()
+        with self._lock:
+            self._active[name] = None
+        self._record(current_rss_mb())
+
+    def stage_finished(self, name: str, seconds: float):
+        rss = current_rss_mb()
+        _, py_peak = tracemalloc.get_traced_memory()
+        self._record(rss)
+        with self._lock:
+            peak = self._active.pop(name, None)
+        # Mehrfach durchlaufene Schritte (z.B. "parse") wie StageTimer.add:
+        # Zeiten addieren, Spitzen als Maximum, RSS danach vom letzten Durchlauf
+        previous = self.stages.get(name, {})
+        self.stages[name] = {
+            "seconds": round(previous.get("seconds", 0.0) + seconds, 4),
+            "rss_mb_peak": _max_mb(previous.get("rss_mb_peak"), peak),
+            "rss_mb_after": round(rss, 1) if rss is not None else None,
+            "python_peak_mb": _max_mb(previous.get("python_peak_mb"), py_peak / 1024 / 1024),
+        }
+
+
+def _max_mb(*values) -> float | None:
+    present = [v for v in values if v is not None]
+    return round(max(present), 1) if present else None
+
+
+def _new_report_dir(out_dir: str, name: str) -> str:
+    """Eigener Ordner je Profil, auch bei mehreren Profilen in derselben Sekunde."""
+    os.makedirs(out_dir, exist_ok=True)
+    path, n = os.path.join(out_dir, name), 1
+    while True:
+        try:
+            os.mkdir(path)
+            return path
+        except FileExistsError:
+            n += 1
+            path = os.path.join(out_dir, f"{name}_{n}")
+
+
+def profile_document(process_fn, pdf_path: str, cfg: dict, dirs: dict, out_dir: str) -> dict:
+    """
+    Führe `process_fn(pdf_path, cfg, dirs, timer=...)` profiliert aus und
+    schreibe die Berichte nach `out_dir/<Zeitstempel>_<Dateiname>[_N]/`.
+    """
+    stem = re.sub(r"[^\w\-.]", "_", os.path.splitext(os.path.basename(pdf_path))[0])
+    report_dir = _new_report_dir(out_dir, f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{stem}")
+    size_bytes = os.path.getsize(pdf_path) if os.path.exists(pdf_path) else 0
+    import cProfile
+    import pstats
+
+    with _profile_lock:
+        probe = _MemoryProbe()
+        rss_before = current_rss_mb()
+        tracemalloc.start(25)
+        probe.start()
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            result = process_fn(pdf_path, cfg, dirs, timer=StageTimer(hook=probe))
+        finally:
+            profiler.disable()
+            probe.stop()
+            snapshot = tracemalloc.take_snapshot()
+            _, py_peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+    # reset_peak() pro Schritt: Gesamtspitze = größte Schrittspitze
+    py_peak = max([py_peak] + [s["python_peak_mb"] * 1024 * 1024 for s in probe.stages.values()])
+
+    profiler.dump_stats(os.path.join(report_dir, "profile.prof"))
+    stats_buf = io.StringIO()
+    pstats.Stats(profiler, stream=stats_buf).sort_stats("cumulative").print_stats(40)
+    with open(os.path.join(report_dir, "profile.txt"), "w", encoding="utf-8") as f:
+        f.write(stats_buf.getvalue())
+
+    snapshot = snapshot.filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ])
+    with open(os.path.join(report_dir, "allocations.txt"), "w", encoding="utf-8") as f:
+        f.write(f"Python-Speicherspitze: {py_peak / 1024 / 1024:.1f} MB\n\n")
+        f.write("Top 30 nach Zeile:\n")
+        for stat in snapshot.statistics("lineno")[:30]:
+            f.write(f"  {stat}\n")
+        f.write("\nTop 5 nach Aufrufkette:\n")
+        for stat in snapshot.statistics("traceback")[:5]:
+            f.write(f"\n{stat.size / 1024 / 1024:.1f} MB in {stat.count} Block(en)\n")
+            for line in stat.traceback.format(limit=10):
+                f.write(f"  {line}\n")
+
+    summary = {
+        "file": os.path.basename(pdf_path),
+        "size_bytes": size_bytes,
+        "status": result.get("status"),
+        "new_name": result.get("new_name", ""),
+        "profiled_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "python": sys.version.split()[0],
+        "timings_ms": result.get("timings_ms", {}),
+        "rss_mb_before": round(rss_before, 1) if rss_before is not None else None,
+        "peak_rss_mb": round(probe.peak_rss_mb, 1) if probe.peak_rss_mb is not None else None,
+        "python_peak_mb": round(py_peak / 1024 / 1024, 1),
+        "stages": probe.stages,
+        "report_dir": os.path.abspath(report_dir),
+    }
+    with open(os.path.join(report_dir, "summary.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
+
+    with _lock:
+        _last_reports.append(summary)
+        del _last_reports[:-20]
+    logger.info(f"  🔬 Profil gespeichert: {report_dir}")
+    return result
@@ -0,0 +1,147 @@
+"""
+Einmaliger Umbau bestehender Ablage-Ordner nach den Ablage-Vorlagen.
+
+    python faxsort_ai.py reshard [--dry-run] [--postfach NAME]
+
+Für jeden Bereich (Archiv/Umbenannt/Fehler) mit Vorlage (faxfinity.layout)
+wandert jedes PDF – auch aus Unterordnern einer früheren Vorlage – in
+seinen Zielordner:
+
+  * Datum: Zeitstempel im Dateinamen (JJJJMMTT_HHMMSS), sonst Änderungszeit,
+  * Kategorie/Absender/Patient: aus der Historie zum Dateinamen (Umbenannt),
+    sonst der erste Namensteil, wenn er eine bekannte Kategorie ist.
+
+Alle gefundenen Dateien, auch die nicht verschobenen, landen im Pfad-Index;
+leer gewordene Unterordner werden entfernt. Läuft unter den Scan-Locks
+(faxfinity.coordinator), also nie parallel zu einem Scan.
+"""
+
+import json
+import logging
+import os
+
+from faxfinity import archive, folder_index, layout
+from faxfinity.history import get_history
+from faxfinity.inboxes import output_base
+from faxfinity.name_index import move_to, reserve_filepath
+from faxfinity.name_index import release as release_filepath
+from faxfinity.priority import KATEGORIEN
+
+logger = logging.getLogger("FaxFinity")
+
+INDEX_BATCH = 1000  # Pfad-Index-Zeilen je Transaktion
+
+_CATEGORIES = {k.casefold(): k for k in KATEGORIEN}
+
+
+def _known_documents(history) -> dict:
+    """Umbenannte Dateien aus der Historie: Name (casefold) → Analysefelder."""
+    known = {}
+    with history.reader() as conn:
+        for (data,) in conn.execute("SELECT data FROM eintraege WHERE ok = 1"):
+            entry = json.loads(data)
+            if entry.get("neu"):
+                known[entry["neu"].casefold()] = {
+                    k: entry.get(k, "") for k in ("kategorie", "absender", "patient")}
+    return known
+
+
+def _analysis_of(name: str, area: str, known: dict) -> dict | None:
+    if area != "umbenannt":
+        return None  # Archiv/Fehler: Inhalt war zum Ablagezeitpunkt noch unbekannt
+    if name.casefold() in known:
+        return known[name.casefold()]
+    first = name.split("_", 1)[0].casefold()
+    return {"kategorie": _CATEGORIES[first]} if first in _CATEGORIES else None
+
+
+def _pdfs(area_dir: str):
+    for root, dirs, files in os.walk(area_dir):
+        if root == area_dir and archive.OBJECTS_DIR in dirs:
+            dirs.remove(archive.OBJECTS_DIR)  # deduplizierte Objekte liegen nach Hash
+        for name in files:
+            if name.lower().endswith(".pdf"):
+                yield os.path.join(root, name)
+
+
+def _remove_empty_dirs(area_dir: str) -> int:
+    removed = 0
+    for root, _, _ in os.walk(area_dir, topdown=False):
+        if root != area_dir:
+            try:
+                os.rmdir(root)  # scheitert, solange etwas darin liegt
+                removed += 1
+            except OSError:
+                pass
+    return removed
+
+
+def reshard_inbox(inbox: dict, known: dict, dry_run: bool = False, progress=None) -> dict:
+    """Bereiche eines Postfachs umbauen. Rückgabe: Zähler je Ergebnis."""
+    history = get_history()
+    counts = {"geprüft": 0, "verschoben": 0, "unverändert": 0, "fehler": 0, "ordner_entfernt": 0}
+    targets: dict = {}  # Zielordner → Anzahl (Probelauf)
+    base = output_base(inbox)
+    rows = []
+    for area, folder in layout.AREAS.items():
+        area_dir = os.path.join(base, folder)
+        template = layout.template_for(inbox, area)
+        if not os.path.isdir(area_dir):
+            continue
+        for path in list(_pdfs(area_dir)):
+            counts["geprüft"] += 1
+            name = os.path.basename(path)
+            try:
+                fields = layout.fields_for(layout.date_of(name, path), _analysis_of(name, area, known),
+                                           inbox.get("postfach_name", ""))
+            except OSError:
+                counts["fehler"] += 1
+                continue
+            sub = layout.subpath(template, fields)
+            wanted = os.path.join(area_dir, sub) if sub else area_dir
+            if os.path.normcase(wanted) == os.path.normcase(os.path.dirname(path)):
+                counts["unverändert"] += 1
+                if not dry_run:
+                    rows.append((None, path, area))
+            elif dry_run:
+                counts["verschoben"] += 1
+                rel = os.path.relpath(wanted, base)
+                targets[rel] = targets.get(rel, 0) + 1
+            else:
+                dest = None
+                try:
+                    dest = reserve_filepath(layout.target_dir(area_dir, template, fields), name)
+                    move_to(path, dest)
+                except OSError as e:
+                    if dest:
+                        release_filepath(dest)
+                    logger.warning(f"  ✗ {name}: {e}")
+                    counts["fehler"] += 1
+                    continue
+                folder_index.record_moved(path, dest)
+                counts["verschoben"] += 1
+                rows.append((path, dest, area))
+            if len(rows) >= INDEX_BATCH:
+                history.relocate(rows)
+                rows = []
+            if progress and counts["geprüft"] % 500 == 0:
+                progress(counts)
+        if not dry_run:
+            counts["ordner_entfernt"] += _remove_empty_dirs(area_dir)
+    if rows:
+        history.relocate(rows)
+    if dry_run:
+        counts["ziele"] = dict(sorted(targets.items()))
+    return counts
+
+
+def reshard(inboxes: list, dry_run: bool = False, progress=None) -> dict:
+    """Alle Postfächer umbauen. Rückgabe: {Postfachname: Zähler}."""
+    problems = [layout.check_template(layout.template_for(inbox, area))
+                for inbox in inboxes for area in layout.AREAS]
+    problems = [p for p in problems if p]
+    if problems:
+        raise ValueError("; ".join(problems))
+    known = _known_documents(get_history())
+    return {inbox["postfach_name"]: reshard_inbox(inbox, known, dry_run, progress)
+            for inbox in inboxes}
@@ -0,0 +1,251 @@
+"""
+Volltext- und Metadatensuche über alle verarbeiteten Faxe.
+
+"Wo ist der Brief vom Kardiologen zu Frau X vom letzten Monat?" – statt im
+Explorer durch `Umbenannt/` zu blättern, sucht die Oberfläche (Tab
+„🔍 Suche") in einer SQLite-FTS5-Tabelle `suche` in der Historie:
+
+  * eine Zeile je Historien-Eintrag (rowid = Eintrags-id) mit Kategorie,
+    Absender, Patient, Original- und neuem Namen sowie der Textebene der
+    PDF, falls vorhanden (digital erzeugte Faxe; reine Scans haben keine),
+  * fortgeschrieben im selben Commit wie der Historien-Eintrag,
+  * Umlaute und Akzente werden ignoriert ("muller" findet "Müller", "weiss"
+    findet "Weiß"), jedes Suchwort gilt als Wortanfang ("kardio" findet
+    "Kardiologe"); Treffer kommen neueste zuerst, ohne Sortieren aller
+    Treffer (die ids der Historie sind chronologisch).
+
+Einträge von vor dieser Tabelle (oder aus einem anderen Prozess ohne
+Suchindex) trägt `backfill` nach – inkrementell, beliebig oft aufrufbar:
+`python faxsort_ai.py index` oder „Index vervollständigen" in der Suche.
+Der Volltext liegt nur im Index, nicht im Historien-Eintrag selbst.
+"""
+
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+
+from faxfinity import layout
+
+logger = logging.getLogger("FaxFinity")
+
+TEXT_MAX_PAGES = 5
+TEXT_MAX_CHARS = 20_000
+RESULT_LIMIT = 50
+BACKFILL_BATCH = 200
+
+SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS suche USING fts5(
+    kategorie, absender, patient, original, neu, volltext,
+    timestamp UNINDEXED, postfach UNINDEXED,
+    tokenize = "unicode61 remove_diacritics 2",
+    prefix = '2 3'
+);
+"""
+_INSERT = ("INSERT OR REPLACE INTO suche (rowid, kategorie, absender, patient, original, neu, "
+           "volltext, timestamp, postfach) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)")
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+_fts5 = {"available": True}  # False, wenn SQLite ohne FTS5 gebaut ist
+_backfill = {"thread": None, "done": 0, "error": ""}  # prozessweit
+_backfill_lock = threading.Lock()
+
+
+# ──────────────────────────────────────────────────────────────
+# TEXTEBENE
+# ──────────────────────────────────────────────────────────────
+def pdf_text(pdf_path: str) -> str:
+    """Text der ersten Seiten (ohne OCR); "" bei Scans oder ohne PyMuPDF."""
+    try:
+        try:
+            import pymupdf as fitz
+        except ImportError:
+            import fitz  # PyMuPDF
+    except ImportError:
+        return ""
+    parts, size = [], 0
+    try:
+        with fitz.open(pdf_path) as doc:
+            for page in doc.pages(0, min(len(doc), TEXT_MAX_PAGES)):
+                text = " ".join(page.get_text().split())
+                parts.append(text)
+                size += len(text)
+                if size >= TEXT_MAX_CHARS:
+                    break
+    except Exception as e:  # beschädigte PDF: Suche nur über die Metadaten
+        logger.debug(f"Textebene nicht lesbar ({pdf_path}): {e}")
+        return ""
+    return " ".join(p for p in parts if p)[:TEXT_MAX_CHARS]
+
+
+# ──────────────────────────────────────────────────────────────
+# INDEX (Tabelle in der Historie)
+# ──────────────────────────────────────────────────────────────
+def ensure_schema(conn: sqlite3.Connection):
+    try:
+        conn.executescript(SCHEMA)
+    except sqlite3.OperationalError as e:  # "no such module: fts5"
+        _fts5["available"] = False
+        logger.warning(f"🔍 Suche nicht verfügbar (SQLite ohne FTS5): {e}")
+
+
+def available() -> bool:
+    return _fts5["available"]
+
+
+def _row(entry_id: int, entry: dict, volltext: str) -> tuple:
+    absender = entry.get("absender") or ""
+    return (entry_id, entry.get("kategorie") or "",
+            absender if absender != "Unbekannt" else "", entry.get("patient") or "",
+            entry.get("original") or "", entry.get("neu") or "", volltext,
+            entry.get("timestamp", ""), entry.get("postfach", ""))
+
+
+def update(conn: sqlite3.Connection, entries: list, first_id: int):
+    """
+    Neue Historien-Einträge indizieren (innerhalb der laufenden Transaktion).
+    `first_id` ist die id des ersten Eintrags; die übrigen folgen lückenlos.
+    """
+    if not available():
+        return
+    conn.executemany(_INSERT, [_row(first_id + i, entry, entry.get("volltext", ""))
+                               for i, entry in enumerate(entries)])
+
+
+def insert_rows(conn: sqlite3.Connection, rows: list):
+    """Fertige Index-Zeilen (siehe `backfill`) schreiben."""
+    conn.executemany(_INSERT, rows)
+
+
+def _term(word: str) -> str:
+    # unicode61 faltet ß nicht: "weiss" und "weiß" sind verschiedene Tokens
+    word = word.lower()
+    variants = {word, word.replace("ß", "ss"), word.replace("ss", "ß")}
+    terms = [f'"{v}"*' for v in sorted(variants)]
+    return terms[0] if len(terms) == 1 else f"({' OR '.join(terms)})"
+
+
+def to_query(text: str) -> str:
+    """Eingabe → FTS5-Ausdruck: jedes Wort als Wortanfang, alle müssen vorkommen."""
+    return " ".join(_term(word) for word in _WORD.findall(text))
+
+
+def search(conn: sqlite3.Connection, text: str, since: str = "", until: str = "",
+           kategorie: str = "", limit: int = RESULT_LIMIT) -> list:
+    """
+    Treffer, neueste zuerst: [(id, timestamp, Ausschnitt aus der Textebene
+    oder ""), …]. `since`/`until` wie in der Historie ("YYYY-MM-DD", until
+    exklusiv).
+    """
+    query = to_query(text)
+    if not available():
+        return []
+    if kategorie:
+        escaped = kategorie.replace('"', '""')
+        query = f'{query} kategorie:"{escaped}"'.strip()
+    if not query:
+        return []
+    sql = ("SELECT rowid, timestamp, snippet(suche, 5, '«', '»', '…', 12) "
+           "FROM suche WHERE suche MATCH ?")
+    params: list = [query]
+    if since:
+        sql += " AND timestamp >= ?"
+        params.append(since)
+    if until:
+        sql += " AND timestamp < ?"
+        params.append(until)
+    sql += " ORDER BY rowid DESC LIMIT ?"
+    params.append(int(limit))
+    # Ohne Treffer in der Textebene liefert snippet() nur deren Anfang
+    return [(hit_id, timestamp, snippet if "«" in snippet else "")
+            for hit_id, timestamp, snippet in conn.execute(sql, params)]
+
+
+def missing_count(conn: sqlite3.Connection) -> int:
+    """Historien-Einträge ohne Zeile im Suchindex (Einträge werden nie gelöscht)."""
+    if not available():
+        return 0
+    # suche_docsize: eine Zeile je indiziertem Eintrag; zählen geht ohne den Index zu lesen
+    return conn.execute("SELECT (SELECT COUNT(*) FROM eintraege) - "
+                        "(SELECT COUNT(*) FROM suche_docsize)").fetchone()[0]
+
+
+# ──────────────────────────────────────────────────────────────
+# NACHTRAGEN (bestehende Historie)
+# ──────────────────────────────────────────────────────────────
+def _current_path(conn: sqlite3.Connection, entry: dict) -> str:
+    """Wo die Datei heute liegt: laut Eintrag, sonst laut Pfad-Index."""
+    ablage = entry.get("ablage") or {}
+    for area in ("umbenannt", "fehler"):
+        if ablage.get(area) and os.path.exists(ablage[area]):
+            return ablage[area]
+    if entry.get("neu"):
+        for area, path in layout.locate(conn, entry["neu"], limit=5):
+            if area != "archiv" and os.path.basename(path).casefold() == entry["neu"].casefold() \
+                    and os.path.exists(path):
+                return path
+    return ""
+
+
+def backfill(history, progress=None, stop: threading.Event | None = None) -> int:
+    """
+    Fehlende Einträge indizieren, die Textebene aus der heutigen Ablage.
+    Schreibt in kleinen Transaktionen, damit laufende Scans nicht warten.
+    Rückgabe: Anzahl nachgetragener Einträge.
+    """
+    done, after = 0, 0
+    while available() and not (stop and stop.is_set()):
+        with history.reader() as conn:
+            rows = conn.execute(
+                "SELECT e.id, e.data FROM eintraege e WHERE e.id > ? AND NOT EXISTS "
+                "(SELECT 1 FROM suche WHERE suche.rowid = e.id) ORDER BY e.id LIMIT ?",
+                (after, BACKFILL_BATCH)).fetchall()
+            if not rows:
+                break
+            batch = []
+            for entry_id, data in rows:
+                entry = json.loads(data)
+                path = _current_path(conn, entry)
+                batch.append(_row(entry_id, entry, pdf_text(path) if path else ""))
+        history.index_rows(batch)
+        after = rows[-1][0]
+        done += len(rows)
+        if progress:
+            progress(done)
+    if done:
+        logger.info(f"🔍 Suchindex: {done} Einträge nachgetragen.")
+    return done
+
+
+def start_backfill(history) -> bool:
+    """`backfill` im Hintergrund starten (False, wenn schon einer läuft)."""
+    with _backfill_lock:
+        if _backfill["thread"] is not None and _backfill["thread"].is_alive():
+            return False
+        _backfill.update(done=0, error="")
+        _backfill["thread"] = threading.Thread(target=_run_backfill, args=(history,),
+                                               daemon=True, name="suchindex")
+        _backfill["thread"].start()
+    return True
+
+
+def backfill_status() -> dict:
+    """{"running": bool, "done": nachgetragene Einträge, "error": Meldung oder ""}."""
+    with _backfill_lock:
+        thread = _backfill["thread"]
+        return {"running": thread is not None and thread.is_alive(),
+                "done": _backfill["done"], "error": _backfill["error"]}
+
+
+def _run_backfill(history):
+    def progress(done):
+        with _backfill_lock:
+            _backfill["done"] = done
+    try:
+        backfill(history, progress)
+    except sqlite3.Error as e:
+        logger.error(f"🔍 Suchindex nicht vervollständigt: {e}")
+        with _backfill_lock:
+            _backfill["error"] = str(e)
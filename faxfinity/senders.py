@@ -0,0 +1,215 @@
+"""
+Absender-Verzeichnis: Faxnummer → Absender (und Fachrichtung).
+
+Die meisten Faxe kommen von wenigen Dutzend Absendern, und Kopfzeile oder
+Dateiname des Faxservers tragen meist deren Nummer. Trotzdem liest das
+Modell den Absender jedes Mal neu – mit wechselnder Schreibweise
+("Kardiologe Dr. Schneider", "Dr. med. Schneider Kardiologie").
+
+  * Nummern kommen aus der Vorab-Einstufung (faxfinity.priority: "Fax …"
+    in der Textebene, Ziffernfolgen im Dateinamen), einheitlich national
+    geschrieben ("+49 911 4478120" → "09114478120"). Es zählen nur Nummern
+    mit Vorwahl; Zeitstempel im Dateinamen fallen so heraus.
+  * Steht eine Nummer im Verzeichnis, ist der Absender gesetzt: der Prompt
+    fragt nur noch Kategorie und Patient (weniger Tokens, eigene
+    Kassetten-Version), und der Dateiname schreibt den Absender immer gleich.
+  * Gelernt wird aus erfolgreichen Analysen ohne Verzeichnis-Treffer: hat
+    das Modell zu einer Nummer mindestens LEARN_AFTER-mal denselben
+    Absender gelesen (Reihenfolge, Titel, Umlaute egal) und sind das
+    mindestens zwei Drittel aller Lesungen dieser Nummer, wird er
+    eingetragen (und wieder ausgetragen, wenn der Anteil später darunter
+    fällt). Sammelnummern erreichen das nicht; die eigenen Nummern der
+    Praxis (`eigene_faxnummern`, z.B. auf zurückgefaxten Formularen) zählen
+    nie.
+  * In der Sidebar („📠 Absender-Verzeichnis") lassen sich Einträge
+    korrigieren, ergänzen und löschen. Von Hand gepflegte Einträge
+    überschreibt das Lernen nie; ein gelöschter Eintrag vergisst auch seine
+    Lesungen.
+
+Verzeichnis und Lesungen liegen als Tabellen in der Historie und werden im
+selben Commit wie der Historien-Eintrag fortgeschrieben – Oberfläche,
+Auto-Scan, `batch` und weitere Rechner lernen gemeinsam.
+"""
+
+import logging
+import re
+import sqlite3
+from datetime import datetime
+
+from faxfinity import metrics, patients, priority
+
+logger = logging.getLogger("FaxFinity")
+
+LEARN_AFTER = 3  # übereinstimmende Lesungen, bis eine Nummer gelernt wird
+MAX_NUMBERS = 5  # Nummern je Fax, die mitgezählt werden
+COLUMNS = ("nummer", "absender", "fachrichtung", "quelle", "geaendert")
+_IGNORED_WORDS = {"dr", "med", "prof", "dipl", "herr", "frau", "praxis", "und"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS absender_verzeichnis (
+    nummer       TEXT PRIMARY KEY,
+    absender     TEXT NOT NULL,
+    fachrichtung TEXT NOT NULL DEFAULT '',
+    quelle       TEXT NOT NULL,  -- 'gelernt' oder 'manuell'
+    geaendert    TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS absender_lesungen (
+    nummer     TEXT NOT NULL,
+    schluessel TEXT NOT NULL,  -- Absender ohne Schreibweise (siehe sender_key)
+    absender   TEXT NOT NULL,  -- erste gelesene Schreibweise
+    anzahl     INTEGER NOT NULL,
+    PRIMARY KEY (nummer, schluessel)
+) WITHOUT ROWID;
+"""
+_UPSERT = ("INSERT OR REPLACE INTO absender_verzeichnis "
+           "(nummer, absender, fachrichtung, quelle, geaendert) VALUES (?, ?, ?, ?, ?)")
+_COUNT = ("INSERT INTO absender_lesungen (nummer, schluessel, absender, anzahl) "
+          "VALUES (?, ?, ?, 1) ON CONFLICT (nummer, schluessel) DO UPDATE SET anzahl = anzahl + 1")
+
+
+# ──────────────────────────────────────────────────────────────
+# FAXNUMMERN
+# ──────────────────────────────────────────────────────────────
+def normalize(number: str) -> str:
+    """Nur Ziffern, national geschrieben: "+49 (911) 447-8120" → "09114478120"."""
+    digits = re.sub(r"\D", "", number)
+    if digits.startswith("0049"):
+        return "0" + digits[4:]
+    if digits.startswith("49") and len(digits) >= 11:  # "+49…" ohne Plus (priority)
+        return "0" + digits[2:]
+    return digits
+
+
+def plausible(number: str) -> bool:
+    """Telefonnummer mit Vorwahl (nicht: Zeitstempel, Seiten- oder Auftragsnummern)."""
+    return number.startswith("0") and 7 <= len(number) <= 15 \
+        and not (number.startswith("00") and len(number) < 10)
+
+
+def own_numbers(cfg: dict) -> set:
+    """`eigene_faxnummern` ("09131 12345, 09131 12346") normalisiert."""
+    return {normalize(n) for n in re.split(r"[,;\n]", cfg.get("eigene_faxnummern") or "")
+            if normalize(n)}
+
+
+def fax_numbers(pdf_path: str, cfg: dict) -> list:
+    """Fremde Faxnummern eines Dokuments (normalisiert, ohne Doppelte, Fundreihenfolge)."""
+    info = priority.inspect_pdf(pdf_path, cfg.get("fax_number_rules"))
+    numbers, own = [], own_numbers(cfg)
+    for number in map(normalize, info["numbers"]):
+        if plausible(number) and number not in numbers and number not in own:
+            numbers.append(number)
+    return numbers[:MAX_NUMBERS]
+
+
+def sender_key(absender: str) -> str:
+    """Vergleichsschlüssel: "Dr. med. Schneider, Kardiologie" == "Kardiologie Schneider"."""
+    words = {patients.fold(word) for word in absender.split()}
+    return " ".join(sorted(w for w in words if len(w) > 1 and w not in _IGNORED_WORDS))
+
+
+# ──────────────────────────────────────────────────────────────
+# VERZEICHNIS (Tabellen in der Historie)
+# ──────────────────────────────────────────────────────────────
+def ensure_schema(conn: sqlite3.Connection):
+    conn.executescript(SCHEMA)
+
+
+def lookup(conn: sqlite3.Connection, numbers: list) -> dict | None:
+    """Eintrag der ersten bekannten Nummer: {"nummer", "absender", "fachrichtung"} oder None."""
+    if not numbers:
+        metrics.SENDER_LOOKUPS.inc(ergebnis="ohne_nummer")
+        return None
+    known = {row[0]: row for row in conn.execute(
+        "SELECT nummer, absender, fachrichtung FROM absender_verzeichnis "
+        f"WHERE nummer IN ({','.join('?' * len(numbers))})", numbers)}
+    for number in numbers:
+        if number in known:
+            metrics.SENDER_LOOKUPS.inc(ergebnis="bekannt")
+            return dict(zip(("nummer", "absender", "fachrichtung"), known[number]))
+    metrics.SENDER_LOOKUPS.inc(ergebnis="unbekannt")
+    return None
+
+
+def observe(conn: sqlite3.Connection, entries: list):
+    """
+    Lesungen neuer Historien-Einträge zählen und Nummern lernen (innerhalb
+    der laufenden Transaktion). Zählt nur Einträge mit `faxnummern` und
+    einem vom Modell gelesenen Absender.
+    """
+    for entry in entries:
+        absender = (entry.get("absender") or "").strip()
+        numbers = entry.get("faxnummern") or []
+        if not numbers or entry.get("absender_quelle") or absender in ("", "Unbekannt"):
+            continue
+        key = sender_key(absender)
+        if not key:
+            continue
+        for number in numbers:
+            conn.execute(_COUNT, (number, key, absender))
+            _learn(conn, number)
+
+
+def _learn(conn: sqlite3.Connection, number: str):
+    readings = conn.execute("SELECT absender, anzahl FROM absender_lesungen WHERE nummer = ?",
+                            (number,)).fetchall()
+    absender, count = max(readings, key=lambda r: r[1])
+    current = conn.execute("SELECT absender, quelle FROM absender_verzeichnis WHERE nummer = ?",
+                           (number,)).fetchone()
+    if current is not None and current[1] == "manuell":
+        return
+    if count < LEARN_AFTER or 3 * count < 2 * sum(n for _, n in readings):
+        if current is not None:  # andere Prozesse haben inzwischen anders gelesen
+            conn.execute("DELETE FROM absender_verzeichnis WHERE nummer = ?", (number,))
+            logger.info(f"📠 Absender für {number} nicht mehr eindeutig – ausgetragen")
+        return
+    if current is not None and current[0] == absender:
+        return
+    conn.execute(_UPSERT, (number, absender, "", "gelernt",
+                           datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+    logger.info(f"📠 Absender gelernt: {number} → {absender} ({count} Lesungen)")
+
+
+def entries(conn: sqlite3.Connection) -> list:
+    """Alle Einträge für die Oberfläche, nach Absender sortiert."""
+    return [dict(zip(COLUMNS, row)) for row in conn.execute(
+        f"SELECT {', '.join(COLUMNS)} FROM absender_verzeichnis ORDER BY absender COLLATE NOCASE")]
+
+
+def save(conn: sqlite3.Connection, rows: list) -> int:
+    """
+    Bearbeitetes Verzeichnis aus der Oberfläche übernehmen: neue und
+    geänderte Zeilen gelten als von Hand gepflegt, fehlende werden samt
+    ihren Lesungen gelöscht. Rückgabe: Anzahl Änderungen.
+    """
+    current = {number: (absender, fach) for number, absender, fach in conn.execute(
+        "SELECT nummer, absender, fachrichtung FROM absender_verzeichnis")}
+    wanted = {}
+    for row in rows:
+        number = normalize(str(row.get("nummer") or ""))
+        absender = (row.get("absender") or "").strip()
+        if number and absender:
+            wanted[number] = (absender, (row.get("fachrichtung") or "").strip())
+    removed = [(number,) for number in current if number not in wanted]
+    conn.executemany("DELETE FROM absender_verzeichnis WHERE nummer = ?", removed)
+    conn.executemany("DELETE FROM absender_lesungen WHERE nummer = ?", removed)
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    changed = [(number, absender, fach, "manuell", now)
+               for number, (absender, fach) in wanted.items()
+               if current.get(number) != (absender, fach)]
+    conn.executemany(_UPSERT, changed)
+    return len(removed) + len(changed)
+
+
+# ──────────────────────────────────────────────────────────────
+# ANALYSE
+# ──────────────────────────────────────────────────────────────
+def apply(analysis: dict, known: dict) -> dict:
+    """Absender (und Fachrichtung) aus dem Verzeichnis in die Analyse übernehmen."""
+    if analysis.get("absender") not in ("", "Unbekannt", known["absender"]):
+        logger.info(f"  📠 Absender laut Verzeichnis: {known['absender']} "
+                    f"(gelesen: {analysis['absender']})")
+    analysis["absender"] = known["absender"]
+    if known.get("fachrichtung"):
+        analysis["fachrichtung"] = known["fachrichtung"]
+    return analysis
@@ -0,0 +1,215 @@
+"""
+Laufend mitgeführte Statistiken zur Verarbeitungs-Historie.
+
+Statt bei jedem Rerun die Historie zu zählen, aktualisiert der
+Schreib-Thread der Historie (faxfinity.history) in derselben Transaktion,
+in der er neue Einträge schreibt, vorberechnete Tabellen:
+
+  stat_zaehler  – Anzahl je Status, Kategorie, Postfach und Ergebnis (ok/Fehler)
+  stat_stunden  – je Stunde: verarbeitet, erfolgreich, Fehler, größter Rückstau
+  stat_latenz   – je Tag ein Histogramm der Bearbeitungszeit und der Zeit bis
+                  zur Ablage (Grenzen wie faxfinity.metrics.DEFAULT_BUCKETS)
+
+Die Oberfläche liest daraus nur noch wenige Zeilen: Summen in O(1),
+Tageswerte und Perzentile über Wochen aus einigen hundert Buckets.
+Der Rückstau ist der Stand von faxfinity_inbox_queue_depth beim Commit.
+Fehlen die Tabellen in einer bestehenden Historie, werden sie einmalig aus
+den Einträgen aufgebaut.
+"""
+
+import json
+import sqlite3
+from datetime import datetime, timedelta
+
+from faxfinity import metrics
+
+LATENCY_BUCKETS = metrics.DEFAULT_BUCKETS + (float("inf"),)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS stat_zaehler (
+    dimension TEXT NOT NULL,
+    wert      TEXT NOT NULL,
+    anzahl    INTEGER NOT NULL,
+    PRIMARY KEY (dimension, wert)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS stat_stunden (
+    stunde      TEXT PRIMARY KEY,
+    verarbeitet INTEGER NOT NULL,
+    erfolgreich INTEGER NOT NULL,
+    fehler      INTEGER NOT NULL,
+    rueckstau   INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS stat_latenz (
+    tag         TEXT NOT NULL,
+    messgroesse TEXT NOT NULL,
+    grenze      REAL NOT NULL,
+    anzahl      INTEGER NOT NULL,
+    PRIMARY KEY (tag, messgroesse, grenze)
+) WITHOUT ROWID;
+"""
+_UPSERT_ZAEHLER = (
+    "INSERT INTO stat_zaehler VALUES (?, ?, ?) "
+    "ON CONFLICT DO UPDATE SET anzahl = anzahl + excluded.anzahl")
+_UPSERT_STUNDEN = (
+    "INSERT INTO stat_stunden VALUES (?, ?, ?, ?, ?) ON CONFLICT DO UPDATE SET "
+    "verarbeitet = verarbeitet + excluded.verarbeitet, "
+    "erfolgreich = erfolgreich + excluded.erfolgreich, "
+    "fehler = fehler + excluded.fehler, "
+    "rueckstau = MAX(rueckstau, excluded.rueckstau)")
+_UPSERT_LATENZ = (
+    "INSERT INTO stat_latenz VALUES (?, ?, ?, ?) "
+    "ON CONFLICT DO UPDATE SET anzahl = anzahl + excluded.anzahl")
+
+DIMENSIONS = ("status", "kategorie", "postfach")
+MEASURES = {"bearbeitung": "Bearbeitungszeit", "ablage": "Zeit bis zur Ablage"}
+
+
+def _bucket(seconds: float) -> float:
+    return next(b for b in LATENCY_BUCKETS if seconds <= b)
+
+
+def _add(target: dict, key, values: tuple):
+    current = target.get(key)
+    target[key] = values if current is None else tuple(a + b for a, b in zip(current, values))
+
+
+# ──────────────────────────────────────────────────────────────
+# SCHREIBEN (im Commit der Historie)
+# ──────────────────────────────────────────────────────────────
+def ensure_schema(conn: sqlite3.Connection):
+    """Tabellen anlegen; bei einer älteren Historie einmalig nachrechnen."""
+    # IMMEDIATE: öffnen zwei Prozesse gleichzeitig, rechnet nur einer nach
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        existed = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'stat_zaehler'").fetchone()
+        for statement in SCHEMA.split(";"):
+            if statement.strip():
+                conn.execute(statement)
+        if not existed:
+            entries = [json.loads(data) for (data,) in
+                       conn.execute("SELECT data FROM eintraege ORDER BY id")]
+            update(conn, entries, backlog=0)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+def update(conn: sqlite3.Connection, entries: list, backlog: int | None = None):
+    """Zähler für neue Einträge fortschreiben (innerhalb der laufenden Transaktion)."""
+    if not entries:
+        return
+    if backlog is None:
+        backlog = int(metrics.INBOX_QUEUE_DEPTH.get())
+    counters: dict = {}
+    hours: dict = {}
+    latencies: dict = {}
+    for entry in entries:
+        status = entry.get("status", "")
+        ok = status.startswith("✅")
+        _add(counters, ("ok", "1" if ok else "0"), (1,))
+        for dimension in DIMENSIONS:
+            if entry.get(dimension):
+                _add(counters, (dimension, entry[dimension]), (1,))
+        timestamp = entry.get("timestamp", "")
+        _add(hours, timestamp[:13], (1, int(ok), int(not ok)))
+        day = timestamp[:10]
+        total_ms = (entry.get("timings_ms") or {}).get("total")
+        if total_ms is not None:
+            _add(latencies, (day, "bearbeitung", _bucket(total_ms / 1000)), (1,))
+        if entry.get("time_to_file_s") is not None:
+            _add(latencies, (day, "ablage", _bucket(entry["time_to_file_s"])), (1,))
+    conn.executemany(_UPSERT_ZAEHLER, [k + v for k, v in counters.items()])
+    conn.executemany(_UPSERT_STUNDEN, [(k,) + v + (backlog,) for k, v in hours.items()])
+    conn.executemany(_UPSERT_LATENZ, [k + v for k, v in latencies.items()])
+
+
+# ──────────────────────────────────────────────────────────────
+# LESEN
+# ──────────────────────────────────────────────────────────────
+def totals(conn: sqlite3.Connection) -> dict:
+    """{"total", "success", "errors"} aus den Zählern."""
+    values = dict(conn.execute(
+        "SELECT wert, anzahl FROM stat_zaehler WHERE dimension = 'ok'").fetchall())
+    success, errors = values.get("1", 0), values.get("0", 0)
+    return {"total": success + errors, "success": success, "errors": errors}
+
+
+def counts(conn: sqlite3.Connection, dimension: str) -> dict:
+    """Anzahl je Wert einer Dimension (status, kategorie, postfach), häufigste zuerst."""
+    return dict(conn.execute(
+        "SELECT wert, anzahl FROM stat_zaehler WHERE dimension = ? ORDER BY anzahl DESC, wert",
+        (dimension,)).fetchall())
+
+
+def hourly(conn: sqlite3.Connection, hours: int = 48) -> list:
+    """Die letzten `hours` Stunden, lückenlos (Stunden ohne Faxe mit 0)."""
+    now = datetime.now().replace(minute=0, second=0, microsecond=0)
+    start = now - timedelta(hours=hours - 1)
+    rows = {r[0]: r[1:] for r in conn.execute(
+        "SELECT stunde, verarbeitet, erfolgreich, fehler, rueckstau FROM stat_stunden "
+        "WHERE stunde >= ?", (start.strftime("%Y-%m-%d %H"),))}
+    result = []
+    for i in range(hours):
+        key = (start + timedelta(hours=i)).strftime("%Y-%m-%d %H")
+        verarbeitet, erfolgreich, fehler, rueckstau = rows.get(key, (0, 0, 0, 0))
+        result.append({"Stunde": key + ":00", "Verarbeitet": verarbeitet,
+                       "Erfolgreich": erfolgreich, "Fehler": fehler, "Rückstau": rueckstau})
+    return result
+
+
+def daily(conn: sqlite3.Connection, days: int = 28) -> list:
+    """Tageswerte der letzten `days` Tage (aus den Stunden-Buckets)."""
+    start = datetime.now().date() - timedelta(days=days - 1)
+    rows = {r[0]: r[1:] for r in conn.execute(
+        "SELECT substr(stunde, 1, 10) AS tag, SUM(verarbeitet), SUM(erfolgreich), "
+        "SUM(fehler), MAX(rueckstau) FROM stat_stunden WHERE stunde >= ? GROUP BY tag",
+        (start.isoformat(),))}
+    result = []
+    for i in range(days):
+        key = (start + timedelta(days=i)).isoformat()
+        verarbeitet, erfolgreich, fehler, rueckstau = rows.get(key, (0, 0, 0, 0))
+        result.append({"Tag": key, "Verarbeitet": verarbeitet, "Erfolgreich": erfolgreich,
+                       "Fehler": fehler, "Rückstau": rueckstau})
+    return result
+
+
+def histogram_quantile(buckets: list, q: float) -> float:
+    """
+    Quantil aus (Obergrenze, Anzahl)-Paaren, linear innerhalb des Buckets
+    interpoliert (wie histogram_quantile in Prometheus).
+    """
+    total = sum(n for _, n in buckets)
+    if not total:
+        return 0.0
+    rank = q * total
+    lower, seen = 0.0, 0
+    for upper, n in sorted(buckets):
+        if seen + n >= rank and n:
+            if upper == float("inf"):
+                return lower  # Mehr als die größte Grenze lässt sich nicht sagen
+            return lower + (upper - lower) * (rank - seen) / n
+        seen += n
+        lower = upper
+    return lower
+
+
+def latency(conn: sqlite3.Connection, days: int = 7) -> list:
+    """p50/p95 je Messgröße über die letzten `days` Tage."""
+    since = (datetime.now().date() - timedelta(days=days - 1)).isoformat()
+    per_measure: dict = {}
+    for measure, upper, n in conn.execute(
+            "SELECT messgroesse, grenze, SUM(anzahl) FROM stat_latenz WHERE tag >= ? "
+            "GROUP BY messgroesse, grenze", (since,)):
+        per_measure.setdefault(measure, []).append((upper, n))
+    return [
+        {
+            "Messgröße": label,
+            "Anzahl": sum(n for _, n in per_measure[measure]),
+            "p50 s": round(histogram_quantile(per_measure[measure], 0.5), 1),
+            "p95 s": round(histogram_quantile(per_measure[measure], 0.95), 1),
+        }
+        for measure, label in MEASURES.items()
+        if measure in per_measure
+    ]
@@ -0,0 +1,211 @@
+"""
+Zeitmessung der Verarbeitungsschritte pro Dokument.
+
+Jedes Fax durchläuft Backup, Speicher-Zulassung, Rendern, Textebene,
+Absender-Verzeichnis, PNG-Encoding, Ollama-Anfrage, Parsen, Abgleich mit
+Absender-Verzeichnis und Patientenliste, Verschieben und Log-Schreiben. Die
+Dauer jedes Schritts wird in Millisekunden mit dem Log-Eintrag gespeichert;
+Ollamas eigene Zeiten (Modell laden, Prompt auswerten, Generieren) kommen
+aus der API-Antwort.
+
+Zusätzlich merkt sich das Modul prozessweit, welches Dokument gerade in
+welchem Schritt steckt (`track_document`, `activity`) – für die Live-Anzeige
+der Oberfläche, ohne dass diese auf den Worker warten muss.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+# Reihenfolge für Anzeige und Export
+STAGES = (
+    "backup",
+    "admission",
+    "render",
+    "text",
+    "sender",
+    "encode",
+    "request",
+    "ollama_load",
+    "ollama_prompt_eval",
+    "ollama_eval",
+    "parse",
+    "match",
+    "move",
+    "log_write",
+    "total",
+)
+
+# Anzeige-Namen der Schritte für die Live-Anzeige
+STAGE_LABELS = {
+    "backup": "💾 Backup",
+    "admission": "⏳ Wartet auf Speicher",
+    "render": "🖼️ Rendern",
+    "text": "🔤 Textebene",
+    "sender": "📠 Absender-Verzeichnis",
+    "encode": "🖼️ Kodieren",
+    "request": "🤖 Ollama-Analyse",
+    "parse": "🔍 Auswerten",
+    "match": "🧩 Abgleich",
+    "move": "📁 Verschieben",
+    "log_write": "📝 Log",
+}
+
+# Ollama-Antwortfelder (Nanosekunden) → Schrittname
+OLLAMA_DURATION_FIELDS = {
+    "load_duration": "ollama_load",
+    "prompt_eval_duration": "ollama_prompt_eval",
+    "eval_duration": "ollama_eval",
+}
+
+
+class StageTimer:
+    """
+    Sammelt Schrittdauern eines Dokuments.
+    Ein optionaler `hook` erhält stage_started(name) / stage_finished(name, s)
+    – genutzt z.B. vom Profiler, um pro Schritt den Speicher zu messen.
+    """
+
+    def __init__(self, hook=None):
+        self._start = time.perf_counter()
+        self.timings: dict[str, float] = {}  # Sekunden
+        self.hook = hook
+
+    @contextmanager
+    def stage(self, name: str):
+        _set_stage(name)
+        if self.hook is not None:
+            self.hook.stage_started(name)
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - t0
+            self.add(name, seconds)
+            if self.hook is not None:
+                self.hook.stage_finished(name, seconds)
+
+    def add(self, name: str, seconds: float):
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+    def add_ollama_durations(self, response_data: dict):
+        """Übernimm load/prompt_eval/eval-Dauer aus einer Ollama-Antwort."""
+        for field, name in OLLAMA_DURATION_FIELDS.items():
+            value = response_data.get(field)
+            if isinstance(value, (int, float)):
+                self.add(name, value / 1e9)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._start
+
+    def as_ms(self) -> dict:
+        """Schrittdauern in ms, gerundet, in fester Reihenfolge."""
+        ordered = {k: self.timings[k] for k in STAGES if k in self.timings}
+        ordered.update({k: v for k, v in self.timings.items() if k not in ordered})
+        return {k: round(v * 1000, 1) for k, v in ordered.items()}
+
+
+# ──────────────────────────────────────────────────────────────
+# LAUFENDE DOKUMENTE (prozessweit, für die Live-Anzeige)
+# ──────────────────────────────────────────────────────────────
+_activity: dict = {}  # Thread-ID → aktuelles Dokument
+_activity_lock = threading.Lock()
+
+
+@contextmanager
+def track_document(name: str, postfach: str = ""):
+    """Markiert für die Dauer des Blocks `name` als in Bearbeitung (je Thread)."""
+    key = threading.get_ident()
+    now = time.monotonic()
+    with _activity_lock:
+        _activity[key] = {"file": name, "postfach": postfach, "stage": "",
+                          "started": now, "stage_started": now}
+    try:
+        yield
+    finally:
+        with _activity_lock:
+            _activity.pop(key, None)
+
+
+def _set_stage(name: str):
+    with _activity_lock:
+        entry = _activity.get(threading.get_ident())
+        if entry is not None:
+            entry["stage"] = name
+            entry["stage_started"] = time.monotonic()
+
+
+def activity() -> list:
+    """
+    Dokumente in Bearbeitung (älteste zuerst): file, postfach, stage,
+    elapsed_s (seit Beginn), stage_s (im aktuellen Schritt).
+    """
+    now = time.monotonic()
+    with _activity_lock:
+        entries = [dict(e) for e in _activity.values()]
+    entries.sort(key=lambda e: e["started"])
+    return [
+        {
+            "file": e["file"],
+            "postfach": e["postfach"],
+            "stage": e["stage"],
+            "elapsed_s": round(now - e["started"], 1),
+            "stage_s": round(now - e["stage_started"], 1),
+        }
+        for e in entries
+    ]
+
+
+def percentile(values: list, p: float) -> float:
+    """Lineare Interpolation zwischen den nächsten Rängen."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def stage_percentiles(log_entries: list, last_n: int = 50) -> list:
+    """
+    p50/p95 je Schritt über die letzten `last_n` Log-Einträge mit Zeitmessung.
+    Rückgabe: Liste von dicts (Schritt, Anzahl, p50_ms, p95_ms).
+    """
+    timed = [e["timings_ms"] for e in log_entries if e.get("timings_ms")][-last_n:]
+    per_stage: dict[str, list] = {}
+    for timings in timed:
+        for stage, ms in timings.items():
+            per_stage.setdefault(stage, []).append(ms)
+
+    order = list(STAGES) + sorted(set(per_stage) - set(STAGES))
+    return [
+        {
+            "Schritt": stage,
+            "Anzahl": len(per_stage[stage]),
+            "p50 ms": round(percentile(per_stage[stage], 50), 1),
+            "p95 ms": round(percentile(per_stage[stage], 95), 1),
+        }
+        for stage in order
+        if stage in per_stage
+    ]
+
+
+def time_to_file_by_category(entries: list, last_n: int = 500) -> dict:
+    """
+    Zeit vom Eingang bis zur Ablage je Kategorie (aus Log-Einträgen oder
+    Verarbeitungsergebnissen mit `kategorie` und `time_to_file_s`).
+    Rückgabe: {Kategorie: {"count", "p50_s", "p95_s"}}, sortiert nach p50.
+    """
+    per_category: dict[str, list] = {}
+    for e in [e for e in entries if e.get("time_to_file_s") is not None][-last_n:]:
+        per_category.setdefault(e.get("kategorie") or "?", []).append(e["time_to_file_s"])
+    stats = {
+        kategorie: {
+            "count": len(values),
+            "p50_s": round(percentile(values, 50), 1),
+            "p95_s": round(percentile(values, 95), 1),
+        }
+        for kategorie, values in per_category.items()
+    }
+    return dict(sorted(stats.items(), key=lambda kv: kv[1]["p50_s"]))
@@ -10,648 +10,48 @@ eingehender Fax-PDFs mittels Vision-LLM (Ollama).
 Entwickelt für: Praxis Dr. med. Florian Rasche
 """
 
+import sys
+
+if __name__ == "__main__" and "streamlit" not in sys.modules:
+    # Kommandozeile: Streamlit und die UI werden gar nicht erst geladen
+    from faxfinity.cli import cli
+    sys.exit(cli(sys.argv[1:]))
+
 import streamlit as st
 import os
-import json
-import time
-import shutil
-import base64
 import re
-import uuid
-import threading
-import logging
-from pathlib import Path
+import shutil
+import time
 from datetime import datetime, timedelta
-from io import BytesIO
-
-import requests
-from PIL import Image
-
-try:
-    import fitz  # PyMuPDF
-    PYMUPDF_AVAILABLE = True
-except ImportError:
-    PYMUPDF_AVAILABLE = False
-
-try:
-    from pdf2image import convert_from_path
-    PDF2IMAGE_AVAILABLE = True
-except ImportError:
-    PDF2IMAGE_AVAILABLE = False
-
-# ──────────────────────────────────────────────────────────────
-# LOGGING
-# ──────────────────────────────────────────────────────────────
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
-)
-logger = logging.getLogger("FaxFinity")
-
-# ──────────────────────────────────────────────────────────────
-# CONSTANTS & DEFAULTS
-# ──────────────────────────────────────────────────────────────
-CONFIG_FILE = "config.json"
-DEFAULT_CONFIG = {
-    "eingangsordner": "",
-    "ollama_url": "http://localhost:11434",
-    "ollama_model": "llama3.2-vision",
-    "eigener_name": "Dr. med. Florian Rasche, Huttenstr. 6",
-    "scan_interval": 120,  # Sekunden
-    "poppler_path": "",  # Optional: Pfad zu Poppler/bin
-}
-LOG_MAX_ENTRIES = 50
-
-
-# ──────────────────────────────────────────────────────────────
-# CONFIG PERSISTENCE
-# ──────────────────────────────────────────────────────────────
-def load_config() -> dict:
-    """Lade Konfiguration aus JSON-Datei oder erstelle Defaults."""
-    if os.path.exists(CONFIG_FILE):
-        try:
-            with open(CONFIG_FILE, "r", encoding="utf-8") as f:
-                cfg = json.load(f)
-            # Merge mit Defaults für neue Keys
-            for k, v in DEFAULT_CONFIG.items():
-                if k not in cfg:
-                    cfg[k] = v
-            return cfg
-        except Exception:
-            pass
-    return DEFAULT_CONFIG.copy()
-
-
-def save_config(cfg: dict):
-    """Speichere Konfiguration als JSON."""
-    with open(CONFIG_FILE, "w", encoding="utf-8") as f:
-        json.dump(cfg, f, indent=2, ensure_ascii=False)
-
-
-# ──────────────────────────────────────────────────────────────
-# PROCESSING LOG
-# ──────────────────────────────────────────────────────────────
-LOG_FILE = "processing_log.json"
-
-
-def load_processing_log() -> list:
-    """Lade Verarbeitungs-Log."""
-    if os.path.exists(LOG_FILE):
-        try:
-            with open(LOG_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception:
-            pass
-    return []
-
-
-def save_processing_log(log_entries: list):
-    """Speichere Verarbeitungs-Log."""
-    with open(LOG_FILE, "w", encoding="utf-8") as f:
-        json.dump(log_entries[-LOG_MAX_ENTRIES:], f, indent=2, ensure_ascii=False)
-
-
-def add_log_entry(
-    original_name: str,
-    new_name: str,
-    status: str,
-    kategorie: str = "",
-    absender: str = "",
-    patient: str = "",
-    details: str = "",
-):
-    """Füge einen Eintrag zum Log hinzu."""
-    entries = load_processing_log()
-    entries.append(
-        {
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "original": original_name,
-            "neu": new_name,
-            "status": status,
-            "kategorie": kategorie,
-            "absender": absender,
-            "patient": patient,
-            "details": details,
-        }
-    )
-    save_processing_log(entries)
-
-
-# ──────────────────────────────────────────────────────────────
-# HELPER: ORDNER ERSTELLEN
-# ──────────────────────────────────────────────────────────────
-def ensure_subdirs(base: str):
-    """Erstelle Unterordner Archiv, Umbenannt, Fehler."""
-    for sub in ["Archiv", "Umbenannt", "Fehler"]:
-        p = os.path.join(base, sub)
-        os.makedirs(p, exist_ok=True)
-    return {
-        "archiv": os.path.join(base, "Archiv"),
-        "umbenannt": os.path.join(base, "Umbenannt"),
-        "fehler": os.path.join(base, "Fehler"),
-    }
-
-
-# ──────────────────────────────────────────────────────────────
-# HELPER: SICHERE DATEINAMEN
-# ──────────────────────────────────────────────────────────────
-def sanitize_filename(name: str) -> str:
-    """Entferne unerlaubte Zeichen aus Dateinamen."""
-    # Erlaube nur Buchstaben, Zahlen, Unterstriche, Bindestriche, Punkte
-    name = re.sub(r"[^\w\-.]", "_", name, flags=re.UNICODE)
-    # Entferne doppelte Unterstriche
-    name = re.sub(r"_+", "_", name)
-    # Entferne führende/trailing Unterstriche
-    name = name.strip("_")
-    return name
-
-
-def unique_filepath(directory: str, filename: str) -> str:
-    """Stelle sicher, dass der Dateiname eindeutig ist."""
-    filepath = os.path.join(directory, filename)
-    if not os.path.exists(filepath):
-        return filepath
-    base, ext = os.path.splitext(filename)
-    counter = 1
-    while True:
-        new_name = f"{base}_{counter}{ext}"
-        new_path = os.path.join(directory, new_name)
-        if not os.path.exists(new_path):
-            return new_path
-        counter += 1
-
-
-# ──────────────────────────────────────────────────────────────
-# OLLAMA API
-# ──────────────────────────────────────────────────────────────
-def fetch_ollama_models(ollama_url: str) -> list:
-    """Hole verfügbare Modelle von Ollama."""
-    try:
-        resp = requests.get(f"{ollama_url}/api/tags", timeout=10)
-        resp.raise_for_status()
-        data = resp.json()
-        models = [m["name"] for m in data.get("models", [])]
-        return sorted(models)
-    except Exception as e:
-        logger.warning(f"Ollama-Modelle konnten nicht geladen werden: {e}")
-        return []
-
-
-def analyze_image_with_ollama(
-    image: Image.Image,
-    ollama_url: str,
-    model: str,
-    eigener_name: str,
-) -> dict | None:
-    """
-    Sende ein Bild an Ollama Vision und erhalte strukturierte Analyse.
-    Gibt ein dict zurück: {'kategorie': ..., 'absender': ..., 'patient': ...}
-    oder None bei Fehler.
-
-    Nutzt /api/chat mit System-Prompt für saubere Kontext-Isolation
-    zwischen aufeinanderfolgenden PDFs.
-    """
-    # Bild → Base64
-    buffer = BytesIO()
-    image.save(buffer, format="PNG")
-    img_base64 = base64.b64encode(buffer.getvalue()).decode("utf-8")
-
-    # Eindeutige Request-ID verhindert Kontext-Vermischung
-    request_id = uuid.uuid4().hex[:8]
-
-    system_prompt = (
-        f"Du bist ein Fax-Analyse-Assistent für eine Arztpraxis. "
-        f"Dies ist eine NEUE, UNABHÄNGIGE Analyse (ID: {request_id}). "
-        f"Vergiss alles aus vorherigen Analysen komplett. "
-        f"Analysiere NUR das beigefügte Bild. "
-        f"Der Empfänger ist '{eigener_name}' — dieser Name darf NIEMALS "
-        f"als Absender oder Patient in deiner Antwort erscheinen. "
-        f"Antworte AUSSCHLIESSLICH im JSON-Format. "
-        f"Verwende KEINE Beispielnamen — nur das, was du tatsächlich im Dokument liest."
-    )
-
-    user_prompt = (
-        f"Analysiere dieses Fax-Dokument (ID: {request_id}).\n\n"
-        f"Lies das Dokument aufmerksam und identifiziere:\n\n"
-        f"1. KATEGORIE — wähle die passendste:\n"
-        f"   Arztbrief, Labor, Medikationsplan, Sturzprotokoll, "
-        f"   Rezeptanforderung, Bestellung, Werbung, Kommunikation, "
-        f"   Überweisung, Befund\n"
-        f"   Falls keine passt, erfinde eine kurze treffende Kategorie.\n\n"
-        f"2. ABSENDER — wer hat das Fax gesendet?\n"
-        f"   Lies den tatsächlichen Namen und ggf. Fachrichtung aus dem Dokument.\n"
-        f"   Der Empfänger '{eigener_name}' ist NICHT der Absender!\n\n"
-        f"3. PATIENT — Nachname des Patienten, falls im Dokument erkennbar.\n\n"
-        f"Antworte NUR mit diesem JSON, sonst nichts:\n"
-        f'{{\"kategorie\": \"...\", \"absender\": \"...\", \"patient\": \"...\"}}'
-    )
 
-    payload = {
-        "model": model,
-        "messages": [
-            {
-                "role": "system",
-                "content": system_prompt,
-            },
-            {
-                "role": "user",
-                "content": user_prompt,
-                "images": [img_base64],
-            },
-        ],
-        "stream": False,
-        "options": {
-            "temperature": 0.1,
-            "num_ctx": 4096,  # Genug für Bild-Tokens + Analyse
-        },
-        "keep_alive": "5s",  # Kurzes Behalten für Performance, aber schnelles Freigeben
-    }
-
-    try:
-        resp = requests.post(
-            f"{ollama_url}/api/chat",
-            json=payload,
-            timeout=180,
-        )
-        resp.raise_for_status()
-        response_data = resp.json()
-        raw_response = response_data.get("message", {}).get("content", "")
-        logger.info(f"Ollama Antwort [{request_id}]: {raw_response}")
-        return parse_ollama_response(raw_response, eigener_name)
-    except requests.exceptions.Timeout:
-        logger.error("Ollama Timeout – Modell hat zu lange gebraucht.")
-        return None
-    except requests.exceptions.ConnectionError:
-        logger.error("Ollama nicht erreichbar. Ist der Server gestartet?")
-        return None
-    except Exception as e:
-        logger.error(f"Ollama Fehler: {e}")
-        return None
-
-
-def parse_ollama_response(raw: str, eigener_name: str = "") -> dict | None:
-    """Parse die JSON-Antwort von Ollama, auch wenn sie in Text eingebettet ist."""
-    # Repariere doppelte Unicode-Escapes (z.B. \u\u00f6 → \u00f6)
-    cleaned = re.sub(r'\\u\\u([0-9a-fA-F]{4})', r'\\u\1', raw)
-    # Auch einfache Variante: \u\u → \u
-    cleaned = re.sub(r'\\u(?=\\u[0-9a-fA-F]{4})', '', cleaned)
-
-    # Versuche direktes JSON-Parsing
-    for text in [cleaned, raw]:
-        try:
-            data = json.loads(text)
-            if isinstance(data, dict):
-                return normalize_analysis(data, eigener_name)
-        except json.JSONDecodeError:
-            pass
-
-    # Versuche JSON aus dem Text zu extrahieren
-    json_patterns = [
-        r"```json\s*(\{[^{}]*\})\s*```",  # Code-Block
-        r"```\s*(\{[^{}]*\})\s*```",  # Code-Block ohne Sprache
-        r"\{[^{}]*\}",  # Einfaches JSON-Objekt
-    ]
-
-    for text in [cleaned, raw]:
-        for pattern in json_patterns:
-            matches = re.findall(pattern, text, re.DOTALL)
-            for match in matches:
-                try:
-                    data = json.loads(match)
-                    if isinstance(data, dict):
-                        return normalize_analysis(data, eigener_name)
-                except json.JSONDecodeError:
-                    continue
-
-    # ── FALLBACK: Markdown-/Freitext-Parsing ──────────────────
-    # Ollama antwortet manchmal im Format:
-    # **Kategorie:** Arztbrief
-    # **Absender:** Dr. Müller
-    logger.info("  ℹ JSON nicht gefunden, versuche Markdown-Parsing...")
-    result = _parse_markdown_response(raw)
-    if result:
-        return normalize_analysis(result, eigener_name)
-
-    logger.warning(f"Konnte Antwort nicht parsen: {raw[:200]}")
-    return None
-
-
-def _parse_markdown_response(raw: str) -> dict | None:
-    """
-    Fallback-Parser für Markdown-formatierte Antworten von Ollama.
-    Erkennt Muster wie:
-      **Kategorie:** Arztbrief
-      Kategorie: Arztbrief
-      - Kategorie: Arztbrief
-    """
-    result = {}
-    patterns = {
-        "kategorie": [
-            r"\*\*Kategorie[:\*]*\*\*\s*:?\s*(.+?)(?:\n|$)",
-            r"(?:^|\n)\s*[-•]?\s*Kategorie\s*:\s*(.+?)(?:\n|$)",
-            r"Kategorie[:\s]+([A-ZÄÖÜ][a-zäöüß-]+)",
-        ],
-        "absender": [
-            r"\*\*Absender[:\*]*\*\*\s*:?\s*(.+?)(?:\n|$)",
-            r"(?:^|\n)\s*[-•]?\s*Absender\s*:\s*(.+?)(?:\n|$)",
-        ],
-        "patient": [
-            r"\*\*Patient[:\*]*\*\*\s*:?\s*(.+?)(?:\n|$)",
-            r"(?:^|\n)\s*[-•]?\s*Patient\s*:\s*(.+?)(?:\n|$)",
-        ],
-    }
-
-    for key, key_patterns in patterns.items():
-        for pattern in key_patterns:
-            match = re.search(pattern, raw, re.IGNORECASE)
-            if match:
-                value = match.group(1).strip().strip("*").strip()
-                # Entferne Klammerbemerkungen am Ende
-                value = re.sub(r"\s*\(.*\)\s*$", "", value)
-                result[key] = value
-                break
-
-    if result.get("kategorie"):
-        logger.info(f"  ✓ Markdown-Parsing erfolgreich: {result}")
-        return result
-
-    return None
-
-
-def _contains_own_name(text: str, eigener_name: str) -> bool:
-    """Prüfe ob der Text den eigenen Namen (Empfänger) enthält."""
-    if not eigener_name or not text:
-        return False
-    text_lower = text.lower()
-    # Prüfe den vollständigen Namen
-    if eigener_name.lower() in text_lower:
-        return True
-    # Prüfe einzelne relevante Namensbestandteile (mind. 3 Buchstaben)
-    # Ignoriere Titel, Abkürzungen und Adressen
-    ignore_parts = {"dr", "dr.", "med", "med.", "prof", "prof.", "str", "str.",
-                    "huttenstr", "huttenstr.", "praxis", "herr", "frau"}
-    name_parts = [p.strip(".,") for p in eigener_name.split()]
-    significant_parts = [p for p in name_parts
-                         if len(p) >= 3 and p.lower() not in ignore_parts]
-    for part in significant_parts:
-        if part.lower() in text_lower:
-            return True
-    return False
-
-
-def normalize_analysis(data: dict, eigener_name: str = "") -> dict:
-    """Normalisiere die Analysedaten und filtere den Empfängernamen heraus."""
-    result = {
-        "kategorie": str(data.get("kategorie", data.get("Kategorie", "Befund"))).strip(),
-        "absender": str(data.get("absender", data.get("Absender", "Unbekannt"))).strip(),
-        "patient": str(data.get("patient", data.get("Patient", ""))).strip(),
-    }
-
-    # Leere Werte behandeln
-    empty_values = ("", "none", "null", "n/a", "-", "unbekannt",
-                    "nicht erkennbar", "nicht ersichtlich", "nicht angegeben",
-                    "keine angabe", "keine", "k.a.", "k. a.", "n.a.",
-                    "kein angabe", "nicht vorhanden", "nicht bekannt")
-    if not result["kategorie"] or result["kategorie"].lower().strip() in empty_values:
-        result["kategorie"] = "Befund"
-    if not result["absender"] or result["absender"].lower().strip() in empty_values:
-        result["absender"] = "Unbekannt"
-    if not result["patient"] or result["patient"].lower().strip() in empty_values:
-        result["patient"] = ""
-
-    # ── EIGENER NAME FILTER ──────────────────────────────────
-    # Wenn der Empfängername im Absender steht, wurde er fälschlich erkannt
-    if eigener_name and _contains_own_name(result["absender"], eigener_name):
-        logger.warning(f"  ⚠ Eigener Name im Absender erkannt: '{result['absender']}' → entfernt")
-        result["absender"] = "Unbekannt"
-
-    # Wenn der Empfängername im Patient steht, wurde er fälschlich erkannt
-    if eigener_name and _contains_own_name(result["patient"], eigener_name):
-        logger.warning(f"  ⚠ Eigener Name im Patient erkannt: '{result['patient']}' → entfernt")
-        result["patient"] = ""
-
-    return result
-
-
-# ──────────────────────────────────────────────────────────────
-# PDF → IMAGE
-# ──────────────────────────────────────────────────────────────
-def pdf_to_image(pdf_path: str, poppler_path: str = "") -> Image.Image | None:
-    """
-    Konvertiere die erste Seite einer PDF in ein Bild.
-    Versucht zuerst PyMuPDF (braucht kein Poppler), dann pdf2image als Fallback.
-    """
-    # ── Methode 1: PyMuPDF (bevorzugt, keine externe Dependency) ──
-    if PYMUPDF_AVAILABLE:
-        try:
-            doc = fitz.open(pdf_path)
-            if len(doc) > 0:
-                page = doc[0]
-                # Hohe Auflösung: 300 DPI (Standard ist 72)
-                mat = fitz.Matrix(300 / 72, 300 / 72)
-                pix = page.get_pixmap(matrix=mat)
-                img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-                doc.close()
-                logger.info(f"  ✓ PDF→Bild via PyMuPDF ({pix.width}x{pix.height}px)")
-                return img
-            doc.close()
-        except Exception as e:
-            logger.warning(f"  PyMuPDF Fehler: {e} – versuche pdf2image...")
-
-    # ── Methode 2: pdf2image + Poppler (Fallback) ──
-    if PDF2IMAGE_AVAILABLE:
-        try:
-            kwargs = {"first_page": 1, "last_page": 1, "dpi": 300}
-            if poppler_path and os.path.isdir(poppler_path):
-                kwargs["poppler_path"] = poppler_path
-            images = convert_from_path(pdf_path, **kwargs)
-            if images:
-                logger.info(f"  ✓ PDF→Bild via pdf2image/Poppler")
-                return images[0]
-        except Exception as e:
-            logger.warning(f"  pdf2image Fehler: {e}")
-
-    logger.error(f"  ✗ PDF→Bild fehlgeschlagen für {pdf_path}. "
-                 f"PyMuPDF={PYMUPDF_AVAILABLE}, pdf2image={PDF2IMAGE_AVAILABLE}")
-    return None
-
-
-# ──────────────────────────────────────────────────────────────
-# DATEINAME GENERIEREN
-# ──────────────────────────────────────────────────────────────
-def generate_new_filename(analysis: dict, timestamp: str) -> str:
-    """
-    Generiere den neuen Dateinamen basierend auf der Analyse.
-    Schema:
-      - Werbung: Werbung_[Zeitstempel].pdf
-      - Arztbrief: Arztbrief_[Fachrichtung]_[Absender]_[Patient]_[Zeitstempel].pdf
-      - Sonstige: [Kategorie]_[Absender]_[Patient]_[Zeitstempel].pdf
-    """
-    kat = analysis.get("kategorie", "Sonstiges")
-    absender = analysis.get("absender", "Unbekannt")
-    patient = analysis.get("patient", "")
-
-    if kat.lower() == "werbung":
-        filename = f"Werbung_{timestamp}.pdf"
-    elif kat.lower() == "arztbrief":
-        # Fachrichtung aus Absender extrahieren (z.B. "Kardiologe Müller")
-        parts = absender.split()
-        if len(parts) >= 2:
-            fachrichtung = parts[0]
-            arzt_name = "_".join(parts[1:])
-        else:
-            fachrichtung = "Arzt"
-            arzt_name = absender if absender != "Unbekannt" else ""
-
-        components = ["Arztbrief", fachrichtung]
-        if arzt_name:
-            components.append(arzt_name)
-        if patient:
-            components.append(patient)
-        components.append(timestamp)
-        filename = "_".join(components) + ".pdf"
-    else:
-        components = [kat]
-        if absender and absender != "Unbekannt":
-            components.append(absender)
-        if patient:
-            components.append(patient)
-        components.append(timestamp)
-        filename = "_".join(components) + ".pdf"
-
-    return sanitize_filename(filename)
-
-
-# ──────────────────────────────────────────────────────────────
-# HAUPTVERARBEITUNG EINER DATEI
-# ──────────────────────────────────────────────────────────────
-def process_single_pdf(pdf_path: str, cfg: dict, dirs: dict) -> dict:
-    """
-    Verarbeite eine einzelne PDF-Datei.
-    Rückgabe: dict mit Ergebnis-Informationen.
-    """
-    original_name = os.path.basename(pdf_path)
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    result = {"original": original_name, "status": "pending", "new_name": ""}
-
-    logger.info(f"{'='*60}")
-    logger.info(f"▶ Verarbeite: {original_name}")
-
-    # ── SCHRITT 1: BACKUP (CRITICAL) ──────────────────────────
-    try:
-        archive_name = f"{timestamp}_{original_name}"
-        archive_path = unique_filepath(dirs["archiv"], archive_name)
-        shutil.copy2(pdf_path, archive_path)
-        logger.info(f"  ✓ Backup: {os.path.basename(archive_path)}")
-    except Exception as e:
-        logger.error(f"  ✗ Backup fehlgeschlagen: {e}")
-        result["status"] = "backup_error"
-        result["details"] = str(e)
-        add_log_entry(original_name, "", "❌ Backup-Fehler", details=str(e))
-        return result
-
-    # ── SCHRITT 2: PDF → BILD ─────────────────────────────────
-    image = pdf_to_image(pdf_path, cfg.get("poppler_path", ""))
-    if image is None:
-        logger.error(f"  ✗ PDF konnte nicht in Bild konvertiert werden.")
-        error_dest = unique_filepath(dirs["fehler"], f"KONVERTIERUNG_{timestamp}_{original_name}")
-        try:
-            shutil.move(pdf_path, error_dest)
-        except Exception:
-            pass
-        result["status"] = "conversion_error"
-        add_log_entry(original_name, "", "❌ Konvertierungsfehler",
-                      details="PDF→Bild fehlgeschlagen")
-        return result
-
-    # ── SCHRITT 3: VISION-ANALYSE ─────────────────────────────
-    logger.info(f"  ⏳ Sende an Ollama ({cfg['ollama_model']})...")
-    analysis = analyze_image_with_ollama(
-        image=image,
-        ollama_url=cfg["ollama_url"],
-        model=cfg["ollama_model"],
-        eigener_name=cfg["eigener_name"],
-    )
-
-    if analysis is None:
-        logger.warning(f"  ✗ Ollama-Analyse fehlgeschlagen → /Fehler")
-        error_dest = unique_filepath(dirs["fehler"], f"ANALYSE_{timestamp}_{original_name}")
-        try:
-            shutil.move(pdf_path, error_dest)
-        except Exception:
-            pass
-        result["status"] = "analysis_error"
-        add_log_entry(original_name, os.path.basename(error_dest),
-                      "⚠️ Analyse-Fehler → /Fehler",
-                      details="Ollama nicht erreichbar oder Parsing fehlgeschlagen")
-        return result
-
-    logger.info(f"  ✓ Analyse: Kat={analysis['kategorie']}, "
-                f"Abs={analysis['absender']}, Pat={analysis['patient']}")
-
-    # ── SCHRITT 4: UMBENENNUNG ────────────────────────────────
-    new_filename = generate_new_filename(analysis, timestamp)
-    logger.info(f"  → Neuer Name: {new_filename}")
-
-    # ── SCHRITT 5: VERSCHIEBEN & CLEANUP ──────────────────────
-    dest_path = unique_filepath(dirs["umbenannt"], new_filename)
-    try:
-        shutil.move(pdf_path, dest_path)
-        final_name = os.path.basename(dest_path)
-        logger.info(f"  ✓ Verschoben nach: /Umbenannt/{final_name}")
-        result["status"] = "success"
-        result["new_name"] = final_name
-        add_log_entry(
-            original_name, final_name, "✅ Erfolgreich",
-            kategorie=analysis["kategorie"],
-            absender=analysis["absender"],
-            patient=analysis["patient"],
-        )
-    except Exception as e:
-        logger.error(f"  ✗ Verschieben fehlgeschlagen: {e}")
-        result["status"] = "move_error"
-        add_log_entry(original_name, new_filename, "❌ Verschiebe-Fehler", details=str(e))
-
-    return result
-
-
-# ──────────────────────────────────────────────────────────────
-# ORDNER-SCAN
-# ──────────────────────────────────────────────────────────────
-def scan_and_process(cfg: dict) -> list:
-    """
-    Scanne den Eingangsordner und verarbeite alle PDFs.
-    Rückgabe: Liste der Verarbeitungsergebnisse.
-    """
-    eingang = cfg["eingangsordner"]
-    if not eingang or not os.path.isdir(eingang):
-        logger.warning("Eingangsordner nicht konfiguriert oder existiert nicht.")
-        return []
-
-    dirs = ensure_subdirs(eingang)
-
-    # Finde alle PDFs im Eingangsordner (nicht in Unterordnern)
-    pdfs = sorted(
-        [
-            os.path.join(eingang, f)
-            for f in os.listdir(eingang)
-            if f.lower().endswith(".pdf") and os.path.isfile(os.path.join(eingang, f))
-        ]
-    )
-
-    if not pdfs:
-        logger.info("Keine neuen PDFs im Eingangsordner.")
-        return []
-
-    logger.info(f"📬 {len(pdfs)} neue PDF(s) gefunden.")
-    results = []
-    for pdf_path in pdfs:
-        result = process_single_pdf(pdf_path, cfg, dirs)
-        results.append(result)
-        time.sleep(1)  # Kleine Pause zwischen Dateien
-
-    return results
+# Die Pipeline liegt im Paket und wird nur einmal pro Prozess importiert;
+# Streamlit führt bei jedem Rerun nur noch diese Datei erneut aus.
+from faxfinity import (coordinator, layout, maintenance, metrics, ollama_models, patients, profiling,
+                       senders, stats, timing)
+from faxfinity import search as search_index
+from faxfinity.cassette import CASSETTE_MODES
+from faxfinity.folder_index import PAGE_SIZE, all_files, format_size, get_snapshot, record_moved
+from faxfinity.history import get_history
+from faxfinity.inboxes import get_inboxes, output_base
+from faxfinity.priority import (
+    KATEGORIEN,
+    QUEUE_ORDERS,
+    count_inbox_pdfs,
+    format_fax_rules,
+    parse_fax_rules,
+)
+from faxfinity.timing import stage_percentiles, time_to_file_by_category
+from faxfinity.pipeline import (
+    DEFAULT_CONFIG,
+    LOG_MAX_ENTRIES,
+    ensure_subdirs,
+    fetch_ollama_models,
+    load_config,
+    load_processing_log,
+    save_config,
+    unique_filepath,
+    vision_model_problem,
+)
 
 
 # ══════════════════════════════════════════════════════════════
@@ -884,11 +284,13 @@ def main():
     if "config" not in st.session_state:
         st.session_state.config = load_config()
     cfg = st.session_state.config
+    metrics.export(cfg)
 
     if "processing" not in st.session_state:
         st.session_state.processing = False
-    if "last_results" not in st.session_state:
-        st.session_state.last_results = []
+    if "session_id" not in st.session_state:
+        st.session_state.session_id = f"{id(st.session_state):x}-{time.time_ns():x}"
+    session_id = st.session_state.session_id
 
     # ── HEADER ──
     st.markdown("""
@@ -931,11 +333,11 @@ def main():
             st.markdown("<br>", unsafe_allow_html=True)
             refresh_models = st.button("🔄", help="Modelle neu laden")
 
-        if "available_models" not in st.session_state or refresh_models:
-            with st.spinner("Lade Modelle..."):
-                st.session_state.available_models = fetch_ollama_models(ollama_url)
-
-        available = st.session_state.get("available_models", [])
+        # Prozessweit zwischengespeichert (faxfinity.ollama_models); 🔄 lädt neu
+        if refresh_models:
+            ollama_models.invalidate(ollama_url)
+        with st.spinner("Lade Modelle..."):
+            available = fetch_ollama_models(ollama_url)
         with col_model:
             if available:
                 current_model = cfg.get("ollama_model", "")
@@ -954,8 +356,17 @@ def main():
                 )
             cfg["ollama_model"] = model
 
+        selected_info = ollama_models.model_info(ollama_url, model) if available else None
+        if selected_info is not None:
+            if selected_info["vision"]:
+                st.caption(ollama_models.describe(selected_info))
+            else:
+                st.error(f"🚫 {model} kann keine Bilder verarbeiten – bitte ein Vision-Modell wählen.")
+
         # Verbindungstest
         if st.button("🔌 Verbindung testen"):
+            import requests
+
             try:
                 r = requests.get(f"{ollama_url}/api/tags", timeout=5)
                 if r.status_code == 200:
@@ -987,6 +398,276 @@ def main():
         )
         cfg["scan_interval"] = scan_interval
 
+        # Speicherbudget
+        cfg["memory_budget_mb"] = int(st.number_input(
+            "🧠 Speicherbudget (MB)",
+            min_value=0,
+            max_value=16384,
+            value=int(cfg.get("memory_budget_mb", DEFAULT_CONFIG["memory_budget_mb"])),
+            step=50,
+            help="Maximaler Arbeitsspeicher für Faxe in Bearbeitung (ca. 70 MB pro Seite "
+                 "bei 300 DPI). Weitere Dokumente warten, bis Speicher frei wird. 0 = unbegrenzt.",
+        ))
+
+        # Kassette (Record/Replay für Tests & Benchmarks)
+        with st.expander("🧪 Ollama-Kassette"):
+            cassette_labels = {"": "Aus", "record": "Aufnehmen", "replay": "Wiedergeben"}
+            current_mode = cfg.get("ollama_cassette_mode", "")
+            cassette_mode = st.selectbox(
+                "Modus",
+                options=list(CASSETTE_MODES),
+                index=CASSETTE_MODES.index(current_mode) if current_mode in CASSETTE_MODES else 0,
+                format_func=lambda m: cassette_labels[m],
+                help="Aufnehmen: Ollama-Antworten speichern. "
+                     "Wiedergeben: gespeicherte Antworten ohne Ollama nutzen.",
+            )
+            cfg["ollama_cassette_mode"] = cassette_mode
+            cfg["ollama_cassette_path"] = st.text_input(
+                "Kassetten-Datei",
+                value=cfg.get("ollama_cassette_path", DEFAULT_CONFIG["ollama_cassette_path"]),
+            )
+
+        with st.expander("📊 Prometheus-Metriken"):
+            cfg["metrics_port"] = int(st.number_input(
+                "Port für /metrics (0 = aus)",
+                min_value=0, max_value=65535,
+                value=int(cfg.get("metrics_port", 0)),
+                help="Portänderungen greifen nach einem Neustart von FaxFinity.",
+            ))
+            cfg["metrics_host"] = st.text_input(
+                "Bind-Adresse",
+                value=cfg.get("metrics_host", DEFAULT_CONFIG["metrics_host"]),
+                help="0.0.0.0, damit Prometheus von einem anderen Rechner abfragen kann.",
+            )
+            cfg["metrics_textfile"] = st.text_input(
+                "Textfile-Collector-Datei (optional)",
+                value=cfg.get("metrics_textfile", ""),
+                placeholder="C:\\node_exporter\\textfile\\faxfinity.prom",
+            )
+
+        with st.expander("🚦 Reihenfolge"):
+            order_labels = {
+                "priority": "Dringlichkeit (Vorab-Einstufung)",
+                "arrival": "Eingangszeit",
+                "pages": "Seitenzahl",
+                "size": "Dateigröße",
+                "name": "Dateiname",
+            }
+            cfg["queue_order"] = st.multiselect(
+                "Sortierung (in dieser Rangfolge)",
+                options=list(QUEUE_ORDERS),
+                default=[o for o in cfg.get("queue_order", DEFAULT_CONFIG["queue_order"])
+                         if o in QUEUE_ORDERS],
+                format_func=lambda o: order_labels[o],
+                help="Die Vorab-Einstufung nutzt die Textebene der ersten Seite "
+                     "und die Faxnummer-Regeln – ohne Ollama.",
+            )
+            cfg["urgent_categories"] = st.multiselect(
+                "Dringende Kategorien (zuerst)",
+                options=list(KATEGORIEN),
+                default=[k for k in cfg.get("urgent_categories", []) if k in KATEGORIEN],
+            )
+            cfg["low_categories"] = st.multiselect(
+                "Niedrige Priorität (zuletzt)",
+                options=list(KATEGORIEN),
+                default=[k for k in cfg.get("low_categories", []) if k in KATEGORIEN],
+            )
+            cfg["fax_number_rules"] = parse_fax_rules(st.text_area(
+                "Faxnummer-Regeln",
+                value=format_fax_rules(cfg.get("fax_number_rules", {})),
+                placeholder="09131 55012 = Labor",
+                help="Eine Regel pro Zeile: Faxnummer (oder Vorwahl) = Kategorie.",
+            ))
+
+        with st.expander("📮 Postfächer"):
+            cfg["postfach_name"] = st.text_input(
+                "Name des Haupt-Postfachs",
+                value=cfg.get("postfach_name", DEFAULT_CONFIG["postfach_name"]),
+            )
+            cfg["ausgabeordner"] = st.text_input(
+                "Ausgabeordner (optional)",
+                value=cfg.get("ausgabeordner", ""),
+                help="Basis für Archiv/Umbenannt/Fehler. Leer = Eingangsordner.",
+            )
+            cfg["dateiname_vorlage"] = st.text_input(
+                "Dateiname-Vorlage (optional)",
+                value=cfg.get("dateiname_vorlage", ""),
+                placeholder="{kategorie}_{absender}_{patient}_{zeitstempel}",
+                help="Platzhalter: {kategorie}, {absender}, {patient}, {zeitstempel}. "
+                     "Leer = Standardschema.",
+            )
+            cfg["gewicht"] = int(st.number_input(
+                "Gewicht", min_value=1, max_value=100, value=int(cfg.get("gewicht", 1)),
+                help="Anteil an der Verarbeitungszeit, wenn mehrere Postfächer warten.",
+            ))
+            st.caption("Weitere Postfächer (leere Felder übernehmen die Werte oben):")
+            postfach_columns = ["postfach_name", "eingangsordner", "ausgabeordner",
+                                "eigener_name", "dateiname_vorlage", "patientenliste", "gewicht"]
+            edited = st.data_editor(
+                [{c: p.get(c) for c in postfach_columns} for p in cfg.get("postfaecher", [])]
+                or [dict.fromkeys(postfach_columns)],
+                num_rows="dynamic",
+                column_config={
+                    "postfach_name": "Name",
+                    "eingangsordner": "Eingangsordner",
+                    "ausgabeordner": "Ausgabeordner",
+                    "eigener_name": "Empfänger",
+                    "dateiname_vorlage": "Vorlage",
+                    "patientenliste": "Patientenliste",
+                    "gewicht": st.column_config.NumberColumn("Gewicht", min_value=1, max_value=100),
+                },
+                use_container_width=True,
+                key="postfaecher_editor",
+            )
+            cfg["postfaecher"] = [
+                {k: v for k, v in row.items() if v not in (None, "")}
+                for row in edited if row.get("eingangsordner")
+            ]
+
+        with st.expander("🗂️ Ablage-Struktur"):
+            st.caption("Unterordner je Bereich, z.B. {yyyy}/{mm} oder {kategorie}. "
+                       "Platzhalter: " + ", ".join(f"{{{p}}}" for p in layout.PLACEHOLDERS)
+                       + ". Leer = alles in einem Ordner.")
+            for area, folder in layout.AREAS.items():
+                key = layout.TEMPLATE_KEYS[area]
+                cfg[key] = st.text_input(folder, value=cfg.get(key, ""), key=f"cfg_{key}",
+                                         placeholder="{yyyy}/{mm}" if area == "archiv" else "")
+                problem = layout.check_template(cfg[key])
+                if problem:
+                    st.error(problem)
+            st.caption("Vorhandene Dateien umsortieren: `python faxsort_ai.py reshard --dry-run`, "
+                       "danach ohne --dry-run.")
+            archive_labels = {"kopie": "Kopie je Fax", "dedup": "Dedupliziert (SHA-256)"}
+            cfg["archiv_modus"] = st.selectbox(
+                "Archiv", options=list(archive_labels), format_func=archive_labels.get,
+                index=list(archive_labels).index(cfg.get("archiv_modus", "kopie")
+                                                 if cfg.get("archiv_modus") in archive_labels else "kopie"),
+                help="Dedupliziert: jede PDF nur einmal unter Archiv/objekte/, per Reflink wo "
+                     "möglich; ein Manifest ordnet Zeitstempel und Originalnamen zu.",
+            )
+            if cfg["archiv_modus"] == "dedup":
+                cfg["archiv_hardlinks"] = st.checkbox(
+                    "Hardlinks erlauben", value=cfg.get("archiv_hardlinks", False),
+                    help="Spart auch ohne Reflink-Dateisystem jeden Schreibvorgang. Die Datei in "
+                         "Umbenannt/ teilt sich dann den Inhalt mit dem Archiv und wird schreibgeschützt.",
+                )
+                st.caption("Suchen/Wiederherstellen: `python faxsort_ai.py archive <Name> --restore <Ordner>`")
+
+        with st.expander("🧹 Archiv-Pflege"):
+            cfg["archiv_pflege"] = st.checkbox(
+                "Archiv im Leerlauf pflegen", value=cfg.get("archiv_pflege", False),
+                help="Nachkomprimieren (verlustfrei, Schwarzweiß-Scans als CCITT G4), alte Faxe "
+                     "zu Jahresbündeln (ZIP) zusammenfassen. Läuft nur, wenn kein Scan läuft "
+                     "und der Eingang leer ist.",
+            )
+            cfg["archiv_pflege_stunden"] = int(st.number_input(
+                "Alle … Stunden", min_value=1, max_value=24 * 30,
+                value=int(cfg.get("archiv_pflege_stunden", DEFAULT_CONFIG["archiv_pflege_stunden"])),
+            ))
+            cfg["archiv_pflege_mb_s"] = int(st.number_input(
+                "Höchstens MB/s", min_value=1, max_value=1000,
+                value=int(cfg.get("archiv_pflege_mb_s", DEFAULT_CONFIG["archiv_pflege_mb_s"])),
+                help="Begrenzt Lesen/Schreiben, damit das NAS für die Praxis schnell bleibt.",
+            ))
+            cfg["archiv_buendel_tage"] = int(st.number_input(
+                "Bündeln nach … Tagen (0 = nie)", min_value=0, max_value=3650,
+                value=int(cfg.get("archiv_buendel_tage", DEFAULT_CONFIG["archiv_buendel_tage"])),
+            ))
+            cfg["archiv_aufbewahrung_jahre"] = int(st.number_input(
+                "Aufbewahrungsfrist (Jahre)", min_value=1, max_value=100,
+                value=int(cfg.get("archiv_aufbewahrung_jahre",
+                                  DEFAULT_CONFIG["archiv_aufbewahrung_jahre"])),
+                help="Gezählt ab Ende des Jahres (§ 630f BGB: 10 Jahre).",
+            ))
+            cfg["archiv_loeschen"] = st.checkbox(
+                "Jahresbündel nach Ablauf der Frist löschen", value=cfg.get("archiv_loeschen", False),
+                help="Ohne Haken werden abgelaufene Jahre nur gemeldet.",
+            )
+            maintenance.update_config(cfg)
+            job = maintenance.status()
+            if job["running"]:
+                st.info("🧹 Pflege läuft …")
+            elif st.button("🧹 Jetzt ausführen", use_container_width=True):
+                maintenance.run_now(cfg)
+                st.info("🧹 Pflege gestartet")
+            if job["last"]:
+                st.caption(f"{job['last']['ende']}: {maintenance.describe(job['last'])}")
+
+        with st.expander("📇 Patientenliste"):
+            cfg["patientenliste"] = st.text_input(
+                "CSV-Export der Praxissoftware",
+                value=cfg.get("patientenliste", ""),
+                placeholder="C:\\Praxis\\Export\\patienten.csv",
+                help="Patientennamen aus der Analyse werden auf die Schreibweise der Liste "
+                     "gebracht (Lesefehler, Umlaute). Spalten: Nachname (oder Name), optional "
+                     "Vorname und Geburtsdatum. Änderungen an der Datei werden automatisch übernommen.",
+            ).strip()
+            if cfg["patientenliste"]:
+                liste = patients.status(cfg["patientenliste"])
+                if liste["fehler"]:
+                    st.error(f"📇 {liste['fehler']}")
+                elif liste["geladen"]:
+                    st.caption(f"📇 {liste['patienten']} Patienten, {liste['nachnamen']} Nachnamen – "
+                               f"geladen {time.strftime('%d.%m. %H:%M', time.localtime(liste['geladen']))}")
+
+        with st.expander("📠 Absender-Verzeichnis"):
+            cfg["absender_verzeichnis"] = st.checkbox(
+                "Absender anhand der Faxnummer festlegen",
+                value=cfg.get("absender_verzeichnis", True),
+                help="Bekannte Faxnummern (Kopfzeile oder Dateiname) legen den Absender fest; "
+                     "das Modell fragt dann nur Kategorie und Patient. Neue Nummern werden nach "
+                     f"{senders.LEARN_AFTER} übereinstimmenden Analysen gelernt.",
+            )
+            cfg["eigene_faxnummern"] = st.text_input(
+                "Eigene Faxnummer(n)",
+                value=cfg.get("eigene_faxnummern", ""),
+                placeholder="09131 12345, 09131 12346",
+                help="Stehen z.B. auf zurückgefaxten Formularen – nie als Absender lernen.",
+            )
+            # Neue Tabelle nach dem Speichern, sonst würden die Änderungen erneut angewendet
+            version = st.session_state.setdefault("absender_editor_version", 0)
+            verzeichnis = get_history().senders()
+            edited_senders = st.data_editor(
+                verzeichnis or [dict.fromkeys(senders.COLUMNS)],
+                num_rows="dynamic",
+                column_config={
+                    "nummer": "Faxnummer",
+                    "absender": "Absender",
+                    "fachrichtung": st.column_config.TextColumn(
+                        "Fachrichtung", help="Optional, für Arztbriefe im Dateinamen"),
+                    "quelle": st.column_config.TextColumn("Quelle", disabled=True),
+                    "geaendert": st.column_config.TextColumn("Geändert", disabled=True),
+                },
+                use_container_width=True,
+                key=f"absender_editor_{version}",
+            )
+            st.caption(f"📠 {len(verzeichnis)} Nummern, davon "
+                       f"{sum(e['quelle'] == 'gelernt' for e in verzeichnis)} gelernt")
+            if st.button("💾 Verzeichnis speichern", use_container_width=True):
+                get_history().save_senders(edited_senders)
+                st.session_state["absender_editor_version"] = version + 1
+                st.rerun()
+
+        with st.expander("🖧 Mehrplatzbetrieb"):
+            cfg["shared_inbox"] = st.checkbox(
+                "Eingang mit anderen Rechnern teilen",
+                value=cfg.get("shared_inbox", False),
+                help="Jedes Fax wird vor der Verarbeitung beansprucht, damit es "
+                     "nur ein Rechner bearbeitet (Eingang z.B. auf dem NAS).",
+            )
+            cfg["node_name"] = st.text_input(
+                "Name dieses Rechners",
+                value=cfg.get("node_name", ""),
+                placeholder="leer = Rechnername",
+            )
+            cfg["lease_ttl"] = int(st.number_input(
+                "Ausfallzeit (Sekunden)",
+                min_value=10, max_value=3600,
+                value=int(cfg.get("lease_ttl", DEFAULT_CONFIG["lease_ttl"])),
+                help="Ohne Lebenszeichen für diese Zeit gilt ein Rechner als ausgefallen; "
+                     "seine Faxe kommen zurück in den Eingang.",
+            ))
+
         st.markdown('<hr class="custom-divider">', unsafe_allow_html=True)
 
         # Speichern
@@ -999,18 +680,14 @@ def main():
     # ══════════════════════════════════════════════════════════
 
     # ── Statistiken ──
-    log_entries = load_processing_log()
-    total = len(log_entries)
-    success = sum(1 for e in log_entries if "✅" in e.get("status", ""))
-    errors = sum(1 for e in log_entries if "❌" in e.get("status", "") or "⚠️" in e.get("status", ""))
+    history = get_history()
+    summary = history.summary()
+    total, success, errors = summary["total"], summary["success"], summary["errors"]
 
     # Ordner-Statistiken
-    pending_count = 0
-    if cfg["eingangsordner"] and os.path.isdir(cfg["eingangsordner"]):
-        pending_count = len([
-            f for f in os.listdir(cfg["eingangsordner"])
-            if f.lower().endswith(".pdf") and os.path.isfile(os.path.join(cfg["eingangsordner"], f))
-        ])
+    inboxes = get_inboxes(cfg)
+    pending_count = sum(count_inbox_pdfs(inbox["eingangsordner"]) for inbox in inboxes
+                        if inbox["eingangsordner"] and os.path.isdir(inbox["eingangsordner"]))
 
     col1, col2, col3, col4 = st.columns(4)
     with col1:
@@ -1045,8 +722,8 @@ def main():
     st.markdown('<hr class="custom-divider">', unsafe_allow_html=True)
 
     # ── Steuerung ──
-    tab_control, tab_log, tab_details = st.tabs([
-        "🎛️ Steuerung", "📋 Verarbeitungs-Log", "📁 Ordner-Übersicht"
+    tab_control, tab_log, tab_search, tab_stats, tab_details = st.tabs([
+        "🎛️ Steuerung", "📋 Verarbeitungs-Log", "🔍 Suche", "📈 Durchsatz", "📁 Ordner-Übersicht"
     ])
 
     with tab_control:
@@ -1065,6 +742,9 @@ def main():
             if not cfg["ollama_model"]:
                 issues.append("Kein Ollama-Modell gewählt")
                 ready = False
+            elif problem := vision_model_problem(inboxes):
+                issues.append(problem)
+                ready = False
 
             if issues:
                 for issue in issues:
@@ -1084,22 +764,86 @@ def main():
                 type="primary",
             ):
                 save_config(cfg)
-                with st.spinner("🔍 Scanne Eingangsordner und verarbeite PDFs..."):
-                    results = scan_and_process(cfg)
-                    st.session_state.last_results = results
-                if results:
-                    successes = sum(1 for r in results if r["status"] == "success")
-                    st.success(f"✅ Verarbeitung abgeschlossen: {successes}/{len(results)} erfolgreich.")
-                else:
-                    st.info("ℹ️ Keine neuen PDFs im Eingangsordner.")
-                st.rerun()
+                # Scan läuft im Hintergrund; der Fortschritt erscheint unten live
+                if not coordinator.start_scan(cfg, owner=session_id):
+                    st.warning("⏳ Es läuft bereits ein Scan.")
 
         with col_c:
             if ready:
                 if st.button("📂 Ordner erstellen", use_container_width=True):
-                    ensure_subdirs(cfg["eingangsordner"])
+                    for inbox in inboxes:
+                        if os.path.isdir(inbox["eingangsordner"]):
+                            ensure_subdirs(output_base(inbox))
                     st.success("✅ Unterordner erstellt (Archiv, Umbenannt, Fehler)")
 
+        # ── Live-Status: aktualisiert sich alle 2 s selbst, ohne die Seite neu zu laden ──
+        @st.fragment(run_every=2)
+        def live_status():
+            scan = coordinator.status(cfg)
+            scan_text = coordinator.describe(scan, session_id)
+            if scan_text:
+                st.info(scan_text)
+            docs = timing.activity()
+            if docs:
+                st.dataframe(
+                    [
+                        {
+                            "Datei": d["file"],
+                            **({"Postfach": d["postfach"]} if len(inboxes) > 1 else {}),
+                            "Schritt": timing.STAGE_LABELS.get(d["stage"], d["stage"] or "…"),
+                            "im Schritt": f"{d['stage_s']:.0f} s",
+                            "gesamt": f"{d['elapsed_s']:.0f} s",
+                        }
+                        for d in docs
+                    ],
+                    hide_index=True, use_container_width=True,
+                )
+            upcoming = coordinator.upcoming(5)
+            if upcoming:
+                st.caption("Als Nächstes: " + " · ".join(
+                    f"{pos}. {name}" + (f" ({hint})" if hint else "")
+                    for pos, (_, name, hint) in enumerate(upcoming, start=1)
+                ))
+            scan_id, summary = coordinator.last_scan()
+            if summary and not scan["running"]:
+                st.caption(f"Letzter Scan ({summary['trigger']}) um {summary['finished']}: "
+                           f"{summary['success']}/{summary['total']} erfolgreich.")
+            if coordinator.auto_scan_enabled(cfg) and not scan["running"]:
+                remaining = int(coordinator.seconds_until_due(cfg["scan_interval"]))
+                next_scan = datetime.now() + timedelta(seconds=remaining)
+                st.markdown(
+                    f"⏳ Nächster Scan in **{remaining}s** "
+                    f"(um {next_scan.strftime('%H:%M:%S')}) — "
+                    f"Intervall: {cfg['scan_interval']}s"
+                )
+            # Nach einem abgeschlossenen Scan einmal die ganze Seite (Log, Zähler, Ordner)
+            if st.session_state.setdefault("seen_scan_id", scan_id) != scan_id:
+                st.session_state.seen_scan_id = scan_id
+                st.rerun()
+
+        live_status()
+
+        # ── Profiling ──
+        with st.expander("🔬 Profiling"):
+            st.caption("Profiliert die nächsten N Dokumente (cProfile, tracemalloc, RSS je Schritt). "
+                       f"Berichte landen in `{cfg.get('profile_dir', 'profiles')}/`.")
+            prof_col1, prof_col2 = st.columns([2, 1])
+            with prof_col1:
+                profile_count = st.number_input("Anzahl Dokumente", min_value=1, max_value=100, value=1)
+            with prof_col2:
+                st.markdown("<br>", unsafe_allow_html=True)
+                if st.button("🔬 Aktivieren", use_container_width=True):
+                    profiling.request_profiles(int(profile_count))
+            pending_profiles = profiling.remaining()
+            if pending_profiles:
+                st.info(f"Noch {pending_profiles} Dokument(e) werden profiliert.")
+                if st.button("Abbrechen"):
+                    profiling.request_profiles(0)
+                    st.rerun()
+            for report in reversed(profiling.last_reports()[-5:]):
+                st.text(f"  {report['file']}: {report['timings_ms'].get('total', 0) / 1000:.1f} s, "
+                        f"Peak-RSS {report['peak_rss_mb']} MB → {report['report_dir']}")
+
         # ── Auto-Scan ──
         st.markdown('<hr class="custom-divider">', unsafe_allow_html=True)
         st.markdown("#### 🔄 Auto-Scan")
@@ -1115,81 +859,83 @@ def main():
             """, unsafe_allow_html=True)
 
         with auto_col2:
-            # Auto-Scan Status aus Config laden (überlebt Browser-Reload)
-            if "auto_scan_active" not in st.session_state:
-                st.session_state.auto_scan_active = cfg.get("auto_scan_active", False)
-
-            auto_scan = st.toggle(
-                "Auto-Scan aktiv",
-                value=st.session_state.auto_scan_active,
-                key="auto_scan_toggle",
-            )
-
-            # Bei Änderung: sofort in Config speichern
-            if auto_scan != st.session_state.auto_scan_active:
-                st.session_state.auto_scan_active = auto_scan
-                cfg["auto_scan_active"] = auto_scan
+            # Der Auto-Scan ist prozessweit (alle Tabs); beim Start aus der Config
+            # übernommen, damit er einen Browser-Reload bzw. Neustart überlebt
+            def on_auto_scan_toggle():
+                cfg["auto_scan_active"] = st.session_state.auto_scan_toggle
                 save_config(cfg)
-            else:
-                st.session_state.auto_scan_active = auto_scan
+                coordinator.set_auto_scan(cfg, cfg["auto_scan_active"])
 
-        if auto_scan and ready:
-            st.markdown(
-                '<span class="status-badge status-online">🟢 Auto-Scan aktiv</span>',
-                unsafe_allow_html=True,
-            )
+            st.session_state.auto_scan_toggle = coordinator.auto_scan_enabled(cfg)
+            auto_scan = st.toggle("Auto-Scan aktiv", key="auto_scan_toggle",
+                                  on_change=on_auto_scan_toggle)
 
-            # Zeitstempel für letzten Scan
-            if "last_auto_scan" not in st.session_state:
-                st.session_state.last_auto_scan = 0.0
-
-            now = time.time()
-            elapsed = now - st.session_state.last_auto_scan
-            interval = cfg["scan_interval"]
-
-            if elapsed >= interval:
-                # Scan durchführen
-                st.session_state.last_auto_scan = time.time()
-                with st.spinner("🔍 Auto-Scan läuft..."):
-                    results = scan_and_process(cfg)
-                if results:
-                    successes = sum(1 for r in results if r["status"] == "success")
-                    st.success(f"✅ {successes}/{len(results)} verarbeitet um {datetime.now().strftime('%H:%M:%S')}")
-                else:
-                    st.info(f"Keine neuen PDFs ({datetime.now().strftime('%H:%M:%S')})")
-
-            # Countdown bis zum nächsten Scan
-            remaining = max(0, int(interval - (time.time() - st.session_state.last_auto_scan)))
-            next_scan = datetime.now() + timedelta(seconds=remaining)
-            st.markdown(
-                f"⏳ Nächster Scan in **{remaining}s** "
-                f"(um {next_scan.strftime('%H:%M:%S')}) — "
-                f"Intervall: {interval}s"
-            )
+        if auto_scan:
+            coordinator.update_auto_config(cfg)
+            if ready:
+                st.markdown(
+                    '<span class="status-badge status-online">🟢 Auto-Scan aktiv</span>',
+                    unsafe_allow_html=True,
+                )
 
     with tab_log:
         st.markdown("#### 📋 Letzte Verarbeitungen")
-        log_entries = load_processing_log()
 
-        if not log_entries:
+        if not total:
             st.info("Noch keine Verarbeitungen durchgeführt.")
         else:
-            # Zeige die letzten 10 (oder alle)
-            show_all = st.checkbox("Alle Einträge anzeigen", value=False)
-            display_entries = log_entries if show_all else log_entries[-10:]
-            display_entries = list(reversed(display_entries))  # Neueste zuerst
+            # Filter laufen als indizierte Abfragen auf der Historie (faxfinity.history)
+            with st.expander("🔎 Filter", expanded=False):
+                f_col1, f_col2, f_col3 = st.columns(3)
+                with f_col1:
+                    f_dates = st.date_input("Zeitraum", value=(), format="DD.MM.YYYY")
+                    f_status = st.selectbox("Status", options=[""] + history.distinct("status"),
+                                            format_func=lambda v: v or "Alle")
+                with f_col2:
+                    f_kategorie = st.selectbox("Kategorie", options=[""] + history.distinct("kategorie"),
+                                               format_func=lambda v: v or "Alle")
+                    f_postfach = (st.selectbox("Postfach", options=[""] + history.distinct("postfach"),
+                                               format_func=lambda v: v or "Alle")
+                                  if len(inboxes) > 1 else "")
+                with f_col3:
+                    f_absender = st.text_input("Absender beginnt mit")
+                    f_patient = st.text_input("Patient beginnt mit")
+            filters = {
+                "status": f_status, "kategorie": f_kategorie, "postfach": f_postfach,
+                "absender": f_absender.strip(), "patient": f_patient.strip(),
+            }
+            if f_dates:
+                filters["since"] = f_dates[0].isoformat()
+                filters["until"] = ((f_dates[1] if len(f_dates) > 1 else f_dates[0])
+                                    + timedelta(days=1)).isoformat()
+
+            matching = history.count(**filters)
+            col_n, col_page = st.columns(2)
+            with col_n:
+                page_size = st.selectbox("Einträge pro Seite", options=[10, 25, 50, 100], index=0)
+            pages = max(1, -(-matching // page_size))
+            with col_page:
+                page = st.number_input(f"Seite (von {pages})", min_value=1, max_value=pages, value=1)
+            display_entries = history.query(limit=page_size, offset=(page - 1) * page_size, **filters)
+            st.caption(f"{matching} von {total} Einträgen")
 
             for entry in display_entries:
                 status_class = "log-status-ok" if "✅" in entry.get("status", "") else "log-status-err"
                 patient_info = f" | Patient: {entry['patient']}" if entry.get("patient") else ""
                 kategorie_info = f" | {entry.get('kategorie', '')}" if entry.get("kategorie") else ""
+                total_ms = entry.get("timings_ms", {}).get("total")
+                dauer_info = f" | ⏱ {total_ms / 1000:.1f} s" if total_ms is not None else ""
+                postfach_info = (f" | 📮 {entry['postfach']}"
+                                 if len(inboxes) > 1 and entry.get("postfach") else "")
 
                 st.markdown(f"""
                 <div class="log-entry">
                     <span class="log-time">{entry.get('timestamp', '')}</span>
                     <span class="{status_class}"> {entry.get('status', '')}</span>
+                    {postfach_info}
                     {kategorie_info}
                     {patient_info}
+                    {dauer_info}
                     <br>
                     <span class="log-original">{entry.get('original', '')}</span>
                     → <span class="log-new">{entry.get('neu', '')}</span>
@@ -1197,76 +943,221 @@ def main():
                 </div>
                 """, unsafe_allow_html=True)
 
-            # Log löschen
-            st.markdown('<hr class="custom-divider">', unsafe_allow_html=True)
-            if st.button("🗑️ Log leeren", type="secondary"):
-                save_processing_log([])
-                st.success("Log wurde geleert.")
+            # Laufzeiten je Verarbeitungsschritt
+            with st.expander("⏱️ Laufzeiten je Schritt (p50/p95)"):
+                last_n = st.number_input(
+                    "Letzte N Dokumente", min_value=5, max_value=1000,
+                    value=LOG_MAX_ENTRIES, step=5,
+                )
+                stage_rows = stage_percentiles(load_processing_log(int(last_n)), int(last_n))
+                if stage_rows:
+                    st.dataframe(stage_rows, hide_index=True, use_container_width=True)
+                else:
+                    st.caption("Noch keine Zeitmessungen vorhanden.")
+
+            # Zeit bis zur Ablage je Kategorie
+            with st.expander("🚦 Zeit bis zur Ablage je Kategorie (p50/p95)"):
+                ttf = time_to_file_by_category(load_processing_log(500))
+                if ttf:
+                    st.dataframe(
+                        [{"Kategorie": k, "Anzahl": v["count"],
+                          "p50 s": v["p50_s"], "p95 s": v["p95_s"]} for k, v in ttf.items()],
+                        hide_index=True, use_container_width=True,
+                    )
+                else:
+                    st.caption("Noch keine abgelegten Dokumente mit Eingangszeit.")
+
+    with tab_search:
+        # Volltextindex in der Historie (faxfinity.search)
+        query = st.text_input("🔍 Suche", placeholder="z.B. kardio meier, Labor Weiß, Ramipril",
+                              help="Kategorie, Absender, Patient, Dateinamen und Text digitaler "
+                                   "Faxe. Jedes Wort gilt als Wortanfang; Umlaute egal.")
+        s_col1, s_col2 = st.columns(2)
+        with s_col1:
+            s_dates = st.date_input("Zeitraum", value=(), format="DD.MM.YYYY", key="search_dates")
+        with s_col2:
+            s_kategorie = st.selectbox("Kategorie", options=[""] + history.distinct("kategorie"),
+                                       format_func=lambda v: v or "Alle", key="search_kategorie")
+        search_filters = {"kategorie": s_kategorie}
+        if s_dates:
+            search_filters["since"] = s_dates[0].isoformat()
+            search_filters["until"] = ((s_dates[1] if len(s_dates) > 1 else s_dates[0])
+                                       + timedelta(days=1)).isoformat()
+        if not search_index.available():
+            st.warning("Die Suche braucht SQLite mit FTS5; diese Python-Installation hat es nicht.")
+        elif query.strip() or s_kategorie:
+            t0 = time.perf_counter()
+            hits = history.search(query, **search_filters)
+            elapsed_ms = (time.perf_counter() - t0) * 1000
+            if hits:
+                st.dataframe(
+                    [{"Zeit": e.get("timestamp", ""), "Kategorie": e.get("kategorie", ""),
+                      "Absender": e.get("absender", ""), "Patient": e.get("patient", ""),
+                      "Datei": e.get("neu") or e.get("original", ""),
+                      "Ablage": (e.get("ablage") or {}).get("umbenannt")
+                                or (e.get("ablage") or {}).get("fehler", ""),
+                      "Treffer im Text": e["treffer"]}
+                     for e in hits],
+                    hide_index=True, use_container_width=True,
+                )
+            st.caption(f"{len(hits)}{'+' if len(hits) >= search_index.RESULT_LIMIT else ''} "
+                       f"Treffer in {elapsed_ms:.0f} ms")
+
+        index_job = search_index.backfill_status()
+        unindexed = history.unindexed()
+        if index_job["running"]:
+            st.info(f"🔍 Suchindex wird vervollständigt … {index_job['done']} nachgetragen")
+        elif unindexed > 0:
+            st.caption(f"{unindexed} ältere Einträge sind noch nicht durchsuchbar.")
+            if st.button("🔍 Index vervollständigen"):
+                search_index.start_backfill(history)
                 st.rerun()
+        if index_job["error"]:
+            st.error(f"Suchindex: {index_job['error']}")
+
+    with tab_stats:
+        st.markdown("#### 📈 Durchsatz & Rückstau")
+
+        if not total:
+            st.info("Noch keine Verarbeitungen durchgeführt.")
+        else:
+            # Vorberechnete Buckets aus faxfinity.stats – kein Durchzählen der Historie
+            zeitraum = st.radio("Zeitraum", options=["48 Stunden", "4 Wochen", "12 Wochen"],
+                                horizontal=True)
+            with history.reader() as conn:
+                if zeitraum == "48 Stunden":
+                    rows, x = stats.hourly(conn, 48), "Stunde"
+                else:
+                    rows, x = stats.daily(conn, 28 if zeitraum == "4 Wochen" else 84), "Tag"
+                latency_rows = stats.latency(conn, 7)
+                per_category = stats.counts(conn, "kategorie")
+
+            st.bar_chart(rows, x=x, y=["Erfolgreich", "Fehler"], color=["#4ade80", "#f87171"])
+            st.caption("📬 Größter Rückstau im Eingang")
+            st.line_chart(rows, x=x, y="Rückstau")
+
+            col_lat, col_cat = st.columns(2)
+            with col_lat:
+                st.markdown("**⏱️ Laufzeiten (7 Tage)**")
+                if latency_rows:
+                    st.dataframe(latency_rows, hide_index=True, use_container_width=True)
+                else:
+                    st.caption("Noch keine Zeitmessungen vorhanden.")
+            with col_cat:
+                st.markdown("**🗂️ Dokumente je Kategorie**")
+                st.dataframe([{"Kategorie": k, "Anzahl": v} for k, v in per_category.items()],
+                             hide_index=True, use_container_width=True)
 
     with tab_details:
         st.markdown("#### 📁 Ordner-Übersicht")
 
-        if not cfg["eingangsordner"] or not os.path.isdir(cfg["eingangsordner"]):
+        inbox = inboxes[0]
+        if len(inboxes) > 1:
+            inbox = inboxes[st.selectbox("📮 Postfach", options=range(len(inboxes)),
+                                         format_func=lambda i: inboxes[i]["postfach_name"])]
+        if not inbox["eingangsordner"] or not os.path.isdir(inbox["eingangsordner"]):
             st.warning("Kein gültiger Eingangsordner konfiguriert.")
         else:
-            base = cfg["eingangsordner"]
+            eingang_dir = inbox["eingangsordner"]
+            base = output_base(inbox)
             dirs_info = {
-                "📬 Eingang": base,
+                "📬 Eingang": eingang_dir,
                 "🗄️ Archiv": os.path.join(base, "Archiv"),
                 "✅ Umbenannt": os.path.join(base, "Umbenannt"),
                 "❌ Fehler": os.path.join(base, "Fehler"),
             }
 
+            # Ablageort über den Pfad-Index (faxfinity.layout) statt Ordner zu durchsuchen
+            wanted = st.text_input("🔎 Ablageort finden", placeholder="Dateiname oder Anfang davon",
+                                   key="ov_locate")
+            if wanted:
+                found = history.locate(wanted)
+                if found:
+                    st.dataframe(
+                        [{"Bereich": layout.AREAS.get(area, area), "Pfad": path,
+                          "Vorhanden": ("📦" if layout.split_member(path)[1] else "✅")
+                                       if layout.exists(path) else "❌"}
+                         for area, path in found],
+                        hide_index=True, use_container_width=True,
+                    )
+                else:
+                    st.caption("Nicht im Pfad-Index.")
+
+            sort_options = {
+                "Name": ("name", False), "Neueste zuerst": ("mtime", True),
+                "Älteste zuerst": ("mtime", False), "Größte zuerst": ("size", True),
+            }
             for label, dir_path in dirs_info.items():
-                if os.path.isdir(dir_path):
-                    files = [
-                        f for f in os.listdir(dir_path)
-                        if os.path.isfile(os.path.join(dir_path, f))
-                    ]
-                    pdf_count = len([f for f in files if f.lower().endswith(".pdf")])
-                    with st.expander(f"{label} — {pdf_count} PDF(s)", expanded=(label == "📬 Eingang")):
+                # Schnappschuss statt listdir + stat je Datei (faxfinity.folder_index)
+                snapshot = get_snapshot(dir_path)
+                if snapshot.refresh():
+                    # Im Eingang liegen ggf. Archiv/Umbenannt/Fehler selbst – dort keine Navigation
+                    nested = label != "📬 Eingang"
+                    pdf_count, sub_count = len(snapshot), len(snapshot.subdirs()) if nested else 0
+                    title = f"{label} — {pdf_count} PDF(s)"
+                    if sub_count:
+                        title += f", {sub_count} Unterordner"
+                    with st.expander(title, expanded=(label == "📬 Eingang")):
+                        # Unterordner nach Ablage-Vorlage: Ebene für Ebene auswählen
+                        depth = 0
+                        while nested and snapshot.subdirs():
+                            choice = st.selectbox("📂 Unterordner", ["(diese Ebene)"] + snapshot.subdirs(),
+                                                  key=f"ov_sub_{dir_path}_{depth}")
+                            if choice == "(diese Ebene)":
+                                break
+                            candidate = get_snapshot(os.path.join(snapshot.directory, choice))
+                            if not candidate.refresh():
+                                break
+                            snapshot, depth = candidate, depth + 1
+                        pdf_count = len(snapshot)
                         if pdf_count == 0:
-                            st.caption("Leer.")
-                        else:
-                            for f in sorted(files):
-                                if f.lower().endswith(".pdf"):
-                                    size = os.path.getsize(os.path.join(dir_path, f))
-                                    size_str = f"{size / 1024:.0f} KB" if size < 1024 * 1024 else f"{size / (1024*1024):.1f} MB"
-                                    st.text(f"  📄 {f}  ({size_str})")
+                            st.caption("Keine PDFs auf dieser Ebene." if sub_count else "Leer.")
+                            continue
+                        view = snapshot.directory
+                        col_filter, col_sort, col_page = st.columns([2, 1, 1])
+                        with col_filter:
+                            contains = st.text_input("Dateiname enthält", key=f"ov_filter_{view}")
+                        with col_sort:
+                            sort, descending = sort_options[st.selectbox(
+                                "Sortierung", options=list(sort_options), key=f"ov_sort_{view}",
+                                index=0 if label == "📬 Eingang" else 1)]
+                        matching, _ = snapshot.page(limit=0, contains=contains)
+                        pages = max(1, -(-matching // PAGE_SIZE))
+                        with col_page:
+                            page = st.number_input(f"Seite (von {pages})", min_value=1, max_value=pages,
+                                                   value=1, key=f"ov_page_{view}_{pages}")
+                        _, rows = snapshot.page((page - 1) * PAGE_SIZE, PAGE_SIZE,
+                                                sort, descending, contains)
+                        st.dataframe(
+                            [{"📄 Datei": name, "Größe": format_size(size),
+                              "Geändert": datetime.fromtimestamp(mtime).strftime("%d.%m.%Y %H:%M")}
+                             for name, size, mtime in rows],
+                            hide_index=True, use_container_width=True,
+                        )
+                        if contains:
+                            st.caption(f"{matching} von {pdf_count} PDF(s)")
                 else:
                     with st.expander(f"{label} — nicht erstellt"):
                         st.caption("Ordner existiert noch nicht. Klicke 'Ordner erstellen'.")
 
-            # Fehler-Ordner: Retry
-            fehler_dir = os.path.join(base, "Fehler")
-            if os.path.isdir(fehler_dir):
-                fehler_pdfs = [f for f in os.listdir(fehler_dir) if f.lower().endswith(".pdf")]
-                if fehler_pdfs and st.button("🔄 Fehler-Dateien erneut verarbeiten"):
-                    # Verschiebe zurück in Eingang
-                    moved = 0
-                    for f in fehler_pdfs:
-                        src = os.path.join(fehler_dir, f)
-                        # Entferne Prefix
-                        clean_name = re.sub(r"^(ANALYSE|KONVERTIERUNG)_\d{8}_\d{6}_", "", f)
-                        dest = unique_filepath(base, clean_name)
-                        try:
-                            shutil.move(src, dest)
-                            moved += 1
-                        except Exception:
-                            pass
-                    st.success(f"✅ {moved} Datei(en) zurück in Eingang verschoben. Starte Scan neu.")
-                    st.rerun()
-
-    # ── Auto-Scan Timer (NACH allen Tabs, damit Log + Ordner gerendert werden) ──
-    if (st.session_state.get("auto_scan_active", False)
-            and cfg.get("eingangsordner") and os.path.isdir(cfg.get("eingangsordner", ""))):
-        interval = cfg.get("scan_interval", 120)
-        last_scan = st.session_state.get("last_auto_scan", 0.0)
-        remaining = max(0, int(interval - (time.time() - last_scan)))
-        time.sleep(min(remaining + 1, interval))
-        st.rerun()
-
+            # Fehler-Ordner (samt Unterordnern): Retry
+            fehler_pdfs = all_files(os.path.join(base, "Fehler"))
+            if fehler_pdfs and st.button("🔄 Fehler-Dateien erneut verarbeiten"):
+                # Verschiebe zurück in Eingang
+                moved = 0
+                for src in fehler_pdfs:
+                    f = os.path.basename(src)
+                    # Entferne Prefix
+                    clean_name = re.sub(r"^(ANALYSE|KONVERTIERUNG)_\d{8}_\d{6}_", "", f)
+                    dest = unique_filepath(eingang_dir, clean_name)
+                    try:
+                        shutil.move(src, dest)
+                        record_moved(src, dest)
+                        moved += 1
+                    except Exception:
+                        pass
+                st.success(f"✅ {moved} Datei(en) zurück in Eingang verschoben. Starte Scan neu.")
+                st.rerun()
 
 if __name__ == "__main__":
     main()
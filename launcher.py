@@ -48,6 +48,57 @@ def find_python():
     return None
 
 
+def _site_packages_dirs(python_exe):
+    """Moegliche site-packages-Ordner eines Interpreters (ohne ihn zu starten)."""
+    import glob
+    py_dir = os.path.dirname(os.path.realpath(python_exe))
+    patterns = [
+        os.path.join(py_dir, "Lib", "site-packages"),  # Windows
+        os.path.join(py_dir, "..", "lib", "python3*", "site-packages"),  # Linux/macOS
+    ]
+    if os.environ.get("APPDATA"):  # pip install --user (Windows)
+        patterns.append(os.path.join(os.environ["APPDATA"], "Python", "Python3*", "site-packages"))
+    patterns.append(os.path.join(os.path.expanduser("~"), ".local", "lib", "python3*", "site-packages"))
+    dirs = []
+    for pattern in patterns:
+        dirs.extend(d for d in glob.glob(pattern) if os.path.isdir(d))
+    return dirs
+
+
+def find_streamlit_version(python_exe):
+    """
+    Streamlit-Version ermitteln, ohne einen weiteren Interpreter zu starten.
+    Rueckgabe: Versionsstring, "" wenn nicht bestimmbar, None wenn sicher fehlend.
+    """
+    if not getattr(sys, "frozen", False):
+        import importlib.metadata
+        import importlib.util
+        if importlib.util.find_spec("streamlit") is None:
+            return None
+        try:
+            return importlib.metadata.version("streamlit")
+        except importlib.metadata.PackageNotFoundError:
+            return ""
+
+    # EXE: Metadaten direkt aus den site-packages des gefundenen Pythons lesen
+    import glob
+    dirs = _site_packages_dirs(python_exe)
+    for site_dir in dirs:
+        for dist_info in glob.glob(os.path.join(site_dir, "streamlit-*.dist-info")):
+            return os.path.basename(dist_info)[len("streamlit-"):-len(".dist-info")]
+    if dirs and os.path.basename(python_exe).lower() not in ("py", "py.exe"):
+        return None
+    return ""  # z.B. py-Launcher: Installation unbekannt, Start entscheidet
+
+
+def print_install_hint(python_exe):
+    print("  FEHLER: Streamlit ist nicht installiert!")
+    print()
+    print("  Bitte fuehre zuerst ERSTINSTALLATION.bat aus,")
+    print("  oder installiere manuell:")
+    print(f"    {python_exe} -m pip install -r requirements.txt")
+
+
 def main():
     # Bestimme den Pfad zum Skript
     if getattr(sys, "frozen", False):
@@ -92,22 +143,13 @@ def main():
     print(f"  Python:  {python_exe}")
     print()
 
-    # Prüfe ob Streamlit installiert ist
+    # Prüfe ob Streamlit installiert ist (ohne eigenen Python-Start)
     print("  Pruefe Streamlit...")
-    check = subprocess.run(
-        [python_exe, "-c", "import streamlit; print(streamlit.__version__)"],
-        capture_output=True, text=True, timeout=15,
-    )
-    if check.returncode != 0:
-        print("  FEHLER: Streamlit ist nicht installiert!")
-        print()
-        print("  Bitte fuehre zuerst ERSTINSTALLATION.bat aus,")
-        print("  oder installiere manuell:")
-        print(f"    {python_exe} -m pip install -r requirements.txt")
+    st_version = find_streamlit_version(python_exe)
+    if st_version is None:
+        print_install_hint(python_exe)
         return
 
-    st_version = check.stdout.strip()
-
     # Freien Port finden (8501 bevorzugt, sonst nächsten freien)
     port = 8501
     for try_port in range(8501, 8511):
@@ -123,7 +165,8 @@ def main():
         print("  Bitte schliesse andere Streamlit-Instanzen.")
         return
 
-    print(f"  Streamlit v{st_version} gefunden")
+    if st_version:
+        print(f"  Streamlit v{st_version} gefunden")
     print(f"  Server:  http://localhost:{port}")
     print()
     print("  Der Browser oeffnet sich gleich automatisch...")
@@ -155,6 +198,9 @@ def main():
     if result.returncode != 0:
         print()
         print(f"  Streamlit wurde mit Fehlercode {result.returncode} beendet.")
+        if not st_version:
+            print()
+            print_install_hint(python_exe)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,466 @@
+"""
+Mock-Ollama-Server für Last- und Dauertests ohne GPU.
+
+Implementiert /api/tags, /api/show, /api/chat und /api/generate (jeweils
+mit und ohne Streaming) und liefert plausible Fax-Analysen im Format, das FaxFinity
+erwartet. Latenz, Parallelität, Fehler, Timeouts und kaputte Ausgaben sind
+konfigurierbar, damit Durchsatz, Rückstau und Fehlerbehandlung
+reproduzierbar geprüft werden können.
+
+Beispiele:
+    python mock_ollama_server.py --port 11435 --latency lognormal:1.0,0.4
+    python mock_ollama_server.py --max-concurrency 1 --max-queue 4 \\
+        --error-rate 0.05 --timeout-rate 0.02 --malformed-rate 0.2
+
+In FaxFinity dann als Ollama-URL http://localhost:11435 eintragen.
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_MODELS = ["llama3.2-vision:latest", "llava:7b"]
+
+KATEGORIEN = [
+    "Arztbrief", "Labor", "Medikationsplan", "Sturzprotokoll",
+    "Rezeptanforderung", "Bestellung", "Werbung", "Kommunikation",
+    "Überweisung", "Befund",
+]
+ABSENDER = [
+    "Kardiologe Dr. Schneider", "Pneumologe Dr. Müller", "Labor Synlab",
+    "Seniorenresidenz Abendsonne", "Blindeninstitut", "Apotheke am Markt",
+    "Radiologie Zentrum Süd",
+]
+PATIENTEN = ["Wagner", "Neubauer", "Schäfer", "Öztürk", "Becker", "Weiß", ""]
+
+# Ausgabeformate, die parse_ollama_response abdecken muss
+MALFORMED_MODES = ("markdown", "codeblock", "double_unicode", "prose", "garbage")
+
+
+# ──────────────────────────────────────────────────────────────
+# LATENZ-VERTEILUNGEN
+# ──────────────────────────────────────────────────────────────
+def parse_latency(spec: str):
+    """
+    Erzeuge eine Latenz-Funktion (Sekunden) aus einer Spezifikation:
+      const:S | uniform:A,B | normal:MU,SIGMA | lognormal:MU,SIGMA | exp:MEAN
+    Bei lognormal ist MU der Median in Sekunden.
+    """
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v.strip()] if args else []
+    kind = kind.strip().lower()
+
+    if kind == "const" and len(values) == 1:
+        return lambda rng: values[0]
+    if kind == "uniform" and len(values) == 2:
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "normal" and len(values) == 2:
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == "lognormal" and len(values) == 2:
+        import math
+        mu = math.log(values[0]) if values[0] > 0 else 0.0
+        return lambda rng: rng.lognormvariate(mu, values[1])
+    if kind == "exp" and len(values) == 1:
+        return lambda rng: rng.expovariate(1.0 / values[0]) if values[0] > 0 else 0.0
+    raise ValueError(f"Ungültige Latenz-Spezifikation: {spec!r}")
+
+
+# ──────────────────────────────────────────────────────────────
+# ANTWORT-INHALT
+# ──────────────────────────────────────────────────────────────
+def _pick_analysis(seed_bytes: bytes) -> dict:
+    """Deterministische Analyse pro Bild – gleiche Eingabe, gleiche Antwort."""
+    digest = hashlib.sha256(seed_bytes).digest()
+    return {
+        "kategorie": KATEGORIEN[digest[0] % len(KATEGORIEN)],
+        "absender": ABSENDER[digest[1] % len(ABSENDER)],
+        "patient": PATIENTEN[digest[2] % len(PATIENTEN)],
+    }
+
+
+def render_content(analysis: dict, mode: str = "") -> str:
+    """Formatiere die Analyse als Modell-Ausgabe (sauber oder kaputt)."""
+    if mode == "markdown":
+        return (
+            "Hier ist die Analyse des Dokuments:\n\n"
+            f"**Kategorie:** {analysis['kategorie']}\n"
+            f"**Absender:** {analysis['absender']}\n"
+            f"**Patient:** {analysis['patient'] or 'nicht erkennbar'} (Nachname)\n"
+        )
+    if mode == "codeblock":
+        return "```json\n" + json.dumps(analysis, ensure_ascii=False) + "\n```"
+    if mode == "double_unicode":
+        # z.B. \uü statt ü – so wie es manche Modelle ausgeben
+        escaped = json.dumps(analysis, ensure_ascii=True)
+        return escaped.replace("\\u", "\\u\\u")
+    if mode == "prose":
+        return ("Das Dokument ist " + json.dumps(analysis, ensure_ascii=False)
+                + " – weitere Angaben sind nicht ersichtlich.")
+    if mode == "garbage":
+        return "Ich kann das Dokument leider nicht lesen."
+    return json.dumps(analysis, ensure_ascii=False)
+
+
+# ──────────────────────────────────────────────────────────────
+# SERVER
+# ──────────────────────────────────────────────────────────────
+class MockOllamaServer:
+    """Konfigurierbarer Ollama-Ersatz auf Basis von ThreadingHTTPServer."""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 11435,
+        models: list | None = None,
+        text_models: list | None = None,
+        context_length: int = 131072,
+        latency: str = "const:0",
+        load_latency: float = 0.0,
+        max_concurrency: int = 1,
+        max_queue: int = 0,
+        error_rate: float = 0.0,
+        timeout_rate: float = 0.0,
+        hang_seconds: float = 300.0,
+        malformed_rate: float = 0.0,
+        malformed_modes: tuple = MALFORMED_MODES,
+        seed: int | None = None,
+    ):
+        self.models = models or list(DEFAULT_MODELS)
+        self.text_models = list(text_models or [])  # ohne Bildverarbeitung
+        self.context_length = context_length
+        self.latency = parse_latency(latency)
+        self.load_latency = load_latency
+        self.max_queue = max_queue
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.hang_seconds = hang_seconds
+        self.malformed_rate = malformed_rate
+        self.malformed_modes = tuple(malformed_modes)
+
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max(1, max_concurrency))
+        self._loaded_models: set = set()
+
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            "requests": 0,
+            "active": 0,
+            "waiting": 0,
+            "max_waiting": 0,
+            "rejected": 0,
+            "errors": 0,
+            "timeouts": 0,
+            "malformed": 0,
+            "completed": 0,
+            "show": 0,
+        }
+
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _random(self) -> float:
+        with self._rng_lock:
+            return self._rng.random()
+
+    def _choice(self, seq):
+        with self._rng_lock:
+            return self._rng.choice(seq)
+
+    def _sample_latency(self) -> float:
+        with self._rng_lock:
+            return self.latency(self._rng)
+
+    def find_model(self, model: str) -> str | None:
+        """Installierter Name zu `model` (ohne Tag: ":latest"), sonst None."""
+        for name in (model, f"{model}:latest"):
+            if name in self.models or name in self.text_models:
+                return name
+        return None
+
+    def show(self, name: str) -> dict:
+        """Antwort von /api/show im Format von Ollama ≥ 0.6."""
+        self._bump("show")
+        vision = name not in self.text_models
+        family = "mllama" if vision else "llama"
+        return {
+            "modelfile": f"FROM {name}",
+            "parameters": "",
+            "template": "{{ .Prompt }}",
+            "details": {
+                "format": "gguf",
+                "family": family,
+                "families": [family],
+                "parameter_size": "7B",
+                "quantization_level": "Q4_K_M",
+            },
+            "model_info": {
+                "general.architecture": family,
+                f"{family}.context_length": self.context_length,
+            },
+            "capabilities": ["completion", "vision"] if vision else ["completion"],
+        }
+
+    def _bump(self, key: str, delta: int = 1):
+        with self._stats_lock:
+            self.stats[key] += delta
+
+    def start(self):
+        """Starte den Server in einem Hintergrund-Thread."""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    # ── Anfrage-Verarbeitung ──
+    def run_inference(self, body: dict) -> tuple[str, str, dict] | tuple[None, str, int]:
+        """
+        Simuliere eine Inferenz.
+        Rückgabe: (content, fehlerart, durations) bzw. (None, fehlertext, http_status).
+        """
+        self._bump("requests")
+
+        with self._stats_lock:
+            if self.max_queue and self.stats["waiting"] >= self.max_queue:
+                self.stats["rejected"] += 1
+                return None, "server busy, please try again", 503
+            self.stats["waiting"] += 1
+            self.stats["max_waiting"] = max(self.stats["max_waiting"], self.stats["waiting"])
+
+        t_wait = time.perf_counter()
+        self._slots.acquire()
+        self._bump("waiting", -1)
+        self._bump("active")
+        try:
+            queued = time.perf_counter() - t_wait
+
+            model = body.get("model", "")
+            load = 0.0
+            if model not in self._loaded_models:
+                load = self.load_latency
+                self._loaded_models.add(model)
+                time.sleep(load)
+
+            if self._random() < self.timeout_rate:
+                self._bump("timeouts")
+                time.sleep(self.hang_seconds)
+                return None, "timeout injected", 504
+
+            latency = self._sample_latency()
+            time.sleep(latency)
+
+            if self._random() < self.error_rate:
+                self._bump("errors")
+                return None, "injected model failure", 500
+
+            mode = ""
+            if self.malformed_modes and self._random() < self.malformed_rate:
+                mode = self._choice(self.malformed_modes)
+                self._bump("malformed")
+
+            images = body.get("images") or []
+            for msg in body.get("messages", []):
+                images = images or msg.get("images") or []
+            seed_bytes = (images[0] if images else json.dumps(body, sort_keys=True)).encode("utf-8")
+            content = render_content(_pick_analysis(seed_bytes), mode)
+
+            self._bump("completed")
+            ns = 1_000_000_000
+            eval_count = max(1, len(content) // 4)
+            durations = {
+                "total_duration": int((queued + load + latency) * ns),
+                "load_duration": int(load * ns),
+                "prompt_eval_count": 1500,
+                "prompt_eval_duration": int(latency * 0.6 * ns),
+                "eval_count": eval_count,
+                "eval_duration": int(latency * 0.4 * ns),
+            }
+            return content, mode, durations
+        finally:
+            self._bump("active", -1)
+            self._slots.release()
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, fmt, *args):
+                pass
+
+            def _send_json(self, status: int, obj: dict):
+                data = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path == "/api/tags":
+                    self._send_json(200, {"models": [
+                        {"name": m, "model": m, "size": 0, "details": {"family": "mock"},
+                         "digest": hashlib.sha256(m.encode()).hexdigest()}
+                        for m in server.models + server.text_models
+                    ]})
+                elif self.path == "/mock/stats":
+                    with server._stats_lock:
+                        self._send_json(200, dict(server.stats))
+                elif self.path in ("/", "/api/version"):
+                    self._send_json(200, {"version": "0.0.0-mock"})
+                else:
+                    self._send_json(404, {"error": "not found"})
+
+            def do_POST(self):
+                if self.path not in ("/api/chat", "/api/generate", "/api/show"):
+                    self._send_json(404, {"error": "not found"})
+                    return
+                try:
+                    body = json.loads(self._read_body() or b"{}")
+                except json.JSONDecodeError:
+                    self._send_json(400, {"error": "invalid JSON"})
+                    return
+
+                model = body.get("model") or body.get("name", "")
+                name = server.find_model(model)
+                if name is None:
+                    self._send_json(404, {"error": f"model '{model}' not found"})
+                    return
+                if self.path == "/api/show":
+                    self._send_json(200, server.show(name))
+                    return
+                if name in server.text_models:
+                    self._send_json(500, {"error": f"{model} does not support images"})
+                    return
+
+                content, info, extra = server.run_inference(body)
+                if content is None:
+                    try:
+                        self._send_json(extra, {"error": info})
+                    except OSError:
+                        pass  # Client hat nach Timeout bereits aufgelegt
+                    return
+
+                is_chat = self.path == "/api/chat"
+                created = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+                def chunk(text: str, done: bool) -> dict:
+                    obj = {"model": model, "created_at": created, "done": done}
+                    if is_chat:
+                        obj["message"] = {"role": "assistant", "content": text}
+                    else:
+                        obj["response"] = text
+                    if done:
+                        obj["done_reason"] = "stop"
+                        obj.update(extra)
+                    return obj
+
+                if body.get("stream", True):
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/x-ndjson")
+                    self.send_header("Transfer-Encoding", "chunked")
+                    self.end_headers()
+                    pieces = [content[i:i + 8] for i in range(0, len(content), 8)]
+                    for piece in pieces:
+                        self._write_chunk(chunk(piece, False))
+                    self._write_chunk(chunk("", True))
+                    self.wfile.write(b"0\r\n\r\n")
+                else:
+                    self._send_json(200, chunk(content, True))
+
+            def _read_body(self) -> bytes:
+                """Request-Body lesen – mit Content-Length oder chunked (wie FaxFinity sendet)."""
+                if "chunked" in self.headers.get("Transfer-Encoding", "").lower():
+                    parts = []
+                    while True:
+                        size = int(self.rfile.readline().split(b";")[0].strip() or b"0", 16)
+                        if size == 0:
+                            self.rfile.readline()  # abschließende Leerzeile
+                            return b"".join(parts)
+                        parts.append(self.rfile.read(size))
+                        self.rfile.readline()  # CRLF nach jedem Stück
+                return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+            def _write_chunk(self, obj: dict):
+                line = (json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8")
+                self.wfile.write(f"{len(line):X}\r\n".encode("ascii") + line + b"\r\n")
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock-Ollama-Server für FaxFinity-Lasttests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--models", default=",".join(DEFAULT_MODELS),
+                        help="Kommagetrennte Modellnamen für /api/tags")
+    parser.add_argument("--text-models", default="",
+                        help="Zusätzliche Modelle ohne Bildverarbeitung (für die Vision-Prüfung)")
+    parser.add_argument("--context-length", type=int, default=131072,
+                        help="Kontextlänge, die /api/show meldet")
+    parser.add_argument("--latency", default="lognormal:2.0,0.3",
+                        help="const:S | uniform:A,B | normal:MU,SIGMA | lognormal:MEDIAN,SIGMA | exp:MEAN")
+    parser.add_argument("--load-latency", type=float, default=0.0,
+                        help="Einmalige Modell-Ladezeit in Sekunden")
+    parser.add_argument("--max-concurrency", type=int, default=1,
+                        help="Gleichzeitige Inferenzen (wie OLLAMA_NUM_PARALLEL)")
+    parser.add_argument("--max-queue", type=int, default=0,
+                        help="Max. wartende Anfragen, danach HTTP 503 (0 = unbegrenzt)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Anteil HTTP-500-Antworten")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="Anteil hängender Anfragen")
+    parser.add_argument("--hang-seconds", type=float, default=300.0,
+                        help="Wie lange eine 'hängende' Anfrage blockiert")
+    parser.add_argument("--malformed-rate", type=float, default=0.0,
+                        help="Anteil nicht-JSON-konformer Antworten")
+    parser.add_argument("--malformed-modes", default=",".join(MALFORMED_MODES),
+                        help=f"Auswahl aus: {', '.join(MALFORMED_MODES)}")
+    parser.add_argument("--seed", type=int, default=None, help="Zufalls-Seed für Reproduzierbarkeit")
+    args = parser.parse_args()
+
+    modes = tuple(m.strip() for m in args.malformed_modes.split(",") if m.strip())
+    unknown = set(modes) - set(MALFORMED_MODES)
+    if unknown:
+        parser.error(f"Unbekannte malformed-modes: {', '.join(sorted(unknown))}")
+
+    server = MockOllamaServer(
+        host=args.host,
+        port=args.port,
+        models=[m.strip() for m in args.models.split(",") if m.strip()],
+        text_models=[m.strip() for m in args.text_models.split(",") if m.strip()],
+        context_length=args.context_length,
+        latency=args.latency,
+        load_latency=args.load_latency,
+        max_concurrency=args.max_concurrency,
+        max_queue=args.max_queue,
+        error_rate=args.error_rate,
+        timeout_rate=args.timeout_rate,
+        hang_seconds=args.hang_seconds,
+        malformed_rate=args.malformed_rate,
+        malformed_modes=modes,
+        seed=args.seed,
+    )
+    print(f"Mock-Ollama läuft auf {server.url} (Strg+C zum Beenden)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nBeendet. Statistik:", json.dumps(server.stats))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Stapelverarbeitung (faxfinity.batch) mit dem Mock-Server."""
+
+import os
+import sys
+
+from faxfinity import ollama_models
+from faxfinity.batch import run_batch
+from faxfinity.leases import CLAIM_DIR, HEARTBEAT_FILE
+from faxfinity.pipeline import DEFAULT_CONFIG
+from mock_ollama_server import MockOllamaServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                "benchmarks"))
+from generate_fax_corpus import generate_corpus  # noqa: E402
+
+
+def _tree(root) -> list:
+    return sorted(os.path.relpath(os.path.join(d, n), root)
+                  for d, _, names in os.walk(root) for n in names)
+
+
+def test_dry_run_leaves_a_shared_inbox_untouched(tmp_path):
+    inbox = tmp_path / "in"
+    generate_corpus(str(inbox), 3, seed=2)
+    first = inbox / sorted(os.listdir(inbox))[0]
+    # Verwaister Arbeitsordner eines anderen Knotens – darf nur ein echter Lauf zurücklegen
+    foreign = inbox / CLAIM_DIR / "anderer"
+    foreign.mkdir(parents=True)
+    (foreign / "Fax_alt.pdf").write_bytes(first.read_bytes())
+    (foreign / HEARTBEAT_FILE).write_text("1", encoding="utf-8")
+    os.utime(foreign / HEARTBEAT_FILE, (1e9, 1e9))
+    before = _tree(inbox)
+
+    server = MockOllamaServer(port=0, seed=2).start()
+    try:
+        cfg = dict(DEFAULT_CONFIG, eingangsordner=str(inbox), ollama_url=server.url,
+                   ollama_model="llama3.2-vision:latest", shared_inbox=True, node_name="knoten1")
+        summary = run_batch(cfg, workers=2, dry_run=True)
+    finally:
+        server.stop()
+        ollama_models._tags.clear()
+        ollama_models._show.clear()
+
+    assert summary["statuses"] == {"success": 3}
+    assert _tree(inbox) == before
@@ -0,0 +1,36 @@
+"""Ollama-Kassette (faxfinity.cassette) mit dem Mock-Server."""
+
+import json
+
+from PIL import Image
+
+from faxfinity import ollama_models
+from faxfinity.cassette import OllamaCassette
+from faxfinity.pipeline import OLLAMA_OPTIONS, analyze_image_with_ollama
+from mock_ollama_server import MockOllamaServer
+
+MODEL = "llama3.2-vision:latest"
+
+
+def test_recorded_options_match_the_sent_request(tmp_path):
+    server = MockOllamaServer(port=0, context_length=2048, seed=1).start()
+    path = str(tmp_path / "kassette.jsonl")
+    try:
+        analysis = analyze_image_with_ollama(Image.new("L", (64, 64), 255), server.url, MODEL,
+                                             "Dr. Praxis", cassette=OllamaCassette(path, "record"))
+    finally:
+        server.stop()
+        ollama_models._tags.clear()
+        ollama_models._show.clear()
+    assert analysis is not None
+
+    with open(path, encoding="utf-8") as f:
+        recorded = json.loads(f.readline())
+    assert recorded["options"] == dict(OLLAMA_OPTIONS, num_ctx=2048)  # Kontextgrenze des Modells
+
+    # Wiedergabe ohne Server: die Grenze kommt aus der Aufnahme, der Fingerabdruck passt
+    replay = OllamaCassette(path, "replay")
+    again = analyze_image_with_ollama(Image.new("L", (64, 64), 255), "http://127.0.0.1:9", MODEL,
+                                      "Dr. Praxis", cassette=replay)
+    assert again == analysis
+    assert (replay.hits, replay.misses) == (1, 0)
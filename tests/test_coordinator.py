@@ -0,0 +1,59 @@
+"""Scan-Lock und Status (faxfinity.coordinator)."""
+
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+
+from faxfinity import coordinator
+
+
+def test_status_never_steals_the_scan_lock(tmp_path):
+    cfg = {"eingangsordner": str(tmp_path)}
+    stop = threading.Event()
+
+    def poll():  # Oberfläche und Archiv-Pflege fragen laufend nach
+        while not stop.is_set():
+            coordinator.status(cfg)
+
+    pollers = [threading.Thread(target=poll) for _ in range(4)]
+    for t in pollers:
+        t.start()
+    try:
+        for _ in range(300):
+            with coordinator.os_locks(cfg, "batch") as held:  # ScanBusy, wenn status() sperrt
+                assert len(held) == 1
+                assert coordinator.status(cfg)["foreign"]["pid"] == os.getpid()
+    finally:
+        stop.set()
+        for t in pollers:
+            t.join()
+    assert coordinator.status(cfg)["foreign"] is None
+
+
+def test_status_ignores_owner_of_crashed_process(tmp_path):
+    proc = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"],
+                          capture_output=True, text=True, check=True)
+    owner = {"pid": int(proc.stdout), "host": socket.gethostname(), "trigger": "batch"}
+    (tmp_path / coordinator.LOCK_FILE).write_text(json.dumps(owner), encoding="utf-8")
+
+    assert coordinator.status({"eingangsordner": str(tmp_path)})["foreign"] is None
+
+
+def test_profile_cli_respects_the_scan_lock(tmp_path):
+    inbox = tmp_path / "in"
+    inbox.mkdir()
+    (tmp_path / "config.json").write_text(json.dumps({"eingangsordner": str(inbox)}),
+                                          encoding="utf-8")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    with coordinator.os_locks({"eingangsordner": str(inbox)}, "batch"):
+        proc = subprocess.run(
+            [sys.executable, os.path.join(root, "faxsort_ai.py"), "profile", "--count", "1"],
+            cwd=tmp_path, capture_output=True, text=True, timeout=120,
+            env=dict(os.environ, PYTHONPATH=root))
+
+    assert proc.returncode == 2, proc.stderr
+    assert "läuft bereits" in proc.stderr
@@ -0,0 +1,48 @@
+"""Group Commit der Historie (faxfinity.history)."""
+
+import sqlite3
+import threading
+
+import pytest
+
+from faxfinity import history, senders
+
+
+def _entry(name: str) -> dict:
+    return {"timestamp": "2024-01-01 12:00:00", "original": name, "status": "✅ Erfolgreich"}
+
+
+def _count(hist) -> int:
+    with hist.reader() as conn:
+        return conn.execute("SELECT COUNT(*) FROM eintraege").fetchone()[0]
+
+
+def test_failed_commit_is_reported_and_writer_survives(tmp_path, monkeypatch):
+    hist = history.ProcessingHistory(str(tmp_path / "h.db"))
+    observe = senders.observe
+
+    def broken(conn, entries):
+        monkeypatch.setattr(senders, "observe", observe)  # nur der erste Commit scheitert
+        raise ValueError("kaputt")
+
+    monkeypatch.setattr(senders, "observe", broken)
+    with pytest.raises(history.HistoryError):
+        hist.append(_entry("a.pdf"))
+    assert _count(hist) == 0  # zurückgerollt
+
+    hist.append(_entry("b.pdf"))  # Schreiber läuft weiter
+    assert _count(hist) == 1
+
+
+def test_locked_database_is_retried(tmp_path, monkeypatch):
+    monkeypatch.setattr(history, "BUSY_TIMEOUT_MS", 50)
+    path = str(tmp_path / "h.db")
+    hist = history.ProcessingHistory(path)
+    other = sqlite3.connect(path, check_same_thread=False)
+    other.execute("BEGIN EXCLUSIVE")  # anderer Prozess schreibt gerade
+    threading.Timer(0.5, other.rollback).start()
+
+    hist.append(_entry("a.pdf"))
+
+    assert _count(hist) == 1
+    other.close()
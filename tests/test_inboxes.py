@@ -0,0 +1,53 @@
+"""Weighted Fair Queueing über mehrere Postfächer (faxfinity.inboxes)."""
+
+import pytest
+
+from faxfinity.inboxes import FairScheduler, get_inboxes
+from faxfinity.pipeline import DEFAULT_CONFIG
+
+pymupdf = pytest.importorskip("pymupdf")
+
+
+def _inbox(path, count: int):
+    path.mkdir()
+    for i in range(count):
+        doc = pymupdf.open()
+        doc.new_page()
+        doc.save(str(path / f"Fax_{i:03d}.pdf"))
+
+
+def _cfg(tmp_path, praxis: int, heim: int) -> dict:
+    _inbox(tmp_path / "praxis", praxis)
+    _inbox(tmp_path / "heim", heim)
+    return dict(DEFAULT_CONFIG, eingangsordner=str(tmp_path / "praxis"), gewicht=2,
+                postfaecher=[{"postfach_name": "Pflegeheim", "eingangsordner": str(tmp_path / "heim"),
+                              "gewicht": 1}])
+
+
+def _drain(queue: FairScheduler, n: int | None = None) -> list:
+    served = []
+    while n is None or len(served) < n:
+        item = queue.pop()
+        if item is None:
+            break
+        served.append(item[0]["postfach_name"])
+    return served
+
+
+def test_backlogged_inboxes_share_by_weight(tmp_path):
+    queue = FairScheduler(get_inboxes(_cfg(tmp_path, 40, 40)))
+
+    served = _drain(queue, 30)
+
+    assert served.count("Praxis") == 20 and served.count("Pflegeheim") == 10
+    for i in range(0, 30, 3):  # gleichmäßig verzahnt, nicht erst alle Praxis-Faxe
+        assert sorted(served[i:i + 3]) == ["Pflegeheim", "Praxis", "Praxis"]
+
+
+def test_idle_inbox_leaves_its_share_to_the_others(tmp_path):
+    queue = FairScheduler(get_inboxes(_cfg(tmp_path, 3, 20)))
+
+    served = _drain(queue)
+
+    assert served.count("Praxis") == 3 and served.count("Pflegeheim") == 20
+    assert "Praxis" not in served[6:]  # danach bekommt das Pflegeheim die ganze GPU
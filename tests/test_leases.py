@@ -0,0 +1,84 @@
+"""Beanspruchen per Rename und Ausfall-Erkennung (faxfinity.leases)."""
+
+import os
+import threading
+
+from faxfinity import leases
+from faxfinity.leases import CLAIM_DIR, HEARTBEAT_FILE, InboxLeases
+
+
+def _fax(path, name: str) -> str:
+    path = os.path.join(path, name)
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4")
+    return path
+
+
+def test_exactly_one_node_wins_a_racing_claim(tmp_path):
+    nodes = [InboxLeases(str(tmp_path), "a"), InboxLeases(str(tmp_path), "b")]
+    for i in range(50):
+        pdf = _fax(tmp_path, f"Fax_{i:03d}.pdf")
+        start = threading.Barrier(2)
+        results = [None, None]
+
+        def claim(k):
+            start.wait()
+            results[k] = nodes[k].claim(pdf)
+
+        threads = [threading.Thread(target=claim, args=(k,)) for k in range(2)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        winners = [r for r in results if r is not None]
+        assert len(winners) == 1
+        assert os.path.exists(winners[0]) and not os.path.exists(pdf)
+
+
+def _crashed_node(tmp_path, name: str, pdf_name: str) -> str:
+    """Arbeitsordner eines Knotens, dessen Prozess mitten in der Arbeit abgestürzt ist."""
+    node_dir = tmp_path / CLAIM_DIR / name
+    node_dir.mkdir(parents=True)
+    _fax(node_dir, pdf_name)
+    (node_dir / HEARTBEAT_FILE).write_text(f"{name} 4711 7\n", encoding="utf-8")
+    return str(node_dir)
+
+
+def test_files_of_a_silent_node_return_after_ttl(tmp_path, monkeypatch):
+    _crashed_node(tmp_path, "a", "Fax_001.pdf")
+    b = InboxLeases(str(tmp_path), "b", ttl=30)
+    clock = [1000.0]
+    monkeypatch.setattr(leases.time, "monotonic", lambda: clock[0])
+
+    assert b.recover_stale(force=True) == 0  # frischer Heartbeat: erst beobachten
+    clock[0] += 29
+    assert b.recover_stale(force=True) == 0  # noch innerhalb der Frist
+    clock[0] += 2
+    assert b.recover_stale(force=True) == 1  # Heartbeat seit > ttl unverändert
+
+    assert os.path.exists(tmp_path / "Fax_001.pdf")
+    assert "Fax_001.pdf" not in os.listdir(tmp_path / CLAIM_DIR / "a")
+
+
+def test_live_node_keeps_its_files(tmp_path, monkeypatch):
+    node_dir = _crashed_node(tmp_path, "a", "Fax_001.pdf")
+    b = InboxLeases(str(tmp_path), "b", ttl=30)
+    clock = [1000.0]
+    monkeypatch.setattr(leases.time, "monotonic", lambda: clock[0])
+
+    for beat in range(8, 12):  # Knoten a lebt: der Zähler ändert sich laufend
+        assert b.recover_stale(force=True) == 0
+        with open(os.path.join(node_dir, HEARTBEAT_FILE), "w", encoding="utf-8") as f:
+            f.write(f"a 4711 {beat}\n")
+        clock[0] += 20
+
+    assert os.path.exists(os.path.join(node_dir, "Fax_001.pdf"))
+
+
+def test_long_orphaned_node_is_recovered_at_first_sight(tmp_path):
+    node_dir = _crashed_node(tmp_path, "a", "Fax_001.pdf")
+    os.utime(os.path.join(node_dir, HEARTBEAT_FILE), (1e9, 1e9))  # laut NAS-Uhr uralt
+
+    assert InboxLeases(str(tmp_path), "b", ttl=30).recover_stale(force=True) == 1
+    assert os.path.exists(tmp_path / "Fax_001.pdf")
@@ -0,0 +1,85 @@
+"""Archiv-Pflege (faxfinity.maintenance)."""
+
+import json
+import os
+import random
+import subprocess
+import sys
+
+import pytest
+
+from faxfinity import maintenance
+from faxfinity.history import get_history
+
+pymupdf = pytest.importorskip("pymupdf")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _bloated_pdf(path: str):
+    """Unkomprimierter Schwarz-Weiß-Scan in RGB – lohnt das Nachkomprimieren."""
+    rng = random.Random(1)
+    doc = pymupdf.open()
+    for _ in range(2):
+        page = doc.new_page()
+        pix = pymupdf.Pixmap(pymupdf.csRGB, pymupdf.IRect(0, 0, 400, 400), False)
+        pix.set_rect(pix.irect, (255, 255, 255))
+        for _ in range(300):
+            x, y = rng.randrange(390), rng.randrange(390)
+            pix.set_rect(pymupdf.IRect(x, y, x + 8, y + 8), (0, 0, 0))
+        page.insert_image(page.rect, pixmap=pix)
+    doc.save(path)
+    os.utime(path, (1e9, 1e9))  # alt genug für die Pflege
+
+
+def test_maintain_dry_run_prints_valid_json(tmp_path):
+    archiv = tmp_path / "in" / "Archiv"
+    archiv.mkdir(parents=True)
+    _bloated_pdf(str(archiv / "20200101_120000_alt.pdf"))
+    (tmp_path / "config.json").write_text(
+        json.dumps({"eingangsordner": str(tmp_path / "in")}), encoding="utf-8")
+
+    proc = subprocess.run(
+        [sys.executable, os.path.join(ROOT, "faxsort_ai.py"), "maintain", "--dry-run"],
+        cwd=tmp_path, capture_output=True, text=True, timeout=120,
+        env=dict(os.environ, PYTHONPATH=ROOT),
+    )
+
+    assert proc.returncode == 0, proc.stderr
+    report = json.loads(proc.stdout)  # keine Warnungen o.ä. vor dem JSON
+    assert report["geprueft"] == 1
+    assert report["komprimiert"] == 1
+
+
+def test_dedup_objects_are_not_recompressed(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    objekt = tmp_path / "in" / "Archiv" / "objekte" / "ab" / ("ab" + "0" * 62 + ".pdf")
+    objekt.parent.mkdir(parents=True)
+    _bloated_pdf(str(objekt))
+    before = objekt.read_bytes()
+
+    report = maintenance.run({"eingangsordner": str(tmp_path / "in"), "archiv_buendel_tage": 0})
+
+    assert report["geprueft"] == 0
+    assert objekt.read_bytes() == before  # Name = SHA-256 des Inhalts
+
+
+def test_retention_forgets_deleted_bundles(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    archiv = tmp_path / "in" / "Archiv"
+    archiv.mkdir(parents=True)
+    (archiv / "20000101_120000_alt.pdf").write_bytes(b"%PDF-1.4 alt")
+    cfg = {"eingangsordner": str(tmp_path / "in"), "archiv_buendel_tage": 1}
+
+    def indexed():
+        with get_history().reader() as conn:
+            return [p for (p,) in conn.execute("SELECT pfad FROM ablage")]
+
+    report = maintenance.run(cfg)
+    assert report["gebuendelt"] == 1 and report["abgelaufen"] == ["2000"]
+    assert [p.rsplit("::", 1)[1] for p in indexed()] == ["20000101_120000_alt.pdf"]
+
+    report = maintenance.run(dict(cfg, archiv_loeschen=True))
+    assert report["geloescht"] > 0
+    assert not (archiv / "Jahresbuendel" / "2000").exists()
+    assert indexed() == []
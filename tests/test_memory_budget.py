@@ -0,0 +1,57 @@
+"""Speicherbudget und Request-Body in Stücken (faxfinity.memory_budget)."""
+
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import requests
+
+from faxfinity.memory_budget import MemoryBudget, iter_body_chunks
+
+
+def test_chunks_are_views_and_reservation_shrinks_to_rest():
+    body = bytes(range(256)) * 4000  # 1 024 000 Bytes
+    budget = MemoryBudget()
+    reservation = budget.reserve(len(body))
+    reserved, chunks = [], []
+
+    for chunk in iter_body_chunks(body, reservation, chunk_size=300_000):
+        assert isinstance(chunk, memoryview)
+        chunks.append(bytes(chunk))
+        reserved.append(budget.reserved)
+
+    assert b"".join(chunks) == body
+    # vor jedem Stück: noch nicht gesendeter Rest inklusive dieses Stücks
+    assert reserved == [1_024_000, 724_000, 424_000, 124_000]
+    assert budget.reserved == 0
+
+
+def test_chunks_go_over_the_wire():
+    received = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            data = b""
+            while True:  # Transfer-Encoding: chunked
+                size = int(self.rfile.readline().strip(), 16)
+                data += self.rfile.read(size)
+                self.rfile.readline()
+                if not size:
+                    break
+            received.append(data)
+            self.send_response(200)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.handle_request, daemon=True).start()
+    body = b'{"x": "' + b"a" * 700_000 + b'"}'
+
+    resp = requests.post(f"http://127.0.0.1:{server.server_port}/api/chat",
+                         data=iter_body_chunks(body), timeout=10)
+
+    server.server_close()
+    assert resp.status_code == 200
+    assert received == [body]
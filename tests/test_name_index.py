@@ -0,0 +1,59 @@
+"""Eindeutige Dateinamen per O_EXCL-Reservierung (faxfinity.name_index)."""
+
+import os
+import threading
+
+from faxfinity import name_index
+
+
+def test_concurrent_reservations_get_distinct_names(tmp_path):
+    paths, lock = [], threading.Lock()
+    shared = lambda: name_index.reserve_filepath(str(tmp_path), "Werbung_20240115.pdf")  # noqa: E731
+    other = name_index.NameIndex(str(tmp_path))  # eigener Index wie in einem zweiten Prozess
+
+    def reserve(reserve_fn):
+        for _ in range(25):
+            path = reserve_fn()
+            with lock:
+                paths.append(path)
+
+    threads = [threading.Thread(target=reserve, args=(shared,)) for _ in range(4)]
+    threads.append(threading.Thread(target=reserve,
+                                    args=(lambda: other.reserve("Werbung_20240115.pdf"),)))
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(paths) == len(set(paths)) == 125
+    assert sorted(os.listdir(tmp_path)) == sorted(os.path.basename(p) for p in paths)
+
+
+def test_released_name_can_be_reserved_again(tmp_path):
+    first = name_index.reserve_filepath(str(tmp_path), "Arztbrief.pdf")
+    name_index.release(first)  # Verschieben fehlgeschlagen: Platzhalter weg
+    assert not os.path.exists(first)
+
+    assert name_index.reserve_filepath(str(tmp_path), "Arztbrief.pdf") == first
+
+
+def test_written_file_is_not_released(tmp_path):
+    path = name_index.reserve_filepath(str(tmp_path), "Labor.pdf")
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4")
+    name_index.release(path)  # nur leere Platzhalter werden entfernt
+    assert os.path.getsize(path) == 8
+    assert name_index.reserve_filepath(str(tmp_path), "Labor.pdf") != path
+
+
+def test_external_files_are_never_overwritten(tmp_path):
+    name_index.reserve_filepath(str(tmp_path), "Befund.pdf")  # Index ist jetzt geladen
+    for name in ("Befund_1.pdf", "Labor.pdf"):  # von einem anderen Rechner angelegt
+        (tmp_path / name).write_bytes(b"fremd")
+
+    assert os.path.basename(name_index.reserve_filepath(str(tmp_path), "Befund.pdf")) \
+        == "Befund_2.pdf"
+    assert os.path.basename(name_index.reserve_filepath(str(tmp_path), "Labor.pdf")) \
+        == "Labor_1.pdf"
+    for name in ("Befund_1.pdf", "Labor.pdf"):
+        assert (tmp_path / name).read_bytes() == b"fremd"
@@ -0,0 +1,121 @@
+"""Abgleich mit der Patientenliste (faxfinity.patients)."""
+
+import os
+import random
+
+import pytest
+
+from faxfinity import patients
+from faxfinity.patients import DeletionIndex, PatientIndex, distance, max_distance
+
+SYLLABLES = ["mul", "ler", "sch", "mid", "er", "wag", "ner", "hof", "man", "bec", "ker", "kru",
+             "ger", "neu", "bau", "wei", "ss", "oz", "tur", "k", "a", "ei", "ber", "stein"]
+
+
+def _typo(rng, word: str) -> str:
+    for _ in range(rng.choice((1, 1, 2, 3))):
+        i = rng.randrange(len(word))
+        op = rng.choice(("einfügen", "löschen", "ersetzen", "vertauschen"))
+        if op == "einfügen":
+            word = word[:i] + rng.choice("abeiklmnrstu") + word[i:]
+        elif op == "löschen" and len(word) > 2:
+            word = word[:i] + word[i + 1:]
+        elif op == "ersetzen":
+            word = word[:i] + rng.choice("abeiklmnrstu") + word[i + 1:]
+        elif i + 1 < len(word):
+            word = word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    return word
+
+
+def _brute_force(keys: set, key: str) -> set:
+    limit = max_distance(key)
+    if not limit:
+        return set()
+    found = set()
+    for candidate in keys:
+        allowed = min(limit, max_distance(candidate))
+        d = distance(key, candidate, allowed)
+        if d <= allowed:
+            found.add((d, candidate))
+    return found
+
+
+def test_deletion_index_is_exact_against_brute_force():
+    rng = random.Random(7)
+    keys = {"".join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 5))) for _ in range(600)}
+    index = DeletionIndex()
+    for key in keys:
+        index.add(key)
+    queries = [_typo(rng, rng.choice(sorted(keys))) for _ in range(400)]
+    queries += ["".join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 5))) for _ in range(100)]
+
+    for query in queries:
+        assert set(index.search(query)) == _brute_force(keys, query), query
+
+
+def test_distance_counts_a_transposition_once():
+    assert distance("muller", "mulelr", 2) == 1
+    assert distance("muller", "mueller", 2) == 1
+    assert distance("wagner", "wgnera", 1) == 2  # > limit: früh abgebrochen
+
+
+def _normalized(index: DeletionIndex) -> dict:
+    return {v: frozenset([k] if isinstance(k, str) else k) for v, k in index.variants.items()}
+
+
+@pytest.fixture
+def patient_list(tmp_path):
+    path = tmp_path / "patienten.csv"
+    path.write_bytes("Nachname;Vorname;Geburtsdatum\n"
+                     "Wagner;Anna;01.01.1950\n"
+                     "Neubauer;Karl;02.02.1960\n"
+                     "Neubauer;Eva;03.03.1970\n"
+                     "Schaefer;Tom;04.04.1980\n"
+                     "Müller;Lisa;06.06.1945\n"
+                     "Meier;Otto;07.07.1955\n"
+                     "Mayer;Ute;08.08.1965\n".encode("cp1252"))  # ältere Praxissoftware
+    index = PatientIndex(str(path))
+    index.refresh()
+    assert not index.error
+    return path, index
+
+
+@pytest.mark.parametrize("value, status, patient", [
+    ("Wagner", "exakt", "Wagner"),
+    ("Wagnr", "korrigiert", "Wagner"),
+    ("Mueller", "korrigiert", "Müller"),  # Schreibweise der Liste
+    ("Frau Schäfer", "korrigiert", "Schaefer"),  # Anrede zählt nicht
+    ("Eva Neubauer", "exakt", "Neubauer"),  # Vorname grenzt auf eine Patientin ein
+    ("Neubaur, Karl", "korrigiert", "Neubauer"),
+    ("Neubauer", "mehrdeutig", "Neubauer"),  # zwei Patienten gleichen Namens
+    ("Meyer", "mehrdeutig", "Meyer"),  # Meier und Mayer gleich nah: Modellwert bleibt
+    ("Zimmermann", "unbekannt", "Zimmermann"),
+])
+def test_match_outcomes(patient_list, value, status, patient):
+    _, index = patient_list
+    result = patients.match(index, value)
+    assert (result["status"], result["patient"]) == (status, patient)
+    assert bool(result["hinweis"]) == (status in ("korrigiert", "mehrdeutig"))
+
+
+def test_changed_list_is_applied_incrementally(patient_list):
+    path, index = patient_list
+    text = path.read_bytes().decode("cp1252").replace("Wagner;Anna;01.01.1950\n", "")
+    path.write_bytes((text + "Hoffmann;Jan;09.09.1999\n").encode("cp1252"))
+    os.utime(path, ns=(0, 10**18))  # andere mtime, auch bei grober Auflösung
+    index._checked = None  # nicht auf CHECK_INTERVAL warten
+    index.refresh()
+
+    assert patients.match(index, "Wagnr")["status"] == "unbekannt"
+    assert patients.match(index, "Hofmann")["patient"] == "Hoffmann"
+    fresh = DeletionIndex()
+    for key in index.by_key:
+        fresh.add(key)
+    assert _normalized(index.fuzzy) == _normalized(fresh)
+
+
+def test_resolve_writes_the_list_spelling_and_a_hint(patient_list):
+    path, _ = patient_list
+    analysis = patients.resolve({"patient": "Wagnr"}, {"patientenliste": str(path)})
+    assert analysis["patient"] == "Wagner"
+    assert "Wagner" in analysis["patient_hinweis"]
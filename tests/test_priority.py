@@ -0,0 +1,25 @@
+"""Vorab-Einstufung per Textebene (faxfinity.priority)."""
+
+import pytest
+
+from faxfinity.priority import classify_text
+
+
+@pytest.mark.parametrize("text", [
+    "Angebot zur Nachsorge nach Ihrem Klinikaufenthalt",
+    "Therapieangebot Physiotherapie für Frau Wagner",
+    "Kostenangebot Hilfsmittel, bitte Verordnung beilegen",
+    "Rabattvertrag der Kasse: Präparat wurde ausgetauscht",
+    "Insgesamt günstiger Verlauf, Kontrolle in 3 Monaten",
+])
+def test_clinical_mail_is_not_advertising(text):
+    assert classify_text(text) != "Werbung"
+
+
+@pytest.mark.parametrize("text", [
+    "Nur diese Woche: Sonderangebot Einmalhandschuhe!",
+    "Unser Newsletter für Praxisbedarf",
+    "Keine Faxe mehr? Hier abbestellen: 0800 123",
+])
+def test_advertising_is_recognized(text):
+    assert classify_text(text) == "Werbung"
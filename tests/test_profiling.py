@@ -0,0 +1,56 @@
+"""Profiling auf Abruf (faxfinity.profiling)."""
+
+import os
+import time
+
+import pytest
+
+from faxfinity import profiling
+
+pytestmark = pytest.mark.skipif(profiling.current_rss_mb() is None, reason="RSS nicht messbar")
+
+
+def _process(pdf_path, cfg, dirs, timer):
+    with timer.stage("render"):
+        buf = b"x" * (200 * 1024 * 1024)  # kurzlebige Spitze mitten im Schritt
+        time.sleep(0.2)
+        del buf
+    return {"status": "success", "timings_ms": timer.as_ms()}
+
+
+def test_stage_peak_is_sampled_and_report_dirs_are_unique(tmp_path):
+    pdf = tmp_path / "fax.pdf"
+    pdf.write_bytes(b"%PDF-1.4")
+    out = tmp_path / "profile"
+
+    for _ in range(2):  # beide in derselben Sekunde
+        profiling.profile_document(_process, str(pdf), {}, {}, str(out))
+
+    first, second = profiling.last_reports()[-2:]
+    assert first["report_dir"] != second["report_dir"]
+    assert len(os.listdir(out)) == 2
+    render = second["stages"]["render"]
+    assert render["rss_mb_peak"] >= render["rss_mb_after"] + 150
+    assert second["peak_rss_mb"] >= render["rss_mb_peak"]
+
+
+def test_repeated_stage_adds_up_like_the_timer(tmp_path):
+    pdf = tmp_path / "fax.pdf"
+    pdf.write_bytes(b"%PDF-1.4")
+
+    def process(pdf_path, cfg, dirs, timer):
+        with timer.stage("parse"):
+            buf = b"x" * (200 * 1024 * 1024)  # erster Durchlauf: Spitze
+            time.sleep(0.2)
+            del buf
+        with timer.stage("parse"):
+            time.sleep(0.1)
+        return {"status": "success", "timings_ms": timer.as_ms()}
+
+    profiling.profile_document(process, str(pdf), {}, {}, str(tmp_path / "profile"))
+
+    report = profiling.last_reports()[-1]
+    parse = report["stages"]["parse"]
+    assert parse["seconds"] == pytest.approx(report["timings_ms"]["parse"] / 1000, abs=0.002)
+    assert parse["seconds"] >= 0.3
+    assert parse["rss_mb_peak"] >= parse["rss_mb_after"] + 150